@@ -1,36 +1,244 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
-from flask import Flask, render_template, request, session
-from flask_socketio import SocketIO, emit, join_room, leave_room
-from game import Game, Team, GamePhase, Player, Role
+from flask import Flask, Response, render_template, request, session
+from flask_socketio import ConnectionRefusedError, SocketIO, join_room, leave_room
+from game import Game, GameAction, Team, GamePhase, Player as GamePlayer, Role
+from broadcast import BroadcastCoalescer
+from outbound import ClientOutbox
+import wire
+from lobby import LobbyIndex
+from matchmaking import MatchQueue
+from bots import BotDriver, BOT_NAME_PREFIX
+from archive import GameArchive
+from stats import LEADERBOARD_SIZE, PlayerStatsStore, profile_id_for
+from replay import RECENT_SIZE, ReplayStore
+from memory import MemoryProfiler, MemorySampler, rooms_report, rss_bytes
+from tracing import Tracer, TracedJSON, span
+from events import EventExporter
+from chat import ChatHistory
+from ratelimit import RateLimiter
+from handoff import HandoffServer
+import handoff
+from functools import wraps
+import contextlib
+import hmac
+import os
 import random
 import string
+import threading
 import time
 
 app = Flask(__name__)
 app.config['SECRET_KEY'] = 'your-secret-key-here'  # 更改为一个安全的密钥
-socketio = SocketIO(app, cors_allowed_origins="*", async_mode='threading')
+app.config['BROADCAST_WINDOW_MS'] = float(os.environ.get('BROADCAST_WINDOW_MS', 20))  # 广播合并窗口，0 表示关闭
+app.config['OUTBOUND_QUEUE_SIZE'] = int(os.environ.get('OUTBOUND_QUEUE_SIZE', 32))  # 每个连接最多缓存的消息数
+app.config['ADMIN_TOKEN'] = os.environ.get('ADMIN_TOKEN')  # 未设置时关闭 /admin 接口
+app.config['MAX_BATCH_ACTIONS'] = int(os.environ.get('MAX_BATCH_ACTIONS', 64))  # HTTP 批量接口每次最多执行的动作数
+app.config['CHAT_HISTORY'] = int(os.environ.get('CHAT_HISTORY', 50))  # 每个房间保留的聊天消息数
+app.config['CHAT_MAX_LENGTH'] = int(os.environ.get('CHAT_MAX_LENGTH', 200))  # 单条聊天消息的最大字数
+app.config['CHAT_RATE'] = float(os.environ.get('CHAT_RATE', 1))  # 每位玩家每秒可以发送的消息数，0 表示不限
+app.config['CHAT_BURST'] = int(os.environ.get('CHAT_BURST', 5))  # 允许连续发送的消息数
+app.config['MAX_ROOMS'] = int(os.environ.get('MAX_ROOMS', 5000))  # 进程内同时存在的房间数上限
+app.config['SOCKET_RATE'] = float(os.environ.get('SOCKET_RATE', 20))  # 每个连接每秒可以发送的事件数，0 表示不限
+app.config['SOCKET_BURST'] = int(os.environ.get('SOCKET_BURST', 40))
+app.config['IP_RATE'] = float(os.environ.get('IP_RATE', 200))  # 每个 IP 每秒的事件数（含新连接），0 表示不限
+app.config['IP_BURST'] = int(os.environ.get('IP_BURST', 400))
+# 数据包经由 TracedJSON 编码，被采样的动作中可以看到每次 emit 的 JSON 编码耗时
+socketio = SocketIO(app, cors_allowed_origins="*", async_mode='threading', json=TracedJSON)
+
+# 动作延迟追踪：按比例采样，写入 Chrome Trace 格式的轮转文件
+tracer = Tracer(
+    os.environ.get('TRACE_FILE', os.path.join('data', 'traces', 'actions.json')),
+    sample_rate=float(os.environ.get('TRACE_SAMPLE_RATE', 0.01)),
+    max_bytes=int(os.environ.get('TRACE_MAX_MB', 16)) * 1024 * 1024)
+
+def room_participants(room):
+    """获取 Socket.IO 房间内的所有连接"""
+    return [sid for sid, _ in socketio.server.manager.get_participants('/', room)]
+
+def engineio_backlog(sid):
+    """连接在 Engine.IO 层尚未写出的数据包数量"""
+    eio_sid = socketio.server.manager.eio_sid_from_sid(sid, '/')
+    eio_socket = socketio.server.eio.sockets.get(eio_sid) if eio_sid else None
+    return eio_socket.queue.qsize() if eio_socket is not None else 0
+
+# 每个连接的有界发送队列，慢客户端只积压最新快照
+outbox = ClientOutbox(
+    lambda event, payload, sid: socketio.emit(event, payload, to=sid),
+    engineio_backlog,
+    maxlen=app.config['OUTBOUND_QUEUE_SIZE'],
+    spawn=socketio.start_background_task,
+    sleep=socketio.sleep)
+
+# 协商使用二进制协议的连接
+binary_clients = set()
+# 连接对应的玩家档案 id（由客户端保存的令牌派生），入座时记到 Player 上用于统计
+client_profiles = {}
+
+def _emit_room(event, payload, room, skip_sid):
+    socketio.emit(event, payload, to=room, skip_sid=skip_sid)
+
+def emit_to_room(event, payload, room):
+    """经由各连接的发送队列向房间广播，二进制协议的连接收到编码一次的 MessagePack 负载"""
+    sids = room_participants(room)
+    binary = [sid for sid in sids if sid in binary_clients]
+    if not binary:
+        with span('emit', event=event, recipients=len(sids)):
+            outbox.broadcast(room, event, payload, sids, _emit_room)
+        return
+
+    text = [sid for sid in sids if sid not in binary_clients]
+    if text:
+        with span('emit', event=event, recipients=len(text)):
+            outbox.broadcast(room, event, payload, text, _emit_room, skip=binary)
+    with span('msgpack_encode'):
+        encoded = wire.encode(payload)
+    with span('emit', event=event, recipients=len(binary), protocol='msgpack'):
+        outbox.broadcast(room, event, encoded, binary, _emit_room, skip=text)
+
+# 按房间合并短时间内的 game_update 广播
+broadcaster = BroadcastCoalescer(
+    emit_to_room,
+    app.config['BROADCAST_WINDOW_MS'],
+    spawn=socketio.start_background_task,
+    sleep=socketio.sleep)
 
 # 存储所有房间
 rooms = {}
+# 已分配房间号、还没登记到 rooms 的房间；容量检查、预留和登记都在 rooms_lock 下进行
+rooms_lock = threading.Lock()
+reserved_codes = set()
+
+# 进程交接开始后置位：房间状态已经交给新进程，不再创建房间、加入玩家或执行动作
+draining = threading.Event()
+DRAINING_ERROR = '服务器正在更新，请稍后重连'
+
+# 以交接方式启动（设置 HANDOFF_SOCKET）时的交接服务和从旧进程接管时的耗时
+handoff_server = None
+handoff_received = None
+
+def ensure_accepting():
+    """交接开始后拒绝修改房间的请求"""
+    if draining.is_set():
+        raise ValueError(DRAINING_ERROR)
+
+# 内存排查：tracemalloc 快照按需开启，房间占用的周期采样开销很低可以常开
+memory_profiler = MemoryProfiler()
+memory_sampler = MemorySampler(
+    rooms,
+    interval=int(os.environ.get('MEMORY_SAMPLE_MS', 10000)) / 1000,
+    spawn=socketio.start_background_task,
+    sleep=socketio.sleep)
+
+# 已结束对局的列式归档，对局结束时只写入内存缓冲，后台批量追加到磁盘
+archive = GameArchive(
+    os.environ.get('ARCHIVE_DIR', os.path.join('data', 'archive')),
+    interval=int(os.environ.get('ARCHIVE_FLUSH_MS', 1000)) / 1000,
+    spawn=socketio.start_background_task,
+    sleep=socketio.sleep)
+
+# 已结束对局的动作回放，对局结束时只编码放入缓冲，后台批量写入磁盘
+replays = ReplayStore(
+    os.environ.get('REPLAY_DIR', os.path.join('data', 'replays')),
+    interval=int(os.environ.get('REPLAY_FLUSH_MS', 200)) / 1000,
+    spawn=socketio.start_background_task,
+    sleep=socketio.sleep)
+
+# 玩家统计，对局结束时记录增量，后台批量写入 SQLite
+player_stats = PlayerStatsStore(
+    os.environ.get('STATS_DB', os.path.join('data', 'stats.sqlite3')),
+    interval=int(os.environ.get('STATS_FLUSH_MS', 200)) / 1000,
+    spawn=socketio.start_background_task,
+    sleep=socketio.sleep)
+
+# 分析用的结构化事件：处理函数只写入内存缓冲区，后台批量写入轮转的 NDJSON 文件
+events = EventExporter(
+    os.environ.get('EVENTS_FILE', os.path.join('data', 'events', 'events.ndjson')),
+    capacity=int(os.environ.get('EVENTS_BUFFER', 10000)),
+    interval=int(os.environ.get('EVENTS_FLUSH_MS', 1000)) / 1000,
+    max_bytes=int(os.environ.get('EVENTS_MAX_MB', 64)) * 1024 * 1024,
+    spawn=socketio.start_background_task,
+    sleep=socketio.sleep)
+
+# 聊天限流，按 (房间号, 玩家名) 计
+chat_limiter = RateLimiter(app.config['CHAT_RATE'], app.config['CHAT_BURST'])
+
+# Socket 事件限流：每个连接和每个 IP 各一个令牌桶，检查不加锁
+sid_limiter = RateLimiter(app.config['SOCKET_RATE'], app.config['SOCKET_BURST'])
+ip_limiter = RateLimiter(app.config['IP_RATE'], app.config['IP_BURST'])
+THROTTLED_ERROR = '请求过于频繁，请稍后再试'
+ROOMS_FULL_ERROR = '服务器房间已满，请稍后再试'
+# 被限流的事件数（按事件名）和因容量拒绝的请求数；计数不加锁，并发时可能少计
+throttled_events = {}
+admission_rejected = {'rooms': 0, 'connections': 0}
+
+def rate_limited(handler):
+    """Socket 事件限流：连接和 IP 的令牌桶都有余量时才执行处理函数，否则回复错误"""
+    @wraps(handler)
+    def wrapper(*args):
+        if not sid_limiter.allow(request.sid) or not ip_limiter.allow(request.remote_addr):
+            event = request.event['message']
+            throttled_events[event] = throttled_events.get(event, 0) + 1
+            return {'error': THROTTLED_ERROR}
+        return handler(*args)
+    return wrapper
+
+def ensure_room_capacity():
+    """房间数（含已预留的）达到 MAX_ROOMS 后拒绝创建新房间"""
+    if len(rooms) + len(reserved_codes) >= app.config['MAX_ROOMS']:
+        admission_rejected['rooms'] += 1
+        raise ValueError(ROOMS_FULL_ERROR)
+
+def reserve_room_code():
+    """检查容量并预留一个房间号，两步在同一把锁下完成，并发创建不会超过 MAX_ROOMS"""
+    with rooms_lock:
+        ensure_room_capacity()
+        code = generate_room_code()
+        reserved_codes.add(code)
+        return code
+
+def register_room(room):
+    """登记已创建的房间，预留的名额转为正式房间"""
+    with rooms_lock:
+        reserved_codes.discard(room.code)
+        rooms[room.code] = room
+
+def discard_room(room):
+    """放弃没有登记的房间：释放预留的名额、移出大厅，并记录 room_closed 与之前的 room_created 对应"""
+    with rooms_lock:
+        reserved_codes.discard(room.code)
+    lobby.remove(room.code)
+    events.emit('room_closed', room=room.code, reason='start_failed')
+
+# 可加入房间的大厅索引，订阅者在 LOBBY_ROOM 中接收增量变更
+lobby = LobbyIndex()
+LOBBY_ROOM = 'lobby'
+
+def refresh_lobby(room):
+    """房间变化后更新大厅索引并通知订阅者"""
+    lobby.update(room)
+    broadcaster.publish(LOBBY_ROOM, 'lobby_update', lobby.publish_changes)
 
 def generate_room_code():
     """生成4位数字房间代码"""
-    return str(random.randint(1000, 9999))
+    for _ in range(100):
+        code = str(random.randint(1000, 9999))
+        if code not in rooms and code not in reserved_codes:
+            return code
+    raise ValueError("房间数量已达上限")
 
-class Player:
+class Player(GamePlayer):
     def __init__(self, name):
-        self.name = name
+        super().__init__(name)
         self.is_host = False
-        self.role = None
-        self.team = None
+        self.is_bot = False
         self.player_number = None  # 添加玩家编号字段
-        self.magic_tokens = 0  # 添加魔法指示物字段
+        self.profile_id = None  # 跨房间的玩家档案 id，没有时不计入统计
 
 class Room:
     def __init__(self, host_name, player_count):
-        self.code = generate_room_code()
+        ensure_accepting()
         self.host_name = host_name
         self.player_count = player_count
         # 创建房主玩家并设置为房主
@@ -39,9 +247,20 @@ class Room:
         host_player.player_number = 1  # 房主为1号玩家
         self.players = [host_player]
         self.game = None  # 初始化时不创建游戏
+        self.bots = []  # 由服务器驱动的机器人玩家名称
+        self.lock = threading.RLock()  # 串行化同一房间内的游戏动作
+        # 同一房间内连续对局的比分：局数、各阵营胜场和每位玩家的胜场
+        self.series = {'games': 0, 'GOOD': 0, 'EVIL': 0, 'wins': {}}
+        self.chat = ChatHistory(app.config['CHAT_HISTORY'], app.config['CHAT_MAX_LENGTH'])
+        # 最后才预留房间号，前面的构造失败时不占用名额；调用方用 register_room 登记或 discard_room 释放
+        self.code = reserve_room_code()
+        events.emit('room_created', room=self.code, player_count=player_count, host=host_name)
+        refresh_lobby(self)
+        memory_sampler.wake()
 
     def add_player(self, player_name):
         """添加玩家到房间"""
+        ensure_accepting()
         if len(self.players) >= self.player_count:
             raise ValueError("房间已满")
         if any(p.name == player_name for p in self.players):
@@ -50,14 +269,105 @@ class Room:
         new_player = Player(player_name)
         new_player.player_number = len(self.players) + 1  # 玩家编号从1开始递增
         self.players.append(new_player)
+        events.emit('player_joined', room=self.code, player=player_name, seat=new_player.player_number,
+                    bot=player_name.startswith(BOT_NAME_PREFIX))
+        refresh_lobby(self)
+        return new_player
+
+    def fill_with_bots(self):
+        """用机器人补满剩余座位"""
+        while not self.is_full():
+            player = self.add_player(f"{BOT_NAME_PREFIX}{len(self.players) + 1}")
+            player.is_bot = True
+            self.bots.append(player.name)
 
     def start_game(self):
         """开始游戏"""
+        ensure_accepting()
         if len(self.players) != self.player_count:
             raise ValueError("玩家数量不足")
         
         # 创建游戏实例，传入玩家列表和玩家数量
         self.game = Game(self.players, self.player_count)
+        refresh_lobby(self)
+
+    def rematch(self):
+        """对局结束后再来一局：玩家不变时在原 Game 对象上重置，连接和 Socket.IO 房间保持不变"""
+        ensure_accepting()
+        if self.game is None or not self.game.is_game_over():
+            raise ValueError("游戏尚未结束")
+        if len(self.players) != self.player_count:
+            raise ValueError("玩家数量不足")
+        if self.game.players == self.players:
+            self.game.rematch()
+        else:
+            # 有玩家离开后又有新玩家加入，只能重新创建；版本号接着递增
+            version = self.game.version
+            self.game = Game(self.players, self.player_count)
+            self.game.version = version
+        refresh_lobby(self)
+
+    def record_result(self, game) -> dict:
+        """记录一局的胜负，返回当前系列赛比分"""
+        winner = game.winner
+        if winner is None:
+            return self.series_summary()
+        self.series['games'] += 1
+        self.series[winner] += 1
+        wins = self.series['wins']
+        for player in game.players:
+            wins.setdefault(player.name, 0)
+            if player.team is not None and player.team.value == winner:
+                wins[player.name] += 1
+        return self.series_summary()
+
+    def snapshot(self) -> dict:
+        """交接给新进程的房间快照（调用方持有房间锁）"""
+        return {
+            'code': self.code,
+            'host_name': self.host_name,
+            'player_count': self.player_count,
+            'players': [{'name': p.name, 'is_host': p.is_host, 'is_bot': p.is_bot,
+                         'player_number': p.player_number, 'profile_id': p.profile_id}
+                        for p in self.players],
+            'bots': list(self.bots),
+            'series': self.series_summary(),
+            'game': self.game.snapshot() if self.game is not None else None,
+            'chat': self.chat.tail(),
+        }
+
+    @classmethod
+    def restore(cls, data: dict) -> 'Room':
+        """从交接快照恢复房间，沿用原来的房间号，不记录 room_created 事件"""
+        room = cls.__new__(cls)
+        room.code = data['code']
+        room.host_name = data['host_name']
+        room.player_count = data['player_count']
+        room.players = []
+        for entry in data['players']:
+            player = Player(entry['name'])
+            player.is_host = entry['is_host']
+            player.is_bot = entry['is_bot']
+            player.player_number = entry['player_number']
+            player.profile_id = entry.get('profile_id')
+            room.players.append(player)
+        room.bots = list(data['bots'])
+        room.lock = threading.RLock()
+        room.series = data['series']
+        room.chat = ChatHistory(app.config['CHAT_HISTORY'], app.config['CHAT_MAX_LENGTH'])
+        room.chat.load(data.get('chat', []))
+        room.game = None
+        if data['game'] is not None:
+            # 对局中途离开的玩家仍然保留在 Game 的座位上
+            seated = {p.name: p for p in room.players}
+            players = [seated.get(name) or Player(name) for name in data['game']['players']]
+            room.game = Game.restore(data['game'], players)
+        lobby.update(room)
+        return room
+
+    def series_summary(self) -> dict:
+        """系列赛比分的副本（用于广播）"""
+        return {**self.series, 'wins': dict(self.series['wins'])}
 
     def _generate_room_code(self) -> str:
         """生成房间代码"""
@@ -68,7 +378,11 @@ class Room:
 
     def remove_player(self, player_name: str) -> bool:
         """从房间移除玩家"""
+        ensure_accepting()
         self.players = [p for p in self.players if p.name != player_name]
+        if player_name in self.bots:
+            self.bots.remove(player_name)
+        refresh_lobby(self)
         return True
 
     def get_player_count(self) -> int:
@@ -88,6 +402,7 @@ class Room:
             'players': [{
                 'name': p.name,
                 'is_host': p.is_host,
+                'is_bot': p.is_bot,
                 'player_number': p.player_number
             } for p in self.players],
             'game_started': self.game is not None
@@ -96,18 +411,197 @@ class Room:
 @app.route('/')
 def index():
     """主页路由"""
-    return render_template('index.html')
+    return render_template('index.html', wire_tables=wire.client_tables())
 
 @app.route('/game')
 def game():
     """游戏页面路由"""
-    return render_template('index.html')
+    return render_template('index.html', wire_tables=wire.client_tables())
 
 @app.route('/health')
 def health_check():
     """健康检查路由"""
     return {'status': 'ok'}
 
+@app.route('/metrics')
+def metrics():
+    """服务器运行指标"""
+    return {
+        'rooms': len(rooms),
+        'broadcast': broadcaster.stats(),
+        'outbound': outbox.stats(),
+        'lobby_rooms': len(lobby),
+        'matchmaking': matchmaker.stats(),
+        'bots': bot_driver.stats(),
+        'player_stats': player_stats.stats(),
+        'replays': replays.stats(),
+        'memory': memory_sampler.stats(),
+        'events': events.stats(),
+        'chat': chat_limiter.stats(),
+        'rate_limit': {
+            'connection': sid_limiter.stats(),
+            'ip': ip_limiter.stats(),
+            'throttled_events': dict(throttled_events),
+            'rejected': dict(admission_rejected),
+            'max_rooms': app.config['MAX_ROOMS'],
+        },
+        'handoff': {'received': handoff_received, 'sent': handoff_server.stats() if handoff_server else None},
+        'tracing': tracer.stats()
+    }
+
+def _lobby_query(args):
+    """解析大厅列表的筛选与分页参数"""
+    player_count = args.get('player_count')
+    return {
+        'player_count': int(player_count) if player_count else None,
+        'min_free': int(args.get('min_free') or 1),
+        'cursor': args.get('cursor') or None,
+        'limit': int(args.get('limit') or 20),
+    }
+
+@app.route('/lobby/rooms')
+def lobby_rooms():
+    """分页列出可加入的房间"""
+    try:
+        return {'success': True, **lobby.list_rooms(**_lobby_query(request.args))}
+    except ValueError as e:
+        return {'success': False, 'error': str(e)}, 400
+
+@app.route('/lobby/changes')
+def lobby_changes():
+    """获取指定版本之后的大厅变更"""
+    try:
+        since = int(request.args.get('since', 0))
+    except ValueError:
+        return {'success': False, 'error': '无效的版本号'}, 400
+    changes = lobby.changes_since(since)
+    if changes is None:
+        return {'success': True, 'reset': True, 'version': lobby.version, 'changes': []}
+    return {'success': True, **changes}
+
+@app.route('/archive/stats')
+def archive_stats():
+    """已归档对局的胜率统计，by 为 player_count / role / quest / magic"""
+    by = request.args.get('by', 'player_count')
+    try:
+        player_count = request.args.get('player_count')
+        rates = archive.query(by, int(player_count) if player_count else None)
+    except ValueError as e:
+        return {'success': False, 'error': str(e)}, 400
+    return {'success': True, 'games': len(archive), 'by': by, 'rates': rates}
+
+def query_limit(default, maximum):
+    """解析查询参数 limit 并限制在 0 到 maximum 之间，不是整数时抛出 ValueError"""
+    value = request.args.get('limit')
+    if not value:
+        return default
+    try:
+        limit = int(value)
+    except ValueError:
+        raise ValueError('limit 必须是整数')
+    return max(0, min(limit, maximum))
+
+@app.route('/replays')
+def list_replays():
+    """最近保存的回放"""
+    try:
+        limit = query_limit(20, RECENT_SIZE)
+    except ValueError as e:
+        return {'success': False, 'error': str(e)}, 400
+    return {'success': True, 'replays': replays.recent(limit)}
+
+@app.route('/replays/<replay_id>')
+def replay_info(replay_id):
+    """回放的玩家、角色和任务结果"""
+    header = replays.header(replay_id)
+    if header is None:
+        return {'success': False, 'error': '回放不存在'}, 404
+    return {'success': True, 'replay': header}
+
+@app.route('/replays/<replay_id>/stream')
+def stream_replay(replay_id):
+    """以 NDJSON（默认）或 SSE（format=sse）流式回放，支持 from_quest 和 speed"""
+    try:
+        lines = replays.stream(replay_id,
+                               from_quest=int(request.args.get('from_quest', 1)),
+                               speed=float(request.args.get('speed', 0)),
+                               sleep=socketio.sleep)
+    except ValueError as e:
+        return {'success': False, 'error': str(e)}, 400
+    if request.args.get('format') == 'sse':
+        lines = (b'data: ' + line.rstrip(b'\n') + b'\n\n' for line in lines)
+        mimetype = 'text/event-stream'
+    else:
+        mimetype = 'application/x-ndjson'
+    return Response(lines, mimetype=mimetype,
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@app.route('/stats/players/<player_id>')
+def player_profile(player_id):
+    """玩家档案的历史统计，player_id 为连接时 protocol 事件返回的 profile_id"""
+    profile = player_stats.profile(player_id)
+    if profile is None:
+        return {'success': False, 'error': '没有该玩家的统计'}, 404
+    return {'success': True, 'profile': profile}
+
+@app.route('/stats/leaderboard')
+def leaderboard():
+    """玩家排行榜，by 为 wins / games / win_rate / quests_led"""
+    try:
+        players = player_stats.leaderboard(request.args.get('by', 'wins'), query_limit(10, LEADERBOARD_SIZE))
+    except ValueError as e:
+        return {'success': False, 'error': str(e)}, 400
+    return {'success': True, 'players': players}
+
+def admin_required(view):
+    """要求请求带有与 ADMIN_TOKEN 一致的 X-Admin-Token 请求头"""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        expected = app.config['ADMIN_TOKEN']
+        token = request.headers.get('X-Admin-Token', '')
+        if not expected or not hmac.compare_digest(token.encode(), expected.encode()):
+            return {'success': False, 'error': '需要管理员权限'}, 403
+        return view(*args, **kwargs)
+    return wrapper
+
+@app.route('/admin/memory')
+@admin_required
+def memory_overview():
+    """进程内存概况和最近的采样"""
+    return {'success': True, 'rss': rss_bytes(), 'tracing': memory_profiler.tracing,
+            'sampler': memory_sampler.stats()}
+
+@app.route('/admin/memory/tracing', methods=['POST'])
+@admin_required
+def memory_tracing():
+    """开启或关闭 tracemalloc，请求体 {"enabled": true, "frames": 1}"""
+    data = request.get_json(silent=True) or {}
+    if data.get('enabled'):
+        memory_profiler.start(int(data.get('frames', 1)))
+    else:
+        memory_profiler.stop()
+    return {'success': True, 'tracing': memory_profiler.tracing}
+
+@app.route('/admin/memory/snapshot')
+@admin_required
+def memory_snapshot():
+    """tracemalloc 快照及与上一次快照的差异，group_by 为 lineno / filename / class"""
+    try:
+        report = memory_profiler.snapshot(request.args.get('group_by', 'lineno'), query_limit(20, 1000))
+    except ValueError as e:
+        return {'success': False, 'error': str(e)}, 400
+    return {'success': True, **report}
+
+@app.route('/admin/memory/rooms')
+@admin_required
+def memory_rooms():
+    """遍历所有房间，按房间、阶段和类型统计持有的内存"""
+    try:
+        limit = query_limit(20, 1000)
+    except ValueError as e:
+        return {'success': False, 'error': str(e)}, 400
+    return {'success': True, **rooms_report(rooms, limit)}
+
 @app.errorhandler(403)
 def forbidden_error(error):
     """处理403错误"""
@@ -124,16 +618,33 @@ def internal_error(error):
     return render_template('error.html', error="500 Internal Server Error - 服务器内部错误"), 500
 
 @socketio.on('connect')
-def handle_connect():
-    """处理客户端连接"""
-    print(f"[DEBUG] Client connected: {request.sid}")
+def handle_connect(auth=None):
+    """处理客户端连接，协商线协议"""
+    if not ip_limiter.allow(request.remote_addr):
+        admission_rejected['connections'] += 1
+        raise ConnectionRefusedError(THROTTLED_ERROR)
+    protocol = wire.negotiate((auth or {}).get('protocol'))
+    if protocol == wire.PROTOCOL_MSGPACK:
+        binary_clients.add(request.sid)
+    profile_id = profile_id_for((auth or {}).get('player_token'))
+    if profile_id is not None:
+        client_profiles[request.sid] = profile_id
+    socketio.emit('protocol', {'protocol': protocol, 'version': wire.WIRE_VERSION, 'profile_id': profile_id},
+                  to=request.sid)
+    print(f"[DEBUG] Client connected: {request.sid}, protocol: {protocol}")
 
 @socketio.on('disconnect')
 def handle_disconnect():
     """处理客户端断开连接"""
     print(f"[DEBUG] Client disconnected: {request.sid}")
+    outbox.discard(request.sid)
+    binary_clients.discard(request.sid)
+    client_profiles.pop(request.sid, None)
+    sid_limiter.forget(request.sid)
+    matchmaker.cancel(request.sid)
 
 @socketio.on('create_room')
+@rate_limited
 def handle_create_room(data):
     """处理创建房间请求"""
     try:
@@ -144,7 +655,8 @@ def handle_create_room(data):
         host_name = "玩家1"
 
         room = Room(host_name, player_count)
-        rooms[room.code] = room
+        register_room(room)
+        room.players[0].profile_id = client_profiles.get(request.sid)
 
         # 加入房间的Socket.IO房间
         join_room(room.code)
@@ -155,9 +667,12 @@ def handle_create_room(data):
 
         room_info = room.to_dict()
         # 广播房间创建消息
-        socketio.emit('room_update', room_info, to=room.code)
+        emit_to_room('room_update', room_info, room.code)
         
         return {'room_info': room_info, 'player_name': host_name}
+    except ValueError as e:
+        # 房间数已满或服务器正在交接，属于正常的拒绝
+        return {'error': str(e)}
     except Exception as e:
         print(f"[ERROR] Exception in create_room: {str(e)}")
         import traceback
@@ -165,6 +680,7 @@ def handle_create_room(data):
         return {'error': str(e)}
 
 @socketio.on('join_room')
+@rate_limited
 def handle_join_room(data):
     """处理加入房间请求"""
     try:
@@ -183,7 +699,7 @@ def handle_join_room(data):
         player_name = f"玩家{next_player_number}"
 
         # 添加玩家到房间
-        room.add_player(player_name)
+        room.add_player(player_name).profile_id = client_profiles.get(request.sid)
         
         # 将玩家加入房间的Socket.IO房间
         join_room(room_code)
@@ -194,17 +710,35 @@ def handle_join_room(data):
 
         # 广播房间更新给所有玩家
         room_info = room.to_dict()
-        socketio.emit('room_update', room_info, to=room_code)
+        emit_to_room('room_update', room_info, room_code)
         print(f"[DEBUG] Broadcasted room update to all players")
 
-        return {'room_info': room_info, 'player_name': player_name}
+        return {'room_info': room_info, 'player_name': player_name, 'chat': room.chat.tail()}
     except Exception as e:
         print(f"[ERROR] Exception in join_room: {str(e)}")
         import traceback
         traceback.print_exc()
         return {'error': str(e)}
 
+@socketio.on('subscribe_lobby')
+@rate_limited
+def handle_subscribe_lobby(data=None):
+    """订阅大厅变更，返回第一页房间列表"""
+    try:
+        join_room(LOBBY_ROOM)
+        return lobby.list_rooms(**_lobby_query(data or {}))
+    except Exception as e:
+        return {'error': str(e)}
+
+@socketio.on('unsubscribe_lobby')
+@rate_limited
+def handle_unsubscribe_lobby(data=None):
+    """取消订阅大厅变更"""
+    leave_room(LOBBY_ROOM)
+    return {'success': True}
+
 @socketio.on('leave_room')
+@rate_limited
 def handle_leave_room(data):
     """离开房间"""
     try:
@@ -218,15 +752,17 @@ def handle_leave_room(data):
             
             if not room.players:
                 del rooms[room_code]
+                lobby.remove(room_code)
             else:
                 # 广播房间更新
-                emit('room_update', room.to_dict(), room=room_code)
+                emit_to_room('room_update', room.to_dict(), room_code)
         
         return {'success': True}
     except Exception as e:
         return {'error': str(e)}
 
 @socketio.on('start_game')
+@rate_limited
 def handle_start_game(data):
     """处理游戏开始"""
     try:
@@ -243,23 +779,8 @@ def handle_start_game(data):
             return {'error': '只有房主可以开始游戏'}
 
         room.start_game()
-        
-        # 先发送游戏开始状态
-        game_state = room.game.get_game_status()
-        socketio.emit('game_started', {'game_state': game_state}, to=room_code)
-        print(f"[DEBUG] Game started state sent to room {room_code}")
-
-        # 为每个玩家发送私人信息
-        for player in room.game.players:
-            player_info = room.game.get_player_info(player.name)
-            if player_info:
-                private_room = f"{room_code}_{player.name}"
-                print(f"[DEBUG] Sending private info to {player.name} in room {private_room}")
-                # 直接使用 emit 而不是 socketio.emit
-                emit('player_info', {
-                    'player_info': player_info
-                }, to=private_room)
-                print(f"[DEBUG] Info sent to {player.name} in {private_room}")
+        announce_game_start(room)
+        bot_driver.schedule(room)
         
         return {'success': True}
     except Exception as e:
@@ -268,94 +789,340 @@ def handle_start_game(data):
         traceback.print_exc()
         return {'error': str(e)}
 
-@socketio.on('select_team')
-def handle_select_team(data):
-    """处理领袖选择队员"""
+def announce_game_start(room):
+    """发送游戏开始状态和每个玩家的私人信息"""
+    room_code = room.code
+    game_state = room.game.get_game_status()
+    emit_to_room('game_started', {'game_state': game_state, 'match_number': room.game.match_number,
+                                  'series': room.series_summary()}, room_code)
+    print(f"[DEBUG] Game started state sent to room {room_code}")
+    events.emit('game_started', room=room_code, match=room.game.match_number,
+                player_count=room.game.player_count,
+                players=[{'name': p.name, 'seat': p.player_number, 'role': p.role.name,
+                          'team': p.team.value, 'bot': p.is_bot} for p in room.game.players])
+
+    # 为每个玩家发送私人信息
+    for player in room.game.players:
+        player_info = room.game.get_player_info(player.name)
+        if player_info:
+            private_room = f"{room_code}_{player.name}"
+            print(f"[DEBUG] Sending private info to {player.name} in room {private_room}")
+            emit_to_room('player_info', {
+                'player_info': player_info
+            }, private_room)
+            print(f"[DEBUG] Info sent to {player.name} in {private_room}")
+
+@socketio.on('rematch')
+@rate_limited
+def handle_rematch(data):
+    """对局结束后房主发起再来一局，沿用房间、玩家和已有连接"""
+    room = rooms.get(data.get('room_code'))
+    if not room:
+        return {'error': '房间不存在'}
+    if data.get('player_name') != room.host_name:
+        return {'error': '只有房主可以发起再来一局'}
+    with room.lock:
+        try:
+            room.rematch()
+        except ValueError as e:
+            return {'error': str(e)}
+        announce_game_start(room)
+    print(f"[DEBUG] Rematch {room.game.match_number} started in room {room.code}")
+    bot_driver.schedule(room)
+    return {'success': True, 'match_number': room.game.match_number, 'series': room.series_summary()}
+
+def start_matched_room(size, tickets):
+    """为匹配成功的玩家创建房间、加入 Socket.IO 房间并开始游戏"""
+    room = Room("玩家1", size)
+    # 先建好房间、开始游戏再登记房间、通知玩家：中途失败时放弃整个房间，票据由匹配队列处理
     try:
-        room_code = data.get('room_code')
-        player_name = data.get('player_name')
-        selected_team = data.get('selected_team', [])
+        for number in range(2, size + 1):
+            room.add_player(f"玩家{number}")
+        for ticket, player in zip(tickets, room.players):
+            player.profile_id = client_profiles.get(ticket.sid)
+        room_info = room.to_dict()
+        room.start_game()
+    except Exception:
+        discard_room(room)
+        raise
+    register_room(room)
+
+    for ticket, player in zip(tickets, room.players):
+        socketio.server.enter_room(ticket.sid, room.code, namespace='/')
+        socketio.server.enter_room(ticket.sid, f"{room.code}_{player.name}", namespace='/')
+        emit_to_room('match_found', {'room_info': room_info, 'player_name': player.name}, ticket.sid)
+    print(f"[DEBUG] Quick match formed room {room.code} with {size} players")
+
+    announce_game_start(room)
+    bot_driver.schedule(room)
+
+def fail_matched_tickets(tickets, error):
+    """房间被拒绝创建（房间已满、服务器正在交接）时通知匹配到的玩家，票据不再放回队列"""
+    for ticket in tickets:
+        emit_to_room('match_failed', {'error': error}, ticket.sid)
+
+matchmaker = MatchQueue(
+    start_matched_room,
+    interval=int(os.environ.get('MATCH_INTERVAL_MS', 50)) / 1000,
+    spawn=socketio.start_background_task,
+    sleep=socketio.sleep,
+    on_fail=fail_matched_tickets)
+
+@socketio.on('quick_match')
+@rate_limited
+def handle_quick_match(data):
+    """加入快速匹配队列，凑满人数后自动开始游戏"""
+    try:
+        player_count = int(data.get('player_count', 5))
+        ensure_accepting()
+        ensure_room_capacity()
+        matchmaker.enqueue(request.sid, player_count)
+        return {'success': True, 'player_count': player_count}
+    except ValueError as e:
+        return {'error': str(e)}
 
+@socketio.on('add_bots')
+@rate_limited
+def handle_add_bots(data):
+    """房主用机器人补满房间的空位"""
+    try:
+        room_code = data.get('room_code')
         room = rooms.get(room_code)
         if not room:
             return {'error': '房间不存在'}
+        if data.get('player_name') != room.host_name:
+            return {'error': '只有房主可以添加机器人'}
+        if room.game is not None:
+            return {'error': '游戏已经开始'}
 
-        game = room.game
-        if game.current_phase != GamePhase.LEADER_TURN:
-            return {'error': '当前不是选择队员阶段'}
-
-        if player_name != game.get_current_leader().name:
-            return {'error': '只有领袖可以选择队员'}
-
-        # 验证选择的队员数量
-        required_players = game.quest_requirements[game.quest_number]
-        if len(selected_team) != required_players:
-            return {'error': f'必须选择 {required_players} 名队员'}
-
-        # 设置任务队员
-        selected_players = [p for p in game.players if p.name in selected_team]
-        game.current_quest.team = selected_players
-        game.current_phase = GamePhase.TEAM_VOTE
+        room.fill_with_bots()
+        room_info = room.to_dict()
+        emit_to_room('room_update', room_info, room_code)
+        print(f"[DEBUG] Filled room {room_code} with bots: {room.bots}")
+        return {'room_info': room_info}
+    except ValueError as e:
+        return {'error': str(e)}
 
-        # 广播游戏状态更新
-        emit('game_update', {
-            'game_state': game.get_game_status()
-        }, room=room_code)
+@socketio.on('cancel_quick_match')
+@rate_limited
+def handle_cancel_quick_match(data=None):
+    """退出快速匹配队列"""
+    if not matchmaker.cancel(request.sid):
+        return {'error': '不在匹配队列中'}
+    return {'success': True}
+
+def broadcast_action(room_code, game, result):
+    """将动作结果按转移表给出的事件类型广播到房间（game_update 会在窗口内合并）"""
+    if result.event == 'game_over':
+        result.extra['replay_id'] = replays.save(game)
+        archive.append(game)
+        player_stats.record(game)
+        room = rooms.get(room_code)
+        if room is not None:
+            result.extra['series'] = room.record_result(game)
+    broadcaster.publish(room_code, result.event,
+                        lambda: {'game_state': game.get_game_status()},
+                        result.extra)
+
+def export_actions(room_code, game, results):
+    """把刚执行的动作转成分析事件，results 与 action_log 末尾的条目一一对应"""
+    if not events.enabled:
+        return
+    entries = game.action_log[len(game.action_log) - len(results):]
+    for entry, result in zip(entries, results):
+        data = entry['data']
+        common = {'room': room_code, 'match': game.match_number, 'quest': entry['quest']}
+        if entry['action'] == GameAction.SUBMIT_TEAM.value:
+            team = list(data.get('team') or [])
+            target = data.get('magic_token_target')
+            events.emit('team_submitted', **common, leader=entry['player'], team=team,
+                        magic_token_target=target if target in team else None)
+        elif entry['action'] == GameAction.SUBMIT_QUEST_VOTE.value:
+            events.emit('vote_cast', **common, player=entry['player'], vote=bool(data.get('success')))
+
+        if result.event in ('quest_result', 'game_over'):
+            quest = next((q for q in game.quest_history if q['quest_number'] == entry['quest']), None)
+            if quest is not None:
+                events.emit('quest_result', **common, leader=quest['leader'], team=quest['team'],
+                            success=quest['success'], fail_count=quest['fail_count'],
+                            magic_holders=quest['magic_holders'])
+        if result.event == 'game_over':
+            events.emit('game_over', room=room_code, match=game.match_number, winner=game.winner,
+                        quest_results=list(game.quest_results), actions=len(game.action_log),
+                        duration=entry['t'],
+                        players=[{'name': p.name, 'role': p.role.name, 'team': p.team.value}
+                                 for p in game.players])
+
+def dispatch_action(action, data, player_name=None, **payload):
+    """查找房间并通过游戏转移表执行动作"""
+    room_code = data.get('room_code')
+    room = rooms.get(room_code)
+    if not room or not room.game:
+        return {'error': '房间不存在或游戏未开始'}
+
+    with tracer.trace(action.value, room=room_code, player=player_name):
+        with span('lock_wait'):
+            room.lock.acquire()
+        try:
+            if draining.is_set():
+                return {'error': DRAINING_ERROR}
+            try:
+                result = room.game.dispatch(action, player_name, **payload)
+            except ValueError as e:
+                return {'error': str(e)}
+
+            broadcast_action(room_code, room.game, result)
+            export_actions(room_code, room.game, [result])
+        finally:
+            room.lock.release()
+        print(f"[DEBUG] {action.value} in room {room_code}, phase: {room.game.current_phase.value}")
+        bot_driver.schedule(room)
+    return result.reply
+
+def bot_act(room, bot_name, action, payload):
+    """在机器人线程池中执行机器人的动作（调用方持有房间锁）"""
+    with tracer.trace(action.value, room=room.code, player=bot_name, bot=True):
+        result = room.game.dispatch(action, bot_name, **payload)
+        broadcast_action(room.code, room.game, result)
+        export_actions(room.code, room.game, [result])
+    print(f"[DEBUG] Bot {bot_name} {action.value} in room {room.code}, phase: {room.game.current_phase.value}")
+
+bot_driver = BotDriver(bot_act, max_workers=int(os.environ.get('BOT_WORKERS', 4)))
+
+# HTTP 批量接口每种动作接受的参数，与 Game.dispatch 的关键字参数一致（机器人 decide() 的结果可以直接提交）
+HTTP_ACTION_FIELDS = {
+    GameAction.SELECT_TEAM: ('team',),
+    GameAction.SUBMIT_TEAM: ('team', 'magic_token_target'),
+    GameAction.SUBMIT_QUEST_VOTE: ('success',),
+    GameAction.SELECT_NEXT_LEADER: ('next_leader',),
+    GameAction.USE_AMULET: ('target',),
+}
+
+def parse_action_batch(items):
+    """把请求体中的动作列表解析为 (动作, 玩家名, 参数)，多余的字段被忽略"""
+    if not isinstance(items, list) or not items:
+        raise ValueError('actions 必须是非空列表')
+    if len(items) > app.config['MAX_BATCH_ACTIONS']:
+        raise ValueError(f"每次最多执行 {app.config['MAX_BATCH_ACTIONS']} 个动作")
+    actions = []
+    for index, item in enumerate(items, 1):
+        if not isinstance(item, dict):
+            raise ValueError(f"第 {index} 个动作格式错误")
+        try:
+            action = GameAction(item.get('action'))
+        except ValueError:
+            raise ValueError(f"第 {index} 个动作未知: {item.get('action')}")
+        payload = {field: item[field] for field in HTTP_ACTION_FIELDS[action] if field in item}
+        actions.append((action, item.get('player_name'), payload))
+    return actions
+
+def owned_seats(game):
+    """请求头 X-Player-Token 中的玩家令牌（逗号分隔，可以有多个）拥有的座位名
+
+    令牌就是连接时 auth.player_token 使用的令牌，入座时以档案 id 的形式记在座位上。
+    """
+    profiles = {profile_id_for(token.strip()) for token in request.headers.get('X-Player-Token', '').split(',')}
+    profiles.discard(None)
+    return {p.name for p in game.players if getattr(p, 'profile_id', None) in profiles}
+
+@app.route('/rooms/<room_code>/actions', methods=['POST'])
+def post_actions(room_code):
+    """原子地执行一批动作，请求体 {"actions": [{"action": ..., "player_name": ..., ...}], "expected_version": n}
+
+    每个动作的 player_name 都必须是 X-Player-Token 拥有的座位，护身符查验结果等私人回复
+    因此只会返回给座位的主人。
+    """
+    if not ip_limiter.allow(request.remote_addr):
+        throttled_events['http_actions'] = throttled_events.get('http_actions', 0) + 1
+        return {'success': False, 'error': THROTTLED_ERROR}, 429
+    data = request.get_json(silent=True) or {}
+    try:
+        actions = parse_action_batch(data.get('actions'))
+    except ValueError as e:
+        return {'success': False, 'error': str(e)}, 400
+    expected_version = data.get('expected_version')
+    if expected_version is not None and (not isinstance(expected_version, int) or isinstance(expected_version, bool)):
+        return {'success': False, 'error': '无效的版本号'}, 400
+
+    room = rooms.get(room_code)
+    if not room or not room.game:
+        return {'success': False, 'error': '房间不存在或游戏未开始'}, 404
+
+    with tracer.trace('batch', room=room_code, actions=len(actions)):
+        with span('lock_wait'):
+            room.lock.acquire()
+        try:
+            if draining.is_set():
+                return {'success': False, 'error': DRAINING_ERROR}, 503
+            game = room.game
+            seats = owned_seats(game)
+            for index, (_, player_name, _) in enumerate(actions, 1):
+                if player_name not in seats:
+                    return {'success': False, 'error': f"第 {index} 个动作：没有操作该座位的权限"}, 403
+            if expected_version is not None and expected_version != game.version:
+                return {'success': False, 'error': '游戏状态已变化', 'version': game.version}, 409
+            try:
+                results = game.dispatch_batch(actions)
+            except ValueError as e:
+                return {'success': False, 'error': str(e), 'version': game.version}, 400
+            for result in results:
+                broadcast_action(room_code, game, result)
+            export_actions(room_code, game, results)
+            response = {
+                'success': True,
+                'version': game.version,
+                'match_number': game.match_number,
+                'results': [result.reply for result in results],
+                'game_state': game.get_game_status(),
+            }
+        finally:
+            room.lock.release()
+        print(f"[DEBUG] {len(actions)} actions via HTTP in room {room_code}, phase: {game.current_phase.value}")
+        bot_driver.schedule(room)
+    return response
+
+@app.route('/rooms/<room_code>/state')
+def room_state(room_code):
+    """游戏状态和版本号；since 等于当前版本时只返回版本号，用于低成本轮询"""
+    room = rooms.get(room_code)
+    if not room or not room.game:
+        return {'success': False, 'error': '房间不存在或游戏未开始'}, 404
+    try:
+        since = int(request.args['since']) if 'since' in request.args else None
+    except ValueError:
+        return {'success': False, 'error': '无效的版本号'}, 400
+    with room.lock:
+        game = room.game
+        if since == game.version:
+            return {'success': True, 'version': game.version, 'changed': False}
+        return {'success': True, 'version': game.version, 'changed': True,
+                'match_number': game.match_number, 'game_state': game.get_game_status()}
 
-        return {'success': True}
+@socketio.on('select_team')
+@rate_limited
+def handle_select_team(data):
+    """处理领袖选择队员"""
+    try:
+        return dispatch_action(GameAction.SELECT_TEAM, data,
+                               data.get('player_name'),
+                               team=data.get('selected_team', []))
     except Exception as e:
         return {'error': str(e)}
 
 @socketio.on('submit_team')
+@rate_limited
 def handle_submit_team(data):
     """处理队长提交队伍"""
     try:
-        room_code = data.get('room_code')
-        team = data.get('team', [])
-        magic_token_target = data.get('magic_token_target')  # 获取魔法指示物目标
-        
-        print(f"[DEBUG] Received team submission for room {room_code}:")
-        print(f"Team: {team}")
-        if magic_token_target:
-            print(f"Magic token target: {magic_token_target}")
-
-        room = rooms.get(room_code)
-        if not room or not room.game:
-            return {'error': '房间不存在或游戏未开始'}
-
-        # 验证队伍
-        if len(team) != room.game.current_quest.required_players:
-            return {'error': f'队伍人数不正确，需要 {room.game.current_quest.required_players} 人'}
-
-        # 设置任务队伍
-        room.game.current_quest.team = [p for p in room.game.players if p.name in team]
-        
-        # 处理魔法指示物分配
-        if magic_token_target:
-            # 获取队长
-            leader = room.game.get_current_leader()
-            # 获取目标队员
-            target_player = next((p for p in room.game.players if p.name == magic_token_target), None)
-            
-            if target_player and target_player in room.game.current_quest.team:
-                # 给目标队员添加魔法指示物
-                target_player.magic_tokens += 1
-                print(f"[DEBUG] Assigned magic token to {target_player.name}")
-            else:
-                print(f"[DEBUG] Target player not found or not in team: {magic_token_target}")
-        
-        # 更新游戏阶段为投票阶段
-        room.game.current_phase = GamePhase.QUEST_VOTE
-        
-        # 广播游戏状态更新
-        game_state = room.game.get_game_status()
-        socketio.emit('game_update', {'game_state': game_state}, to=room_code)
-        
-        print(f"[DEBUG] Game state updated: {game_state}")
-        print(f"[DEBUG] Current phase: {room.game.current_phase}")
-        print(f"[DEBUG] Quest team: {[p.name for p in room.game.current_quest.team]}")
-        
-        return {'success': True}
+        print(f"[DEBUG] Received team submission for room {data.get('room_code')}:")
+        print(f"Team: {data.get('team', [])}")
+        if data.get('magic_token_target'):
+            print(f"Magic token target: {data.get('magic_token_target')}")
+
+        return dispatch_action(GameAction.SUBMIT_TEAM, data,
+                               data.get('player_name'),
+                               team=data.get('team', []),
+                               magic_token_target=data.get('magic_token_target'))
     except Exception as e:
         print(f"[ERROR] Exception in submit_team: {str(e)}")
         import traceback
@@ -363,122 +1130,16 @@ def handle_submit_team(data):
         return {'error': str(e)}
 
 @socketio.on('submit_quest_vote')
+@rate_limited
 def handle_quest_vote(data):
     """处理任务投票"""
     try:
-        room_code = data.get('room_code')
-        success = data.get('success')
-        player_name = data.get('player_name')
-        
-        print(f"[DEBUG] Received quest vote for room {room_code}:")
-        print(f"Player: {player_name}, Vote: {'success' if success else 'fail'}")
-
-        room = rooms.get(room_code)
-        if not room or not room.game:
-            return {'error': '房间不存在或游戏未开始'}
-
-        # 获取当前玩家
-        current_player = next((p for p in room.game.players if p.name == player_name), None)
-        if not current_player:
-            print(f"[DEBUG] Players in game: {[p.name for p in room.game.players]}")
-            print(f"[DEBUG] Looking for player: {player_name}")
-            return {'error': '玩家不存在'}
-
-        # 验证玩家是否在任务队伍中
-        if current_player not in room.game.current_quest.team:
-            return {'error': '你不是任务队员'}
-
-        # 检查玩家是否已经投票
-        if current_player.name in room.game.current_quest.votes:
-            return {'error': '你已经投过票了'}
-
-        # 检查玩家是否有魔法指示物，如果有则必须使用
-        if current_player.magic_tokens > 0:
-            # 使用魔法指示物
-            current_player.magic_tokens -= 1
-            print(f"[DEBUG] {player_name} used a magic token (forced)")
-            
-            # 如果是摩根勒菲，可以选择失败，否则必须成功
-            if current_player.role == Role.MORGAN:
-                # 允许摩根勒菲选择任意结果
-                print(f"[DEBUG] Morgan used magic token but can choose any result")
-            else:
-                # 非摩根勒菲使用魔法指示物时必须成功
-                success = True
-                print(f"[DEBUG] Non-Morgan player used magic token, forcing success")
-
-        # 记录投票
-        room.game.current_quest.votes[current_player.name] = success
-        
-        print(f"[DEBUG] Vote recorded for {current_player.name}: {success}")
-        print(f"[DEBUG] Current votes: {room.game.current_quest.votes}")
-        print(f"[DEBUG] Team size: {len(room.game.current_quest.team)}")
-        print(f"[DEBUG] Votes count: {len(room.game.current_quest.votes)}")
-
-        # 返回玩家的投票结果
-        vote_result = {
-            'success': True,
-            'vote': success
-        }
-
-        # 检查是否所有队员都已投票
-        if len(room.game.current_quest.votes) == len(room.game.current_quest.team):
-            print("[DEBUG] All votes received, calculating result")
-            # 计算任务结果
-            fail_votes = sum(1 for vote in room.game.current_quest.votes.values() if not vote)
-            quest_success = fail_votes == 0  # 任何失败票都导致任务失败
-            
-            print(f"[DEBUG] Quest result: {'Success' if quest_success else 'Fail'}")
-            print(f"[DEBUG] Fail votes: {fail_votes}")
-            
-            # 记录任务结果
-            room.game.quest_results.append(quest_success)
-            if quest_success:
-                room.game.successful_quests += 1
-            else:
-                room.game.failed_quests += 1
-
-            # 检查游戏是否结束
-            game_over = False
-            winner = None
-            if room.game.successful_quests >= 3:
-                game_over = True
-                winner = 'GOOD'
-            elif room.game.failed_quests >= 3:
-                game_over = True
-                winner = 'EVIL'
-
-            if game_over:
-                room.game.current_phase = GamePhase.GAME_OVER
-                room.game.winner = winner
-                # 获取包含游戏结果的游戏状态
-                game_state = room.game.get_game_status()
-                # 广播游戏结束
-                socketio.emit('game_over', {
-                    'winner': game_state['winner'],
-                    'game_state': game_state
-                }, to=room_code)
-            else:
-                # 更新游戏阶段为选择下一任队长
-                room.game.current_phase = GamePhase.SELECT_NEXT_LEADER
-                # 准备下一轮任务，但不自动更换队长
-                room.game.prepare_next_quest_without_leader_change()
-                
-                # 广播任务结果
-                game_state = room.game.get_game_status()
-                socketio.emit('quest_result', {
-                    'success': quest_success,
-                    'fail_count': fail_votes,
-                    'game_state': game_state
-                }, to=room_code)
-            
-            print(f"[DEBUG] Game state updated: {room.game.current_phase}")
-        else:
-            # 广播投票进度
-            game_state = room.game.get_game_status()
-            socketio.emit('game_update', {'game_state': game_state}, to=room_code)
+        print(f"[DEBUG] Received quest vote for room {data.get('room_code')}:")
+        print(f"Player: {data.get('player_name')}, Vote: {'success' if data.get('success') else 'fail'}")
 
-        return vote_result
+        return dispatch_action(GameAction.SUBMIT_QUEST_VOTE, data,
+                               data.get('player_name'),
+                               success=data.get('success'))
     except Exception as e:
         print(f"[ERROR] Exception in quest_vote: {str(e)}")
         import traceback
@@ -486,56 +1147,94 @@ def handle_quest_vote(data):
         return {'error': str(e)}
 
 @socketio.on('select_next_leader')
+@rate_limited
 def handle_select_next_leader(data):
     """处理选择下一任队长"""
     try:
-        room_code = data.get('room_code')
-        next_leader = data.get('next_leader')
-        player_name = data.get('player_name')
-        
-        print(f"[DEBUG] Selecting next leader in room {room_code}:")
-        print(f"Next leader: {next_leader}")
-        print(f"Current player: {player_name}")
-
-        room = rooms.get(room_code)
-        if not room or not room.game:
-            return {'error': '房间不存在或游戏未开始'}
-
-        # 验证当前玩家是否是队长
-        current_leader = room.game.get_current_leader()
-        if player_name != current_leader.name:
-            return {'error': '只有当前队长可以选择下一任队长'}
-
-        # 验证被选择的玩家是否存在
-        next_leader_player = next((p for p in room.game.players if p.name == next_leader), None)
-        if not next_leader_player:
-            return {'error': '选择的玩家不存在'}
-            
-        # 验证被选择的玩家是否曾当过队长
-        if next_leader in room.game.previous_leaders:
-            return {'error': '新队长必须是没当过队长的玩家'}
-
-        # 更新队长
-        room.game.current_leader_index = room.game.players.index(next_leader_player)
-        room.game.current_phase = GamePhase.LEADER_TURN
+        print(f"[DEBUG] Selecting next leader in room {data.get('room_code')}:")
+        print(f"Next leader: {data.get('next_leader')}")
+        print(f"Current player: {data.get('player_name')}")
 
-        # 广播游戏状态更新
-        game_state = room.game.get_game_status()
-        socketio.emit('game_update', {
-            'game_state': game_state,
-            'next_leader': next_leader
-        }, to=room_code)
-        
-        print(f"[DEBUG] Next leader selected: {next_leader}")
-        print(f"[DEBUG] New game phase: {room.game.current_phase}")
-
-        return {'success': True}
+        return dispatch_action(GameAction.SELECT_NEXT_LEADER, data,
+                               data.get('player_name'),
+                               next_leader=data.get('next_leader'))
     except Exception as e:
         print(f"[ERROR] Exception in select_next_leader: {str(e)}")
         import traceback
         traceback.print_exc()
         return {'error': str(e)}
 
+@socketio.on('use_amulet')
+@rate_limited
+def handle_use_amulet(data):
+    """处理使用护身符查验玩家阵营（结果只回复给使用者）"""
+    try:
+        return dispatch_action(GameAction.USE_AMULET, data,
+                               data.get('player_name'),
+                               target=data.get('target'))
+    except Exception as e:
+        print(f"[ERROR] Exception in use_amulet: {str(e)}")
+        return {'error': str(e)}
+
+@socketio.on('get_amulet_history')
+@rate_limited
+def handle_get_amulet_history(data):
+    """返回玩家可以看到的护身符记录"""
+    room = rooms.get(data.get('room_code'))
+    if not room or not room.game:
+        return {'error': '房间不存在或游戏未开始'}
+    with room.lock:
+        player = room.game.get_player(data.get('player_name'))
+        if player is None:
+            return {'error': '玩家不存在'}
+        return {'success': True, 'amulets': player.amulets, 'history': room.game.get_amulet_view(player)}
+
+@socketio.on('resume')
+@rate_limited
+def handle_resume(data):
+    """断线重连（包括服务器交接后）时恢复房间和玩家身份：重新加入 Socket.IO 房间并返回当前状态"""
+    room = rooms.get(data.get('room_code'))
+    if not room:
+        return {'error': '房间不存在'}
+    player_name = data.get('player_name')
+    if not any(p.name == player_name for p in room.players):
+        return {'error': '玩家不在房间中'}
+    join_room(room.code)
+    join_room(f"{room.code}_{player_name}")
+    reply = {'success': True, 'room_info': room.to_dict(), 'player_name': player_name,
+             'chat': room.chat.tail()}
+    with room.lock:
+        if room.game is not None:
+            reply.update(game_state=room.game.get_game_status(),
+                         player_info=room.game.get_player_info(player_name),
+                         match_number=room.game.match_number,
+                         series=room.series_summary())
+    print(f"[DEBUG] {player_name} resumed in room {room.code}")
+    return reply
+
+@socketio.on('chat_message')
+@rate_limited
+def handle_chat_message(data):
+    """房间聊天：按发送者限流，消息记入房间的聊天记录后向房间广播"""
+    room_code = data.get('room_code')
+    room = rooms.get(room_code)
+    if not room:
+        return {'error': '房间不存在'}
+    player_name = data.get('player_name')
+    if not any(p.name == player_name for p in room.players):
+        return {'error': '玩家不在房间中'}
+    if draining.is_set():
+        return {'error': DRAINING_ERROR}
+    key = (room_code, player_name)
+    if not chat_limiter.allow(key):
+        return {'error': '发言太快，请稍后再试', 'retry_after': round(chat_limiter.retry_after(key), 2)}
+    try:
+        message = room.chat.append(player_name, data.get('text'))
+    except ValueError as e:
+        return {'error': str(e)}
+    emit_to_room('chat_message', message, room_code)
+    return {'success': True, 'id': message['id']}
+
 # 添加测试路由
 @app.route('/test/create_room')
 def test_create_room():
@@ -546,7 +1245,7 @@ def test_create_room():
         player_count = 5
         room = Room(host_name, player_count)
         room_code = room.code
-        rooms[room_code] = room
+        register_room(room)
 
         # 添加一些测试玩家
         test_players = ["测试玩家2", "测试玩家3", "测试玩家4", "测试玩家5"]
@@ -659,9 +1358,86 @@ def test_room_info(room_code):
             'error': str(e)
         }
 
+def export_rooms(server):
+    """交接开始：停止接受修改，等各房间正在执行的动作完成后导出快照，连同监听 socket 一起交出"""
+    draining.set()
+    bot_driver.stop()
+    snapshots = []
+    for room in list(rooms.values()):
+        with room.lock:
+            snapshots.append(room.snapshot())
+    return {'format': handoff.STATE_FORMAT, 'rooms': snapshots}, [server.socket.fileno()]
+
+def abort_handoff():
+    """新进程没有完成接管，继续服务"""
+    draining.clear()
+    bot_driver.resume()
+    for room in list(rooms.values()):
+        bot_driver.schedule(room)
+
+def restore_rooms(state):
+    """恢复从旧进程收到的房间，返回耗时（毫秒）"""
+    if state.get('format') != handoff.STATE_FORMAT:
+        raise ValueError(f"不支持的交接格式: {state.get('format')}")
+    started = time.perf_counter()
+    # 重放动作时的 [DEBUG] 输出没有意义；此时服务器还没有开始处理请求
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        for data in state['rooms']:
+            room = Room.restore(data)
+            rooms[room.code] = room
+    for room in rooms.values():
+        bot_driver.schedule(room)
+    return round((time.perf_counter() - started) * 1000, 3)
+
+def finish_handoff():
+    """被新进程接管后：通知所有连接重连，写完缓冲的统计、事件、归档和追踪"""
+    socketio.emit('server_handoff', {'reconnect': True})
+    socketio.sleep(int(os.environ.get('HANDOFF_GRACE_MS', 2000)) / 1000)
+    player_stats.close()
+    events.close()
+    archive.flush()
+    replays.flush()
+    tracer.close()
+
+def serve_with_handoff(path, host, port):
+    """支持热交接的启动方式
+
+    有旧进程在 path 上等待时，接管它的房间和监听 socket，端口不会中断；否则自己监听端口。
+    之后在 path 上等待下一个新进程，被接管后停止接受连接、通知客户端重连并退出。
+    """
+    global handoff_server, handoff_received
+    from werkzeug.serving import make_server
+
+    received = handoff.receive_state(path)
+    listen_fd = None
+    if received is not None:
+        conn, state, fds = received
+        restore_ms = restore_rooms(state)
+        listen_fd = fds[0]
+    server = make_server(host, port, app, threaded=True, fd=listen_fd)
+    if received is not None:
+        handoff.acknowledge(conn, rooms=len(rooms), restore_ms=restore_ms)
+        handoff_received = {'rooms': len(rooms), 'restore_ms': restore_ms}
+        print(f"[DEBUG] Took over {len(rooms)} rooms in {restore_ms} ms")
+
+    handoff_server = HandoffServer(path, lambda: export_rooms(server), server.shutdown, abort_handoff,
+                                   spawn=socketio.start_background_task)
+    handoff_server.start()
+    print(f"[DEBUG] Serving on {host}:{server.port}, waiting for successor on {path}")
+    try:
+        server.serve_forever()
+    finally:
+        if handoff_server.handed_off.is_set():
+            finish_handoff()
+        server.server_close()
+
 if __name__ == '__main__':
-    socketio.run(app, 
-                 host='0.0.0.0',  # 允许外部访问
-                 port=5001,       # 指定端口
-                 debug=True,      # 开启调试模式
-                 allow_unsafe_werkzeug=True) 
\ No newline at end of file
+    port = int(os.environ.get('PORT', 5001))
+    if os.environ.get('HANDOFF_SOCKET'):
+        serve_with_handoff(os.environ['HANDOFF_SOCKET'], '0.0.0.0', port)
+    else:
+        socketio.run(app, 
+                     host='0.0.0.0',  # 允许外部访问
+                     port=port,       # 指定端口
+                     debug=True,      # 开启调试模式
+                     allow_unsafe_werkzeug=True) 
\ No newline at end of file
@@ -0,0 +1,353 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""已结束对局的列式归档
+
+每张表的每一列是一个只追加的定长二进制文件（<目录>/<表>/<列>.bin），读取时用
+numpy.memmap 映射，聚合查询全部是向量化的 bincount，不会为每局游戏创建 Python
+对象。三张表：
+
+- games：每局一行（人数、获胜方、任务轮数、结束时间）
+- seats：每局每个座位一行（角色、阵营、使用魔法指示物次数、担任队长次数）
+- quests：每局每轮任务一行（轮次、队长座位、人数、失败票数、使用魔法人数、是否成功）
+
+seats / quests 的 game 列是 games 表中的行号。只支持单个写入进程；写入中途崩溃
+导致同一张表的列长度不一致时，打开归档时把各列截断到共同的行数，之后的追加重新对齐。
+"""
+
+import os
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+from game import GamePhase, Role, Team
+
+try:
+    import numpy as np
+except ImportError:  # 未安装 numpy 时不归档
+    np = None
+
+AVAILABLE = np is not None
+
+TEAMS = list(Team)
+ROLES = list(Role)
+TEAM_CODES = {team: code for code, team in enumerate(TEAMS)}
+ROLE_CODES = {role: code for code, role in enumerate(ROLES)}
+
+SCHEMA = {
+    'games': {
+        'player_count': 'u1',
+        'winner': 'u1',
+        'quests': 'u1',
+        'finished_at': 'u4',
+    },
+    'seats': {
+        'game': 'u4',
+        'seat': 'u1',
+        'role': 'u1',
+        'team': 'u1',
+        'magic_used': 'u1',
+        'leader_turns': 'u1',
+    },
+    'quests': {
+        'game': 'u4',
+        'quest_number': 'u1',
+        'leader_seat': 'u1',
+        'team_size': 'u1',
+        'fail_count': 'u1',
+        'magic_used': 'u1',
+        'success': 'u1',
+    },
+}
+
+
+def game_rows(game) -> Dict[str, List[Dict]]:
+    """把一局已结束的游戏拆成三张表的行（game 列留给写入时填充）"""
+    seats = {p.name: seat for seat, p in enumerate(game.players)}
+    magic_used = [0] * len(game.players)
+    leader_turns = [0] * len(game.players)
+    quests = []
+    for record in game.quest_history:
+        leader = seats[record['leader']]
+        leader_turns[leader] += 1
+        for name in record['magic_holders']:
+            magic_used[seats[name]] += 1
+        quests.append({
+            'quest_number': record['quest_number'],
+            'leader_seat': leader,
+            'team_size': len(record['team']),
+            'fail_count': record['fail_count'],
+            'magic_used': len(record['magic_holders']),
+            'success': int(record['success']),
+        })
+    return {
+        'games': [{
+            'player_count': len(game.players),
+            'winner': TEAM_CODES[Team[game.winner]],
+            'quests': len(game.quest_results),
+            'finished_at': int(time.time()),
+        }],
+        'seats': [{
+            'seat': seat,
+            'role': ROLE_CODES[p.role],
+            'team': TEAM_CODES[p.role.team],
+            'magic_used': magic_used[seat],
+            'leader_turns': leader_turns[seat],
+        } for seat, p in enumerate(game.players)],
+        'quests': quests,
+    }
+
+
+def _rates(counts, hits, labels) -> Dict:
+    """把 bincount 的结果整理为 {标签: {count, wins, rate}}，跳过没有数据的分组"""
+    result = {}
+    for code, label in enumerate(labels):
+        if code >= len(counts) or label is None:
+            continue
+        count = int(counts[code])
+        if count:
+            wins = int(hits[code])
+            result[label] = {'count': count, 'wins': wins, 'rate': round(wins / count, 4)}
+    return result
+
+
+def _empty_buffer() -> Dict[str, Dict[str, List]]:
+    return {table: {column: [] for column in columns} for table, columns in SCHEMA.items()}
+
+
+class GameArchive:
+    """列式对局归档：append() 缓冲已结束的对局
+
+    提供 spawn 时由后台线程每隔 interval 秒把缓冲写入磁盘，append() 不等待磁盘；
+    否则满 flush_every 局后在 append() 中写入。写入时缓冲先被取走，磁盘 I/O 不持有
+    append() 使用的锁。
+    """
+
+    def __init__(self, path: str, flush_every: int = 64, interval: float = 1.0,
+                 spawn: Optional[Callable] = None, sleep: Callable[[float], None] = time.sleep):
+        self.path = path
+        self.flush_every = flush_every
+        self.interval = interval
+        self._spawn = spawn
+        self._sleep = sleep
+        self._running = False
+        self._buffer = _empty_buffer()
+        self._buffered_games = 0
+        self._writing_games = 0
+        self._rows = None
+        self._opened = False
+        self._maps = {}
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()  # 串行化磁盘写入，先于 _lock 获取
+
+    def _column_path(self, table: str, column: str) -> str:
+        return os.path.join(self.path, table, f"{column}.bin")
+
+    def _disk_rows(self, table: str) -> int:
+        """磁盘上一张表的完整行数（按最短的列计算）"""
+        rows = []
+        for column, dtype in SCHEMA[table].items():
+            path = self._column_path(table, column)
+            size = os.path.getsize(path) if os.path.exists(path) else 0
+            rows.append(size // np.dtype(dtype).itemsize)
+        return min(rows)
+
+    def _open(self):
+        """第一次读写前把每张表的各列截断到共同的行数，丢弃崩溃时只写了一部分的行"""
+        if self._opened:
+            return
+        for table, columns in SCHEMA.items():
+            rows = self._disk_rows(table)
+            for column, dtype in columns.items():
+                path = self._column_path(table, column)
+                size = rows * np.dtype(dtype).itemsize
+                if os.path.exists(path) and os.path.getsize(path) != size:
+                    print(f"[DEBUG] Truncating torn archive column {table}/{column} to {rows} rows")
+                    os.truncate(path, size)
+        self._opened = True
+
+    def __len__(self):
+        """已归档（含未写入磁盘）的对局数"""
+        if not AVAILABLE:
+            return 0
+        with self._lock:
+            return self._game_rows()
+
+    def _game_rows(self) -> int:
+        if self._rows is None:
+            self._open()
+            self._rows = self._disk_rows('games')
+        return self._rows + self._writing_games + self._buffered_games
+
+    def append(self, game) -> bool:
+        """归档一局已结束的游戏"""
+        if not AVAILABLE or game.current_phase != GamePhase.GAME_OVER or game.winner is None:
+            return False
+        rows = game_rows(game)
+        with self._lock:
+            game_index = self._game_rows()
+            for table, table_rows in rows.items():
+                buffer = self._buffer[table]
+                for row in table_rows:
+                    if table != 'games':
+                        row['game'] = game_index
+                    for column, value in row.items():
+                        buffer[column].append(value)
+            self._buffered_games += 1
+            if self._spawn is not None:
+                flush = False
+                start = not self._running
+                self._running = True
+            else:
+                flush = self._buffered_games >= self.flush_every
+                start = False
+        if start:
+            self._spawn(self._run)
+        if flush:
+            self.flush()
+        return True
+
+    def _run(self):
+        """写入线程，缓冲为空时退出，下次归档时重新启动"""
+        while True:
+            self._sleep(self.interval)
+            try:
+                self.flush()
+            except OSError as e:
+                print(f"[ERROR] Failed to write archive: {str(e)}")
+            with self._lock:
+                if not self._buffered_games:
+                    self._running = False
+                    return
+
+    def flush(self):
+        """把缓冲的对局写入磁盘"""
+        if not AVAILABLE:
+            return
+        with self._write_lock:
+            with self._lock:
+                if not self._buffered_games:
+                    return
+                self._game_rows()
+                buffer, self._buffer = self._buffer, _empty_buffer()
+                self._writing_games, self._buffered_games = self._buffered_games, 0
+            try:
+                for table, columns in buffer.items():
+                    self._write(table, columns)
+            except OSError:
+                with self._lock:
+                    # 丢弃这一批，下次读写时重新截断各列并读取行数
+                    self._writing_games = 0
+                    self._rows = None
+                    self._opened = False
+                raise
+            with self._lock:
+                self._rows += self._writing_games
+                self._writing_games = 0
+
+    def write_columns(self, table: str, columns: Dict):
+        """向一张表直接追加整列数据（列表或 numpy 数组，各列长度相同），用于批量导入"""
+        self.flush()
+        with self._write_lock:
+            with self._lock:
+                self._game_rows()
+                self._write(table, columns)
+                self._rows = None
+
+    def _write(self, table: str, columns: Dict):
+        os.makedirs(os.path.join(self.path, table), exist_ok=True)
+        for column, dtype in SCHEMA[table].items():
+            data = np.asarray(columns[column], dtype=dtype)
+            with open(self._column_path(table, column), 'ab') as f:
+                f.write(data.tobytes())
+
+    def columns(self, table: str) -> Dict:
+        """以内存映射方式读取一张表的所有列"""
+        self.flush()
+        rows = self._disk_rows(table)
+        result = {}
+        for column, dtype in SCHEMA[table].items():
+            path = self._column_path(table, column)
+            key = (table, column)
+            cached = self._maps.get(key)
+            if cached is None or len(cached) < rows:
+                cached = np.memmap(path, dtype=dtype, mode='r') if rows else np.zeros(0, dtype)
+                self._maps[key] = cached
+            result[column] = cached[:rows]
+        return result
+
+    def _game_filter(self, game_column, player_count: Optional[int]):
+        if player_count is None:
+            return None
+        return self.columns('games')['player_count'][game_column] == player_count
+
+    def win_rates_by_player_count(self) -> Dict:
+        """各人数配置下正义阵营的胜率"""
+        games = self.columns('games')
+        counts = np.bincount(games['player_count'], minlength=11)
+        good = np.bincount(games['player_count'], weights=games['winner'] == TEAM_CODES[Team.GOOD],
+                           minlength=11)
+        return _rates(counts, good, [None] * 4 + list(range(4, 11)))
+
+    def role_win_rates(self, player_count: Optional[int] = None) -> Dict:
+        """各角色的胜率"""
+        seats = self.columns('seats')
+        winners = self.columns('games')['winner'][seats['game']]
+        won = winners == seats['team']
+        roles = seats['role']
+        selected = self._game_filter(seats['game'], player_count)
+        if selected is not None:
+            roles, won = roles[selected], won[selected]
+        counts = np.bincount(roles, minlength=len(ROLES))
+        wins = np.bincount(roles, weights=won, minlength=len(ROLES))
+        return _rates(counts, wins, [role.display_name for role in ROLES])
+
+    def quest_success_rates(self, player_count: Optional[int] = None) -> Dict:
+        """各轮任务的成功率"""
+        quests = self.columns('quests')
+        numbers, success = quests['quest_number'], quests['success']
+        selected = self._game_filter(quests['game'], player_count)
+        if selected is not None:
+            numbers, success = numbers[selected], success[selected]
+        counts = np.bincount(numbers, minlength=6)
+        wins = np.bincount(numbers, weights=success, minlength=6)
+        return _rates(counts, wins, [None, 1, 2, 3, 4, 5])
+
+    def magic_token_rates(self, player_count: Optional[int] = None) -> Dict:
+        """使用与未使用魔法指示物时的任务成功率，以及使用过魔法指示物的玩家胜率"""
+        quests = self.columns('quests')
+        used, success = (quests['magic_used'] > 0).astype('u1'), quests['success']
+        selected = self._game_filter(quests['game'], player_count)
+        if selected is not None:
+            used, success = used[selected], success[selected]
+        quest_rates = _rates(np.bincount(used, minlength=2),
+                             np.bincount(used, weights=success, minlength=2),
+                             ['without_magic', 'with_magic'])
+
+        seats = self.columns('seats')
+        won = self.columns('games')['winner'][seats['game']] == seats['team']
+        seat_used = (seats['magic_used'] > 0).astype('u1')
+        selected = self._game_filter(seats['game'], player_count)
+        if selected is not None:
+            seat_used, won = seat_used[selected], won[selected]
+        seat_rates = _rates(np.bincount(seat_used, minlength=2),
+                            np.bincount(seat_used, weights=won, minlength=2),
+                            ['without_magic', 'with_magic'])
+        return {'quests': quest_rates, 'players': seat_rates}
+
+    QUERIES = {
+        'player_count': 'win_rates_by_player_count',
+        'role': 'role_win_rates',
+        'quest': 'quest_success_rates',
+        'magic': 'magic_token_rates',
+    }
+
+    def query(self, by: str, player_count: Optional[int] = None) -> Dict:
+        """按名称执行聚合查询"""
+        if not AVAILABLE:
+            raise ValueError('未安装 numpy，归档不可用')
+        method = self.QUERIES.get(by)
+        if method is None:
+            raise ValueError(f"不支持的统计维度: {by}")
+        if by == 'player_count':
+            return getattr(self, method)()
+        return getattr(self, method)(player_count)
@@ -0,0 +1,183 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import threading
+from collections import OrderedDict
+from itertools import combinations
+from math import comb
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from rules import STANDARD_RULES, Role, Team
+
+# 邪恶队员（未被魔法指示物限制时）出失败牌的默认概率
+DEFAULT_FAIL_RATE = 0.75
+
+
+class BeliefModel:
+    """某种人数配置下所有与角色配置一致的隐藏分配
+
+    每个假设是 (邪恶座位的位掩码, 摩根勒菲的座位)。同一假设对应的完整角色排列数只
+    取决于角色的重复次数，对所有假设都相同，因此先验是均匀的，不需要展开全部排列：
+    10 人局只有 C(10,4) * 4 = 840 个假设。摩根勒菲需要单独区分，因为只有她在持有
+    魔法指示物时仍然可以出失败牌。
+
+    模型在同一人数配置的所有对局间共享，按 (队伍, 使用魔法的队员, 失败票数) 缓存
+    每个假设的似然。
+    """
+
+    _models: Dict[Tuple[int, float], 'BeliefModel'] = {}
+    _models_lock = threading.Lock()
+
+    def __init__(self, player_count: int, fail_rate: float = DEFAULT_FAIL_RATE,
+                 cache_size: int = 4096):
+        roles = STANDARD_RULES.for_players(player_count).roles
+        evil_count = sum(1 for role in roles if role.team == Team.EVIL)
+        has_morgan = Role.MORGAN in roles
+        self.player_count = player_count
+        self.fail_rate = fail_rate
+
+        masks = []
+        morgans = []
+        for seats in combinations(range(player_count), evil_count):
+            mask = 0
+            for seat in seats:
+                mask |= 1 << seat
+            for morgan in (seats if has_morgan else (None,)):
+                masks.append(mask)
+                morgans.append(0 if morgan is None else 1 << morgan)
+        self.masks: List[int] = masks
+        self.morgans: List[int] = morgans
+        # 每个座位为邪恶的假设编号，用于求边缘概率
+        self.seat_hypotheses: List[List[int]] = [
+            [h for h, mask in enumerate(masks) if mask >> seat & 1]
+            for seat in range(player_count)
+        ]
+        self._fail_pmf = [[comb(n, f) * fail_rate ** f * (1 - fail_rate) ** (n - f)
+                           for f in range(n + 1)] for n in range(player_count + 1)]
+        self._cache: OrderedDict = OrderedDict()
+        self._cache_size = cache_size
+        self._cache_lock = threading.Lock()
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    @classmethod
+    def get(cls, player_count: int, fail_rate: float = DEFAULT_FAIL_RATE) -> 'BeliefModel':
+        """获取共享的模型"""
+        key = (player_count, fail_rate)
+        model = cls._models.get(key)
+        if model is None:
+            with cls._models_lock:
+                model = cls._models.get(key)
+                if model is None:
+                    model = cls._models[key] = cls(player_count, fail_rate)
+        return model
+
+    def __len__(self):
+        return len(self.masks)
+
+    def likelihood(self, team_mask: int, magic_mask: int, fail_count: int) -> List[float]:
+        """每个假设下观察到 fail_count 张失败牌的概率（带缓存）"""
+        key = (team_mask, magic_mask, fail_count)
+        with self._cache_lock:
+            cached = self._cache.get(key)
+            if cached is not None:
+                self._cache.move_to_end(key)
+                self.cache_hits += 1
+                return cached
+
+        pmf = self._fail_pmf
+        values = []
+        for mask, morgan in zip(self.masks, self.morgans):
+            evil = team_mask & mask
+            # 持有魔法指示物的邪恶队员只能出成功牌，摩根勒菲除外
+            can_fail = bin(evil & ~(magic_mask & ~morgan)).count('1')
+            values.append(pmf[can_fail][fail_count] if fail_count <= can_fail else 0.0)
+
+        with self._cache_lock:
+            self.cache_misses += 1
+            self._cache[key] = values
+            if len(self._cache) > self._cache_size:
+                self._cache.popitem(last=False)
+        return values
+
+
+class RoleBeliefs:
+    """根据公开的任务历史推断每个座位属于邪恶阵营的概率
+
+    每轮任务结算后用 observe_quest() 增量更新权重（一次逐项相乘），并立即重算各座位
+    的边缘概率，查询只是读取缓存。与所有假设都矛盾的观察（例如正义玩家出了失败牌）
+    会被忽略并计入 inconsistent。
+    """
+
+    def __init__(self, player_names: Sequence[str], fail_rate: float = DEFAULT_FAIL_RATE):
+        self.names = list(player_names)
+        self.seats = {name: seat for seat, name in enumerate(self.names)}
+        self.model = BeliefModel.get(len(self.names), fail_rate)
+        self.weights = [1.0] * len(self.model)
+        self.observed = 0
+        self.inconsistent = 0
+        self._marginals: List[float] = []
+        self._conditional: Dict[int, List[float]] = {}
+        self._refresh()
+
+    @classmethod
+    def for_game(cls, game, fail_rate: float = DEFAULT_FAIL_RATE) -> 'RoleBeliefs':
+        """为对局创建推断器并读入已有的任务历史"""
+        beliefs = cls([p.name for p in game.players], fail_rate)
+        beliefs.sync(game)
+        return beliefs
+
+    def sync(self, game):
+        """读入对局中尚未处理的任务记录"""
+        for record in game.quest_history[self.observed + self.inconsistent:]:
+            self.observe_quest(record['team'], record['fail_count'], record['magic_holders'])
+
+    def _mask(self, names: Iterable[str]) -> int:
+        mask = 0
+        for name in names:
+            mask |= 1 << self.seats[name]
+        return mask
+
+    def observe_quest(self, team: Iterable[str], fail_count: int,
+                      magic_holders: Iterable[str] = ()) -> bool:
+        """根据一轮任务的结果更新，返回观察是否与角色配置一致"""
+        likelihood = self.model.likelihood(self._mask(team), self._mask(magic_holders), fail_count)
+        updated = [w * l for w, l in zip(self.weights, likelihood)]
+        total = sum(updated)
+        if total <= 0:
+            self.inconsistent += 1
+            return False
+        self.weights = [w / total for w in updated]
+        self.observed += 1
+        self._refresh()
+        return True
+
+    def _refresh(self):
+        weights = self.weights
+        total = sum(weights)
+        self._marginals = [sum(weights[h] for h in hypotheses) / total
+                           for hypotheses in self.model.seat_hypotheses]
+        self._conditional.clear()
+
+    def evil_probability(self, name: str) -> float:
+        """某个座位属于邪恶阵营的概率"""
+        return self._marginals[self.seats[name]]
+
+    def marginals(self, known_good: Optional[str] = None) -> Dict[str, float]:
+        """所有座位属于邪恶阵营的概率；known_good 为已知是正义的玩家（例如自己）"""
+        if known_good is None:
+            return dict(zip(self.names, self._marginals))
+        seat = self.seats[known_good]
+        values = self._conditional.get(seat)
+        if values is None:
+            bit = 1 << seat
+            weights = [0.0 if mask & bit else w for mask, w in zip(self.model.masks, self.weights)]
+            total = sum(weights) or 1.0
+            values = [sum(weights[h] for h in hypotheses) / total
+                      for hypotheses in self.model.seat_hypotheses]
+            self._conditional[seat] = values
+        return dict(zip(self.names, values))
+
+    def most_likely_evil(self) -> List[str]:
+        """按属于邪恶阵营的概率从高到低排序的玩家"""
+        return sorted(self.names, key=self.evil_probability, reverse=True)
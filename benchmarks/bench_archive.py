@@ -0,0 +1,88 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""归档查询基准：在合成的大量对局上测量各聚合查询的耗时"""
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import archive
+from archive import GameArchive
+
+
+def synthesize(target, games, seed=1):
+    """用向量化方式生成 games 局合成数据并批量写入"""
+    np = archive.np
+    rng = np.random.default_rng(seed)
+    player_count = rng.integers(4, 11, games, dtype='u1')
+    quests = rng.integers(3, 6, games, dtype='u1')
+    target.write_columns('games', {
+        'player_count': player_count,
+        'winner': rng.integers(0, 2, games),
+        'quests': quests,
+        'finished_at': np.full(games, int(time.time())),
+    })
+
+    seat_game = np.repeat(np.arange(games, dtype='u4'), player_count)
+    seat_count = len(seat_game)
+    starts = np.repeat(np.cumsum(player_count, dtype='u8') - player_count, player_count)
+    role = rng.integers(0, len(archive.ROLES), seat_count, dtype='u1')
+    target.write_columns('seats', {
+        'game': seat_game,
+        'seat': (np.arange(seat_count, dtype='u8') - starts).astype('u1'),
+        'role': role,
+        'team': np.array([archive.TEAM_CODES[r.team] for r in archive.ROLES], dtype='u1')[role],
+        'magic_used': rng.integers(0, 2, seat_count),
+        'leader_turns': rng.integers(0, 2, seat_count),
+    })
+
+    quest_game = np.repeat(np.arange(games, dtype='u4'), quests)
+    quest_count = len(quest_game)
+    starts = np.repeat(np.cumsum(quests, dtype='u8') - quests, quests)
+    target.write_columns('quests', {
+        'game': quest_game,
+        'quest_number': (np.arange(quest_count, dtype='u8') - starts + 1).astype('u1'),
+        'leader_seat': rng.integers(0, 4, quest_count),
+        'team_size': rng.integers(2, 6, quest_count),
+        'fail_count': rng.integers(0, 3, quest_count),
+        'magic_used': rng.integers(0, 2, quest_count),
+        'success': rng.integers(0, 2, quest_count),
+    })
+    return seat_count, quest_count
+
+
+def main():
+    parser = argparse.ArgumentParser(description='归档查询基准')
+    parser.add_argument('--games', type=int, default=1000000)
+    args = parser.parse_args()
+
+    if not archive.AVAILABLE:
+        print("未安装 numpy，无法运行")
+        return
+
+    path = tempfile.mkdtemp()
+    try:
+        target = GameArchive(path)
+        start = time.perf_counter()
+        seats, quests = synthesize(target, args.games)
+        print(f"写入 {args.games:,} 局 / {seats:,} 座位 / {quests:,} 任务: "
+              f"{time.perf_counter() - start:.2f} s")
+
+        reader = GameArchive(path)
+        for by, player_count in [('player_count', None), ('role', None), ('role', 7),
+                                 ('quest', None), ('magic', None), ('magic', 10)]:
+            start = time.perf_counter()
+            reader.query(by, player_count)
+            label = by if player_count is None else f"{by}({player_count}人)"
+            print(f"{label:>16}: {(time.perf_counter() - start) * 1000:8.1f} ms")
+    finally:
+        shutil.rmtree(path)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,48 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""角色推断基准：每轮任务结算后的更新耗时与单座位查询耗时"""
+
+import argparse
+import os
+import random
+import sys
+import time
+import timeit
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from beliefs import BeliefModel, RoleBeliefs
+
+
+def main():
+    parser = argparse.ArgumentParser(description='角色推断基准')
+    parser.add_argument('--games', type=int, default=200)
+    args = parser.parse_args()
+
+    rng = random.Random(1)
+    print(f"{'人数':>4} {'假设数':>6} {'建模ms':>8} {'更新us':>8} {'查询us':>8} {'缓存命中':>8}")
+    for count in range(4, 11):
+        start = time.perf_counter()
+        model = BeliefModel(count)
+        build_ms = (time.perf_counter() - start) * 1000
+        BeliefModel._models[(count, model.fail_rate)] = model
+
+        names = [f"玩家{i}" for i in range(count)]
+        updates = 0
+        start = time.perf_counter()
+        for _ in range(args.games):
+            beliefs = RoleBeliefs(names)
+            for _ in range(5):
+                team = rng.sample(names, rng.randint(2, min(5, count - 1)))
+                if not beliefs.observe_quest(team, rng.randint(0, 1), team[:rng.randint(0, 1)]):
+                    continue
+                updates += 1
+        update_us = (time.perf_counter() - start) / max(updates, 1) * 1e6
+
+        query_us = timeit.timeit(lambda: beliefs.evil_probability(names[0]), number=100000) / 100000 * 1e6
+        hit_rate = model.cache_hits / max(model.cache_hits + model.cache_misses, 1)
+        print(f"{count:>4} {len(model):>6} {build_ms:>8.1f} {update_us:>8.1f} {query_us:>8.2f} {hit_rate:>8.1%}")
+
+
+if __name__ == '__main__':
+    main()
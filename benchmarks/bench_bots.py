@@ -0,0 +1,76 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""机器人基准：大量全机器人房间并发对局，同时测量人类房间的动作延迟"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from bots import BotDriver
+from game import GameAction, GamePhase
+
+
+def main():
+    parser = argparse.ArgumentParser(description='机器人基准')
+    parser.add_argument('--rooms', type=int, default=300)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--players', type=int, default=7)
+    args = parser.parse_args()
+
+    devnull = open(os.devnull, 'w')
+    real_stdout, sys.stdout = sys.stdout, devnull
+    try:
+        import app
+        driver = BotDriver(app.bot_act, max_workers=args.workers, seed=1)
+        bot_rooms = []
+        for _ in range(args.rooms):
+            room = app.Room("机器人1", args.players)
+            room.bots.append("机器人1")
+            room.players[0].is_bot = True
+            room.fill_with_bots()
+            room.start_game()
+            bot_rooms.append(room)
+
+        human = app.Room("玩家1", 5)
+        human.fill_with_bots()
+        human.bots.clear()
+        human.start_game()
+        app.rooms[human.code] = human
+
+        start = time.perf_counter()
+        for room in bot_rooms:
+            driver.schedule(room)
+
+        # 机器人对局进行时，人类房间反复执行一个会被拒绝的动作，测量处理耗时
+        latencies = []
+        data = {'room_code': human.code}
+        remaining = list(bot_rooms)
+        while remaining and time.perf_counter() - start < 60:
+            for _ in range(20):
+                begin = time.perf_counter()
+                app.dispatch_action(GameAction.SELECT_NEXT_LEADER, data, '玩家1', next_leader='玩家1')
+                latencies.append(time.perf_counter() - begin)
+                time.sleep(0.005)
+            remaining = [room for room in remaining if room.game.current_phase != GamePhase.GAME_OVER]
+        elapsed = time.perf_counter() - start
+        driver.shutdown()
+    finally:
+        sys.stdout = real_stdout
+        devnull.close()
+
+    finished = sum(room.game.current_phase == GamePhase.GAME_OVER for room in bot_rooms)
+    latencies.sort()
+    stats = driver.stats()
+    print(f"机器人房间: {finished}/{args.rooms} 局完成, 耗时 {elapsed:.2f} s, "
+          f"{stats['actions'] / elapsed:,.0f} 动作/秒 ({args.workers} 线程)")
+    if latencies:
+        p50 = latencies[len(latencies) // 2] * 1e6
+        p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1e6
+        print(f"人类房间动作延迟: p50 {p50:.0f} us, p99 {p99:.0f} us ({len(latencies)} 次)")
+
+
+if __name__ == '__main__':
+    main()
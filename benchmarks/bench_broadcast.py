@@ -0,0 +1,114 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""广播合并基准：统计每局游戏实际发出的房间广播次数
+
+使用虚拟时钟驱动完整对局，投票按给定的平均间隔到达，比较不同合并窗口下的
+广播次数（以及乘以房间人数后的消息数）。
+"""
+
+import argparse
+import heapq
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from broadcast import BroadcastCoalescer
+from game import Game, GamePhase, Player
+
+
+class VirtualClock:
+    """虚拟时钟：记录合并器的延迟发送任务并在时间推进时执行"""
+
+    def __init__(self):
+        self.now = 0.0
+        self._due = []
+        self._seq = 0
+        self.coalescer = None
+
+    def spawn(self, target, room):
+        self._seq += 1
+        heapq.heappush(self._due, (self.now + self.coalescer.window, self._seq, room))
+
+    def advance(self, seconds):
+        self.now += seconds
+        while self._due and self._due[0][0] <= self.now:
+            _, _, room = heapq.heappop(self._due)
+            self.coalescer.flush(room)
+
+    def drain(self):
+        if self._due:
+            self.advance(max(due for due, _, _ in self._due) - self.now)
+
+
+def play_game(coalescer, clock, player_count, vote_gap_ms, rng, room='BENCH'):
+    players = [Player(f"基准玩家{i}") for i in range(1, player_count + 1)]
+    game = Game(players, player_count)
+
+    def publish(result):
+        coalescer.publish(room, result.event, lambda: {'game_state': game.get_game_status()},
+                          result.extra)
+
+    while not game.is_game_over():
+        clock.advance(1.0)
+        leader = game.get_current_leader()
+        if game.current_phase == GamePhase.LEADER_TURN:
+            team = rng.sample(game.players, game.current_quest.required_players)
+            publish(game.submit_team([p.name for p in team], player_name=leader.name))
+        elif game.current_phase == GamePhase.QUEST_VOTE:
+            for player in list(game.current_quest.team):
+                clock.advance(rng.expovariate(1000.0 / vote_gap_ms))
+                publish(game.submit_quest_result(player, rng.random() < 0.6))
+        elif game.current_phase == GamePhase.SELECT_NEXT_LEADER:
+            candidates = [p for p in game.players if p not in game.previous_leaders]
+            if not candidates:
+                break
+            publish(game.select_next_leader(leader.name, rng.choice(candidates).name))
+    clock.drain()
+
+
+def run(window_ms, vote_gap_ms, games, player_count, seed):
+    rng = random.Random(seed)
+    sent = []
+    clock = VirtualClock()
+    coalescer = BroadcastCoalescer(lambda event, payload, room: sent.append(event),
+                                   window_ms, spawn=clock.spawn, sleep=lambda s: None)
+    clock.coalescer = coalescer
+    for _ in range(games):
+        play_game(coalescer, clock, player_count, vote_gap_ms, rng)
+    return coalescer.stats(), len(sent)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='广播合并基准')
+    parser.add_argument('--games', type=int, default=200)
+    parser.add_argument('--players', type=int, default=10)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    # 屏蔽游戏引擎的调试输出
+    devnull = open(os.devnull, 'w')
+    real_stdout, sys.stdout = sys.stdout, devnull
+    try:
+        rows = []
+        for vote_gap_ms in (5, 20, 100):
+            for window_ms in (0, 20, 50):
+                stats, sent = run(window_ms, vote_gap_ms, args.games, args.players, args.seed)
+                rows.append((vote_gap_ms, window_ms, stats, sent))
+    finally:
+        sys.stdout = real_stdout
+        devnull.close()
+
+    print(f"{args.players}人局，{args.games}局游戏")
+    print(f"{'投票间隔ms':>10} {'窗口ms':>8} {'请求广播/局':>12} {'实际广播/局':>12} {'消息数/局':>10} {'节省':>8}")
+    for vote_gap_ms, window_ms, stats, sent in rows:
+        requested = stats['requested'] / args.games
+        per_game = sent / args.games
+        saved = 1 - sent / stats['requested'] if stats['requested'] else 0
+        print(f"{vote_gap_ms:>10} {window_ms:>8} {requested:>12.1f} {per_game:>12.1f} "
+              f"{per_game * args.players:>10.1f} {saved:>8.1%}")
+
+
+if __name__ == '__main__':
+    main()
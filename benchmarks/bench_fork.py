@@ -0,0 +1,58 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""对局分叉基准：Game.fork() 与 copy.deepcopy 的每秒分叉次数"""
+
+import argparse
+import copy
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from game import Game, Player, Team
+
+
+def mid_game(player_count):
+    """打完两轮任务、第三轮投票进行中的对局"""
+    players = [Player(f"玩家{i}") for i in range(1, player_count + 1)]
+    game = Game(players, player_count)
+    for _ in range(2):
+        leader = game.get_current_leader()
+        team = [p.name for p in players[:game.current_quest.required_players]]
+        game.submit_team(team, team[0], leader.name)
+        for name in team:
+            player = game.get_player(name)
+            game.submit_quest_result(player, player.team == Team.GOOD)
+        if game.is_game_over():
+            break
+        candidates = [p for p in players if p not in game.previous_leaders]
+        game.select_next_leader(game.get_current_leader().name, candidates[0].name)
+    return game
+
+
+def main():
+    parser = argparse.ArgumentParser(description='对局分叉基准')
+    parser.add_argument('--number', type=int, default=20000)
+    args = parser.parse_args()
+
+    devnull = open(os.devnull, 'w')
+    real_stdout, sys.stdout = sys.stdout, devnull
+    try:
+        games = {count: mid_game(count) for count in range(4, 11)}
+    finally:
+        sys.stdout = real_stdout
+        devnull.close()
+
+    print(f"{'人数':>4} {'fork/秒':>12} {'deepcopy/秒':>12} {'倍数':>6}")
+    for count, game in games.items():
+        fork_seconds = timeit.timeit(game.fork, number=args.number)
+        deep_number = max(args.number // 20, 1)
+        deep_seconds = timeit.timeit(lambda: copy.deepcopy(game), number=deep_number)
+        forks = args.number / fork_seconds
+        deep = deep_number / deep_seconds
+        print(f"{count:>4} {forks:>12,.0f} {deep:>12,.0f} {forks / deep:>6.1f}")
+
+
+if __name__ == '__main__':
+    main()
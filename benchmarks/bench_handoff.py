@@ -0,0 +1,86 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""热交接基准：N 个进行中的房间导出快照、经 Unix socket 传输、在新进程中重放恢复的耗时"""
+
+import argparse
+import os
+import random
+import shutil
+import socket
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='热交接基准')
+    parser.add_argument('--rooms', type=int, nargs='+', default=[1000, 5000])
+    parser.add_argument('--players', type=int, default=7)
+    parser.add_argument('--actions', type=int, default=12, help='每个房间已执行的动作数')
+    args = parser.parse_args()
+
+    data_dir = tempfile.mkdtemp()
+    for name in ('ARCHIVE_DIR', 'REPLAY_DIR', 'STATS_DB', 'EVENTS_FILE', 'TRACE_FILE'):
+        os.environ.setdefault(name, os.path.join(data_dir, name.lower()))
+
+    devnull = open(os.devnull, 'w')
+    real_stdout = sys.stdout
+    results = []
+    try:
+        sys.stdout = devnull
+        import app
+        import handoff
+        from bots import play_out
+
+        for count in args.rooms:
+            app.rooms.clear()
+            rng = random.Random(0)
+            for number in range(count):
+                random.seed(number)
+                room = app.Room("玩家1", args.players)
+                for index in range(2, args.players + 1):
+                    room.add_player(f"玩家{index}")
+                room.start_game()
+                play_out(room.game, rng, steps=args.actions)
+                app.rooms[room.code] = room
+
+            start = time.perf_counter()
+            state = {'format': handoff.STATE_FORMAT, 'rooms': [room.snapshot() for room in app.rooms.values()]}
+            exported = time.perf_counter()
+
+            # 发送方和接收方在不同线程，接收方解码 JSON 计入传输时间
+            sender, receiver = socket.socketpair(socket.AF_UNIX, socket.SOCK_STREAM)
+            received = {}
+            reader = threading.Thread(target=lambda: received.update(message=handoff.recv_message(receiver)[0]))
+            reader.start()
+            size = handoff.send_message(sender, {'type': 'state', 'state': state})
+            reader.join()
+            sent = time.perf_counter()
+            sender.close()
+            receiver.close()
+
+            app.rooms.clear()
+            for data in received['message']['state']['rooms']:
+                restored = app.Room.restore(data)
+                app.rooms[restored.code] = restored
+            restored_at = time.perf_counter()
+            results.append((count, size, (exported - start) * 1000, (sent - exported) * 1000,
+                            (restored_at - sent) * 1000))
+            app.rooms.clear()
+            app.lobby.clear()
+    finally:
+        sys.stdout = real_stdout
+        devnull.close()
+        shutil.rmtree(data_dir, ignore_errors=True)
+
+    print(f"{'房间数':>8} {'MB':>8} {'导出 ms':>10} {'传输 ms':>10} {'恢复 ms':>10} {'合计 ms':>10}")
+    for count, size, export_ms, send_ms, restore_ms in results:
+        print(f"{count:>8} {size / 1e6:>8.2f} {export_ms:>10.1f} {send_ms:>10.1f} {restore_ms:>10.1f} "
+              f"{export_ms + send_ms + restore_ms:>10.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,45 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""快速匹配基准：入队吞吐量以及批量组桌的耗时"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from matchmaking import MatchQueue
+
+
+def main():
+    parser = argparse.ArgumentParser(description='快速匹配基准')
+    parser.add_argument('--players', type=int, default=100000)
+    parser.add_argument('--cancel-rate', type=float, default=0.1)
+    args = parser.parse_args()
+
+    formed = []
+    queue = MatchQueue(lambda size, tickets: formed.append(size))
+    rng = random.Random(1)
+    sizes = [rng.randint(4, 10) for _ in range(args.players)]
+
+    start = time.perf_counter()
+    for i, size in enumerate(sizes):
+        queue.enqueue(f"sid{i}", size)
+        if rng.random() < args.cancel_rate:
+            queue.cancel(f"sid{rng.randrange(i + 1)}")
+    enqueue_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    queue.match_once()
+    match_seconds = time.perf_counter() - start
+
+    stats = queue.stats()
+    print(f"入队: {args.players} 次, {args.players / enqueue_seconds:,.0f} 次/秒")
+    print(f"组桌: {len(formed)} 桌, {stats['matched']} 人, 耗时 {match_seconds * 1000:.1f} ms")
+    print(f"剩余排队: {stats['waiting']}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""回放流基准：大量并发回放流的吞吐量和内存占用"""
+
+import argparse
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from bots import play_out
+from game import Game, Player
+from replay import ReplayStore
+
+
+def play_game(player_count, rng):
+    """由机器人决策打完一局"""
+    players = [Player(f"玩家{i}") for i in range(1, player_count + 1)]
+    game = Game(players, player_count)
+    play_out(game, rng)
+    return game if game.is_game_over() else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description='回放流基准')
+    parser.add_argument('--games', type=int, default=50)
+    parser.add_argument('--streams', type=int, nargs='+', default=[100, 1000, 4000])
+    args = parser.parse_args()
+
+    path = tempfile.mkdtemp()
+    devnull = open(os.devnull, 'w')
+    real_stdout, sys.stdout = sys.stdout, devnull
+    try:
+        rng = random.Random(1)
+        store = ReplayStore(path)
+        ids = [store.save(g) for g in (play_game(rng.choice([5, 7, 10]), rng) for _ in range(args.games)) if g]
+    finally:
+        sys.stdout = real_stdout
+        devnull.close()
+
+    print(f"{len(ids)} 局回放，平均 {sum(store.header(i)['actions'] for i in ids) / len(ids):.0f} 个动作")
+    print(f"{'并发流':>8} {'行/秒':>12} {'峰值内存/流':>12}")
+    try:
+        for count in args.streams:
+            tracemalloc.start()
+            streams = [store.stream(ids[i % len(ids)], from_quest=1 + i % 3) for i in range(count)]
+            lines = 0
+            start = time.perf_counter()
+            # 在单线程中轮流推进所有回放流，模拟同时在线的观众
+            while streams:
+                alive = []
+                for stream in streams:
+                    if next(stream, None) is not None:
+                        lines += 1
+                        alive.append(stream)
+                streams = alive
+            elapsed = time.perf_counter() - start
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            print(f"{count:>8} {lines / elapsed:>12,.0f} {peak / count / 1024:>10.1f} KB")
+    finally:
+        shutil.rmtree(path)
+
+
+if __name__ == '__main__':
+    main()
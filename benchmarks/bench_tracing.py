@@ -0,0 +1,77 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""动作追踪基准：不同采样率下每个动作（经由 dispatch_action，含广播）的额外耗时"""
+
+import argparse
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='动作追踪基准')
+    parser.add_argument('--games', type=int, default=200)
+    parser.add_argument('--players', type=int, default=7)
+    parser.add_argument('--rates', type=float, nargs='+', default=[0, 0.01, 1])
+    args = parser.parse_args()
+
+    data_dir = tempfile.mkdtemp()
+    for name in ('ARCHIVE_DIR', 'REPLAY_DIR', 'STATS_DB', 'EVENTS_FILE', 'TRACE_FILE'):
+        os.environ.setdefault(name, os.path.join(data_dir, name.lower()))
+    os.environ.setdefault('BROADCAST_WINDOW_MS', '0')
+
+    devnull = open(os.devnull, 'w')
+    real_stdout = sys.stdout
+    try:
+        sys.stdout = devnull
+        import app
+        from bots import play_out
+        from tracing import Tracer
+
+        results = []
+        # 第一轮用于预热，不计入结果
+        for rate in args.rates[:1] + args.rates:
+            app.tracer = Tracer(os.path.join(data_dir, f"trace-{rate}.json"), sample_rate=rate)
+            rng = random.Random(0)
+            actions = 0
+            elapsed = 0.0
+            for number in range(args.games):
+                random.seed(number)
+                room = app.Room("玩家1", args.players)
+                for index in range(2, args.players + 1):
+                    room.add_player(f"玩家{index}")
+                app.rooms[room.code] = room
+                room.start_game()
+                data = {'room_code': room.code}
+
+                def timed(player_name, action, payload):
+                    nonlocal elapsed
+                    start = time.perf_counter()
+                    app.dispatch_action(action, data, player_name, **payload)
+                    elapsed += time.perf_counter() - start
+
+                actions += play_out(room.game, rng, dispatch=timed)
+                app.rooms.pop(room.code, None)
+                app.lobby.remove(room.code)
+            app.tracer.close()
+            results.append((rate, actions, elapsed, app.tracer.stats()['spans']))
+    finally:
+        sys.stdout = real_stdout
+        devnull.close()
+        shutil.rmtree(data_dir, ignore_errors=True)
+
+    results = results[1:]
+    base = results[0][2] / results[0][1]
+    print(f"{'采样率':>8} {'动作数':>8} {'µs/动作':>10} {'相对':>8} {'span 数':>8}")
+    for rate, actions, elapsed, spans in results:
+        per_action = elapsed / actions
+        print(f"{rate:>8g} {actions:>8} {per_action * 1e6:>10.1f} {per_action / base - 1:>+8.1%} {spans:>8}")
+
+
+if __name__ == '__main__':
+    main()
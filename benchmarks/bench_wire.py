@@ -0,0 +1,63 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""线协议基准：比较 JSON 与 MessagePack 紧凑格式的负载大小和编码耗时
+
+JSON 编码方式与 python-socketio 默认一致（json.dumps，非 ASCII 字符转义）。
+"""
+
+import argparse
+import json
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import wire
+from game import Game, Player
+
+
+def sample_payloads(player_count):
+    players = [Player(f"玩家{i}") for i in range(1, player_count + 1)]
+    game = Game(players, player_count)
+    leader = game.get_current_leader()
+    team = [p.name for p in players[:game.current_quest.required_players]]
+    game.submit_team(team, team[0], leader.name)
+    game.submit_quest_result(players[1], True)
+    return {
+        'game_update': {'game_state': game.get_game_status()},
+        'player_info': {'player_info': game.get_player_info(players[0].name)},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='线协议基准')
+    parser.add_argument('--number', type=int, default=2000)
+    args = parser.parse_args()
+
+    if not wire.AVAILABLE:
+        print("未安装 msgpack，无法运行")
+        return
+
+    devnull = open(os.devnull, 'w')
+    real_stdout, sys.stdout = sys.stdout, devnull
+    try:
+        samples = {count: sample_payloads(count) for count in range(4, 11)}
+    finally:
+        sys.stdout = real_stdout
+        devnull.close()
+
+    print(f"{'人数':>4} {'事件':>12} {'JSON字节':>10} {'二进制字节':>10} {'比例':>7} "
+          f"{'JSON编码us':>11} {'二进制编码us':>12}")
+    for count, payloads in samples.items():
+        for event, payload in payloads.items():
+            json_size = len(json.dumps(payload).encode())
+            binary_size = len(wire.encode(payload))
+            json_us = timeit.timeit(lambda: json.dumps(payload), number=args.number) / args.number * 1e6
+            binary_us = timeit.timeit(lambda: wire.encode(payload), number=args.number) / args.number * 1e6
+            print(f"{count:>4} {event:>12} {json_size:>10} {binary_size:>10} "
+                  f"{binary_size / json_size:>7.1%} {json_us:>11.1f} {binary_us:>12.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,317 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""引擎热路径基准套件，与保存的基线比较并在退化时以非零状态退出
+
+覆盖 4-10 人的 Game 创建（含 setup_roles）、再来一局、get_game_status、get_player_info、
+完整模拟对局，Room.to_dict，以及在进程内通过 Socket.IO 测试客户端调用的各个
+事件处理函数。结果以每次调用的微秒数记录在 baselines.json 中：
+
+    python benchmarks/suite.py            # 与基线比较，超过阈值时退出码为 1
+    python benchmarks/suite.py --save     # 更新基线
+    python benchmarks/suite.py -k socket  # 只运行名称包含 socket 的项
+
+基线与机器相关，换机器或 Python 版本后应先用 --save 重新生成。未设置
+PYTHONHASHSEED 时以 PYTHONHASHSEED=0 重新启动自身，使各次运行可以比较。
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import timeit
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baselines.json')
+PLAYER_COUNTS = range(4, 11)
+DEFAULT_THRESHOLD = 0.25
+REPEAT = 5
+TARGET_SECONDS = 0.05  # 每次重复的目标耗时
+SAVE_ROUNDS = 3  # 保存基线时每项运行的轮数（取最快一轮）
+RETRIES = 2  # 超过阈值的项重新测量的次数，持续超过才算退化
+
+# 基准项：名称 -> 返回 {结果名: 每次调用微秒数} 的函数
+CASES = {}
+
+
+def case(name):
+    def register(func):
+        CASES[name] = func
+        return func
+    return register
+
+
+def per_call_us(func, repeat=REPEAT):
+    """自动确定调用次数，取多次重复中最快一次的单次耗时（微秒）"""
+    timer = timeit.Timer(func)
+    number = 1
+    while timer.timeit(number) < TARGET_SECONDS:
+        number *= 2
+    return min(timer.repeat(repeat, number)) / number * 1e6
+
+
+def new_game(player_count, seed=0):
+    from game import Game, Player
+    random.seed(seed)
+    return Game([Player(f"玩家{i}") for i in range(1, player_count + 1)], player_count)
+
+
+@case('game_init')
+def bench_game_init():
+    from game import Game, Player
+    results = {}
+    for count in PLAYER_COUNTS:
+        players = [Player(f"玩家{i}") for i in range(1, count + 1)]
+        results[f"game_init[{count}]"] = per_call_us(lambda: Game(players, count))
+    return results
+
+
+@case('rematch')
+def bench_rematch():
+    """同一房间再来一局（在原 Game 对象上重置），与 game_init 对比"""
+    from game import GamePhase
+    results = {}
+    for count in PLAYER_COUNTS:
+        game = new_game(count)
+
+        def rematch():
+            game.current_phase = GamePhase.GAME_OVER
+            game.rematch()
+        results[f"rematch[{count}]"] = per_call_us(rematch)
+    return results
+
+
+@case('game_status')
+def bench_game_status():
+    results = {}
+    for count in PLAYER_COUNTS:
+        game = new_game(count)
+        results[f"game_status[{count}]"] = per_call_us(game.get_game_status)
+    return results
+
+
+@case('player_info')
+def bench_player_info():
+    """每个玩家各取一次私人信息（与开局时的发送一致）"""
+    results = {}
+    for count in PLAYER_COUNTS:
+        game = new_game(count)
+        names = [p.name for p in game.players]
+        results[f"player_info[{count}]"] = per_call_us(lambda: [game.get_player_info(n) for n in names])
+    return results
+
+
+@case('full_game')
+def bench_full_game():
+    from bots import play_out
+    results = {}
+    for count in PLAYER_COUNTS:
+        results[f"full_game[{count}]"] = per_call_us(
+            lambda: play_out(new_game(count, seed=count), random.Random(count)))
+    return results
+
+
+@case('room_to_dict')
+def bench_room_to_dict():
+    import app
+    results = {}
+    for count in (5, 10):
+        room = app.Room("玩家1", count)
+        for number in range(2, count + 1):
+            room.add_player(f"玩家{number}")
+        app.lobby.remove(room.code)
+        results[f"room_to_dict[{count}]"] = per_call_us(room.to_dict)
+    return results
+
+
+@case('event_emit')
+def bench_event_emit():
+    """处理函数记录一个分析事件的开销（只进入缓冲区，缓冲区满后走丢弃路径）"""
+    from events import EventExporter
+    exporter = EventExporter(os.devnull, capacity=1024)
+    team = ["玩家1", "玩家2", "玩家3"]
+
+    def emit():
+        exporter.emit('team_submitted', room='1234', match=1, quest=1, leader="玩家1", team=team,
+                      magic_token_target="玩家2")
+    return {'event_emit': per_call_us(emit)}
+
+
+@case('rate_limit')
+def bench_rate_limit():
+    """每个 Socket 事件的限流检查（连接和 IP 两个令牌桶）"""
+    from ratelimit import RateLimiter
+    sids = RateLimiter(rate=1e9, burst=1e9)
+    ips = RateLimiter(rate=1e9, burst=1e9)
+
+    def check():
+        return sids.allow('sid') and ips.allow('127.0.0.1')
+    return {'rate_limit': per_call_us(check)}
+
+
+@case('socket')
+def bench_socket_handlers(rounds=40, player_count=5):
+    """在进程内通过测试客户端走完房间生命周期，记录每个事件处理函数的耗时中位数"""
+    import app
+    from bots import play_out
+
+    timings = {}
+
+    def call(client, event, data):
+        start = time.perf_counter()
+        reply = client.emit(event, data, callback=True)
+        timings.setdefault(event, []).append(time.perf_counter() - start)
+        return reply
+
+    clients = [app.socketio.test_client(app.app) for _ in range(player_count)]
+    try:
+        rng = random.Random(0)
+        # 第一轮用于预热（数据库连接、归档目录等延迟初始化），不计入结果
+        for round_number in range(rounds + 1):
+            if round_number == 1:
+                timings.clear()
+            random.seed(round_number)
+            host = clients[0]
+            reply = call(host, 'create_room', {'player_count': player_count})
+            code = reply['room_info']['code']
+            for client in clients[1:]:
+                call(client, 'join_room', {'room_code': code})
+            call(host, 'start_game', {'room_code': code, 'player_name': '玩家1'})
+
+            room = app.rooms[code]
+            sockets = {p.name: clients[i] for i, p in enumerate(room.players)}
+            play_out(room.game, rng, dispatch=lambda name, action, payload: call(
+                sockets[name], action.value, {'room_code': code, 'player_name': name, **payload}))
+
+            for name, client in sockets.items():
+                call(client, 'chat_message', {'room_code': code, 'player_name': name, 'text': '好局'})
+            for name, client in sockets.items():
+                call(client, 'leave_room', {'room_code': code, 'player_name': name})
+            for client in clients:
+                client.get_received()
+    finally:
+        for client in clients:
+            client.disconnect()
+    return {f"socket.{event}": statistics.median(samples) * 1e6 for event, samples in timings.items()}
+
+
+def case_of(result_name):
+    """结果名所属的基准项，例如 game_init[4] -> game_init，socket.join_room -> socket"""
+    return result_name.split('[')[0].split('.')[0]
+
+
+def run(selected=None, rounds=1, results=None):
+    """运行基准项 rounds 轮，与已有结果合并，每个结果取最快的一次"""
+    results = dict(results or {})
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        for name, func in CASES.items():
+            if selected is not None and name not in selected:
+                continue
+            for _ in range(rounds):
+                for result, us in func().items():
+                    results[result] = min(us, results.get(result, us))
+    return results
+
+
+def load_baseline(path):
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding='utf-8') as f:
+        return json.load(f).get('results', {})
+
+
+def save_baseline(path, results):
+    """合并写入基线（只覆盖本次运行的项）"""
+    merged = load_baseline(path)
+    merged.update({name: round(us, 3) for name, us in results.items()})
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({'meta': {'python': platform.python_version(), 'machine': platform.machine(),
+                            'saved_at': time.strftime('%Y-%m-%d %H:%M:%S')},
+                   'results': dict(sorted(merged.items()))},
+                  f, ensure_ascii=False, indent=2)
+        f.write('\n')
+
+
+def compare(results, baseline, threshold):
+    """返回 (表格行, 退化的项)，耗时超过基线 (1 + threshold) 倍即为退化"""
+    rows, regressions = [], []
+    for name, us in results.items():
+        base = baseline.get(name)
+        if base is None:
+            rows.append((name, None, us, '新增'))
+            continue
+        change = us / base - 1
+        status = ''
+        if change > threshold:
+            status = '退化'
+            regressions.append(name)
+        elif change < -threshold:
+            status = '提升'
+        rows.append((name, base, us, f"{change:+.1%} {status}".strip()))
+    return rows, regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='引擎热路径基准套件')
+    parser.add_argument('-k', dest='selected', action='append', help='只运行名称包含该字符串的基准项')
+    parser.add_argument('--save', action='store_true', help='把本次结果写入基线')
+    parser.add_argument('--baseline', default=BASELINE_PATH)
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD, help='允许的退化比例')
+    parser.add_argument('--retries', type=int, default=RETRIES, help='超过阈值的项重新测量的次数')
+    args = parser.parse_args(argv)
+    selected = None
+    if args.selected:
+        selected = {name for name in CASES if any(s in name for s in args.selected)}
+
+    # 服务端的归档、统计、回放、分析事件和追踪写入临时目录，广播同步发送以便计入处理函数的耗时
+    data_dir = tempfile.mkdtemp()
+    os.environ.setdefault('ARCHIVE_DIR', os.path.join(data_dir, 'archive'))
+    os.environ.setdefault('STATS_DB', os.path.join(data_dir, 'stats.sqlite3'))
+    os.environ.setdefault('REPLAY_DIR', os.path.join(data_dir, 'replays'))
+    os.environ.setdefault('EVENTS_FILE', os.path.join(data_dir, 'events', 'events.ndjson'))
+    os.environ.setdefault('TRACE_FILE', os.path.join(data_dir, 'traces', 'actions.json'))
+    os.environ.setdefault('BROADCAST_WINDOW_MS', '0')
+    # 基准在同一个进程里连续发送大量事件，不限流
+    os.environ.setdefault('SOCKET_RATE', '0')
+    os.environ.setdefault('IP_RATE', '0')
+    baseline = load_baseline(args.baseline)
+    try:
+        results = run(selected, SAVE_ROUNDS if args.save else 1)
+        rows, regressions = compare(results, baseline, args.threshold)
+        # 单次测量受机器负载影响较大，超过阈值的项重新测量后再判定
+        for _ in range(0 if args.save else args.retries):
+            if not regressions:
+                break
+            results = run({case_of(name) for name in regressions}, results=results)
+            rows, regressions = compare(results, baseline, args.threshold)
+    finally:
+        shutil.rmtree(data_dir, ignore_errors=True)
+
+    print(f"{'基准项':<32} {'基线(µs)':>12} {'本次(µs)':>12}  变化")
+    for name, base, us, change in rows:
+        base_text = f"{base:,.1f}" if base is not None else '-'
+        print(f"{name:<32} {base_text:>12} {us:>12,.1f}  {change}")
+
+    if args.save:
+        save_baseline(args.baseline, results)
+        print(f"\n基线已保存到 {args.baseline}")
+        return 0
+    if regressions:
+        print(f"\n{len(regressions)} 项超过基线 {args.threshold:.0%}: {', '.join(regressions)}")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    # 字符串哈希随机化会让同一基准项在不同进程间相差 30% 以上，固定后再运行
+    if 'PYTHONHASHSEED' not in os.environ:
+        os.environ['PYTHONHASHSEED'] = '0'
+        os.execv(sys.executable, [sys.executable] + sys.argv)
+    sys.exit(main())
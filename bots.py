@@ -0,0 +1,199 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import random
+import threading
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
+
+from beliefs import RoleBeliefs
+from game import Game, GameAction, GamePhase, Player, Role, Team
+
+BOT_NAME_PREFIX = "机器人"
+
+# 邪恶阵营队员投失败票的概率
+EVIL_FAIL_RATE = 0.8
+
+
+def _least_suspected(candidates: List[Player], bot: Player, beliefs: Optional[RoleBeliefs],
+                     rng: random.Random) -> List[Player]:
+    """正义机器人按嫌疑从低到高排列候选人，嫌疑相同的随机排列"""
+    candidates = list(candidates)
+    rng.shuffle(candidates)
+    if beliefs is not None and bot.team == Team.GOOD:
+        suspicion = beliefs.marginals(known_good=bot.name)
+        candidates.sort(key=lambda p: suspicion[p.name])
+    return candidates
+
+
+def decide(game: Game, bot_name: str, rng: random.Random,
+           beliefs: Optional[RoleBeliefs] = None) -> Optional[Tuple[GameAction, Dict]]:
+    """根据当前局面为机器人选择动作，不需要行动时返回 None"""
+    bot = game.get_player(bot_name)
+    if bot is None:
+        return None
+    phase = game.current_phase
+    leader = game.players[game.current_leader_index]
+
+    if phase == GamePhase.LEADER_TURN and leader is bot:
+        others = _least_suspected([p for p in game.players if p is not bot], bot, beliefs, rng)
+        team = [bot] + others[:game.current_quest.required_players - 1]
+        # 正义阵营把魔法指示物交给自己，邪恶阵营随机交给队友
+        target = bot if bot.team == Team.GOOD else rng.choice(team)
+        return GameAction.SUBMIT_TEAM, {
+            'team': [p.name for p in team],
+            'magic_token_target': target.name,
+        }
+
+    if phase == GamePhase.QUEST_VOTE and game.current_quest.has_member(bot) \
+            and bot not in game.current_quest.votes:
+        success = bot.team == Team.GOOD or rng.random() >= EVIL_FAIL_RATE
+        if bot.role == Role.MORGAN:
+            success = False
+        return GameAction.SUBMIT_QUEST_VOTE, {'success': success}
+
+    if phase == GamePhase.SELECT_NEXT_LEADER and leader is bot:
+        candidates = [p for p in game.players if p not in game.previous_leaders]
+        if not candidates:
+            return None
+        candidates = _least_suspected(candidates, bot, beliefs, rng)
+        return GameAction.SELECT_NEXT_LEADER, {'next_leader': candidates[0].name}
+
+    return None
+
+
+def next_move(game: Game, rng: random.Random,
+              beliefs: Optional[RoleBeliefs] = None) -> Optional[Tuple[str, GameAction, Dict]]:
+    """按座位顺序找第一个需要行动的玩家，返回 (玩家名, 动作, 参数)；没有人需要行动时返回 None"""
+    for player in game.players:
+        decision = decide(game, player.name, rng, beliefs)
+        if decision is not None:
+            return (player.name,) + decision
+    return None
+
+
+def play_out(game: Game, rng: random.Random, steps: Optional[int] = None,
+             dispatch: Optional[Callable] = None) -> int:
+    """由机器人决策替所有玩家行动，直到游戏结束、没有人需要行动或执行了 steps 个动作
+
+    测试、基准和批量模拟用它打完一局。dispatch(player_name, action, payload) 默认直接调用
+    game.dispatch，需要经过 Socket.IO 等入口时传入。返回执行的动作数。
+    """
+    actions = 0
+    while game.current_phase != GamePhase.GAME_OVER and (steps is None or actions < steps):
+        move = next_move(game, rng)
+        if move is None:
+            break
+        player_name, action, payload = move
+        if dispatch is None:
+            game.dispatch(action, player_name, **payload)
+        else:
+            dispatch(player_name, action, payload)
+        actions += 1
+    return actions
+
+
+class BotDriver:
+    """在有界线程池中驱动房间内的机器人
+
+    Socket.IO 处理线程只调用 schedule()，把房间放入线程池后立即返回。每个房间同时
+    最多有一个待执行任务：任务持有房间锁，为第一个需要行动的机器人做决定并通过
+    act(room, bot_name, action, payload) 执行，然后重新排队，让其他房间的任务
+    能够穿插执行。任务出错时按指数退避（retry_delay 起，最多 max_retry_delay 秒）
+    重新排队，房间不会因为一次失败停住。
+    """
+
+    def __init__(self, act: Callable, max_workers: int = 4, seed: Optional[int] = None,
+                 retry_delay: float = 0.5, max_retry_delay: float = 30.0):
+        self.act = act
+        self.max_workers = max_workers
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='bot')
+        self._pending = set()
+        self._lock = threading.Lock()
+        self._rng = random.Random(seed)
+        self._beliefs = weakref.WeakKeyDictionary()  # Game -> (局数, RoleBeliefs)
+        self._failures = weakref.WeakKeyDictionary()  # Room -> 连续失败次数
+        self.retry_delay = retry_delay
+        self.max_retry_delay = max_retry_delay
+        self._stopped = False
+        self.actions = 0
+        self.errors = 0
+        self.retries = 0
+
+    def schedule(self, room):
+        """房间状态变化后调用，有机器人且游戏进行中时排队执行"""
+        if self._stopped or not room.bots or room.game is None or room.game.current_phase == GamePhase.GAME_OVER:
+            return
+        with self._lock:
+            if room in self._pending:
+                return
+            self._pending.add(room)
+        self._executor.submit(self._step, room)
+
+    def _step(self, room):
+        with self._lock:
+            self._pending.discard(room)
+        acted = False
+        try:
+            with room.lock:
+                game = room.game
+                if game is None or self._stopped:
+                    return
+                match_number, beliefs = self._beliefs.get(game, (None, None))
+                if match_number != game.match_number:
+                    # 新对局或再来一局后任务历史已清空，重新推断
+                    beliefs = RoleBeliefs.for_game(game)
+                    self._beliefs[game] = (game.match_number, beliefs)
+                else:
+                    beliefs.sync(game)
+                for bot_name in room.bots:
+                    decision = decide(game, bot_name, self._rng, beliefs)
+                    if decision is not None:
+                        action, payload = decision
+                        self.act(room, bot_name, action, payload)
+                        self.actions += 1
+                        acted = True
+                        break
+        except Exception as e:
+            self.errors += 1
+            failures = self._failures[room] = self._failures.get(room, 0) + 1
+            delay = min(self.max_retry_delay, self.retry_delay * 2 ** (failures - 1))
+            print(f"[ERROR] Bot action failed in room {room.code}: {str(e)}, retrying in {delay:.1f}s")
+            self._retry_later(room, delay)
+            return
+        self._failures.pop(room, None)
+        if acted:
+            self.schedule(room)
+
+    def _retry_later(self, room, delay: float):
+        """delay 秒后重新排队出错的房间"""
+        def retry():
+            self.retries += 1
+            self.schedule(room)
+        timer = threading.Timer(delay, retry)
+        timer.daemon = True
+        timer.start()
+
+    def stop(self):
+        """不再执行机器人动作（进程交接时调用）；持有房间锁的动作会先完成"""
+        self._stopped = True
+
+    def resume(self):
+        """交接失败后恢复，调用方需要重新 schedule() 各房间"""
+        self._stopped = False
+
+    def shutdown(self):
+        """停止线程池，之后到期的重试不再排队"""
+        self._stopped = True
+        self._executor.shutdown(wait=True)
+
+    def stats(self) -> Dict:
+        """机器人线程池的运行指标"""
+        return {
+            'workers': self.max_workers,
+            'pending_rooms': len(self._pending),
+            'actions': self.actions,
+            'errors': self.errors,
+            'retries': self.retries,
+        }
@@ -0,0 +1,116 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import threading
+import time
+from typing import Callable, Dict, Optional
+
+from tracing import activate, current_trace, span
+
+# 可以合并的事件，窗口内只发送一次（game_update 取最新状态，lobby_update 取累计变更）
+COALESCED_EVENTS = frozenset({'game_update', 'lobby_update'})
+
+
+class PendingBroadcast:
+    """窗口内等待发送的合并广播"""
+    __slots__ = ('event', 'build_payload', 'extra', 'merged', 'trace')
+
+    def __init__(self, event: str, build_payload: Callable[[], Dict], extra: Dict):
+        self.event = event
+        self.build_payload = build_payload  # 发送时才构建 game_state，保证是最新状态
+        self.extra = dict(extra)
+        self.merged = 1
+        self.trace = current_trace()  # 延迟发送的耗时记到最近一次被采样的动作上
+
+
+class BroadcastCoalescer:
+    """按房间合并短时间内的全量状态广播
+
+    game_update 在窗口内只发送一次最新状态；quest_result、game_over 等离散事件
+    立即发送，并取代房间内尚未发送的 game_update（它们本身携带完整 game_state）。
+    """
+
+    def __init__(self, emit: Callable, window_ms: float = 20,
+                 spawn: Optional[Callable] = None, sleep: Callable = time.sleep):
+        self.emit = emit            # emit(event, payload, room)
+        self.window = window_ms / 1000.0
+        self.spawn = spawn or self._spawn_thread
+        self.sleep = sleep
+        self._pending: Dict[str, PendingBroadcast] = {}
+        self._lock = threading.Lock()
+        self.requested = 0
+        self.sent = 0
+
+    @staticmethod
+    def _spawn_thread(target, *args):
+        thread = threading.Thread(target=target, args=args, daemon=True)
+        thread.start()
+        return thread
+
+    def publish(self, room: str, event: str, build_payload: Callable[[], Dict],
+                extra: Optional[Dict] = None):
+        """发布一次房间广播"""
+        extra = extra or {}
+        with self._lock:
+            self.requested += 1
+            if event not in COALESCED_EVENTS or self.window <= 0:
+                # 离散事件携带完整状态，等待中的全量更新不再需要
+                if event not in COALESCED_EVENTS:
+                    self._pending.pop(room, None)
+                self.sent += 1
+                immediate = True
+            else:
+                pending = self._pending.get(room)
+                if pending is None:
+                    self._pending[room] = PendingBroadcast(event, build_payload, extra)
+                    immediate = False
+                else:
+                    # 附加字段描述的是触发这次更新的动作，只保留最近一次的，旧动作的字段不再适用
+                    pending.build_payload = build_payload
+                    pending.extra = dict(extra)
+                    pending.merged += 1
+                    pending.trace = current_trace() or pending.trace
+                    return
+
+        if immediate:
+            self._send(room, event, build_payload, extra)
+        else:
+            self.spawn(self._flush_later, room)
+
+    def _flush_later(self, room: str):
+        self.sleep(self.window)
+        self.flush(room)
+
+    def flush(self, room: Optional[str] = None):
+        """立即发送等待中的广播（不指定房间时发送全部）"""
+        with self._lock:
+            if room is None:
+                batch = list(self._pending.items())
+                self._pending.clear()
+            else:
+                pending = self._pending.pop(room, None)
+                batch = [(room, pending)] if pending else []
+            self.sent += len(batch)
+
+        for room_code, pending in batch:
+            with activate(pending.trace):
+                with span('coalesced_send', merged=pending.merged):
+                    self._send(room_code, pending.event, pending.build_payload, pending.extra)
+
+    def _send(self, room: str, event: str, build_payload: Callable[[], Dict], extra: Dict):
+        payload = dict(extra)
+        with span('build_payload', event=event):
+            payload.update(build_payload())
+        self.emit(event, payload, room)
+
+    def stats(self) -> Dict:
+        """广播统计：请求次数、实际发送次数和节省的次数"""
+        with self._lock:
+            pending = len(self._pending)
+            return {
+                'window_ms': self.window * 1000,
+                'requested': self.requested,
+                'sent': self.sent,
+                'saved': self.requested - self.sent - pending,
+                'pending_rooms': pending,
+            }
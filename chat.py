@@ -0,0 +1,53 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""房间聊天记录
+
+每个房间只保留最近 capacity 条消息（deque(maxlen) 环形缓冲区，追加 O(1)，内存有上限），
+新加入或重连的客户端通过一次回复拿到缓冲中的全部消息。消息 id 在房间内递增，
+客户端可以据此去重和排序。
+"""
+
+import threading
+import time
+from collections import deque
+from typing import Callable, Dict, List
+
+
+class ChatHistory:
+    """房间内最近的聊天消息"""
+
+    def __init__(self, capacity: int = 50, max_length: int = 200,
+                 clock: Callable[[], float] = time.time):
+        self.max_length = max_length
+        self._clock = clock
+        self._messages: deque = deque(maxlen=capacity)
+        self._lock = threading.Lock()
+        self._seq = 0
+
+    def __len__(self):
+        return len(self._messages)
+
+    def append(self, player: str, text) -> Dict:
+        """校验并记录一条消息，返回要广播的消息"""
+        if not isinstance(text, str) or not text.strip():
+            raise ValueError('消息不能为空')
+        text = text.strip()
+        if len(text) > self.max_length:
+            raise ValueError(f'消息不能超过 {self.max_length} 个字')
+        with self._lock:
+            self._seq += 1
+            message = {'id': self._seq, 'player': player, 'text': text, 'ts': round(self._clock(), 3)}
+            self._messages.append(message)
+        return message
+
+    def tail(self, since: int = 0) -> List[Dict]:
+        """缓冲中 id 大于 since 的消息，按时间顺序"""
+        with self._lock:
+            return [m for m in self._messages if m['id'] > since]
+
+    def load(self, messages: List[Dict]):
+        """恢复交接前的消息，之后的 id 接着递增"""
+        with self._lock:
+            self._messages.extend(messages)
+            if messages:
+                self._seq = max(self._seq, messages[-1]['id'])
@@ -1,7 +1,51 @@
 #!/bin/bash
+# 用法: ./deploy.sh [版本] [handoff]
+# handoff 模式下新容器从旧容器接管房间和监听端口，正在进行的对局不中断。
+# 两个容器需要共享网络命名空间（--network host）和存放交接 socket 的数据卷；
+# 从普通模式第一次切换到 handoff 模式时仍会重启一次。
+# HANDOFF_TIMEOUT（秒，默认 120）为等待新容器接管和旧容器退出的时间。
 VERSION=${1:-v2}
+MODE=${2:-restart}
 docker build  .  -t aolifu/awalong2:$VERSION
 docker push aolifu/awalong2:$VERSION
-docker stop awalong2
-docker rm awalong2
-docker run -d --name awalong2 -p 11015:5001 aolifu/awalong2:$VERSION
\ No newline at end of file
+
+if [ "$MODE" = "handoff" ]; then
+    OLD=$(docker ps -q --filter "name=^awalong2-")
+    # 普通模式启动的容器不能交接，先停掉
+    if [ -n "$(docker ps -aq --filter "name=^awalong2$")" ]; then
+        docker stop awalong2
+        docker rm awalong2
+    fi
+    NEW=awalong2-$(date +%s)
+    docker run -d --name $NEW --network host \
+        -e PORT=11015 -e HANDOFF_SOCKET=/app/data/handoff.sock -e PYTHONUNBUFFERED=1 \
+        -v awalong2-data:/app/data aolifu/awalong2:$VERSION || exit 1
+    # 新容器确认接管（或没有旧容器时自己监听端口）后打印 "Serving on"；
+    # 超时或新容器退出时删除新容器，旧容器收不到确认会自行恢复服务
+    TIMEOUT=${HANDOFF_TIMEOUT:-120}
+    for ((i = 0; i < TIMEOUT; i++)); do
+        if docker logs $NEW 2>&1 | grep -q "Serving on"; then
+            break
+        fi
+        if [ "$(docker inspect -f '{{.State.Running}}' $NEW 2>/dev/null)" != "true" ]; then
+            i=$TIMEOUT
+            break
+        fi
+        sleep 1
+    done
+    if [ $i -ge $TIMEOUT ]; then
+        echo "新容器 $NEW 已退出或没有在 ${TIMEOUT} 秒内接管，已放弃" >&2
+        docker logs --tail 50 $NEW >&2
+        docker rm -f $NEW
+        exit 1
+    fi
+    # 旧容器在新容器确认接管、通知客户端重连后自行退出
+    for container in $OLD; do
+        timeout $TIMEOUT docker wait $container
+        docker rm -f $container
+    done
+else
+    docker stop awalong2
+    docker rm awalong2
+    docker run -d --name awalong2 -p 11015:5001 aolifu/awalong2:$VERSION
+fi
@@ -0,0 +1,130 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""结构化事件导出
+
+房间创建、玩家加入、开局、提交队伍、任务投票、任务结果和对局结束等事件以字典形式
+放入有界的环形缓冲区，处理函数只做一次加锁的追加，不做编码和磁盘写入。后台线程按
+interval 批量取出，编码为 NDJSON 追加到本地文件，文件超过 max_bytes 时轮转。写入
+跟不上时缓冲区丢弃最旧的记录并计数，每条记录带递增的 seq，下游可以据此发现缺口。
+"""
+
+import json
+import os
+import threading
+import time
+from collections import deque
+from typing import Callable, Dict, Optional
+
+
+class EventExporter:
+    """事件的环形缓冲区和批量写入的轮转 NDJSON 文件"""
+
+    def __init__(self, path: str, capacity: int = 10000, interval: float = 1.0,
+                 max_bytes: int = 64 * 1024 * 1024, backups: int = 5,
+                 spawn: Optional[Callable] = None, sleep: Callable[[float], None] = time.sleep,
+                 clock: Callable[[], float] = time.time):
+        self.path = path
+        self.capacity = capacity
+        self.interval = interval
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self._spawn = spawn
+        self._sleep = sleep
+        self._clock = clock
+        self._buffer: deque = deque(maxlen=capacity)
+        self._lock = threading.Lock()       # 保护缓冲区，持有时间只有一次追加或交换
+        self._file_lock = threading.Lock()  # 串行化写入和轮转
+        self._running = False
+        self._file = None
+        self._size = 0
+        self._seq = 0
+        self.dropped = 0
+        self.written = 0
+        self.batches = 0
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.path) and self.capacity > 0
+
+    def emit(self, event_type: str, **fields):
+        """记录一个事件，字段需要能被 JSON 编码；不会阻塞等待写入"""
+        if not self.enabled:
+            return
+        with self._lock:
+            self._seq += 1
+            if len(self._buffer) == self.capacity:
+                # 缓冲区已满，deque 会挤掉最旧的一条
+                self.dropped += 1
+            self._buffer.append({'seq': self._seq, 'ts': round(self._clock(), 3),
+                                 'type': event_type, **fields})
+            start = self._spawn is not None and not self._running
+            if start:
+                self._running = True
+        if start:
+            self._spawn(self._run)
+
+    def _run(self):
+        """写入线程，缓冲区为空时退出，下次记录时重新启动"""
+        while True:
+            self._sleep(self.interval)
+            self.flush()
+            with self._lock:
+                if not self._buffer:
+                    self._running = False
+                    return
+
+    def flush(self):
+        """取出缓冲区中的全部事件，编码后一次写入"""
+        with self._lock:
+            if not self._buffer:
+                return
+            batch, self._buffer = self._buffer, deque(maxlen=self.capacity)
+        data = ''.join(json.dumps(event, ensure_ascii=False) + '\n' for event in batch)
+        with self._file_lock:
+            if self._file is None:
+                self._open()
+            self._file.write(data)
+            self._file.flush()
+            self._size += len(data.encode())
+            self.written += len(batch)
+            self.batches += 1
+            if self._size >= self.max_bytes:
+                self._rotate()
+
+    def _open(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._file = open(self.path, 'a', encoding='utf-8')
+        self._size = self._file.tell()
+
+    def _rotate(self):
+        self._file.close()
+        self._file = None
+        for index in range(self.backups - 1, 0, -1):
+            source = f"{self.path}.{index}"
+            if os.path.exists(source):
+                os.replace(source, f"{self.path}.{index + 1}")
+        if self.backups > 0:
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+
+    def stats(self) -> Dict:
+        """导出的运行指标"""
+        return {
+            'enabled': self.enabled,
+            'emitted': self._seq,
+            'buffered': len(self._buffer),
+            'written': self.written,
+            'dropped': self.dropped,
+            'batches': self.batches,
+        }
+
+    def close(self):
+        """写入剩余事件并关闭文件"""
+        self.flush()
+        with self._file_lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
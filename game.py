@@ -2,37 +2,13 @@ from __future__ import annotations  # 添加这行来支持前向引用
 from enum import Enum, auto
 from typing import List, Dict, Optional, Set, Callable
 import random
+import sys
 from datetime import datetime, timedelta
 import time
 
-class Team(Enum):
-    GOOD = "GOOD"
-    EVIL = "EVIL"
-
-    @property
-    def display_name(self):
-        return {
-            'GOOD': '正义阵营',
-            'EVIL': '邪恶阵营'
-        }[self.value]
-
-    @property
-    def value(self):
-        return self.name
-
-class Role(Enum):
-    LOYAL_SERVANT = ('亚瑟的忠臣', Team.GOOD, '效忠于亚瑟王的正义骑士')
-    DUKE = ('公爵', Team.GOOD, '在最终任务中可以指定一位玩家放下一只手')
-    GRAND_DUKE = ('大公', Team.GOOD, '在最终任务中，邪恶方揭露身份后，可以改变一个玩家一只手的指向')
-    MORGAN = ('摩根勒菲', Team.EVIL, '不受魔法指示物效果影响，可以出任务失敗牌')
-    PRINCE = ('王儲', Team.EVIL, '不知道邪恶方有谁，但邪恶方知道谁是王儲')
-    SHAPESHIFTER = ('幻形妖', Team.EVIL, '邪恶方不知道幻形妖是谁，幻形妖也不知道哪些人是邪恶方')
-    MORDRED_MINION = ('莫德雷德的爪牙', Team.EVIL, '知道其他邪恶阵营的人（除了幻形妖）')
-
-    def __init__(self, display_name, team, description):
-        self.display_name = display_name
-        self.team = team
-        self.description = description
+from journal import ActionJournal
+from rules import ROLE_CONFIG, STANDARD_RULES, Role, RuleSet, Team  # Team、Role、ROLE_CONFIG 仍可从 game 导入
+from tracing import span
 
 class GamePhase(Enum):
     SETUP = 'SETUP'
@@ -46,13 +22,40 @@ class Player:
     def __init__(self, name: str):
         if not name.strip():
             raise ValueError("玩家名称不能为空")
-        self.name = name.strip()
+        # 身份就是驻留后的名称字符串：同名玩家共享同一个对象，比较时先比较指针；
+        # 驻留表由解释器维护，最后一个引用释放后条目随之删除，不会随历史玩家增长
+        self._id = sys.intern(name.strip())
+        # 按身份计算并缓存哈希，与名称字符串一致，使 player == "名称" 在集合/字典中同样成立
+        self._hash = hash(self._id)
+        self.revealed_by_amulet: Set[Player] = set()
+        self.reset()
+        self.player_number: Optional[int] = None
+
+    def reset(self):
+        """清除上一局的角色、阵营和指示物（再来一局时调用）"""
         self.role = None
         self.team = None
         self.magic_tokens = 0  # 初始没有魔法指示物
         self.amulets = 1
-        self.revealed_by_amulet = []
+        self.revealed_by_amulet.clear()
+
+    @property
+    def name(self) -> str:
+        """玩家名称（创建后不可修改，保证哈希稳定）"""
+        return self._id
+
+    @property
+    def id(self) -> str:
+        """玩家的驻留身份"""
+        return self._id
     
+    def fork(self) -> Player:
+        """复制玩家的可变状态（身份与子类字段保持不变），用于 Game.fork"""
+        clone = object.__new__(type(self))
+        clone.__dict__.update(self.__dict__)
+        clone.revealed_by_amulet = set(self.revealed_by_amulet)
+        return clone
+
     def use_magic_token(self) -> bool:
         """使用魔法指示物强制任务成功"""
         if self.magic_tokens > 0:
@@ -73,8 +76,7 @@ class Player:
         
     def add_revealer(self, player: Player):
         """添加查验者记录"""
-        if player not in self.revealed_by_amulet:
-            self.revealed_by_amulet.append(player)
+        self.revealed_by_amulet.add(player)
 
     def to_dict(self):
         """将Player对象转换为字典"""
@@ -89,12 +91,18 @@ class Player:
     def __str__(self):
         return self.name
 
+    def __repr__(self):
+        return f"Player({self.name!r})"
+
     def __eq__(self, other):
-        if isinstance(other, str):
-            return self.name == other
         if isinstance(other, Player):
-            return self.name == other.name
-        return False
+            return self._id == other._id
+        if isinstance(other, str):
+            return self._id == other
+        return NotImplemented
+
+    def __hash__(self):
+        return self._hash
 
 class SpecialAbility(Enum):
     NONE = auto()                    # 无特殊能力
@@ -127,29 +135,60 @@ class Quest:
         self.team = []
         self.results = []
         self.is_completed = False
-        self.votes = {}  # 存储任务投票结果 {player_name: success}
+        self.votes: Dict[Player, bool] = {}  # 存储任务投票结果 {player: success}
         self.vote_track = 0
         self.result = None
+        self._submitted: Set[Player] = set()
+
+    @property
+    def team(self) -> List[Player]:
+        """任务队员（保持选择顺序）"""
+        return self._team
+
+    @team.setter
+    def team(self, players):
+        self._team = list(players)
+        self._team_set: Set[Player] = set(self._team)
+
+    def fork(self, players: Dict[Player, Player]) -> Quest:
+        """复制任务状态，队员换成分支中的玩家对象"""
+        clone = object.__new__(Quest)
+        clone.__dict__.update(self.__dict__)
+        clone.team = [players[p] for p in self._team]
+        clone.results = list(self.results)
+        clone.votes = {players[p]: vote for p, vote in self.votes.items()}
+        clone._submitted = set(self._submitted)
+        return clone
+
+    def has_member(self, player) -> bool:
+        """检查玩家（或玩家名称）是否在任务队伍中"""
+        return player in self._team_set
+
+    def has_submitted(self, player) -> bool:
+        """检查玩家是否已经提交过结果"""
+        return player in self._submitted
 
     def add_team_member(self, player: Player):
         """添加任务队员"""
-        if len(self.team) >= self.required_players:
+        if len(self._team) >= self.required_players:
             raise ValueError("任务队员已满")
-        if player in self.team:
+        if player in self._team_set:
             raise ValueError("该玩家已经在任务队伍中")
-        self.team.append(player)
+        self._team.append(player)
+        self._team_set.add(player)
 
     def is_team_full(self) -> bool:
         """检查任务队伍是否已满"""
-        return len(self.team) == self.required_players
+        return len(self._team) == self.required_players
 
     def submit_result(self, player: Player, success: bool, used_magic: bool = False):
         """提交任务结果"""
-        if player not in self.team:
+        if player not in self._team_set:
             raise ValueError("只有任务队员才能提交结果")
-        if any(r.player == player for r in self.results):
+        if player in self._submitted:
             raise ValueError("该玩家已经提交过结果")
         self.results.append(QuestResult(success, player, used_magic))
+        self._submitted.add(player)
 
     def get_final_result(self) -> bool:
         """获取任务最终结果"""
@@ -159,7 +198,7 @@ class Quest:
 
     def complete_quest(self):
         """完成任务并返回结果"""
-        if len(self.votes) < len(self.team):
+        if len(self.votes) < len(self._team):
             raise ValueError("还有队员未投票")
         
         fail_votes = sum(1 for vote in self.votes.values() if not vote)
@@ -187,21 +226,30 @@ class FinalQuestStatus(Enum):
     COMPLETED = "已完成"
 
 class FinalQuest:
-    def __init__(self, player_count: int):
-        self.required_players = self._get_required_players(player_count)
+    def __init__(self, required_players: int):
+        self.required_players = required_players
         self.status = FinalQuestStatus.NOT_STARTED
         self.nominated_leader: Optional[Player] = None
         self.team: List[Player] = []
         self.votes: Dict[Player, bool] = {}  # 投票选择领袖
         self.results: List[QuestResult] = []
+        self._submitted: Set[Player] = set()
         
-    def _get_required_players(self, player_count: int) -> int:
-        """获取最终任务需要的队员数量"""
-        requirements = {
-            4: 3,  # 4人游戏最终任务需要3人
-            5: 3, 6: 4, 7: 4, 8: 5, 9: 5, 10: 5
-        }
-        return requirements[player_count]
+    def has_submitted(self, player) -> bool:
+        """检查玩家是否已经提交过最终任务结果"""
+        return player in self._submitted
+
+    def fork(self, players: Dict[Player, Player]) -> FinalQuest:
+        """复制最终任务状态，队员换成分支中的玩家对象"""
+        clone = object.__new__(FinalQuest)
+        clone.__dict__.update(self.__dict__)
+        if self.nominated_leader is not None:
+            clone.nominated_leader = players[self.nominated_leader]
+        clone.team = [players[p] for p in self.team]
+        clone.votes = {players[p]: vote for p, vote in self.votes.items()}
+        clone.results = list(self.results)
+        clone._submitted = set(self._submitted)
+        return clone
 
 class GameResult:
     def __init__(self):
@@ -288,47 +336,111 @@ class PhaseTimer:
     LEADER_SELECTION = 60  # 领袖选择阶段 60秒
     TEAM_BUILDING = 120    # 组队阶段 120秒
     QUEST_EXECUTION = 30   # 任务执行阶段 30秒
-    FINAL_LEADER_VOTE = 90 # 最终任务领袖投票 90秒
-    FINAL_QUEST = 45      # 最终任务执行 45秒
+
+class GameAction(Enum):
+    """玩家动作，值与 Socket.IO 事件名一致"""
+    SELECT_TEAM = 'select_team'
+    SUBMIT_TEAM = 'submit_team'
+    SUBMIT_QUEST_VOTE = 'submit_quest_vote'
+    SELECT_NEXT_LEADER = 'select_next_leader'
+    USE_AMULET = 'use_amulet'
+
+class Transition:
+    """阶段转移表中的一项：校验 -> 变更 -> 下一阶段 -> 广播类型"""
+    __slots__ = ('validator', 'mutator', 'next_phase', 'broadcast')
+
+    def __init__(self, validator: Callable, mutator: Callable,
+                 next_phase: Optional[GamePhase], broadcast: str):
+        self.validator = validator    # (game, player_name, data) -> context，失败时抛出 ValueError
+        self.mutator = mutator        # (game, context) -> ActionResult
+        self.next_phase = next_phase  # None 表示由 mutator 决定下一阶段
+        self.broadcast = broadcast    # 默认广播事件名
+
+class ActionResult:
+    """动作执行结果：回复给操作者的内容和需要向房间广播的事件"""
+    __slots__ = ('reply', 'event', 'extra')
+
+    def __init__(self, reply: Optional[Dict] = None, event: Optional[str] = None,
+                 extra: Optional[Dict] = None):
+        self.reply = reply if reply is not None else {'success': True}
+        self.event = event  # 为 None 时使用转移表中的默认广播
+        self.extra = extra or {}  # 广播时附加在 game_state 之外的字段
+
+# 不在对应阶段时的错误提示
+ACTION_PHASE_ERRORS = {
+    GameAction.SELECT_TEAM: '当前不是选择队员阶段',
+    GameAction.SUBMIT_TEAM: '当前不是选择队员阶段',
+    GameAction.SUBMIT_QUEST_VOTE: '现在不是执行任务的阶段',
+    GameAction.SELECT_NEXT_LEADER: '当前不是选择下一任队长阶段',
+    GameAction.USE_AMULET: '当前不能使用护身符',
+}
 
 class Game:
-    def __init__(self, players, player_count):
+    # (阶段, 动作) -> Transition，在模块末尾编译一次
+    TRANSITIONS: Dict[tuple, Transition] = {}
+
+    # 只追加的历史（列表或 ActionJournal），fork() 后由各分支共享，第一次写入时才复制
+    SHARED_HISTORY = ('quest_results', 'quest_history', 'amulet_history', 'ability_history',
+                      'action_log')
+
+    def __init__(self, players, player_count, rules: RuleSet = STANDARD_RULES,
+                 rng: Optional[random.Random] = None):
+        self.rules = rules.for_players(player_count)
+        self.rng = rng  # 分配角色和超时自动选人用的随机数生成器，None 时使用全局的 random
         self.players = players
         self.player_count = player_count
+        self._players_by_name: Dict[str, Player] = {}
+        for number, player in enumerate(self.players, 1):
+            self._register_player(player, number)
+        self.match_number = 1  # 同一房间内连续进行的第几局
+        self.version = 0  # 成功执行的动作数，再来一局后继续递增，客户端据此判断状态是否变化
+        self.is_timer_enabled = False
+        self._start_match()
+
+    def _start_match(self):
+        """初始化一局的状态并分配角色，新建对局和再来一局共用"""
         self.current_leader_index = 0
         self.quest_number = 1
         
         # 添加已担任过队长的玩家集合
-        self.previous_leaders = set()
-        
-        # 设置任务需求玩家数
-        if self.player_count == 4:
-            self.quest_requirements = [2, 3, 2, 3, 3]
-        elif self.player_count == 5:
-            self.quest_requirements = [2, 3, 2, 3, 3]
-        elif self.player_count == 6:
-            self.quest_requirements = [2, 3, 4, 3, 4]
-        elif self.player_count == 7:
-            self.quest_requirements = [2, 3, 3, 4, 4]
-        elif self.player_count == 8:
-            self.quest_requirements = [3, 4, 4, 5, 5]
-        elif self.player_count == 9:
-            self.quest_requirements = [3, 4, 4, 5, 5]
-        elif self.player_count == 10:
-            self.quest_requirements = [3, 4, 4, 5, 5]
-        else:
-            raise ValueError(f"不支持 {self.player_count} 人游戏")
+        self.previous_leaders: Set[Player] = set()
+        
+        # 任务人数、角色配置等规则引用共享的只读表
+        self.quest_requirements = self.rules.quest_sizes
             
         self.current_quest = Quest(self.quest_number, self.quest_requirements[0])
         self.quest_results = []
+        self.quest_history: List[Dict] = []  # 每轮任务的公开信息：队长、队伍、失败票数、使用魔法的队员
+        self.amulet_history = ActionJournal()  # AmuletUse，按使用者、目标和任务轮次索引
+        self.ability_history = ActionJournal()  # AbilityUse
+        self.fail_votes_cast: Dict[str, int] = {}  # 玩家名称 -> 出失败牌次数（不公开）
+        self.action_log: List[Dict] = []  # 按顺序记录所有成功执行的动作，用于回放
+        self.created_at = time.time()
+        self._shared_history: Set[str] = set()
         self.successful_quests = 0
         self.failed_quests = 0
         self.current_phase = GamePhase.LEADER_TURN
         self.winner = None
+        self.game_result = None
+
+        # 最终任务与计时器
+        self.final_quest: Optional[FinalQuest] = None
+        self.current_timer: Optional[GameTimer] = None
         
         # 设置角色
         self.setup_roles()
 
+    def rematch(self):
+        """对局结束后在原对象上开始下一局：保留玩家和规则，清空任务、历史和指示物，重新分配角色"""
+        if self.current_phase != GamePhase.GAME_OVER:
+            raise ValueError('游戏尚未结束')
+        if self.current_timer is not None:
+            self.current_timer.pause()
+        for player in self.players:
+            player.reset()
+        self.match_number += 1
+        self._start_match()
+
     def assign_roles(self):
         """已弃用，使用setup_roles代替"""
         raise DeprecationWarning("此方法已弃用，请使用setup_roles代替")
@@ -336,27 +448,9 @@ class Game:
     def setup_roles(self):
         """设置玩家角色"""
         print("[DEBUG] Setting up roles...")
-        # 根据玩家数量确定角色配置
-        role_config = {
-            4: [Role.LOYAL_SERVANT, Role.LOYAL_SERVANT, 
-                Role.MORGAN, Role.PRINCE],
-            5: [Role.LOYAL_SERVANT, Role.LOYAL_SERVANT, Role.LOYAL_SERVANT, 
-                Role.MORGAN, Role.PRINCE],
-            6: [Role.LOYAL_SERVANT, Role.LOYAL_SERVANT, Role.LOYAL_SERVANT, 
-                Role.MORGAN, Role.SHAPESHIFTER, Role.MORDRED_MINION],
-            7: [Role.LOYAL_SERVANT, Role.LOYAL_SERVANT, Role.LOYAL_SERVANT, Role.DUKE,
-                Role.MORGAN, Role.SHAPESHIFTER, Role.MORDRED_MINION],
-            8: [Role.LOYAL_SERVANT, Role.LOYAL_SERVANT, Role.LOYAL_SERVANT, Role.LOYAL_SERVANT, Role.DUKE,
-                Role.MORGAN, Role.SHAPESHIFTER, Role.MORDRED_MINION],
-            9: [Role.LOYAL_SERVANT, Role.LOYAL_SERVANT, Role.LOYAL_SERVANT, Role.LOYAL_SERVANT, Role.DUKE, Role.GRAND_DUKE,
-                Role.MORGAN, Role.SHAPESHIFTER, Role.MORDRED_MINION],
-            10: [Role.LOYAL_SERVANT, Role.LOYAL_SERVANT, Role.LOYAL_SERVANT, Role.LOYAL_SERVANT, Role.DUKE, Role.GRAND_DUKE,
-                 Role.MORGAN, Role.SHAPESHIFTER, Role.MORDRED_MINION, Role.MORDRED_MINION]
-        }
-
         # 随机打乱角色
-        roles = role_config[self.player_count].copy()
-        random.shuffle(roles)
+        roles = list(self.rules.roles)
+        (self.rng or random).shuffle(roles)
         
         # 分配角色给玩家
         for player, role in zip(self.players, roles):
@@ -364,11 +458,80 @@ class Game:
             player.team = role.team
             print(f"[DEBUG] Player {player.name} got role: {role.display_name} ({role.team.display_name})")
 
+    def fork(self) -> Game:
+        """创建独立的对局分支，用于搜索和假设推演
+
+        历史列表与原对局共享（写时复制），玩家、当前任务和队长集合按当前状态复制，
+        开销只与玩家人数有关。分支不带计时器，分支上的任何动作都不会影响原对局。
+        """
+        branch = object.__new__(Game)
+        branch.__dict__.update(self.__dict__)
+
+        players = {p: p.fork() for p in self.players}
+        branch.players = list(players.values())
+        branch._players_by_name = {p.name: p for p in branch.players}
+        branch.previous_leaders = {players[p] for p in self.previous_leaders}
+        branch.current_quest = self.current_quest.fork(players)
+        if self.final_quest is not None:
+            branch.final_quest = self.final_quest.fork(players)
+        branch.fail_votes_cast = dict(self.fail_votes_cast)
+        branch.current_timer = None
+        branch.is_timer_enabled = False
+
+        self._shared_history = set(self.SHARED_HISTORY)
+        branch._shared_history = set(self.SHARED_HISTORY)
+        return branch
+
+    def snapshot(self) -> Dict:
+        """可以 JSON 编码的对局快照：座位、角色、已担任过队长的玩家和本局的动作记录
+
+        配合 restore() 在另一个进程中按动作记录重放出同样的状态，不依赖对象的内部结构，
+        新旧版本的代码之间也可以交接。
+        """
+        return {
+            'player_count': self.player_count,
+            'players': [p.name for p in self.players],
+            'roles': [p.role.name for p in self.players],
+            'previous_leaders': [p.name for p in self.players if p in self.previous_leaders],
+            'match_number': self.match_number,
+            'version': self.version,
+            'created_at': self.created_at,
+            'action_log': list(self.action_log),
+        }
+
+    @classmethod
+    def restore(cls, snapshot: Dict, players: List[Player]) -> Game:
+        """从 snapshot() 的结果重建对局，players 按快照中的座位顺序给出"""
+        game = cls(players, snapshot['player_count'])
+        for player, role in zip(game.players, snapshot['roles']):
+            player.role = Role[role]
+            player.team = player.role.team
+        for entry in snapshot['action_log']:
+            action, player_name = GameAction(entry['action']), entry['player']
+            if player_name is None and action == GameAction.SUBMIT_TEAM:
+                # 旧版本接受不带玩家名的组队，交接时按当时的队长重放
+                player_name = game.players[game.current_leader_index].name
+            game.dispatch(action, player_name, **entry['data'])
+        # 保留原来的动作时间和版本号
+        game.action_log = list(snapshot['action_log'])
+        game.created_at = snapshot['created_at']
+        game.match_number = snapshot['match_number']
+        game.version = snapshot['version']
+        game.previous_leaders = {game.get_player(name) for name in snapshot['previous_leaders']}
+        return game
+
+    def _history(self, name: str) -> list:
+        """获取可写的历史列表，与分支共享时先复制"""
+        if name in self._shared_history:
+            setattr(self, name, getattr(self, name).copy())
+            self._shared_history.discard(name)
+        return getattr(self, name)
+
     def get_current_leader(self):
         """获取当前队长"""
         current_leader = self.players[self.current_leader_index]
         # 添加当前队长到已担任过队长的玩家集合
-        self.previous_leaders.add(current_leader.name)
+        self.previous_leaders.add(current_leader)
         return current_leader
 
     def prepare_next_quest(self):
@@ -383,8 +546,7 @@ class Game:
         self.quest_number += 1
         self.current_quest = Quest(self.quest_number, self.quest_requirements[self.quest_number - 1])
         # 记录当前队长
-        current_leader = self.get_current_leader()
-        self.previous_leaders.add(current_leader.name)
+        self.get_current_leader()
         # 不改变当前队长，等待手动选择
         self.current_phase = GamePhase.SELECT_NEXT_LEADER
 
@@ -401,6 +563,17 @@ class Game:
             raise ValueError(f"玩家名称 '{player.name}' 已存在")
             
         self.players.append(player)
+        self._register_player(player, len(self.players))
+
+    def _register_player(self, player: Player, number: int):
+        """登记玩家名称索引，并为没有编号的玩家分配座位号"""
+        self._players_by_name[player.name] = player
+        if getattr(player, 'player_number', None) is None:
+            player.player_number = number
+
+    def get_player(self, player_name: str) -> Optional[Player]:
+        """按名称查找玩家"""
+        return self._players_by_name.get(player_name)
 
     def start_game(self):
         """开始游戏"""
@@ -465,51 +638,199 @@ class Game:
         if self.current_quest.is_team_full():
             self.current_phase = GamePhase.QUEST_VOTE
 
-    def submit_quest_result(self, player: Player, success: bool, use_magic: bool = False):
+    def dispatch(self, action: GameAction, player_name: Optional[str] = None, **data) -> ActionResult:
+        """执行玩家动作：一次查表、一次校验，服务器与命令行共用"""
+        transition = self.TRANSITIONS.get((self.current_phase, action))
+        if transition is None:
+            raise ValueError(ACTION_PHASE_ERRORS.get(action, '未知的操作'))
+
+        with span('validate'):
+            context = transition.validator(self, player_name, data)
+        quest_number = self.quest_number
+        with span('mutate'):
+            result = transition.mutator(self, context)
+        self._history('action_log').append({
+            't': round(time.time() - self.created_at, 3),
+            'quest': quest_number,
+            'player': player_name,
+            'action': action.value,
+            'data': dict(data),
+        })
+        if transition.next_phase is not None:
+            self.current_phase = transition.next_phase
+        if result.event is None:
+            result.event = transition.broadcast
+        self.version += 1
+        return result
+
+    def dispatch_batch(self, actions: List[tuple]) -> List[ActionResult]:
+        """原子地执行一批 (动作, 玩家名, 参数)：任何一个动作失败时本局保持不变
+
+        动作执行不依赖随机数，先在分支上试运行整批，全部成功后再在本局上执行同样的动作。
+        只有一个动作时直接执行：校验在修改状态之前完成，失败时不需要回滚。
+        """
+        rehearsal = self.fork() if len(actions) > 1 else self
+        results = []
+        for index, (action, player_name, data) in enumerate(actions, 1):
+            try:
+                results.append(rehearsal.dispatch(action, player_name, **data))
+            except ValueError as e:
+                raise ValueError(f"第 {index} 个动作（{action.value}）失败: {e}")
+        if rehearsal is self:
+            return results
+        return [self.dispatch(action, player_name, **data) for action, player_name, data in actions]
+
+    def submit_team(self, team: List[str], magic_token_target: Optional[str] = None,
+                    player_name: Optional[str] = None) -> ActionResult:
+        """队长提交任务队伍"""
+        return self.dispatch(GameAction.SUBMIT_TEAM, player_name,
+                             team=team, magic_token_target=magic_token_target)
+
+    def submit_quest_result(self, player: Player, success: bool, use_magic: bool = False) -> ActionResult:
         """提交任务结果"""
-        if self.current_phase != GamePhase.QUEST_VOTE:
-            raise ValueError("现在不是执行任务的阶段")
-            
-        if not self.current_quest or player not in self.current_quest.team:
-            raise ValueError("该玩家不是任务队员")
-            
-        if any(r.player == player for r in self.current_quest.results):
-            raise ValueError("该玩家已经提交过结果")
-            
-        # 如果使用魔法指示物，检查并消耗
-        if use_magic and not player.use_magic_token():
-            raise ValueError("没有可用的魔法指示物")
+        return self.dispatch(GameAction.SUBMIT_QUEST_VOTE, player.name,
+                             success=success, use_magic=use_magic)
 
-        self.current_quest.submit_result(player, success, use_magic)
-        
-        # 检查是否所有队员都提交了结果
-        if len(self.current_quest.results) == self.current_quest.required_players:
-            self._complete_current_quest()
+    def select_next_leader(self, player_name: str, next_leader: str) -> ActionResult:
+        """当前队长选择下一任队长"""
+        return self.dispatch(GameAction.SELECT_NEXT_LEADER, player_name, next_leader=next_leader)
 
-    def _complete_current_quest(self):
+    def _validate_team(self, player_name: Optional[str], data: Dict):
+        """校验队长选择的队伍"""
+        leader = self.get_current_leader()
+        if player_name != leader.name:
+            raise ValueError('只有领袖可以选择队员')
+
+        team_names = data.get('team') or []
+        required_players = self.current_quest.required_players
+        if len(team_names) != required_players:
+            raise ValueError(f'队伍人数不正确，需要 {required_players} 人')
+
+        team = [self._players_by_name.get(name) for name in team_names]
+        if None in team:
+            raise ValueError('选择的玩家不存在')
+        if len(set(team)) != len(team):
+            raise ValueError('队员不能重复')
+
+        target_name = data.get('magic_token_target')
+        target = self._players_by_name.get(target_name) if target_name else None
+        if target_name and target not in team:
+            print(f"[DEBUG] Target player not found or not in team: {target_name}")
+            target = None
+        return team, target
+
+    def _apply_team(self, context) -> ActionResult:
+        """设置任务队伍并分配魔法指示物"""
+        team, target = context
+        self.current_quest.team = team
+        if target is not None:
+            target.magic_tokens += 1
+            print(f"[DEBUG] Assigned magic token to {target.name}")
+        return ActionResult()
+
+    def _validate_quest_vote(self, player_name: Optional[str], data: Dict):
+        """校验任务投票"""
+        player = self._players_by_name.get(player_name)
+        if player is None:
+            raise ValueError('玩家不存在')
+        if not self.current_quest.has_member(player):
+            raise ValueError('你不是任务队员')
+        if player in self.current_quest.votes:
+            raise ValueError('你已经投过票了')
+        if data.get('use_magic') and player.magic_tokens <= 0:
+            raise ValueError('没有可用的魔法指示物')
+        return player, data.get('success')
+
+    def _apply_quest_vote(self, context) -> ActionResult:
+        """记录任务投票，全员投票后结算任务"""
+        player, success = context
+        used_magic = player.use_magic_token()
+        # 拥有魔法指示物的队员自动使用，除摩根勒菲外必须选择成功
+        if used_magic and player.role != Role.MORGAN:
+            success = True
+        success = bool(success)
+
+        quest = self.current_quest
+        quest.votes[player] = success
+        if not success:
+            self.fail_votes_cast[player.name] = self.fail_votes_cast.get(player.name, 0) + 1
+        quest.submit_result(player, success, used_magic)
+        reply = {'success': True, 'vote': success}
+
+        if len(quest.votes) < len(quest.team):
+            return ActionResult(reply)
+        return self._complete_current_quest(reply)
+
+    def _complete_current_quest(self, reply: Optional[Dict] = None) -> ActionResult:
         """完成当前任务并处理结果"""
-        if not self.current_quest:
-            return
-        
-        self.current_quest.is_completed = True
-        quest_result = self.current_quest.get_final_result()
-        self.quest_results.append(quest_result)
+        quest = self.current_quest
+        quest.is_completed = True
+        quest_success, fail_votes = quest.complete_quest()
+        self._history('quest_results').append(quest_success)
+        self._history('quest_history').append({
+            'quest_number': quest.quest_number,
+            'leader': self.players[self.current_leader_index].name,
+            'team': [p.name for p in quest.team],
+            'fail_count': fail_votes,
+            'magic_holders': [r.player.name for r in quest.results if r.used_magic],
+            'success': quest_success,
+        })
         
         # 更新任务成功/失败计数
-        if quest_result:
+        if quest_success:
             self.successful_quests += 1
         else:
             self.failed_quests += 1
 
         # 检查游戏是否结束
-        if self.successful_quests >= 3:
-            self._end_game(Team.GOOD)
-        elif self.failed_quests >= 3:
-            self._end_game(Team.EVIL)
-        else:
-            # 准备下一个任务
-            self.next_leader()
-            self.start_new_quest()
+        if self.successful_quests >= 3 or self.failed_quests >= 3:
+            winning_team = Team.GOOD if self.successful_quests >= 3 else Team.EVIL
+            self._end_game(winning_team)
+            return ActionResult(reply, 'game_over', {'winner': winning_team.value})
+
+        # 准备下一轮任务，但不自动更换队长
+        self.prepare_next_quest_without_leader_change()
+        return ActionResult(reply, 'quest_result', {'success': quest_success, 'fail_count': fail_votes})
+
+    def _validate_next_leader(self, player_name: Optional[str], data: Dict):
+        """校验下一任队长的选择"""
+        if player_name != self.get_current_leader().name:
+            raise ValueError('只有当前队长可以选择下一任队长')
+
+        next_leader = self._players_by_name.get(data.get('next_leader'))
+        if next_leader is None:
+            raise ValueError('选择的玩家不存在')
+        if next_leader in self.previous_leaders:
+            raise ValueError('新队长必须是没当过队长的玩家')
+        return next_leader
+
+    def _apply_next_leader(self, next_leader: Player) -> ActionResult:
+        """更换队长"""
+        self.current_leader_index = self.players.index(next_leader)
+        return ActionResult(extra={'next_leader': next_leader.name})
+
+    def _validate_amulet(self, player_name: Optional[str], data: Dict):
+        """校验护身符的使用者和查验目标"""
+        user = self._players_by_name.get(player_name)
+        if user is None:
+            raise ValueError('玩家不存在')
+        if user.amulets <= 0:
+            raise ValueError('该玩家没有可用的护身符')
+        target = self._players_by_name.get(data.get('target'))
+        if target is None:
+            raise ValueError('查验的玩家不存在')
+        if target == user:
+            raise ValueError('不能查验自己')
+        return user, target
+
+    def _apply_amulet(self, context) -> ActionResult:
+        """使用护身符：查验结果只回复给使用者，房间内只广播谁查验了谁"""
+        user, target = context
+        result = self.use_amulet(user, target)
+        target.add_revealer(user)
+        return ActionResult(
+            reply={'success': True, 'target': target.name, 'revealed_team': result.revealed_team.value},
+            extra={'user': user.name, 'target': target.name})
 
     def get_quest_status(self) -> str:
         """获取当前任务状态"""
@@ -532,12 +853,13 @@ class Game:
             'players': [{
                 'name': p.name,
                 'is_leader': p == current_leader,
-                'has_been_leader': p.name in self.previous_leaders,
+                'has_been_leader': p in self.previous_leaders,
                 'role': p.role.display_name if hasattr(p, 'role') else None,
                 'team': p.role.team.value if hasattr(p, 'role') else None,
                 'team_display': p.role.team.display_name if hasattr(p, 'role') else None,
                 'player_number': p.player_number,
-                'magic_tokens': p.magic_tokens if hasattr(p, 'magic_tokens') else 0
+                'magic_tokens': p.magic_tokens if hasattr(p, 'magic_tokens') else 0,
+                'amulets': p.amulets
             } for p in self.players],
             'quest_results': self.quest_results,
             'successful_quests': self.successful_quests,
@@ -545,13 +867,13 @@ class Game:
             'current_quest': {
                 'required_players': self.current_quest.required_players,
                 'team': [{'name': p.name, 'player_number': p.player_number} for p in self.current_quest.team],
-                'votes': list(self.current_quest.votes.keys())
+                'votes': [str(voter) for voter in self.current_quest.votes]
             }
         }
         
         # 如果游戏结束，添加获胜者信息
         if self.current_phase == GamePhase.GAME_OVER:
-            status['winner'] = 'GOOD' if self.successful_quests >= 3 else 'EVIL'
+            status['winner'] = self.winner
             
         return status
 
@@ -582,14 +904,23 @@ class Game:
         amulet_use = AmuletUse(user, target)
         amulet_use.result = result
         amulet_use.timestamp = self.get_current_quest_number()
-        self.amulet_history.append(amulet_use)
+        self._history('amulet_history').append(amulet_use, amulet_use.timestamp)
         
         return result
 
     def get_amulet_history(self, player: Player) -> List[AmuletUse]:
-        """获取指定玩家的护身符使用历史"""
-        return [use for use in self.amulet_history 
-                if use.user == player or use.target == player]
+        """获取指定玩家的护身符使用历史（使用或被查验）"""
+        return self.amulet_history.involving(player.name)
+
+    def get_amulet_view(self, player: Player) -> List[Dict]:
+        """玩家可以看到的护身符记录：自己查验的结果，以及谁查验过自己"""
+        view = []
+        for use in self.amulet_history.involving(player.name):
+            entry = {'quest': use.timestamp, 'user': use.user.name, 'target': use.target.name}
+            if use.user == player:
+                entry['revealed_team'] = use.result.revealed_team.value
+            view.append(entry)
+        return view
 
     def get_current_quest_number(self) -> int:
         """获取当前任务编号"""
@@ -637,7 +968,9 @@ class Game:
             result_message = self._use_know_evil_team(user)
 
         # 记录能力使用
-        self.ability_history.append(AbilityUse(user, ability, target))
+        ability_use = AbilityUse(user, ability, target)
+        ability_use.quest_number = self.quest_number
+        self._history('ability_history').append(ability_use, ability_use.quest_number)
         user.role.ability_used = True
         
         return result_message
@@ -693,7 +1026,7 @@ class Game:
     def get_ability_history(self, player: Player) -> List[str]:
         """获取能力使用历史"""
         history = []
-        for use in self.ability_history:
+        for use in self.ability_history.involving(player.name):
             if use.user == player:
                 target_info = f" -> {use.target.name}" if use.target else ""
                 history.append(f"使用了 {use.ability.name}{target_info}")
@@ -702,13 +1035,14 @@ class Game:
         return history 
 
     def start_final_quest(self):
-        """开始最终任务阶段"""
-        if self.current_phase != GamePhase.FINAL_QUEST:
-            raise ValueError("现在不是最终任务阶段")
-        
-        self.final_quest = FinalQuest(self.player_count)
+        """开始最终任务（没有阶段转换进入它，由调用方直接开始）"""
+        if self.current_phase == GamePhase.GAME_OVER:
+            raise ValueError("游戏已经结束")
+        if self.final_quest is not None:
+            raise ValueError("最终任务已经开始")
+
+        self.final_quest = FinalQuest(self.rules.final_quest_size)
         self.final_quest.status = FinalQuestStatus.SELECTING_LEADER
-        self._setup_phase_timer(PhaseTimer.FINAL_LEADER_VOTE)
         
     def nominate_final_leader(self, nominator: Player, nominee: Player):
         """提名最终任务的领袖"""
@@ -729,6 +1063,9 @@ class Game:
         if not self.final_quest or not self.final_quest.nominated_leader:
             raise ValueError("没有可以投票的领袖提名")
             
+        if voter not in self.players:
+            raise ValueError("玩家不在游戏中")
+
         if voter in self.final_quest.votes:
             raise ValueError("你已经投过票了")
             
@@ -781,7 +1118,7 @@ class Game:
         if player not in self.final_quest.team:
             raise ValueError("只有任务队员才能提交结果")
             
-        if any(r.player == player for r in self.final_quest.results):
+        if self.final_quest.has_submitted(player):
             raise ValueError("你已经提交过结果了")
             
         # 处理魔法指示物
@@ -789,6 +1126,7 @@ class Game:
             raise ValueError("没有可用的魔法指示物")
             
         self.final_quest.results.append(QuestResult(success, player, use_magic))
+        self.final_quest._submitted.add(player)
         
         # 检查是否所有人都提交了结果
         if len(self.final_quest.results) == self.final_quest.required_players:
@@ -809,8 +1147,8 @@ class Game:
             # 最终任务中只要有一个失败就算失败
             final_result = all(result.success for result in self.final_quest.results)
             
-        self.quest_results.append(final_result)
-        self.current_phase = GamePhase.GAME_OVER
+        self._history('quest_results').append(final_result)
+        self._end_game(Team.GOOD if final_result else Team.EVIL)
         
     def get_final_quest_status(self) -> str:
         """获取最终任务状态"""
@@ -832,6 +1170,7 @@ class Game:
     def _end_game(self, winning_team: Team):
         """结束游戏"""
         self.current_phase = GamePhase.GAME_OVER
+        self.winner = winning_team.value
         self.game_result = {
             'winning_team': winning_team,
             'quest_results': self.quest_results,
@@ -886,8 +1225,6 @@ class Game:
             self._auto_select_team()
         elif self.current_phase == GamePhase.QUEST_VOTE:
             self._auto_complete_quest()
-        elif self.current_phase == GamePhase.FINAL_QUEST:
-            self._handle_final_quest_timeout()
             
     def _auto_select_team(self):
         """自动选择队员（时间到时）"""
@@ -902,7 +1239,7 @@ class Game:
         needed_count = required_count - len(self.current_quest.team)
         
         if needed_count > 0 and available_players:
-            selected = random.sample(available_players, min(needed_count, len(available_players)))
+            selected = (self.rng or random).sample(available_players, min(needed_count, len(available_players)))
             for player in selected:
                 self.assign_quest_member(leader, player)
                 
@@ -913,26 +1250,11 @@ class Game:
             
         # 未提交结果的队员自动提交
         for player in self.current_quest.team:
-            if not any(r.player == player for r in self.current_quest.results):
+            if not self.current_quest.has_submitted(player):
                 # 邪恶阵营自动选择失败，正义阵营自动选择成功
                 success = player.team == Team.GOOD
                 self.submit_quest_result(player, success)
-                
-    def _handle_final_quest_timeout(self):
-        """处理最终任务超时"""
-        if not self.final_quest:
-            return
-            
-        if self.final_quest.status == FinalQuestStatus.SELECTING_LEADER:
-            # 自动结束领袖投票
-            self._resolve_final_leader_vote()
-        elif self.final_quest.status == FinalQuestStatus.SELECTING_TEAM:
-            # 自动完成队伍选择
-            self._auto_select_final_team()
-        elif self.final_quest.status == FinalQuestStatus.EXECUTING:
-            # 自动完成任务执行
-            self._auto_complete_final_quest()
-            
+
     def get_timer_status(self) -> str:
         """获取计时器状态"""
         if not self.current_timer or not self.is_timer_enabled:
@@ -966,6 +1288,7 @@ class Game:
 
         print(f"[DEBUG] Getting info for {player_name}, role: {player.role.display_name if player.role else 'None'}")
         
+        visible_roles = self.rules.visibility.get(player.role, ())
         visible_info = []
         for i, other in enumerate(self.players):
             info = {
@@ -985,29 +1308,29 @@ class Game:
                 })
                 print(f"[DEBUG] Self info for {player_name}: {info}")
             
-            # 根据角色规则显示其他玩家信息
-            elif player.role == Role.MORGAN:
-                # 摩根勒菲知道所有邪恶方的身份，除了幻形妖
-                if other.team == Team.EVIL and other.role != Role.SHAPESHIFTER:
-                    info['team'] = Team.EVIL.value
-                    info['team_display'] = Team.EVIL.display_name
-                    info['role'] = other.role.display_name  # 摩根勒菲知道其他邪恶方的具体角色
-            
-            elif player.role == Role.MORDRED_MINION:
-                # 莫德雷德的爪牙可以看到摩根勒菲和王储，不知道幻形妖
-                if other.role == Role.MORGAN or other.role == Role.PRINCE:
-                    info['team'] = Team.EVIL.value
-                    info['team_display'] = Team.EVIL.display_name
-                    info['role'] = other.role.display_name  # 莫德雷德爪牙知道角色
-            
-            elif player.role == Role.PRINCE:
-                # 王储不知道谁是邪恶方
-                pass
-
-            elif player.role == Role.SHAPESHIFTER:
-                # 幻形妖不知道谁是邪恶方
-                pass
+            # 根据规则表显示其他玩家信息（摩根勒菲和莫德雷德的爪牙知道部分邪恶方的角色）
+            elif other.role in visible_roles:
+                info['team'] = other.team.value
+                info['team_display'] = other.team.display_name
+                info['role'] = other.role.display_name
 
             visible_info.append(info)
 
-        return visible_info 
\ No newline at end of file
+        return visible_info
+
+Game.TRANSITIONS = {
+    (GamePhase.LEADER_TURN, GameAction.SELECT_TEAM):
+        Transition(Game._validate_team, Game._apply_team, GamePhase.TEAM_VOTE, 'game_update'),
+    (GamePhase.LEADER_TURN, GameAction.SUBMIT_TEAM):
+        Transition(Game._validate_team, Game._apply_team, GamePhase.QUEST_VOTE, 'game_update'),
+    (GamePhase.QUEST_VOTE, GameAction.SUBMIT_QUEST_VOTE):
+        Transition(Game._validate_quest_vote, Game._apply_quest_vote, None, 'game_update'),
+    (GamePhase.SELECT_NEXT_LEADER, GameAction.SELECT_NEXT_LEADER):
+        Transition(Game._validate_next_leader, Game._apply_next_leader, GamePhase.LEADER_TURN, 'game_update'),
+}
+
+# 护身符可以在对局进行中的任意阶段使用，不改变阶段
+Game.TRANSITIONS.update({
+    (phase, GameAction.USE_AMULET): Transition(Game._validate_amulet, Game._apply_amulet, None, 'amulet_used')
+    for phase in (GamePhase.LEADER_TURN, GamePhase.QUEST_VOTE, GamePhase.SELECT_NEXT_LEADER)
+})
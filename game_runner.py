@@ -1,10 +1,23 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
-from game import Game, Team, GamePhase, Player, FinalQuestStatus
+from game import Game, GameAction, Team, GamePhase, Player, ActionResult, Role
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional
+import argparse
+import contextlib
+import cProfile
+import json
+import os
+import pstats
 import random
+import shutil
+import sys
+import tempfile
 import time
 
+ROLES_BY_NAME = {role.display_name: role for role in Role}
+
 class GameRunner:
     def __init__(self):
         self.game = None
@@ -23,15 +36,22 @@ class GameRunner:
             except ValueError:
                 print("请输入有效数字")
         
-        self.game = Game(player_count)
-        
         # 添加玩家
-        for i in range(player_count):
-            name = input("请输入玩家{0}的名字: ".format(i+1))
-            self.game.add_player(name)
+        players = []
+        while len(players) < player_count:
+            name = input("请输入玩家{0}的名字: ".format(len(players)+1))
+            try:
+                player = Player(name)
+            except ValueError as e:
+                print(e)
+                continue
+            if player in players:
+                print("玩家名称 '{0}' 已存在".format(player.name))
+                continue
+            players.append(player)
         
-        # 开始游戏
-        self.game.start_game()
+        # 开始游戏（创建时即分配角色）
+        self.game = Game(players, player_count)
         self.run_game_loop()
         
     def run_game_loop(self):
@@ -43,26 +63,35 @@ class GameRunner:
             
             if self.game.current_phase == GamePhase.LEADER_TURN:
                 self.handle_leader_turn()
-            elif self.game.current_phase == GamePhase.QUEST:
+            elif self.game.current_phase == GamePhase.QUEST_VOTE:
                 self.handle_quest_phase()
-            elif self.game.current_phase == GamePhase.FINAL_QUEST:
-                self.handle_final_quest()
+            elif self.game.current_phase == GamePhase.SELECT_NEXT_LEADER:
+                self.handle_select_next_leader()
                 
             time.sleep(1)  # 防止刷屏太快
             
         self.show_game_result()
         
+    def report(self, result: ActionResult):
+        """显示动作结果（与服务器广播的事件相同）"""
+        if result.event == 'quest_result':
+            fail_count = result.extra['fail_count']
+            print("\n任务{0}！{1}".format('成功' if result.extra['success'] else '失败',
+                                      "失败票数：{0}".format(fail_count) if fail_count else ""))
+        elif result.event == 'game_over':
+            print("\n游戏结束！{0}获胜".format(Team[result.extra['winner']].display_name))
+
     def handle_leader_turn(self):
         """处理领袖回合"""
         leader = self.game.get_current_leader()
         print("\n当前领袖: {0}".format(leader.name))
-        required_players = self.game.get_current_quest_size()
+        required_players = self.game.current_quest.required_players
         print("需要选择 {0} 名队员".format(required_players))
         print("当前是第 {0} 个任务".format(self.game.quest_number))
         
-        while not (self.game.current_quest and self.game.current_quest.is_team_full()):
+        current_team = []
+        while len(current_team) < required_players:
             # 显示当前已选择的队员
-            current_team = self.game.current_quest.team if self.game.current_quest else []
             if current_team:
                 print("\n已选择的队员: {0}".format(", ".join(p.name for p in current_team)))
                 print("还需要选择 {0} 名队员".format(required_players - len(current_team)))
@@ -79,58 +108,59 @@ class GameRunner:
                     if selected_player in current_team:
                         print("\n错误: {0} 已经在队伍中了".format(selected_player.name))
                     else:
-                        self.game.assign_quest_member(leader, selected_player)
+                        current_team.append(selected_player)
                         print("\n成功选择: {0}".format(selected_player.name))
                 else:
                     print("\n无效的选择")
             except ValueError:
                 print("\n请输入有效数字")
-            except Exception as e:
-                print("\n错误: {0}".format(e))
             
             # 添加一个空行使输出更清晰
             print("")
+
+        target = input("魔法指示物交给谁? (输入队员名字，直接回车跳过): ").strip() or None
+        try:
+            self.report(self.game.submit_team([p.name for p in current_team], target, leader.name))
+        except ValueError as e:
+            print("\n错误: {0}".format(e))
             
     def handle_quest_phase(self):
         """处理任务阶段"""
-        if not self.game.current_quest:
-            return
-            
+        quest = self.game.current_quest
         print("\n任务执行阶段")
-        print("当前队员:", ", ".join(p.name for p in self.game.current_quest.team))
+        print("当前队员:", ", ".join(p.name for p in quest.team))
         
-        for player in self.game.current_quest.team:
-            if any(r.player == player for r in self.game.current_quest.results):
+        for player in list(quest.team):
+            if quest.has_submitted(player):
                 continue
                 
             print(f"\n{player.name} 的回合")
             if player.magic_tokens > 0:
-                use_magic = input("是否使用魔法指示物? (y/n): ").lower() == 'y'
-            else:
-                use_magic = False
+                print("你持有魔法指示物，将自动使用")
                 
             if player.team == Team.EVIL:
                 success = input("选择任务结果 (s:成功/f:失败): ").lower() == 's'
             else:
                 success = True
                 
-            self.game.submit_quest_result(player, success, use_magic)
-            
-    def handle_final_quest(self):
-        """处理最终任务"""
-        if not self.game.final_quest:
-            self.game.start_final_quest()
-            return
-            
-        print("\n最终任务阶段")
-        print(self.game.get_final_quest_status())
-        
-        if self.game.final_quest.status == FinalQuestStatus.SELECTING_LEADER:
-            self.handle_final_leader_selection()
-        elif self.game.final_quest.status == FinalQuestStatus.SELECTING_TEAM:
-            self.handle_final_team_selection()
-        elif self.game.final_quest.status == FinalQuestStatus.EXECUTING:
-            self.handle_final_quest_execution()
+            self.report(self.game.submit_quest_result(player, success))
+
+    def handle_select_next_leader(self):
+        """处理选择下一任队长"""
+        leader = self.game.get_current_leader()
+        candidates = [p for p in self.game.players if p not in self.game.previous_leaders]
+        print("\n{0} 请选择下一任队长:".format(leader.name))
+        for i, player in enumerate(candidates):
+            print("{0}. {1}".format(i+1, player.name))
+
+        try:
+            choice = int(input("请选择 (输入序号): ")) - 1
+            if 0 <= choice < len(candidates):
+                self.report(self.game.select_next_leader(leader.name, candidates[choice].name))
+            else:
+                print("无效的选择")
+        except ValueError as e:
+            print("错误: {0}".format(e))
             
     def show_game_result(self):
         """显示游戏结果"""
@@ -141,45 +171,181 @@ class GameRunner:
         for player in self.game.players:
             print("\n" + "-"*30)
             print(self.game.get_player_stats(player))
-            
-    def handle_final_leader_selection(self):
-        """处理最终任务领袖选择"""
-        if not self.game.final_quest.nominated_leader:
-            good_players = [p for p in self.game.players if p.team == Team.GOOD]
-            print("\n正义阵营玩家可以提名领袖:")
-            for i, player in enumerate(self.game.players):
-                print(f"{i+1}. {player.name}")
-                
-            try:
-                choice = int(input("请选择要提名的领袖 (输入序号): ")) - 1
-                if 0 <= choice < len(self.game.players):
-                    nominator = random.choice(good_players)
-                    self.game.nominate_final_leader(nominator, self.game.players[choice])
-                else:
-                    print("无效的选择")
-            except ValueError:
-                print("请输入有效数字")
-            except Exception as e:
-                print(f"错误: {e}")
+
+
+def load_script(path: str) -> Dict:
+    """读取动作脚本（NDJSON，格式与回放文件相同）
+
+    可选的 header 行给出 player_count、players（名称列表，或带 role 的字典列表）
+    和 seed；其余每行一个动作：{"player", "action", "data"}，其他类型的行忽略。
+    """
+    header = {}
+    actions = []
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            kind = record.get('type', 'action')
+            if kind == 'header':
+                header = record
+            elif kind == 'action':
+                actions.append(record)
+    return {'name': path, 'header': header, 'actions': actions}
+
+
+def generated_script(player_count: int, seed: int) -> Dict:
+    """由机器人决策生成动作的脚本"""
+    return {'name': f"generated-{player_count}-{seed}",
+            'header': {'player_count': player_count, 'seed': seed},
+            'actions': None}
+
+
+def _script_game(header: Dict) -> Game:
+    """按脚本 header 创建游戏，给出角色时覆盖随机分配的角色"""
+    entries = header.get('players')
+    player_count = header.get('player_count') or len(entries)
+    if not entries:
+        entries = [f"玩家{i}" for i in range(1, player_count + 1)]
+    entries = [e if isinstance(e, dict) else {'name': e} for e in entries]
+
+    # 每个脚本用自己的随机数生成器，不影响进程内其他代码使用的全局 random
+    rng = random.Random(header.get('seed'))
+    game = Game([Player(e['name']) for e in entries], player_count, rng=rng)
+    for player, entry in zip(game.players, entries):
+        if entry.get('role'):
+            player.role = ROLES_BY_NAME[entry['role']]
+            player.team = player.role.team
+    return game
+
+
+def run_script(script: Dict) -> Dict:
+    """执行一个脚本（不等待、不交互），返回机器可读的结果"""
+    start = time.perf_counter()
+    outcome = {'script': script['name'], 'player_count': None, 'winner': None, 'quests': [],
+               'phase': None, 'actions': 0, 'error': None}
+    try:
+        game = _script_game(script['header'])
+        outcome['player_count'] = game.player_count
+        if script['actions'] is None:
+            from bots import next_move
+            rng = random.Random(script['header'].get('seed'))
+            moves = _generated_moves(game, next_move, rng)
         else:
-            # 处理投票
-            for player in self.game.players:
-                if player not in self.game.final_quest.votes:
-                    print(f"\n{player.name} 请为 {self.game.final_quest.nominated_leader.name} 投票")
-                    approve = input("同意这位领袖吗? (y/n): ").lower() == 'y'
-                    self.game.vote_for_final_leader(player, approve)
-                    
-    def handle_final_team_selection(self):
-        """处理最终任务队伍选择"""
-        leader = self.game.final_quest.nominated_leader
-        print(f"\n领袖 {leader.name} 选择队员")
-        self.handle_leader_turn()  # 复用普通任务的队员选择逻辑
-        
-    def handle_final_quest_execution(self):
-        """处理最终任务执行"""
-        print("\n最终任务执行")
-        self.handle_quest_phase()  # 复用普通任务的执行逻辑
+            moves = ((a['player'], GameAction(a['action']), a.get('data') or {}) for a in script['actions'])
+        for player_name, action, data in moves:
+            if game.current_phase == GamePhase.GAME_OVER:
+                break
+            game.dispatch(action, player_name, **data)
+            outcome['actions'] += 1
+        outcome['winner'] = game.winner
+        outcome['quests'] = list(game.quest_results)
+        outcome['phase'] = game.current_phase.value
+    except Exception as e:
+        # 任何异常都只记到这个脚本的结果里，不中断整批
+        outcome['error'] = str(e) if isinstance(e, (ValueError, KeyError)) else f"{type(e).__name__}: {e}"
+    outcome['seconds'] = round(time.perf_counter() - start, 6)
+    return outcome
+
+
+def _generated_moves(game: Game, next_move, rng):
+    """按机器人决策逐个生成动作，直到游戏结束；没有人可以行动时报错"""
+    while game.current_phase != GamePhase.GAME_OVER:
+        move = next_move(game, rng)
+        if move is None:
+            raise ValueError(f"没有玩家可以行动（{game.current_phase.value}）")
+        yield move
+
+
+def _run_chunk(scripts: List[Dict], profile_path: Optional[str] = None) -> List[Dict]:
+    """在一个工作进程中依次执行脚本，游戏的调试输出被丢弃"""
+    profiler = cProfile.Profile() if profile_path else None
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        if profiler:
+            profiler.enable()
+        try:
+            return [run_script(script) for script in scripts]
+        finally:
+            if profiler:
+                profiler.disable()
+                profiler.dump_stats(profile_path)
+
+
+def run_batch(scripts: List[Dict], jobs: int = 1, profile_dir: Optional[str] = None) -> List[Dict]:
+    """把脚本分给 jobs 个进程并发执行，按输入顺序返回结果"""
+    jobs = max(1, min(jobs, len(scripts)))
+    chunks = [scripts[i::jobs] for i in range(jobs)]
+    paths = [os.path.join(profile_dir, f"{i}.prof") if profile_dir else None for i in range(jobs)]
+    if jobs == 1:
+        results = [_run_chunk(chunks[0], paths[0])] if scripts else []
+    else:
+        with ProcessPoolExecutor(jobs) as pool:
+            results = list(pool.map(_run_chunk, chunks, paths))
+
+    outcomes = [None] * len(scripts)
+    for i, chunk_results in enumerate(results):
+        outcomes[i::jobs] = chunk_results
+    return outcomes
+
+
+def report_profile(profile_dir: str, top: int, out=None):
+    """汇总各进程的性能数据，列出 game.py 中自身耗时最多的函数"""
+    out = out or sys.stderr
+    paths = [os.path.join(profile_dir, name) for name in os.listdir(profile_dir)]
+    stats = pstats.Stats(*paths)
+    game_file = os.path.abspath(sys.modules[Game.__module__].__file__)
+    rows = [(tt, ct, nc, name, line) for (path, line, name), (cc, nc, tt, ct, _) in stats.stats.items()
+            if os.path.abspath(path) == game_file]
+    rows.sort(reverse=True)
+    print(f"\ngame.py 中最耗时的函数（{stats.total_tt:.3f} s 总计）:", file=out)
+    print(f"{'自身(s)':>10} {'累计(s)':>10} {'调用次数':>10}  函数", file=out)
+    for tt, ct, nc, name, line in rows[:top]:
+        print(f"{tt:>10.4f} {ct:>10.4f} {nc:>10}  {name}:{line}", file=out)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='阿瓦隆Quest 命令行；不带参数时进入交互模式')
+    parser.add_argument('scripts', nargs='*', help='动作脚本文件（NDJSON，可以直接使用回放文件）')
+    parser.add_argument('--generate', type=int, default=0, help='额外生成多少局由机器人决策的对局')
+    parser.add_argument('--players', type=int, default=7, help='生成对局的人数')
+    parser.add_argument('--seed', type=int, default=0, help='生成对局的起始随机种子')
+    parser.add_argument('--jobs', type=int, default=os.cpu_count() or 1, help='并发进程数')
+    parser.add_argument('--output', help='结果输出文件（NDJSON），默认输出到标准输出')
+    parser.add_argument('--profile', action='store_true', help='统计各函数耗时并输出 game.py 的热点')
+    parser.add_argument('--top', type=int, default=15, help='性能报告显示的函数数量')
+    args = parser.parse_args(argv)
+
+    if not args.scripts and not args.generate:
+        GameRunner().start_new_game()
+        return 0
+
+    scripts = [load_script(path) for path in args.scripts]
+    scripts += [generated_script(args.players, args.seed + i) for i in range(args.generate)]
+
+    profile_dir = tempfile.mkdtemp() if args.profile else None
+    start = time.perf_counter()
+    try:
+        outcomes = run_batch(scripts, args.jobs, profile_dir)
+        elapsed = time.perf_counter() - start
+        out = open(args.output, 'w', encoding='utf-8') if args.output else sys.stdout
+        try:
+            for outcome in outcomes:
+                out.write(json.dumps(outcome, ensure_ascii=False) + '\n')
+        finally:
+            if args.output:
+                out.close()
+
+        errors = sum(1 for o in outcomes if o['error'])
+        wins = {team.value: sum(1 for o in outcomes if o['winner'] == team.value) for team in Team}
+        print(f"{len(outcomes)} 局，{errors} 局出错，正义胜 {wins['GOOD']}，邪恶胜 {wins['EVIL']}，"
+              f"耗时 {elapsed:.2f} s（{len(outcomes) / elapsed:,.0f} 局/秒）", file=sys.stderr)
+        if profile_dir:
+            report_profile(profile_dir, args.top)
+    finally:
+        if profile_dir:
+            shutil.rmtree(profile_dir)
+    return 1 if errors else 0
+
 
 if __name__ == "__main__":
-    runner = GameRunner()
-    runner.start_new_game() 
\ No newline at end of file
+    sys.exit(main()) 
\ No newline at end of file
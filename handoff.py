@@ -0,0 +1,180 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""进程间的热交接
+
+新版本的进程启动时连接旧进程在 HANDOFF_SOCKET 上监听的 Unix socket，收到全部房间的
+快照和旧进程正在监听的 TCP socket（通过 SCM_RIGHTS 传递文件描述符）。新进程恢复房间、
+在同一个监听 socket 上开始接受连接后回复确认，旧进程随即停止接受连接，通知客户端
+重连后退出。端口从不关闭，重连的客户端直接由新进程处理。
+
+消息格式：4 字节大端长度 + UTF-8 JSON，文件描述符随长度一起发送。
+"""
+
+import json
+import os
+import socket
+import struct
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+HEADER = struct.Struct('!I')
+MAX_FDS = 4
+# 状态格式的版本，格式不兼容时新进程拒绝接管
+STATE_FORMAT = 1
+
+
+def send_message(sock: socket.socket, message: Dict, fds: List[int] = ()) -> int:
+    """发送一条消息，返回 JSON 的字节数"""
+    data = json.dumps(message, ensure_ascii=False, separators=(',', ':')).encode()
+    header = HEADER.pack(len(data))
+    if fds:
+        socket.send_fds(sock, [header], list(fds))
+    else:
+        sock.sendall(header)
+    sock.sendall(data)
+    return len(data)
+
+
+def _recv_exactly(sock: socket.socket, size: int) -> bytes:
+    chunks = []
+    while size:
+        chunk = sock.recv(min(size, 1 << 20))
+        if not chunk:
+            raise ConnectionError('交接连接被关闭')
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b''.join(chunks)
+
+
+def recv_message(sock: socket.socket) -> Tuple[Dict, List[int]]:
+    """接收一条消息和随附的文件描述符"""
+    header, fds, _, _ = socket.recv_fds(sock, HEADER.size, MAX_FDS)
+    if not header:
+        raise ConnectionError('交接连接被关闭')
+    if len(header) < HEADER.size:
+        header += _recv_exactly(sock, HEADER.size - len(header))
+    (size,) = HEADER.unpack(header)
+    return json.loads(_recv_exactly(sock, size)), fds
+
+
+def receive_state(path: str, timeout: float = 30.0) -> Optional[Tuple[socket.socket, Dict, List[int]]]:
+    """连接旧进程，取得状态和监听 socket；没有正在运行的旧进程时返回 None
+
+    返回的连接在恢复完成后交给 acknowledge()，旧进程收到确认前仍然保持监听。
+    """
+    if not os.path.exists(path):
+        return None
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.settimeout(timeout)
+    try:
+        sock.connect(path)
+    except (ConnectionRefusedError, FileNotFoundError):
+        # 旧进程异常退出留下的 socket 文件
+        sock.close()
+        return None
+    send_message(sock, {'type': 'handoff', 'pid': os.getpid()})
+    message, fds = recv_message(sock)
+    if message.get('type') != 'state':
+        sock.close()
+        raise ValueError(f"交接失败: {message.get('error', message.get('type'))}")
+    return sock, message['state'], fds
+
+
+def acknowledge(sock: socket.socket, **info):
+    """通知旧进程新进程已接管"""
+    try:
+        send_message(sock, {'type': 'ack', **info})
+    finally:
+        sock.close()
+
+
+class HandoffServer:
+    """在 Unix socket 上等待下一个新进程
+
+    export() 返回 (状态, 要交出的文件描述符)，调用后本进程不应再修改已导出的状态；
+    complete() 在新进程确认接管后调用，导出之后交接失败时调用 abort() 恢复服务。
+    每个进程只交接一次。
+    """
+
+    def __init__(self, path: str, export: Callable[[], Tuple[Dict, List[int]]],
+                 complete: Callable[[], None], abort: Callable[[], None] = lambda: None,
+                 timeout: float = 60.0, spawn: Optional[Callable] = None):
+        self.path = path
+        self.timeout = timeout  # 等待新进程恢复并确认的最长时间
+        self._export = export
+        self._complete = complete
+        self._abort = abort
+        self._spawn = spawn or (lambda target: threading.Thread(target=target, daemon=True).start())
+        self._sock: Optional[socket.socket] = None
+        self._exported = False
+        self.handed_off = threading.Event()
+        self.last: Dict = {}
+
+    def start(self):
+        """开始监听（替换旧进程留下的 socket 文件）"""
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+        self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._sock.bind(self.path)
+        self._sock.listen(1)
+        self._spawn(self._serve)
+
+    def _serve(self):
+        while not self.handed_off.is_set():
+            try:
+                conn, _ = self._sock.accept()
+            except OSError:
+                return
+            with conn:
+                self._exported = False
+                try:
+                    self._handle(conn)
+                except (OSError, ValueError) as e:
+                    print(f"[ERROR] Handoff failed: {e}")
+                    self.last = {'error': str(e)}
+                    if self._exported:
+                        self._abort()
+        self.close()
+
+    def _handle(self, conn: socket.socket):
+        conn.settimeout(self.timeout)
+        request, _ = recv_message(conn)
+        if request.get('type') != 'handoff':
+            send_message(conn, {'type': 'error', 'error': '未知的请求'})
+            return
+        started = time.perf_counter()
+        state, fds = self._export()
+        self._exported = True
+        exported = time.perf_counter()
+        size = send_message(conn, {'type': 'state', 'state': state}, fds)
+        sent = time.perf_counter()
+        ack, _ = recv_message(conn)
+        if ack.get('type') != 'ack':
+            raise ValueError('新进程没有确认接管')
+        finished = time.perf_counter()
+        self.last = {
+            'successor': request.get('pid'),
+            'bytes': size,
+            'export_ms': round((exported - started) * 1000, 3),
+            'send_ms': round((sent - exported) * 1000, 3),
+            'restore_ms': ack.get('restore_ms'),
+            'total_ms': round((finished - started) * 1000, 3),
+            'rooms': ack.get('rooms'),
+        }
+        print(f"[DEBUG] Handed off {ack.get('rooms')} rooms to process {request.get('pid')} "
+              f"in {self.last['total_ms']} ms")
+        self.handed_off.set()
+        self._complete()
+
+    def close(self):
+        if self._sock is not None:
+            self._sock.close()
+            self._sock = None
+
+    def stats(self) -> Dict:
+        """最近一次交接的耗时"""
+        return {'path': self.path, 'handed_off': self.handed_off.is_set(), **self.last}
@@ -0,0 +1,72 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""带索引的动作日志
+
+护身符和特殊能力的使用记录只追加、从不修改，按使用者、目标和任务轮次各建一份
+位置索引。查询一个玩家或一轮任务的记录只访问命中的条目，与整局的记录数无关。
+"""
+
+import heapq
+from typing import Dict, Iterator, List, Optional
+
+
+class ActionJournal:
+    """只追加的动作日志，条目需要有 user 和 target（可以为 None）属性"""
+    __slots__ = ('_entries', '_by_user', '_by_target', '_by_quest')
+
+    def __init__(self):
+        self._entries: List = []
+        self._by_user: Dict[str, List[int]] = {}
+        self._by_target: Dict[str, List[int]] = {}
+        self._by_quest: Dict[int, List[int]] = {}
+
+    def append(self, entry, quest_number: Optional[int] = None):
+        """追加一条记录并更新索引"""
+        position = len(self._entries)
+        self._entries.append(entry)
+        self._by_user.setdefault(entry.user.name, []).append(position)
+        if entry.target is not None:
+            self._by_target.setdefault(entry.target.name, []).append(position)
+        if quest_number is not None:
+            self._by_quest.setdefault(quest_number, []).append(position)
+
+    def copy(self) -> 'ActionJournal':
+        """复制日志（条目本身共享），供 Game.fork 写时复制"""
+        clone = ActionJournal()
+        clone._entries = list(self._entries)
+        clone._by_user = {k: list(v) for k, v in self._by_user.items()}
+        clone._by_target = {k: list(v) for k, v in self._by_target.items()}
+        clone._by_quest = {k: list(v) for k, v in self._by_quest.items()}
+        return clone
+
+    def by_user(self, name: str) -> List:
+        """玩家使用的记录"""
+        return [self._entries[i] for i in self._by_user.get(name, ())]
+
+    def by_target(self, name: str) -> List:
+        """以玩家为目标的记录"""
+        return [self._entries[i] for i in self._by_target.get(name, ())]
+
+    def in_quest(self, quest_number: int) -> List:
+        """某一轮任务中的记录"""
+        return [self._entries[i] for i in self._by_quest.get(quest_number, ())]
+
+    def involving(self, name: str) -> List:
+        """玩家使用或作为目标的记录，按发生顺序"""
+        used = self._by_user.get(name, ())
+        targeted = self._by_target.get(name, ())
+        positions = []
+        # 两个索引都是递增的，合并后去掉对自己使用的重复位置
+        for position in heapq.merge(used, targeted):
+            if not positions or positions[-1] != position:
+                positions.append(position)
+        return [self._entries[i] for i in positions]
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __iter__(self) -> Iterator:
+        return iter(self._entries)
+
+    def __getitem__(self, index):
+        return self._entries[index]
@@ -0,0 +1,193 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import threading
+from collections import deque
+from typing import Dict, List, Optional, Tuple
+
+MIN_PLAYERS = 4
+MAX_PLAYERS = 10
+
+
+class LobbyIndex:
+    """可加入房间（未开始、未满）的索引
+
+    房间按 (人数配置, 已加入人数) 分桶，每个桶是一个列表加位置表，增删都是 O(1)
+    （删除时与末尾交换）。列表按人数配置升序、同配置内按已加入人数降序（接近开局的
+    房间优先）分页，翻页游标直接定位到桶内偏移，因此每页的开销只与页大小有关。
+    每次变化写入一个有界的变更环，订阅者按版本号增量获取。
+    """
+
+    def __init__(self, feed_size: int = 1024):
+        self._buckets: Dict[Tuple[int, int], List[str]] = {}
+        self._positions: Dict[str, int] = {}
+        self._locations: Dict[str, Tuple[int, int]] = {}
+        self._summaries: Dict[str, Dict] = {}
+        self._feed: deque = deque(maxlen=feed_size)
+        self._lock = threading.RLock()
+        self._published = 0
+        self.version = 0
+
+    def __len__(self):
+        return len(self._locations)
+
+    def __contains__(self, code):
+        return code in self._locations
+
+    @staticmethod
+    def _bucket_order():
+        """桶的遍历顺序"""
+        for player_count in range(MIN_PLAYERS, MAX_PLAYERS + 1):
+            for filled in range(player_count - 1, 0, -1):
+                yield player_count, filled
+
+    def update(self, room):
+        """房间变化后更新索引"""
+        filled = len(room.players)
+        is_open = room.game is None and 0 < filled < room.player_count
+        with self._lock:
+            if not is_open:
+                self._remove(room.code)
+                return
+            key = (room.player_count, filled)
+            if self._locations.get(room.code) != key:
+                self._detach(room.code)
+                bucket = self._buckets.setdefault(key, [])
+                self._positions[room.code] = len(bucket)
+                bucket.append(room.code)
+                self._locations[room.code] = key
+            summary = {
+                'code': room.code,
+                'host_name': room.host_name,
+                'player_count': room.player_count,
+                'current_players': filled,
+            }
+            self._summaries[room.code] = summary
+            self._record(room.code, 'upsert', summary)
+
+    def remove(self, code: str):
+        """房间关闭后移出索引"""
+        with self._lock:
+            self._remove(code)
+
+    def _remove(self, code: str):
+        if self._detach(code):
+            del self._summaries[code]
+            self._record(code, 'remove', None)
+
+    def _detach(self, code: str) -> bool:
+        key = self._locations.pop(code, None)
+        if key is None:
+            return False
+        bucket = self._buckets[key]
+        position = self._positions.pop(code)
+        last = bucket.pop()
+        if last != code:
+            bucket[position] = last
+            self._positions[last] = position
+        return True
+
+    def _record(self, code: str, op: str, summary: Optional[Dict]):
+        self.version += 1
+        self._feed.append((self.version, code, op, summary))
+
+    def list_rooms(self, player_count: Optional[int] = None, min_free: int = 1,
+                   cursor: Optional[str] = None, limit: int = 20) -> Dict:
+        """分页列出可加入的房间
+
+        player_count 只列出指定人数配置的房间，min_free 为至少剩余的空位数。
+        返回的 next_cursor 传回即可获取下一页，为 None 表示已经到底。
+        """
+        limit = max(1, min(limit, 100))
+        start_key, offset = self._parse_cursor(cursor)
+        rooms = []
+        next_cursor = None
+        with self._lock:
+            started = start_key is None
+            for key in self._bucket_order():
+                if not started:
+                    if key != start_key:
+                        continue
+                    started = True
+                else:
+                    offset = 0
+                count, filled = key
+                if player_count is not None and count != player_count:
+                    continue
+                if count - filled < min_free:
+                    continue
+                bucket = self._buckets.get(key)
+                if not bucket or offset >= len(bucket):
+                    continue
+                take = bucket[offset:offset + limit - len(rooms)]
+                rooms.extend(self._summaries[code] for code in take)
+                if len(rooms) >= limit:
+                    end = offset + len(take)
+                    if end < len(bucket):
+                        next_cursor = f"{count}:{filled}:{end}"
+                    else:
+                        next_cursor = self._next_bucket_cursor(key, player_count, min_free)
+                    break
+            return {'version': self.version, 'rooms': rooms, 'next_cursor': next_cursor}
+
+    def _next_bucket_cursor(self, after, player_count, min_free) -> Optional[str]:
+        passed = False
+        for key in self._bucket_order():
+            if not passed:
+                passed = key == after
+                continue
+            count, filled = key
+            if player_count is not None and count != player_count:
+                continue
+            if count - filled >= min_free and self._buckets.get(key):
+                return f"{count}:{filled}:0"
+        return None
+
+    @staticmethod
+    def _parse_cursor(cursor: Optional[str]):
+        if not cursor:
+            return None, 0
+        try:
+            count, filled, offset = (int(part) for part in cursor.split(':'))
+        except ValueError:
+            raise ValueError('无效的翻页游标')
+        return (count, filled), offset
+
+    def changes_since(self, version: int) -> Optional[Dict]:
+        """获取指定版本之后的变更（同一房间只保留最后一次）
+
+        版本过旧、变更已被环形缓冲覆盖时返回 None，客户端应重新拉取列表。
+        """
+        with self._lock:
+            if version > self.version:
+                return None
+            if self._feed and version < self._feed[0][0] - 1:
+                return None
+            if not self._feed and version < self.version:
+                return None
+            changes = {}
+            for change_version, code, op, summary in reversed(self._feed):
+                if change_version <= version:
+                    break
+                if code not in changes:
+                    changes[code] = {'code': code, 'op': op, 'room': summary}
+            return {'version': self.version, 'changes': list(reversed(list(changes.values())))}
+
+    def publish_changes(self) -> Dict:
+        """获取自上次推送以来的变更，用于向订阅者广播"""
+        with self._lock:
+            changes = self.changes_since(self._published)
+            if changes is None:
+                changes = {'version': self.version, 'changes': [], 'reset': True}
+            self._published = changes['version']
+            return changes
+
+    def clear(self):
+        """清空索引"""
+        with self._lock:
+            self._buckets.clear()
+            self._positions.clear()
+            self._locations.clear()
+            self._summaries.clear()
+            self._feed.clear()
+            self._published = self.version
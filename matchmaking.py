@@ -0,0 +1,223 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import heapq
+import itertools
+import threading
+import time
+from collections import deque
+from typing import Callable, Dict, List, Optional
+
+MIN_PLAYERS = 4
+MAX_PLAYERS = 10
+
+
+class MatchTicket:
+    """一个排队中的玩家"""
+    __slots__ = ('sid', 'size', 'enqueued_at', 'seq', 'active')
+
+    def __init__(self, sid: str, size: int, enqueued_at: float, seq: int):
+        self.sid = sid
+        self.size = size
+        self.enqueued_at = enqueued_at
+        self.seq = seq
+        self.active = True
+
+    def __lt__(self, other):
+        return (self.enqueued_at, self.seq) < (other.enqueued_at, other.seq)
+
+
+class MatchQueue:
+    """快速匹配队列
+
+    每种人数配置一个按入队时间排序的优先队列，入队和取消都是 O(log n)（取消的
+    票据在出队时跳过）。匹配线程按固定间隔批量组桌：每种配置凑满多少桌就组多少桌，
+    然后在锁外调用 on_match(size, tickets)。on_match 抛出 ValueError 表示请求被拒绝
+    （房间已满、服务器交接等），重试不会成功：票据作废并调用 on_fail(tickets, 原因)。
+    其他异常时票据按原入队时间放回队列，不会因此排到后面，该人数配置暂停组桌，
+    暂停时间从 retry_delay 起每次连续失败翻倍，最长 max_retry_delay，组桌成功后复位。
+    """
+
+    def __init__(self, on_match: Callable[[int, List[MatchTicket]], None],
+                 interval: float = 0.05, wait_samples: int = 1024,
+                 spawn: Optional[Callable] = None, sleep: Callable[[float], None] = time.sleep,
+                 clock: Callable[[], float] = time.monotonic,
+                 on_fail: Optional[Callable[[List[MatchTicket], str], None]] = None,
+                 retry_delay: float = 1.0, max_retry_delay: float = 30.0):
+        self.on_match = on_match
+        self.on_fail = on_fail
+        self.interval = interval
+        self.retry_delay = retry_delay
+        self.max_retry_delay = max_retry_delay
+        self._spawn = spawn
+        self._sleep = sleep
+        self._clock = clock
+        self._queues: Dict[int, List[MatchTicket]] = {
+            size: [] for size in range(MIN_PLAYERS, MAX_PLAYERS + 1)
+        }
+        self._waiting = {size: 0 for size in self._queues}
+        # 组桌失败后暂停的人数配置：恢复时间和当前的暂停时长
+        self._paused_until: Dict[int, float] = {}
+        self._backoff: Dict[int, float] = {}
+        self._tickets: Dict[str, MatchTicket] = {}
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+        self._running = False
+        self._waits = deque(maxlen=wait_samples)
+        self.enqueued = 0
+        self.cancelled = 0
+        self.matched = 0
+        self.rooms_formed = 0
+        self.failed = 0
+        self.rejected = 0
+
+    def enqueue(self, sid: str, size: int) -> MatchTicket:
+        """加入匹配队列，重复加入时替换之前的票据"""
+        if size not in self._queues:
+            raise ValueError(f"玩家数量必须在{MIN_PLAYERS}到{MAX_PLAYERS}之间")
+        with self._lock:
+            self._cancel(sid)
+            ticket = MatchTicket(sid, size, self._clock(), next(self._seq))
+            heapq.heappush(self._queues[size], ticket)
+            self._tickets[sid] = ticket
+            self._waiting[size] += 1
+            self.enqueued += 1
+            start = self._spawn is not None and not self._running
+            if start:
+                self._running = True
+        if start:
+            self._spawn(self._run)
+        return ticket
+
+    def cancel(self, sid: str) -> bool:
+        """退出匹配队列"""
+        with self._lock:
+            if self._cancel(sid):
+                self.cancelled += 1
+                return True
+            return False
+
+    def _cancel(self, sid: str) -> bool:
+        ticket = self._tickets.pop(sid, None)
+        if ticket is None:
+            return False
+        ticket.active = False
+        self._waiting[ticket.size] -= 1
+        return True
+
+    def _pop(self, size: int) -> MatchTicket:
+        queue = self._queues[size]
+        while True:
+            ticket = heapq.heappop(queue)
+            if ticket.active:
+                return ticket
+
+    def _requeue(self, tickets: List[MatchTicket]):
+        """把组桌失败的票据按原顺序放回队列"""
+        with self._lock:
+            for ticket in tickets:
+                if ticket.sid in self._tickets:
+                    continue
+                ticket.active = True
+                heapq.heappush(self._queues[ticket.size], ticket)
+                self._tickets[ticket.sid] = ticket
+                self._waiting[ticket.size] += 1
+
+    def _pause(self, size: int):
+        """组桌出错后暂停该人数配置，连续出错时暂停时间翻倍"""
+        with self._lock:
+            delay = self.retry_delay if size not in self._backoff else self._backoff[size] * 2
+            delay = min(delay, self.max_retry_delay)
+            self._backoff[size] = delay
+            self._paused_until[size] = self._clock() + delay
+
+    def match_once(self) -> int:
+        """组一轮桌，返回组成的房间数"""
+        groups = []
+        with self._lock:
+            now = self._clock()
+            for size, waiting in self._waiting.items():
+                paused = now < self._paused_until.get(size, now)
+                while waiting >= size and not paused:
+                    group = [self._pop(size) for _ in range(size)]
+                    for ticket in group:
+                        del self._tickets[ticket.sid]
+                        ticket.active = False
+                        self._waits.append(now - ticket.enqueued_at)
+                    waiting -= size
+                    groups.append(group)
+                self._waiting[size] = waiting
+                # 取消的票据过多时重建堆，避免队列无限增长
+                queue = self._queues[size]
+                if len(queue) > 2 * waiting + 64:
+                    self._queues[size] = [t for t in queue if t.active]
+                    heapq.heapify(self._queues[size])
+
+        formed = 0
+        for group in groups:
+            size = group[0].size
+            try:
+                self.on_match(size, group)
+            except ValueError as e:
+                print(f"[DEBUG] Matched room rejected: {str(e)}")
+                self.rejected += 1
+                if self.on_fail is not None:
+                    self.on_fail(group, str(e))
+                continue
+            except Exception as e:
+                print(f"[ERROR] Failed to start matched room: {str(e)}")
+                self.failed += 1
+                self._requeue(group)
+                self._pause(size)
+                continue
+            with self._lock:
+                self._paused_until.pop(size, None)
+                self._backoff.pop(size, None)
+            formed += 1
+            self.rooms_formed += 1
+            self.matched += len(group)
+        return formed
+
+    def _run(self):
+        """匹配线程，队列清空后退出，下次入队时重新启动"""
+        while True:
+            self._sleep(self.interval)
+            self.match_once()
+            with self._lock:
+                if not self._tickets:
+                    self._running = False
+                    return
+
+    def __len__(self):
+        return len(self._tickets)
+
+    def stats(self) -> Dict:
+        """匹配队列的运行指标，等待时间统计最近 wait_samples 个已匹配的玩家"""
+        with self._lock:
+            now = self._clock()
+            oldest = {}
+            for size, queue in self._queues.items():
+                waits = [now - t.enqueued_at for t in queue if t.active]
+                if waits:
+                    oldest[size] = round(max(waits) * 1000, 1)
+            waits = sorted(self._waits)
+            waiting = {size: count for size, count in self._waiting.items() if count}
+
+        def percentile(p):
+            if not waits:
+                return None
+            return round(waits[min(len(waits) - 1, int(len(waits) * p))] * 1000, 1)
+
+        return {
+            'waiting': waiting,
+            'oldest_wait_ms': oldest,
+            'enqueued': self.enqueued,
+            'cancelled': self.cancelled,
+            'matched': self.matched,
+            'rooms_formed': self.rooms_formed,
+            'failed': self.failed,
+            'rejected': self.rejected,
+            'wait_p50_ms': percentile(0.5),
+            'wait_p95_ms': percentile(0.95),
+            'wait_max_ms': round(waits[-1] * 1000, 1) if waits else None,
+        }
@@ -0,0 +1,335 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""内存排查工具
+
+两种互补的方式：
+
+- 遍历对象图：从房间出发统计其引用的全部对象（游戏、玩家、任务、各历史列表等），
+  得到每个房间、每个阶段和每种类型实际持有的字节数。不需要 tracemalloc，
+  MemorySampler 每次只随机抽取少数房间，开销足够低，可以在生产环境常开。
+- tracemalloc 快照：按需开启，比较前后两次快照，按行、文件或所在的类/第三方包
+  （例如 engineio 的发送缓冲）汇总新增的内存。开启期间每次分配都有额外开销。
+"""
+
+import ast
+import collections
+import enum
+import os
+import random
+import sys
+import threading
+import time
+import tracemalloc
+import types
+from typing import Callable, Dict, List, Optional, Tuple
+
+from rules import PlayerCountRules
+
+# 这些对象属于模块或全局共享，遍历时不计入也不深入
+SHARED_TYPES = (type, types.ModuleType, types.FunctionType, types.BuiltinFunctionType,
+                types.MethodType, enum.Enum, threading.Thread, PlayerCountRules)
+# 只计自身大小、不深入的对象（锁等）
+OPAQUE_TYPES = (type(threading.Lock()), type(threading.RLock()))
+ATOMIC_TYPES = (str, bytes, int, float, bool, type(None))
+
+SNAPSHOT_GROUPS = ('lineno', 'filename', 'class')
+REPO_ROOT = os.path.dirname(os.path.abspath(__file__))
+
+
+def _walk(root, seen: set):
+    """深度优先遍历 root 可达的对象，跳过共享对象和 seen 中已遍历过的对象"""
+    stack = [root]
+    while stack:
+        obj = stack.pop()
+        if id(obj) in seen or isinstance(obj, SHARED_TYPES):
+            continue
+        seen.add(id(obj))
+        yield obj
+        if isinstance(obj, ATOMIC_TYPES) or isinstance(obj, OPAQUE_TYPES):
+            continue
+        if isinstance(obj, dict):
+            stack.extend(obj.keys())
+            stack.extend(obj.values())
+        elif isinstance(obj, (list, tuple, set, frozenset, collections.deque)):
+            stack.extend(obj)
+        else:
+            attributes = getattr(obj, '__dict__', None)
+            if attributes is not None:
+                stack.append(attributes)
+            for slot in getattr(type(obj), '__slots__', ()):
+                value = getattr(obj, slot, None)
+                if value is not None:
+                    stack.append(value)
+
+
+def footprint(root, seen: Optional[set] = None) -> Tuple[int, collections.Counter]:
+    """从 root 出发统计可达对象的总字节数和按类型的分布
+
+    传入 seen 时跳过其中的对象并把本次遍历到的对象加入，多次调用之间不重复计算。
+    """
+    by_type = collections.Counter()
+    total = 0
+    for obj in _walk(root, set() if seen is None else seen):
+        size = sys.getsizeof(obj)
+        total += size
+        by_type[type(obj).__name__] += size
+    return total, by_type
+
+
+def room_phase(room) -> str:
+    return room.game.current_phase.value if room.game else 'WAITING'
+
+
+def room_footprint(room) -> Dict:
+    """一个房间持有的内存，以及游戏各字段（历史列表等）的大小
+
+    遍历时持有房间锁，避免和游戏动作同时修改历史列表。
+    """
+    with room.lock:
+        return _room_footprint(room)
+
+
+def _room_footprint(room) -> Dict:
+    total, by_type = footprint(room)
+    entry = {'code': room.code, 'phase': room_phase(room), 'bytes': total,
+             'by_type': dict(by_type.most_common(10))}
+    if room.game is not None:
+        # 字段之间共享的对象（玩家等）只计入先遍历到的字段
+        seen = {id(vars(room.game))}
+        attributes = {name: footprint(value, seen)[0] for name, value in vars(room.game).items()}
+        entry['game_attributes'] = dict(sorted(attributes.items(), key=lambda kv: -kv[1])[:10])
+        entry['history_lengths'] = {name: len(getattr(room.game, name))
+                                    for name in room.game.SHARED_HISTORY}
+    return entry
+
+
+def rooms_report(rooms: Dict, limit: int = 20) -> Dict:
+    """所有房间的内存：最大的若干房间、按阶段和按类型的汇总"""
+    entries = [room_footprint(room) for room in list(rooms.values())]
+    by_phase = collections.Counter()
+    by_type = collections.Counter()
+    for entry in entries:
+        by_phase[entry['phase']] += entry['bytes']
+        by_type.update(entry['by_type'])
+    entries.sort(key=lambda e: -e['bytes'])
+    return {
+        'rooms': len(entries),
+        'bytes': sum(by_phase.values()),
+        'by_phase': dict(by_phase),
+        'by_type': dict(by_type.most_common(20)),
+        'largest': entries[:max(0, limit)],
+    }
+
+
+def rss_bytes() -> int:
+    """进程当前常驻内存（Linux 读取 /proc，其他平台返回峰值）"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == 'darwin' else peak * 1024
+
+
+class _ClassIndex:
+    """把源文件行号映射到所在的类，用于按类汇总 tracemalloc 统计"""
+
+    def __init__(self):
+        self._ranges: Dict[str, List[Tuple[int, int, str]]] = {}
+
+    def label(self, filename: str, lineno: int) -> str:
+        path = os.path.abspath(filename)
+        if not path.startswith(REPO_ROOT + os.sep):
+            return self._package(path)
+        module = os.path.relpath(path, REPO_ROOT)
+        for start, end, name in self._classes(path):
+            if start <= lineno <= end:
+                return f"{module}:{name}"
+        return f"{module}:<module>"
+
+    def _classes(self, path):
+        ranges = self._ranges.get(path)
+        if ranges is None:
+            try:
+                with open(path, encoding='utf-8') as f:
+                    tree = ast.parse(f.read())
+                ranges = [(node.lineno, node.end_lineno, node.name) for node in ast.walk(tree)
+                          if isinstance(node, ast.ClassDef)]
+                # 嵌套类优先匹配最内层
+                ranges.sort(key=lambda r: r[1] - r[0])
+            except (OSError, SyntaxError):
+                ranges = []
+            self._ranges[path] = ranges
+        return ranges
+
+    @staticmethod
+    def _package(path):
+        parts = path.split(os.sep)
+        for marker in ('site-packages', 'dist-packages'):
+            if marker in parts:
+                index = parts.index(marker)
+                if index + 1 < len(parts):
+                    return parts[index + 1].split('.')[0]
+        return os.path.basename(path)
+
+
+class MemoryProfiler:
+    """tracemalloc 快照：按需开启、拍摄快照并与上一次比较"""
+
+    def __init__(self):
+        self._last: Optional[tracemalloc.Snapshot] = None
+        self._classes = _ClassIndex()
+        self._lock = threading.Lock()
+
+    @property
+    def tracing(self) -> bool:
+        return tracemalloc.is_tracing()
+
+    def start(self, frames: int = 1):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(frames)
+        self._last = None
+
+    def stop(self):
+        tracemalloc.stop()
+        self._last = None
+
+    def snapshot(self, group_by: str = 'lineno', limit: int = 20) -> Dict:
+        """拍摄快照，返回当前占用最多的位置和相对上一次快照的变化"""
+        if group_by not in SNAPSHOT_GROUPS:
+            raise ValueError(f"不支持的汇总方式: {group_by}")
+        if not tracemalloc.is_tracing():
+            raise ValueError('tracemalloc 未开启')
+        with self._lock:
+            snapshot = tracemalloc.take_snapshot().filter_traces((
+                tracemalloc.Filter(False, tracemalloc.__file__),
+                tracemalloc.Filter(False, '<frozen importlib._bootstrap*>'),
+            ))
+            previous, self._last = self._last, snapshot
+
+        current = self._group(snapshot, group_by)
+        result = {
+            'group_by': group_by,
+            'traced': tracemalloc.get_traced_memory()[0],
+            'top': [{'where': k, 'size': size, 'count': count}
+                    for k, (size, count) in sorted(current.items(), key=lambda kv: -kv[1][0])[:limit]],
+            'diff': None,
+        }
+        if previous is not None:
+            before = self._group(previous, group_by)
+            changes = []
+            for key in current.keys() | before.keys():
+                size, count = current.get(key, (0, 0))
+                old_size, old_count = before.get(key, (0, 0))
+                if size != old_size:
+                    changes.append({'where': key, 'size_diff': size - old_size,
+                                    'count_diff': count - old_count, 'size': size})
+            changes.sort(key=lambda c: -abs(c['size_diff']))
+            result['diff'] = changes[:limit]
+        return result
+
+    def _group(self, snapshot, group_by) -> Dict[str, Tuple[int, int]]:
+        if group_by != 'class':
+            return {self._where(stat.traceback, group_by): (stat.size, stat.count)
+                    for stat in snapshot.statistics(group_by)}
+        grouped: Dict[str, List[int]] = {}
+        for stat in snapshot.statistics('lineno'):
+            frame = stat.traceback[0]
+            entry = grouped.setdefault(self._classes.label(frame.filename, frame.lineno), [0, 0])
+            entry[0] += stat.size
+            entry[1] += stat.count
+        return {key: tuple(value) for key, value in grouped.items()}
+
+    @staticmethod
+    def _where(traceback, group_by):
+        frame = traceback[0]
+        if group_by == 'filename':
+            return frame.filename
+        return f"{frame.filename}:{frame.lineno}"
+
+
+class MemorySampler:
+    """低开销的周期采样：每次随机遍历少数房间，估算各阶段房间占用并记录 RSS
+
+    与广播合并器相同，后台任务在有房间时由 wake() 启动，没有房间时退出。
+    """
+
+    def __init__(self, rooms: Dict, interval: float, sample_size: int = 4, history: int = 120,
+                 spawn: Optional[Callable] = None, sleep: Callable[[float], None] = time.sleep,
+                 rng: Optional[random.Random] = None):
+        self.rooms = rooms
+        self.interval = interval
+        self.sample_size = sample_size
+        self.samples = collections.deque(maxlen=history)
+        self._spawn = spawn
+        self._sleep = sleep
+        self._rng = rng or random.Random()
+        self._running = False
+        self._lock = threading.Lock()
+
+    def wake(self):
+        """有房间时启动采样任务（interval 为 0 时关闭采样）"""
+        if not self.interval or self._spawn is None:
+            return
+        with self._lock:
+            if self._running:
+                return
+            self._running = True
+        self._spawn(self._run)
+
+    def _run(self):
+        idle = False
+        try:
+            while not idle:
+                self._sleep(self.interval)
+                try:
+                    self.sample()
+                except Exception as e:
+                    print(f"[ERROR] Memory sampling failed: {str(e)}")
+                with self._lock:
+                    idle = not self.rooms
+                    if idle:
+                        self._running = False
+        finally:
+            if not idle:
+                # 意外退出（sleep 被中断等）时允许下次 wake() 重新启动
+                with self._lock:
+                    self._running = False
+
+    def sample(self) -> Dict:
+        """采样一次：按抽中房间的平均大小外推各阶段的总占用"""
+        rooms = list(self.rooms.values())
+        chosen = self._rng.sample(rooms, min(self.sample_size, len(rooms)))
+        counts = collections.Counter(room_phase(room) for room in rooms)
+        sizes: Dict[str, List[int]] = {}
+        for room in chosen:
+            with room.lock:
+                sizes.setdefault(room_phase(room), []).append(footprint(room)[0])
+        average = sum(sum(v) for v in sizes.values()) / len(chosen) if chosen else 0
+        by_phase = {phase: int(count * (sum(sizes[phase]) / len(sizes[phase]) if phase in sizes else average))
+                    for phase, count in counts.items()}
+        sample = {
+            'time': time.time(),
+            'rss': rss_bytes(),
+            'rooms': len(rooms),
+            'sampled': len(chosen),
+            'estimated_room_bytes': sum(by_phase.values()),
+            'by_phase': by_phase,
+            'traced': tracemalloc.get_traced_memory()[0] if tracemalloc.is_tracing() else None,
+        }
+        self.samples.append(sample)
+        return sample
+
+    def stats(self) -> Dict:
+        """最近一次采样和 RSS 变化趋势"""
+        if not self.samples:
+            return {'samples': 0, 'rss': rss_bytes()}
+        first, last = self.samples[0], self.samples[-1]
+        return {
+            'samples': len(self.samples),
+            'rss': last['rss'],
+            'rss_growth': last['rss'] - first['rss'],
+            'window_seconds': round(last['time'] - first['time'], 1),
+            'latest': last,
+        }
@@ -0,0 +1,174 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import threading
+import time
+from collections import deque
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+# 全量状态快照事件：较新的快照会取代同类型中尚未发送的旧快照
+SNAPSHOT_EVENTS = frozenset({'game_update', 'room_update'})
+
+
+class OutboundQueue:
+    """单个连接的有界发送队列
+
+    快照事件同一类型最多保留一条（新的取代旧的），quest_result、game_over 等
+    离散事件按顺序保留。超过容量时优先丢弃最旧的快照，其次才丢弃最旧的消息。
+    """
+    __slots__ = ('maxlen', '_items', 'superseded', 'overflow')
+
+    def __init__(self, maxlen: int = 32):
+        self.maxlen = maxlen
+        self._items: deque = deque()
+        self.superseded = 0
+        self.overflow = 0
+
+    def __len__(self):
+        return len(self._items)
+
+    def push(self, event: str, payload):
+        """加入一条待发送消息"""
+        if event in SNAPSHOT_EVENTS:
+            for index, (queued_event, _) in enumerate(self._items):
+                if queued_event == event:
+                    del self._items[index]
+                    self.superseded += 1
+                    break
+
+        if len(self._items) >= self.maxlen:
+            self._evict()
+        self._items.append((event, payload))
+
+    def _evict(self):
+        for index, (queued_event, _) in enumerate(self._items):
+            if queued_event in SNAPSHOT_EVENTS:
+                del self._items[index]
+                self.superseded += 1
+                return
+        self._items.popleft()
+        self.overflow += 1
+
+    def pop(self) -> Optional[Tuple[str, object]]:
+        """取出最早的一条消息"""
+        return self._items.popleft() if self._items else None
+
+
+class ClientOutbox:
+    """按连接管理发送队列，慢客户端不拖慢同房间的其他客户端
+
+    房间广播时，畅通的连接仍然通过一次房间 emit 发送（只编码一次），拥塞的连接
+    （有未发送消息或底层 Engine.IO 缓冲超过阈值）被跳过，改为进入各自的有界队列，
+    由后台任务在底层缓冲清空后逐条发送。
+    """
+
+    def __init__(self, send: Callable, backlog: Callable[[str], int],
+                 maxlen: int = 32, congestion_threshold: int = 2,
+                 spawn: Optional[Callable] = None, sleep: Callable = time.sleep,
+                 poll_interval: float = 0.05):
+        self.send = send                    # send(event, payload, sid)
+        self.backlog = backlog              # backlog(sid) -> 底层缓冲中的数据包数量
+        self.maxlen = maxlen
+        self.congestion_threshold = congestion_threshold
+        self.spawn = spawn or self._spawn_thread
+        self.sleep = sleep
+        self.poll_interval = poll_interval
+        self._queues: Dict[str, OutboundQueue] = {}
+        self._draining = set()
+        self._lock = threading.Lock()
+        self.direct = 0
+        self.queued = 0
+        self.delivered = 0
+        self.superseded = 0
+        self.overflow = 0
+
+    @staticmethod
+    def _spawn_thread(target, *args):
+        thread = threading.Thread(target=target, args=args, daemon=True)
+        thread.start()
+        return thread
+
+    def is_congested(self, sid: str) -> bool:
+        """连接是否拥塞"""
+        queue = self._queues.get(sid)
+        if queue is not None and len(queue):
+            return True
+        return self.backlog(sid) > self.congestion_threshold
+
+    def split(self, sids: Iterable[str]) -> Tuple[List[str], List[str]]:
+        """将连接分为畅通和拥塞两组"""
+        fast, slow = [], []
+        for sid in sids:
+            (slow if self.is_congested(sid) else fast).append(sid)
+        return fast, slow
+
+    def broadcast(self, room: str, event: str, payload, sids: Iterable[str], emit_room: Callable,
+                  skip: Iterable[str] = ()):
+        """向房间广播：畅通的连接一次性发送，拥塞的连接进入各自队列
+
+        skip 为房间内不属于 sids 的连接（例如使用另一种协议的客户端），房间 emit 时一并跳过。
+        """
+        fast, slow = self.split(sids)
+        if fast:
+            skip_sid = list(skip) + slow
+            emit_room(event, payload, room, skip_sid or None)
+            with self._lock:
+                self.direct += len(fast)
+        for sid in slow:
+            self.push(sid, event, payload)
+
+    def push(self, sid: str, event: str, payload):
+        """将消息放入连接的发送队列"""
+        with self._lock:
+            queue = self._queues.get(sid)
+            if queue is None:
+                queue = self._queues[sid] = OutboundQueue(self.maxlen)
+            queue.push(event, payload)
+            self.queued += 1
+            if sid in self._draining:
+                return
+            self._draining.add(sid)
+        self.spawn(self._drain, sid)
+
+    def _drain(self, sid: str):
+        while True:
+            if self.backlog(sid) > 0:
+                self.sleep(self.poll_interval)
+                continue
+            with self._lock:
+                queue = self._queues.get(sid)
+                item = queue.pop() if queue is not None else None
+                if item is None:
+                    self._draining.discard(sid)
+                    if queue is not None:
+                        self._collect(queue)
+                        del self._queues[sid]
+                    return
+            self.send(item[0], item[1], sid)
+            with self._lock:
+                self.delivered += 1
+
+    def _collect(self, queue: OutboundQueue):
+        self.superseded += queue.superseded
+        self.overflow += queue.overflow
+
+    def discard(self, sid: str):
+        """连接断开时丢弃其队列"""
+        with self._lock:
+            queue = self._queues.pop(sid, None)
+            if queue is not None:
+                self._collect(queue)
+
+    def stats(self) -> Dict:
+        """发送队列统计"""
+        with self._lock:
+            queues = list(self._queues.values())
+            return {
+                'direct': self.direct,
+                'queued': self.queued,
+                'delivered': self.delivered,
+                'superseded': self.superseded + sum(q.superseded for q in queues),
+                'overflow': self.overflow + sum(q.overflow for q in queues),
+                'congested_clients': len(queues),
+                'pending_messages': sum(len(q) for q in queues),
+            }
@@ -0,0 +1,96 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""令牌桶限流
+
+每个键（发送者、连接或 IP）一个令牌桶：容量为 burst，每秒补充 rate 个令牌，每个事件
+消耗一个。令牌在检查时按距上次检查的时间补充，不需要定时器，每次检查 O(1)。桶满
+（空闲了 burst / rate 秒以上）的键与从未出现过的键等价，键的数量翻倍时一次清理掉，
+均摊下来仍是 O(1)，内存只随最近活跃的键增长。
+
+检查不加锁：并发检查同一个键时可能多放行一两个事件，对限流来说可以接受。
+"""
+
+import time
+from typing import Callable, Dict, Hashable
+
+
+class TokenBucket:
+    """单个键的剩余令牌和上次补充的时间"""
+    __slots__ = ('tokens', 'updated')
+
+    def __init__(self, tokens: float, updated: float):
+        self.tokens = tokens
+        self.updated = updated
+
+
+class RateLimiter:
+    """按键的令牌桶"""
+
+    def __init__(self, rate: float, burst: float, clock: Callable[[], float] = time.monotonic,
+                 prune_threshold: int = 1024):
+        self.rate = rate    # 每秒补充的令牌数，0 表示不限流
+        self.burst = burst  # 桶的容量，即允许的突发事件数
+        self._clock = clock
+        self._buckets: Dict[Hashable, TokenBucket] = {}
+        self._prune_threshold = prune_threshold
+        self._prune_at = prune_threshold
+        self.allowed = 0
+        self.throttled = 0
+
+    def __len__(self):
+        return len(self._buckets)
+
+    @property
+    def enabled(self) -> bool:
+        return self.rate > 0
+
+    def allow(self, key: Hashable, cost: float = 1.0) -> bool:
+        """消耗 cost 个令牌，令牌不足时返回 False（不消耗）"""
+        if not self.enabled:
+            return True
+        now = self._clock()
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            if len(self._buckets) >= self._prune_at:
+                self._prune(now)
+            bucket = self._buckets[key] = TokenBucket(self.burst, now)
+        else:
+            bucket.tokens = min(self.burst, bucket.tokens + (now - bucket.updated) * self.rate)
+            bucket.updated = now
+        if bucket.tokens >= cost:
+            bucket.tokens -= cost
+            self.allowed += 1
+            return True
+        self.throttled += 1
+        return False
+
+    def retry_after(self, key: Hashable, cost: float = 1.0) -> float:
+        """还需要等待多少秒才有 cost 个令牌"""
+        bucket = self._buckets.get(key)
+        if not self.enabled or bucket is None:
+            return 0.0
+        tokens = bucket.tokens + (self._clock() - bucket.updated) * self.rate
+        return max(0.0, (cost - tokens) / self.rate)
+
+    def forget(self, key: Hashable):
+        """删除键的令牌桶（连接断开等）"""
+        self._buckets.pop(key, None)
+
+    def _prune(self, now: float):
+        """删除已经补满的桶，下次在剩余数量翻倍时再清理"""
+        idle = self.burst / self.rate
+        # list() 一次复制字典，其他线程同时插入新键时不会出错
+        for key, bucket in list(self._buckets.items()):
+            if now - bucket.updated >= idle:
+                self._buckets.pop(key, None)
+        self._prune_at = max(self._prune_threshold, 2 * len(self._buckets))
+
+    def stats(self) -> Dict:
+        """限流计数"""
+        return {
+            'rate': self.rate,
+            'burst': self.burst,
+            'keys': len(self._buckets),
+            'allowed': self.allowed,
+            'throttled': self.throttled,
+        }
@@ -0,0 +1,221 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""已结束对局的回放存储
+
+每局保存为一个 NDJSON 文件（<目录>/<回放ID>.ndjson）：
+
+- 第一行是 header：人数、玩家及其角色、获胜方、各轮任务结果，以及每轮任务第一个
+  动作相对 header 末尾的字节偏移（seek 索引）
+- 之后每行一个动作：序号、相对开局的秒数、任务轮次、玩家、动作和参数
+- 最后一行是 end
+
+stream() 逐行读取文件并按需等待，跳转到指定任务轮次时直接 seek，不会把整局读入
+内存，每个回放流只占用一个文件句柄和一行缓冲。
+"""
+
+import json
+import os
+import re
+import threading
+import time
+import uuid
+from collections import deque
+from typing import Callable, Dict, Iterator, List, Optional
+
+from game import GamePhase
+
+REPLAY_ID = re.compile(r'^[0-9a-f]{32}$')
+
+# 回放时两个动作之间的最长等待（秒，按 1 倍速计）
+MAX_GAP = 5.0
+# 支持的回放速度范围，0 表示不等待
+MAX_SPEED = 64.0
+# 内存中保留的最近回放ID数量，也是 recent() 的上限
+RECENT_SIZE = 1000
+
+
+class ReplayStore:
+    """按回放ID保存和流式读取已结束对局的动作记录
+
+    提供 spawn 时 save() 只把编码好的内容放入待写缓冲并立即返回回放ID，后台线程每隔
+    interval 秒写入磁盘；否则在 save() 中直接写入。读取还在缓冲中的回放时先把缓冲写完。
+    最近的回放ID保存在内存索引中，recent() 不扫描目录。
+    """
+
+    def __init__(self, path: str, interval: float = 1.0,
+                 spawn: Optional[Callable] = None, sleep: Callable[[float], None] = time.sleep):
+        self.path = path
+        self.interval = interval
+        self._spawn = spawn
+        self._sleep = sleep
+        self.saved = 0
+        self.streams = 0  # 正在进行的回放流数量
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()  # 串行化磁盘写入，先于 _lock 获取
+        self._running = False
+        self._pending: Dict[str, bytes] = {}  # 待写入的回放，写完才移除
+        self._recent = None  # 最近的回放ID（从旧到新），第一次使用时从目录加载
+
+    def _file(self, replay_id: str) -> str:
+        return os.path.join(self.path, f"{replay_id}.ndjson")
+
+    def save(self, game) -> Optional[str]:
+        """保存一局已结束的游戏，返回回放ID"""
+        if game.current_phase != GamePhase.GAME_OVER:
+            return None
+        replay_id = uuid.uuid4().hex
+
+        lines: List[bytes] = []
+        seek = {}
+        offset = 0
+        for seq, entry in enumerate(game.action_log):
+            seek.setdefault(str(entry['quest']), offset)
+            line = json.dumps({'type': 'action', 'seq': seq, **entry}, ensure_ascii=False).encode() + b'\n'
+            lines.append(line)
+            offset += len(line)
+        lines.append(json.dumps({'type': 'end', 'winner': game.winner}).encode() + b'\n')
+
+        header = {
+            'type': 'header',
+            'id': replay_id,
+            'player_count': game.player_count,
+            'players': [{'name': p.name,
+                         'role': p.role.display_name if p.role else None,
+                         'team': p.role.team.value if p.role else None} for p in game.players],
+            'winner': game.winner,
+            'quest_results': list(game.quest_results),
+            'actions': len(game.action_log),
+            'duration': game.action_log[-1]['t'] if game.action_log else 0,
+            'seek': seek,
+            'end': offset,
+        }
+
+        data = json.dumps(header, ensure_ascii=False).encode() + b'\n' + b''.join(lines)
+        with self._lock:
+            self._index().append(replay_id)
+            self._pending[replay_id] = data
+            self.saved += 1
+            start = self._spawn is not None and not self._running
+            if start:
+                self._running = True
+        if start:
+            self._spawn(self._run)
+        elif self._spawn is None:
+            self.flush()
+        return replay_id
+
+    def _run(self):
+        """写入线程，缓冲为空时退出，下次保存时重新启动"""
+        while True:
+            self._sleep(self.interval)
+            try:
+                self.flush()
+            except OSError as e:
+                print(f"[ERROR] Failed to write replays: {str(e)}")
+            with self._lock:
+                if not self._pending:
+                    self._running = False
+                    return
+
+    def flush(self):
+        """把缓冲的回放写入磁盘"""
+        with self._write_lock:
+            with self._lock:
+                pending = list(self._pending.items())
+            if not pending:
+                return
+            try:
+                os.makedirs(self.path, exist_ok=True)
+                for replay_id, data in pending:
+                    temp = self._file(replay_id) + '.tmp'
+                    with open(temp, 'wb') as f:
+                        f.write(data)
+                    os.replace(temp, self._file(replay_id))
+                    with self._lock:
+                        del self._pending[replay_id]
+            except OSError:
+                with self._lock:
+                    # 丢弃没写成的回放，不在后台反复重试
+                    for replay_id, _ in pending:
+                        if self._pending.pop(replay_id, None) is not None and replay_id in self._recent:
+                            self._recent.remove(replay_id)
+                raise
+
+    def _index(self) -> deque:
+        """最近回放ID的内存索引，调用方持有 _lock"""
+        if self._recent is None:
+            self._recent = deque(maxlen=RECENT_SIZE)
+            if os.path.isdir(self.path):
+                entries = [e for e in os.scandir(self.path) if e.name.endswith('.ndjson')]
+                entries.sort(key=lambda e: e.stat().st_mtime)
+                self._recent.extend(e.name[:-len('.ndjson')] for e in entries[-RECENT_SIZE:])
+        return self._recent
+
+    def _on_disk(self, replay_id: str) -> bool:
+        """回放已经在磁盘上；还在缓冲中时先写入"""
+        if not REPLAY_ID.match(replay_id):
+            return False
+        if replay_id in self._pending:
+            self.flush()
+        return os.path.exists(self._file(replay_id))
+
+    def exists(self, replay_id: str) -> bool:
+        """回放ID格式正确且已保存（含还在缓冲中的）"""
+        return bool(REPLAY_ID.match(replay_id)) and (
+            replay_id in self._pending or os.path.exists(self._file(replay_id)))
+
+    def header(self, replay_id: str) -> Optional[dict]:
+        """读取回放的 header（只读第一行）"""
+        if not self._on_disk(replay_id):
+            return None
+        with open(self._file(replay_id), 'rb') as f:
+            return json.loads(f.readline())
+
+    def recent(self, limit: int = 20) -> List[str]:
+        """最近保存的回放ID（从新到旧，最多 RECENT_SIZE 个）"""
+        with self._lock:
+            index = self._index()
+            count = max(0, min(limit, len(index)))
+            return [index[-i] for i in range(1, count + 1)]
+
+    def stream(self, replay_id: str, from_quest: int = 1, speed: float = 0,
+               sleep: Callable[[float], None] = time.sleep) -> Iterator[bytes]:
+        """按行产出回放记录（header、动作、end）
+
+        from_quest 大于 1 时跳过之前的任务；speed 为回放倍速，动作之间按记录的时间
+        间隔除以倍速等待（单次最多 MAX_GAP / speed 秒），0 表示不等待。
+        """
+        if not self._on_disk(replay_id):
+            raise ValueError('回放不存在')
+        if speed < 0 or speed > MAX_SPEED:
+            raise ValueError(f'回放速度需要在 0 到 {MAX_SPEED:g} 之间')
+        return self._stream(replay_id, from_quest, speed, sleep)
+
+    def _stream(self, replay_id, from_quest, speed, sleep):
+        with self._lock:
+            self.streams += 1
+        try:
+            with open(self._file(replay_id), 'rb') as f:
+                first = f.readline()
+                yield first
+                if from_quest > 1:
+                    header = json.loads(first)
+                    offsets = [offset for quest, offset in header['seek'].items() if int(quest) >= from_quest]
+                    f.seek(len(first) + min(offsets, default=header['end']))
+
+                previous = None
+                for line in f:
+                    if speed:
+                        t = json.loads(line).get('t')
+                        if t is not None:
+                            if previous is not None and t > previous:
+                                sleep(min(t - previous, MAX_GAP) / speed)
+                            previous = t
+                    yield line
+        finally:
+            with self._lock:
+                self.streams -= 1
+
+    def stats(self):
+        """回放存储的运行指标"""
+        return {'saved': self.saved, 'pending': len(self._pending), 'streams': self.streams}
@@ -0,0 +1,180 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""游戏规则表
+
+所有随人数变化的规则（各轮任务人数、最终任务人数、角色配置、身份可见性）在导入时
+编译成只读的共享表。创建 Game 时只引用对应人数的表，不再构建任何规则数据。
+规则变体通过 RuleSet.from_dict / load_rules 加载，与标准规则并存，互不影响。
+"""
+
+import json
+from enum import Enum
+from types import MappingProxyType
+from typing import Dict, FrozenSet, Iterable, Mapping, Sequence, Tuple
+
+QUEST_COUNT = 5
+
+
+class Team(Enum):
+    GOOD = "GOOD"
+    EVIL = "EVIL"
+
+    @property
+    def display_name(self):
+        return {
+            'GOOD': '正义阵营',
+            'EVIL': '邪恶阵营'
+        }[self.value]
+
+    @property
+    def value(self):
+        return self.name
+
+class Role(Enum):
+    LOYAL_SERVANT = ('亚瑟的忠臣', Team.GOOD, '效忠于亚瑟王的正义骑士')
+    DUKE = ('公爵', Team.GOOD, '在最终任务中可以指定一位玩家放下一只手')
+    GRAND_DUKE = ('大公', Team.GOOD, '在最终任务中，邪恶方揭露身份后，可以改变一个玩家一只手的指向')
+    MORGAN = ('摩根勒菲', Team.EVIL, '不受魔法指示物效果影响，可以出任务失敗牌')
+    PRINCE = ('王儲', Team.EVIL, '不知道邪恶方有谁，但邪恶方知道谁是王儲')
+    SHAPESHIFTER = ('幻形妖', Team.EVIL, '邪恶方不知道幻形妖是谁，幻形妖也不知道哪些人是邪恶方')
+    MORDRED_MINION = ('莫德雷德的爪牙', Team.EVIL, '知道其他邪恶阵营的人（除了幻形妖）')
+
+    def __init__(self, display_name, team, description):
+        self.display_name = display_name
+        self.team = team
+        self.description = description
+
+
+class PlayerCountRules:
+    """某一人数下的规则（只读，由同一规则集的所有对局共享）"""
+    __slots__ = ('player_count', 'quest_sizes', 'final_quest_size', 'roles', 'visibility')
+
+    def __init__(self, player_count: int, quest_sizes: Tuple[int, ...], final_quest_size: int,
+                 roles: Tuple[Role, ...], visibility: Mapping[Role, FrozenSet[Role]]):
+        object.__setattr__(self, 'player_count', player_count)
+        object.__setattr__(self, 'quest_sizes', quest_sizes)            # 各轮任务需要的队员数
+        object.__setattr__(self, 'final_quest_size', final_quest_size)  # 最终任务需要的队员数
+        object.__setattr__(self, 'roles', roles)                        # 本局的角色（可重复）
+        object.__setattr__(self, 'visibility', visibility)              # 角色 -> 能看到身份的角色
+
+    def __setattr__(self, name, value):
+        raise AttributeError('规则表不可修改')
+
+    def __repr__(self):
+        return f"PlayerCountRules({self.player_count})"
+
+
+class RuleSet:
+    """一套完整规则：各人数的规则表在创建时编译完成"""
+    __slots__ = ('name', '_tables')
+
+    def __init__(self, name: str, quest_sizes: Mapping[int, Sequence[int]],
+                 final_quest_sizes: Mapping[int, int], roles: Mapping[int, Sequence[Role]],
+                 visibility: Mapping[Role, Iterable[Role]]):
+        if set(quest_sizes) != set(roles) or set(quest_sizes) != set(final_quest_sizes):
+            raise ValueError(f"规则 {name} 的任务人数、最终任务人数和角色配置覆盖的人数不一致")
+        tables = {}
+        for player_count in sorted(quest_sizes):
+            sizes = tuple(quest_sizes[player_count])
+            if len(sizes) != QUEST_COUNT or not all(0 < size <= player_count for size in sizes):
+                raise ValueError(f"规则 {name} 的 {player_count} 人任务人数无效: {list(sizes)}")
+            final_size = final_quest_sizes[player_count]
+            if not 0 < final_size <= player_count:
+                raise ValueError(f"规则 {name} 的 {player_count} 人最终任务人数无效: {final_size}")
+            role_list = tuple(roles[player_count])
+            if len(role_list) != player_count:
+                raise ValueError(f"规则 {name} 的 {player_count} 人角色数量与人数不符")
+            # 只保留本局存在的角色，查表时不需要再过滤
+            present = frozenset(role_list)
+            seen = MappingProxyType({viewer: frozenset(visibility[viewer]) & present
+                                     for viewer in present if viewer in visibility})
+            tables[player_count] = PlayerCountRules(player_count, sizes, final_size, role_list, seen)
+        self.name = name
+        self._tables: Mapping[int, PlayerCountRules] = MappingProxyType(tables)
+
+    @property
+    def player_counts(self) -> Tuple[int, ...]:
+        return tuple(self._tables)
+
+    def for_players(self, player_count: int) -> PlayerCountRules:
+        """获取对应人数的规则表"""
+        table = self._tables.get(player_count)
+        if table is None:
+            raise ValueError(f"不支持 {player_count} 人游戏")
+        return table
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'RuleSet':
+        """从 JSON 结构加载规则变体，角色使用枚举名（例如 MORGAN），人数可以是字符串"""
+        try:
+            return cls(
+                data['name'],
+                {int(k): v for k, v in data['quest_sizes'].items()},
+                {int(k): v for k, v in data['final_quest_sizes'].items()},
+                {int(k): [Role[r] for r in v] for k, v in data['roles'].items()},
+                {Role[k]: [Role[r] for r in v] for k, v in data.get('visibility', {}).items()},
+            )
+        except KeyError as e:
+            raise ValueError(f"规则定义缺少字段或角色不存在: {e}")
+
+
+# 标准规则
+STANDARD_RULES = RuleSet(
+    'standard',
+    quest_sizes={
+        4: [2, 3, 2, 3, 3],
+        5: [2, 3, 2, 3, 3],
+        6: [2, 3, 4, 3, 4],
+        7: [2, 3, 3, 4, 4],
+        8: [3, 4, 4, 5, 5],
+        9: [3, 4, 4, 5, 5],
+        10: [3, 4, 4, 5, 5],
+    },
+    final_quest_sizes={4: 3, 5: 3, 6: 4, 7: 4, 8: 5, 9: 5, 10: 5},
+    roles={
+        4: [Role.LOYAL_SERVANT, Role.LOYAL_SERVANT,
+            Role.MORGAN, Role.PRINCE],
+        5: [Role.LOYAL_SERVANT, Role.LOYAL_SERVANT, Role.LOYAL_SERVANT,
+            Role.MORGAN, Role.PRINCE],
+        6: [Role.LOYAL_SERVANT, Role.LOYAL_SERVANT, Role.LOYAL_SERVANT,
+            Role.MORGAN, Role.SHAPESHIFTER, Role.MORDRED_MINION],
+        7: [Role.LOYAL_SERVANT, Role.LOYAL_SERVANT, Role.LOYAL_SERVANT, Role.DUKE,
+            Role.MORGAN, Role.SHAPESHIFTER, Role.MORDRED_MINION],
+        8: [Role.LOYAL_SERVANT, Role.LOYAL_SERVANT, Role.LOYAL_SERVANT, Role.LOYAL_SERVANT, Role.DUKE,
+            Role.MORGAN, Role.SHAPESHIFTER, Role.MORDRED_MINION],
+        9: [Role.LOYAL_SERVANT, Role.LOYAL_SERVANT, Role.LOYAL_SERVANT, Role.LOYAL_SERVANT, Role.DUKE,
+            Role.GRAND_DUKE, Role.MORGAN, Role.SHAPESHIFTER, Role.MORDRED_MINION],
+        10: [Role.LOYAL_SERVANT, Role.LOYAL_SERVANT, Role.LOYAL_SERVANT, Role.LOYAL_SERVANT, Role.DUKE,
+             Role.GRAND_DUKE, Role.MORGAN, Role.SHAPESHIFTER, Role.MORDRED_MINION, Role.MORDRED_MINION],
+    },
+    visibility={
+        # 摩根勒菲知道所有邪恶方的身份，除了幻形妖
+        Role.MORGAN: [Role.MORGAN, Role.PRINCE, Role.MORDRED_MINION],
+        # 莫德雷德的爪牙可以看到摩根勒菲和王储，不知道幻形妖
+        Role.MORDRED_MINION: [Role.MORGAN, Role.PRINCE],
+        # 王储和幻形妖不知道谁是邪恶方
+    },
+)
+
+# 已加载的规则集：名称 -> RuleSet
+RULE_SETS: Dict[str, RuleSet] = {STANDARD_RULES.name: STANDARD_RULES}
+
+# 标准规则的角色配置（只读），兼容按人数取角色列表的旧代码
+ROLE_CONFIG: Mapping[int, Tuple[Role, ...]] = MappingProxyType(
+    {count: STANDARD_RULES.for_players(count).roles for count in STANDARD_RULES.player_counts})
+
+
+def load_rules(path: str) -> RuleSet:
+    """从 JSON 文件加载规则变体并登记到 RULE_SETS"""
+    with open(path, encoding='utf-8') as f:
+        rules = RuleSet.from_dict(json.load(f))
+    RULE_SETS[rules.name] = rules
+    return rules
+
+
+def get_rules(name: str) -> RuleSet:
+    """按名称获取已加载的规则集"""
+    rules = RULE_SETS.get(name)
+    if rules is None:
+        raise ValueError(f"规则不存在: {name}")
+    return rules
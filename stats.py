@@ -0,0 +1,289 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import hashlib
+import heapq
+import os
+import sqlite3
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+from game import Team
+
+# 参与计数的字段，与 player_stats 表的列一一对应
+COUNTERS = ('games', 'wins', 'good_games', 'good_wins', 'evil_games', 'evil_wins',
+            'quests_led', 'fail_votes')
+
+# 排行榜可用的排序方式
+LEADERBOARDS = ('wins', 'games', 'win_rate', 'quests_led')
+LEADERBOARD_SIZE = 100
+# 胜率排行榜的最少对局数
+MIN_GAMES_FOR_RATE = 5
+# 客户端玩家令牌的长度范围
+TOKEN_LENGTH = (16, 128)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS profile_stats (
+    player_id TEXT PRIMARY KEY,
+    games INTEGER NOT NULL DEFAULT 0,
+    wins INTEGER NOT NULL DEFAULT 0,
+    good_games INTEGER NOT NULL DEFAULT 0,
+    good_wins INTEGER NOT NULL DEFAULT 0,
+    evil_games INTEGER NOT NULL DEFAULT 0,
+    evil_wins INTEGER NOT NULL DEFAULT 0,
+    quests_led INTEGER NOT NULL DEFAULT 0,
+    fail_votes INTEGER NOT NULL DEFAULT 0,
+    updated_at REAL NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS profile_role_stats (
+    player_id TEXT NOT NULL,
+    role TEXT NOT NULL,
+    games INTEGER NOT NULL DEFAULT 0,
+    wins INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (player_id, role)
+);
+"""
+
+
+def profile_id_for(token) -> Optional[str]:
+    """由客户端保存的随机令牌派生公开的档案 id；令牌不合法时返回 None
+
+    房间里的座位名（玩家1、玩家2……）每局都会重复，不能用来累计统计。令牌只在客户端
+    和连接时出现，排行榜和档案路由只暴露它的哈希，别人拿到档案 id 也无法冒用。
+    """
+    if not isinstance(token, str) or not TOKEN_LENGTH[0] <= len(token) <= TOKEN_LENGTH[1]:
+        return None
+    return hashlib.sha256(token.encode()).hexdigest()[:16]
+
+
+def game_deltas(game) -> List[Dict]:
+    """把一局已结束的游戏拆成每个玩家档案的计数增量（机器人和没有档案 id 的玩家不计入）"""
+    led = {}
+    for record in game.quest_history:
+        led[record['leader']] = led.get(record['leader'], 0) + 1
+    deltas = []
+    for player in game.players:
+        player_id = getattr(player, 'profile_id', None)
+        if getattr(player, 'is_bot', False) or player.role is None or player_id is None:
+            continue
+        team = player.role.team
+        won = int(team.value == game.winner)
+        good = team == Team.GOOD
+        deltas.append({
+            'player_id': player_id,
+            'role': player.role.display_name,
+            'games': 1,
+            'wins': won,
+            'good_games': int(good),
+            'good_wins': won if good else 0,
+            'evil_games': int(not good),
+            'evil_wins': 0 if good else won,
+            'quests_led': led.get(player.name, 0),
+            'fail_votes': game.fail_votes_cast.get(player.name, 0),
+        })
+    return deltas
+
+
+class PlayerStatsStore:
+    """持久化的玩家统计
+
+    record() 只把计数增量放入待写队列（不访问数据库），后台线程按 interval 批量
+    在一个事务中写入 SQLite，同时更新内存中的档案和预先排好的排行榜。读取档案和
+    排行榜都只查内存，不随玩家数量增长。
+    """
+
+    def __init__(self, path: str, interval: float = 0.2,
+                 spawn: Optional[Callable] = None, sleep: Callable[[float], None] = time.sleep):
+        self.path = path
+        self.interval = interval
+        self._spawn = spawn
+        self._sleep = sleep
+        self._pending: List[Dict] = []
+        self._lock = threading.Lock()
+        self._db_lock = threading.Lock()
+        self._running = False
+        self._conn = None
+        self._profiles: Dict[str, Dict] = {}
+        self._leaderboards: Dict[str, List[Dict]] = {by: [] for by in LEADERBOARDS}
+        self.batches = 0
+        self.recorded = 0
+
+    def _connect(self):
+        if self._conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.executescript(SCHEMA)
+            self._load()
+        return self._conn
+
+    def _load(self):
+        """启动时把已有统计读入内存"""
+        conn = self._conn
+        columns = ', '.join(COUNTERS)
+        for row in conn.execute(f"SELECT player_id, {columns} FROM profile_stats"):
+            profile = dict(zip(('player_id',) + COUNTERS, row))
+            profile['roles'] = {}
+            self._profiles[row[0]] = profile
+        for player_id, role, games, wins in conn.execute(
+                "SELECT player_id, role, games, wins FROM profile_role_stats"):
+            if player_id in self._profiles:
+                self._profiles[player_id]['roles'][role] = {'games': games, 'wins': wins}
+        self._rank()
+
+    def record(self, game):
+        """记录一局已结束的游戏，实际写入由后台批量完成"""
+        deltas = game_deltas(game)
+        if not deltas:
+            return
+        with self._lock:
+            self._pending.extend(deltas)
+            self.recorded += 1
+            start = self._spawn is not None and not self._running
+            if start:
+                self._running = True
+        if start:
+            self._spawn(self._run)
+
+    def _run(self):
+        """写入线程，没有待写数据时退出，下次记录时重新启动"""
+        while True:
+            self._sleep(self.interval)
+            self.flush()
+            with self._lock:
+                if not self._pending:
+                    self._running = False
+                    return
+
+    def flush(self):
+        """把待写的增量合并后在一个事务中写入"""
+        with self._lock:
+            pending, self._pending = self._pending, []
+        with self._db_lock:
+            conn = self._connect()
+            if not pending:
+                return
+
+            merged: Dict[str, Dict] = {}
+            roles: Dict[tuple, List[int]] = {}
+            for delta in pending:
+                totals = merged.setdefault(delta['player_id'], dict.fromkeys(COUNTERS, 0))
+                for counter in COUNTERS:
+                    totals[counter] += delta[counter]
+                role = roles.setdefault((delta['player_id'], delta['role']), [0, 0])
+                role[0] += 1
+                role[1] += delta['wins']
+
+            now = time.time()
+            columns = ', '.join(COUNTERS)
+            placeholders = ', '.join('?' for _ in COUNTERS)
+            updates = ', '.join(f"{c} = {c} + excluded.{c}" for c in COUNTERS)
+            with conn:
+                conn.executemany(
+                    f"INSERT INTO profile_stats (player_id, {columns}, updated_at) VALUES (?, {placeholders}, ?) "
+                    f"ON CONFLICT(player_id) DO UPDATE SET {updates}, updated_at = excluded.updated_at",
+                    [(player_id, *(totals[c] for c in COUNTERS), now) for player_id, totals in merged.items()])
+                conn.executemany(
+                    "INSERT INTO profile_role_stats (player_id, role, games, wins) VALUES (?, ?, ?, ?) "
+                    "ON CONFLICT(player_id, role) DO UPDATE SET games = games + excluded.games, "
+                    "wins = wins + excluded.wins",
+                    [(player_id, role, games, wins) for (player_id, role), (games, wins) in roles.items()])
+
+            # 每个档案整体替换，读取方拿到的总是完整的旧档案或新档案
+            updated = {}
+            previous = {}
+            for player_id, totals in merged.items():
+                old = previous[player_id] = self._profiles.get(player_id)
+                profile = {'player_id': player_id, 'roles': dict(old['roles']) if old else {}}
+                for counter in COUNTERS:
+                    profile[counter] = (old[counter] if old else 0) + totals[counter]
+                updated[player_id] = profile
+            for (player_id, role), (games, wins) in roles.items():
+                old = updated[player_id]['roles'].get(role, {'games': 0, 'wins': 0})
+                updated[player_id]['roles'][role] = {'games': old['games'] + games, 'wins': old['wins'] + wins}
+            self._profiles.update(updated)
+            self._rank(previous)
+            self.batches += 1
+
+    def _rank(self, changed: Optional[Dict[str, Optional[Dict]]] = None):
+        """更新各排行榜的前 LEADERBOARD_SIZE 名
+
+        changed 是本批变化的档案 id 到变化前档案（新档案为 None）的映射，为 None 时
+        扫描全部档案。计数只增不减，按胜场、对局数和带队次数排序时，榜外又没有变化的
+        档案不可能超过榜上的档案，只需在当前榜单和变化的档案中重新取前几名。胜率会下降：
+        满员的胜率榜上有人胜率下降时，榜外的档案可能补进来，这时才扫描全部档案。
+        """
+        leaderboards = {}
+        for by in LEADERBOARDS:
+            if by == 'win_rate':
+                key = lambda p: (p['wins'] / p['games'], p['games'])
+                eligible = lambda p: p['games'] >= MIN_GAMES_FOR_RATE
+            else:
+                key = lambda p, by=by: (p[by], p['games'])
+                eligible = lambda p: True
+            board = self._leaderboards[by]
+            listed = [summary['player_id'] for summary in board]
+            if changed is None or (by == 'win_rate' and len(board) == LEADERBOARD_SIZE
+                                   and self._rate_dropped(listed, changed, key)):
+                candidates = self._profiles.keys()
+            else:
+                candidates = set(listed).union(changed)
+            top = heapq.nlargest(LEADERBOARD_SIZE, (self._profiles[player_id] for player_id in candidates
+                                                    if eligible(self._profiles[player_id])), key=key)
+            # 没有变化的档案沿用榜上已有的摘要
+            summaries = {summary['player_id']: summary for summary in board}
+            leaderboards[by] = [
+                self._summary(p) if changed is None or p['player_id'] in changed or p['player_id'] not in summaries
+                else summaries[p['player_id']] for p in top]
+        self._leaderboards = leaderboards
+
+    def _rate_dropped(self, listed: List[str], changed: Dict[str, Optional[Dict]], key) -> bool:
+        """榜上是否有档案的胜率比变化前低"""
+        return any(key(self._profiles[player_id]) < key(changed[player_id])
+                   for player_id in listed if player_id in changed)
+
+    @staticmethod
+    def _summary(profile: Dict) -> Dict:
+        summary = {key: profile[key] for key in ('player_id',) + COUNTERS}
+        summary['win_rate'] = round(profile['wins'] / profile['games'], 4) if profile['games'] else 0.0
+        return summary
+
+    def profile(self, player_id: str) -> Optional[Dict]:
+        """玩家档案（含各角色的对局数和胜场）"""
+        if self._conn is None:
+            with self._db_lock:
+                self._connect()
+        profile = self._profiles.get(player_id)
+        if profile is None:
+            return None
+        summary = self._summary(profile)
+        summary['roles'] = {role: dict(stats) for role, stats in profile['roles'].items()}
+        return summary
+
+    def leaderboard(self, by: str = 'wins', limit: int = 10) -> List[Dict]:
+        """排行榜"""
+        if by not in LEADERBOARDS:
+            raise ValueError(f"不支持的排行方式: {by}")
+        if self._conn is None:
+            with self._db_lock:
+                self._connect()
+        return self._leaderboards[by][:max(0, min(limit, LEADERBOARD_SIZE))]
+
+    def stats(self) -> Dict:
+        """统计服务的运行指标"""
+        return {
+            'players': len(self._profiles),
+            'recorded_games': self.recorded,
+            'pending': len(self._pending),
+            'batches': self.batches,
+        }
+
+    def close(self):
+        """写入剩余数据并关闭数据库"""
+        self.flush()
+        with self._db_lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
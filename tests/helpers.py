@@ -0,0 +1,43 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""测试共用的设置
+
+在任何测试导入 app 之前，把 app 模块级的存储（归档、回放、玩家统计、分析事件、追踪等）指向临时目录，测试运行不会
+写入真实的 data/ 目录；进程退出时关闭这些存储并删除临时目录。导入 app 的测试文件
+都应先导入本模块。另外提供由机器人打完一局等测试共用的小工具。
+"""
+
+import atexit
+import contextlib
+import os
+import shutil
+import sys
+import tempfile
+
+DATA_DIR = tempfile.mkdtemp(prefix='awalong-tests-')
+
+os.environ['ARCHIVE_DIR'] = os.path.join(DATA_DIR, 'archive')
+os.environ['REPLAY_DIR'] = os.path.join(DATA_DIR, 'replays')
+os.environ['EVENTS_FILE'] = os.path.join(DATA_DIR, 'events', 'events.ndjson')
+os.environ['STATS_DB'] = os.path.join(DATA_DIR, 'stats.sqlite3')
+os.environ['TRACE_FILE'] = os.path.join(DATA_DIR, 'traces', 'actions.json')
+
+DEVNULL = open(os.devnull, 'w')
+
+
+def quiet():
+    """屏蔽游戏和 app 的调试输出"""
+    return contextlib.redirect_stdout(DEVNULL)
+
+
+@atexit.register
+def _cleanup():
+    app = sys.modules.get('app')
+    if app is not None:
+        app.archive.flush()
+        app.replays.flush()
+        app.player_stats.close()
+        app.events.close()
+        app.tracer.close()
+    shutil.rmtree(DATA_DIR, ignore_errors=True)
+    DEVNULL.close()
@@ -0,0 +1,132 @@
+import unittest
+import random
+import shutil
+import sys
+import os
+import tempfile
+
+# 添加项目根目录到 Python 路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tests.helpers import quiet
+
+import archive
+from archive import GameArchive
+from bots import play_out
+from game import Game, Player, Team
+
+
+def play_game(player_count, rng):
+    """由机器人决策打完一局"""
+    players = [Player(f"归档玩家{i}") for i in range(1, player_count + 1)]
+    game = Game(players, player_count)
+    play_out(game, rng)
+    return game if game.is_game_over() else None
+
+
+@unittest.skipUnless(archive.AVAILABLE, "未安装 numpy")
+class TestGameArchive(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        with quiet():
+            rng = random.Random(7)
+            cls.games = [g for g in (play_game(rng.choice([5, 7, 10]), rng) for _ in range(40)) if g]
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.archive = GameArchive(self.path, flush_every=16)
+        for game in self.games:
+            self.assertTrue(self.archive.append(game))
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def test_win_rates_by_player_count(self):
+        """测试按人数统计的胜率与逐局计算一致（含未写入磁盘的缓冲）"""
+        rates = self.archive.query('player_count')
+        for count in (5, 7, 10):
+            games = [g for g in self.games if g.player_count == count]
+            good = sum(1 for g in games if g.winner == 'GOOD')
+            self.assertEqual(rates[count]['count'], len(games))
+            self.assertEqual(rates[count]['wins'], good)
+        self.assertEqual(len(self.archive), len(self.games))
+
+    def test_role_win_rates(self):
+        """测试按角色统计的胜率"""
+        rates = self.archive.query('role', player_count=7)
+        expected = {}
+        for game in self.games:
+            if game.player_count != 7:
+                continue
+            for player in game.players:
+                entry = expected.setdefault(player.role.display_name, [0, 0])
+                entry[0] += 1
+                entry[1] += player.role.team.value == game.winner
+        self.assertEqual({name: [r['count'], r['wins']] for name, r in rates.items()}, expected)
+
+    def test_quest_and_magic_rates(self):
+        """测试按任务轮次和魔法指示物统计"""
+        quests = self.archive.query('quest')
+        total = sum(len(g.quest_history) for g in self.games)
+        self.assertEqual(sum(r['count'] for r in quests.values()), total)
+        self.assertEqual(quests[1]['count'], len(self.games))
+
+        magic = self.archive.query('magic')
+        self.assertEqual(sum(r['count'] for r in magic['quests'].values()), total)
+        seats = sum(len(g.players) for g in self.games)
+        self.assertEqual(sum(r['count'] for r in magic['players'].values()), seats)
+
+    def test_reopen_and_truncated_column(self):
+        """测试重新打开归档时把写了一半的列截断，之后追加的对局与其他列对齐"""
+        self.archive.flush()
+        winner_path = os.path.join(self.path, 'games', 'winner.bin')
+        with open(winner_path, 'ab') as f:
+            f.write(b'\x00')
+        with open(os.path.join(self.path, 'seats', 'role.bin'), 'ab') as f:
+            f.write(b'\x00\x00\x00')
+        reopened = GameArchive(self.path, flush_every=1)
+        with quiet():
+            self.assertEqual(len(reopened), len(self.games))
+        self.assertEqual(os.path.getsize(winner_path), len(self.games))
+        self.assertEqual(reopened.query('player_count'), self.archive.query('player_count'))
+
+        self.assertTrue(reopened.append(self.games[0]))
+        self.assertEqual(os.path.getsize(winner_path), len(self.games) + 1)
+        seats = reopened.columns('seats')
+        self.assertEqual(len(seats['role']), len(seats['game']))
+        self.assertEqual(int(seats['game'][-1]), len(self.games))
+        self.assertEqual(reopened.query('role'), GameArchive(self.path).query('role'))
+
+    def test_background_writer(self):
+        """测试提供 spawn 时 append() 不写磁盘，由后台任务批量写入后退出"""
+        path = tempfile.mkdtemp()
+        try:
+            spawned = []
+            background = GameArchive(path, flush_every=1, spawn=spawned.append, sleep=lambda seconds: None)
+            for game in self.games[:3]:
+                background.append(game)
+            self.assertEqual(len(spawned), 1)
+            self.assertFalse(os.path.exists(os.path.join(path, 'games')))
+            self.assertEqual(len(background), 3)
+            spawned[0]()
+            self.assertEqual(os.path.getsize(os.path.join(path, 'games', 'winner.bin')), 3)
+            background.append(self.games[3])
+            self.assertEqual(len(spawned), 2)
+            self.assertEqual(len(GameArchive(path)), 3)
+            self.assertEqual(len(background), 4)
+        finally:
+            shutil.rmtree(path)
+
+    def test_unfinished_game_not_archived(self):
+        """测试未结束的对局不归档"""
+        game = Game([Player(f"归档玩家{i}") for i in range(1, 6)], 5)
+        self.assertFalse(self.archive.append(game))
+
+    def test_invalid_query(self):
+        """测试不支持的统计维度"""
+        with self.assertRaises(ValueError):
+            self.archive.query('color')
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,172 @@
+import unittest
+import random
+import sys
+import os
+
+# 添加项目根目录到 Python 路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tests.helpers import quiet  # 在导入 app 之前把数据目录指向临时目录
+
+from game import Game, GameAction, GamePhase, Player
+from ratelimit import RateLimiter
+from stats import profile_id_for
+
+
+def token_of(name):
+    """测试座位的玩家令牌"""
+    return f"token-of-{name}-0123456789"
+
+
+def quest_batch(game, success=True):
+    """当前队长提交队伍、队员全部投票的一批动作"""
+    leader = game.players[game.current_leader_index]
+    team = [p.name for p in game.players[:game.current_quest.required_players]]
+    actions = [(GameAction.SUBMIT_TEAM, leader.name, {'team': team, 'magic_token_target': None})]
+    actions += [(GameAction.SUBMIT_QUEST_VOTE, name, {'success': success}) for name in team]
+    return actions
+
+
+class TestDispatchBatch(unittest.TestCase):
+    def setUp(self):
+        random.seed(11)
+        with quiet():
+            self.game = Game([Player(f"玩家{i}") for i in range(1, 6)], 5)
+
+    def test_batch_applies_in_order(self):
+        """测试一批动作按顺序执行，版本号按动作数递增"""
+        actions = quest_batch(self.game)
+        with quiet():
+            results = self.game.dispatch_batch(actions)
+        self.assertEqual(len(results), len(actions))
+        self.assertEqual(self.game.version, len(actions))
+        self.assertEqual(len(self.game.quest_results), 1)
+        self.assertEqual(results[-1].event, 'quest_result')
+        self.assertEqual([entry['action'] for entry in self.game.action_log],
+                         [action.value for action, _, _ in actions])
+
+    def test_failed_batch_leaves_game_unchanged(self):
+        """测试任何一个动作失败时整批都不执行"""
+        actions = quest_batch(self.game)
+        actions.append((GameAction.SUBMIT_QUEST_VOTE, actions[1][1], {'success': True}))
+        with quiet(), self.assertRaises(ValueError) as caught:
+            self.game.dispatch_batch(actions)
+        self.assertIn(f'第 {len(actions)} 个动作', str(caught.exception))
+        self.assertEqual(self.game.version, 0)
+        self.assertEqual(self.game.current_phase, GamePhase.LEADER_TURN)
+        self.assertEqual(self.game.current_quest.team, [])
+        self.assertEqual(len(self.game.action_log), 0)
+        self.assertTrue(all(p.magic_tokens == 0 for p in self.game.players))
+
+    def test_version_survives_rematch(self):
+        """测试再来一局后版本号接着递增"""
+        with quiet():
+            self.game.dispatch_batch(quest_batch(self.game))
+            version = self.game.version
+            self.game.current_phase = GamePhase.GAME_OVER
+            self.game.rematch()
+            self.game.dispatch_batch(quest_batch(self.game)[:1])
+        self.assertEqual(self.game.version, version + 1)
+        self.assertEqual(self.game.match_number, 2)
+
+
+class TestBatchHTTP(unittest.TestCase):
+    def setUp(self):
+        import app
+        self.app = app
+        random.seed(4)
+        with quiet():
+            self.room = app.Room('玩家1', 5)
+            for number in range(2, 6):
+                self.room.add_player(f"玩家{number}")
+            for player in self.room.players:
+                player.profile_id = profile_id_for(token_of(player.name))
+            app.register_room(self.room)
+            self.room.start_game()
+        self.client = app.app.test_client()
+        self.url = f'/rooms/{self.room.code}/actions'
+        self.tokens = ','.join(token_of(p.name) for p in self.room.players)
+        self.ip_limiter = app.ip_limiter
+
+    def tearDown(self):
+        self.app.ip_limiter = self.ip_limiter
+        self.app.rooms.pop(self.room.code, None)
+
+    def post(self, actions, tokens=None, **extra):
+        body = {'actions': [{'action': action.value, 'player_name': player, **payload}
+                            for action, player, payload in actions], **extra}
+        with quiet():
+            return self.client.post(self.url, json=body,
+                                    headers={'X-Player-Token': self.tokens if tokens is None else tokens})
+
+    def test_batch_request(self):
+        """测试一次请求完成组队和全部投票，返回版本号、每个动作的回复和最新状态"""
+        game = self.room.game
+        actions = quest_batch(game)
+        response = self.post(actions, expected_version=0)
+        self.assertEqual(response.status_code, 200)
+        body = response.get_json()
+        self.assertTrue(body['success'])
+        self.assertEqual(body['version'], game.version)
+        self.assertEqual(len(body['results']), len(actions))
+        self.assertEqual(body['game_state']['quest_results'], [True])
+        self.assertIs(self.room.game, game)
+
+        unchanged = self.client.get(f'/rooms/{self.room.code}/state?since={game.version}').get_json()
+        self.assertEqual(unchanged, {'success': True, 'version': game.version, 'changed': False})
+        with quiet():
+            state = self.client.get(f'/rooms/{self.room.code}/state?since=0').get_json()
+        self.assertTrue(state['changed'])
+        self.assertEqual(state['game_state']['quest_number'], 2)
+
+    def test_rejected_batches(self):
+        """测试版本号过期返回 409，非法动作返回 400，两者都不修改游戏"""
+        game = self.room.game
+        stale = self.post(quest_batch(game), expected_version=3)
+        self.assertEqual(stale.status_code, 409)
+        self.assertEqual(stale.get_json()['version'], 0)
+
+        bad = quest_batch(game)
+        bad[-1] = (GameAction.SUBMIT_QUEST_VOTE, game.players[-1].name, {'success': True})
+        invalid = self.post(bad)
+        self.assertEqual(invalid.status_code, 400)
+        self.assertIn(f'第 {len(bad)} 个动作', invalid.get_json()['error'])
+
+        team = quest_batch(game)[0][2]
+        anonymous = self.client.post(self.url, json={'actions': [{'action': 'submit_team', **team}]},
+                                     headers={'X-Player-Token': self.tokens})
+        self.assertEqual(anonymous.status_code, 403)
+
+        unknown = self.client.post(self.url, json={'actions': [{'action': 'start_game'}]})
+        self.assertEqual(unknown.status_code, 400)
+        self.assertEqual(self.client.post(self.url, json={'actions': []}).status_code, 400)
+        self.assertEqual(self.client.post('/rooms/0000/actions', json={'actions': [
+            {'action': 'use_amulet', 'player_name': '玩家1', 'target': '玩家2'}]}).status_code, 404)
+        self.assertEqual(game.version, 0)
+        self.assertEqual(len(game.action_log), 0)
+
+    def test_seat_credentials(self):
+        """测试只能操作令牌拥有的座位，护身符查验结果只返回给使用者"""
+        game = self.room.game
+        amulet = [(GameAction.USE_AMULET, '玩家2', {'target': '玩家3'})]
+        self.assertEqual(self.post(amulet, tokens='').status_code, 403)
+        self.assertEqual(self.post(amulet, tokens=token_of('玩家3')).status_code, 403)
+        mixed = self.post(quest_batch(game), tokens=token_of(game.get_current_leader().name))
+        self.assertEqual(mixed.status_code, 403)
+        self.assertEqual(game.version, 0)
+
+        response = self.post(amulet, tokens=token_of('玩家2'))
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(response.get_json()['results'][0]['revealed_team'], ('GOOD', 'EVIL'))
+
+    def test_ip_rate_limit(self):
+        """测试 HTTP 批量动作与 Socket 事件共用按 IP 的限流"""
+        self.app.ip_limiter = RateLimiter(rate=0.001, burst=1)
+        self.assertEqual(self.post(quest_batch(self.room.game)[:1]).status_code, 200)
+        throttled = self.post(quest_batch(self.room.game)[:1])
+        self.assertEqual(throttled.status_code, 429)
+        self.assertGreaterEqual(self.app.throttled_events['http_actions'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,109 @@
+import unittest
+import sys
+import os
+from itertools import permutations
+from math import comb
+
+# 添加项目根目录到 Python 路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from beliefs import BeliefModel, RoleBeliefs
+from game import ROLE_CONFIG, Game, Player, Role, Team
+
+
+def brute_force(player_count, observations, fail_rate):
+    """枚举全部角色排列求每个座位属于邪恶阵营的概率"""
+    totals = [0.0] * player_count
+    weight_sum = 0.0
+    for roles in set(permutations(ROLE_CONFIG[player_count])):
+        weight = 1.0
+        for team, fail_count, magic in observations:
+            can_fail = sum(1 for seat in team if roles[seat].team == Team.EVIL
+                           and (seat not in magic or roles[seat] == Role.MORGAN))
+            if fail_count > can_fail:
+                weight = 0.0
+                break
+            weight *= comb(can_fail, fail_count) * fail_rate ** fail_count * \
+                (1 - fail_rate) ** (can_fail - fail_count)
+        weight_sum += weight
+        for seat, role in enumerate(roles):
+            if role.team == Team.EVIL:
+                totals[seat] += weight
+    return [total / weight_sum for total in totals]
+
+
+class TestRoleBeliefs(unittest.TestCase):
+    def names(self, count):
+        return [f"玩家{i}" for i in range(1, count + 1)]
+
+    def test_hypothesis_count(self):
+        """测试假设数量为邪恶座位组合数乘以摩根勒菲的位置数"""
+        self.assertEqual(len(BeliefModel.get(10)), comb(10, 4) * 4)
+        self.assertEqual(len(BeliefModel.get(5)), comb(5, 2) * 2)
+
+    def test_prior(self):
+        """测试没有观察时每个座位的概率等于邪恶人数占比"""
+        beliefs = RoleBeliefs(self.names(7))
+        for probability in beliefs.marginals().values():
+            self.assertAlmostEqual(probability, 3 / 7)
+
+    def test_matches_brute_force(self):
+        """测试与枚举全部角色排列的结果一致（含魔法指示物）"""
+        names = self.names(6)
+        observations = [((0, 1), 1, (0,)), ((1, 2, 3), 0, ()), ((0, 4, 5), 2, (4,))]
+        beliefs = RoleBeliefs(names, fail_rate=0.6)
+        for team, fail_count, magic in observations:
+            beliefs.observe_quest([names[s] for s in team], fail_count, [names[s] for s in magic])
+        expected = brute_force(6, observations, 0.6)
+        for name, probability in zip(names, expected):
+            self.assertAlmostEqual(beliefs.evil_probability(name), probability)
+
+    def test_certain_evil(self):
+        """测试失败票数等于队伍人数时队员必为邪恶"""
+        names = self.names(5)
+        beliefs = RoleBeliefs(names)
+        beliefs.observe_quest(names[:2], 2)
+        self.assertAlmostEqual(beliefs.evil_probability(names[0]), 1.0)
+        self.assertAlmostEqual(beliefs.evil_probability(names[4]), 0.0)
+        self.assertEqual(beliefs.most_likely_evil()[:2], names[:2])
+
+    def test_magic_holder_must_be_morgan(self):
+        """测试持有魔法指示物的队员出失败牌时只能是摩根勒菲"""
+        names = self.names(5)
+        beliefs = RoleBeliefs(names)
+        beliefs.observe_quest(names[:1] + names[1:2], 2, magic_holders=names[:2])
+        self.assertEqual(beliefs.inconsistent, 1)
+        beliefs.observe_quest(names[:1], 1, magic_holders=names[:1])
+        self.assertAlmostEqual(beliefs.evil_probability(names[0]), 1.0)
+
+    def test_known_good(self):
+        """测试已知自己是正义时其他座位的条件概率"""
+        names = self.names(5)
+        beliefs = RoleBeliefs(names)
+        suspicion = beliefs.marginals(known_good=names[0])
+        self.assertEqual(suspicion[names[0]], 0.0)
+        self.assertAlmostEqual(suspicion[names[1]], 2 / 4)
+
+    def test_sync_with_game(self):
+        """测试增量读入对局的任务历史并复用似然缓存"""
+        players = [Player(name) for name in self.names(5)]
+        game = Game(players, 5)
+        leader = game.get_current_leader()
+        team = [p.name for p in players[:2]]
+        game.submit_team(team, None, leader.name)
+        for player in players[:2]:
+            game.submit_quest_result(player, player.team == Team.GOOD)
+
+        beliefs = RoleBeliefs.for_game(game)
+        self.assertEqual(beliefs.observed, 1)
+        beliefs.sync(game)
+        self.assertEqual(beliefs.observed, 1)
+
+        model = beliefs.model
+        hits = model.cache_hits
+        RoleBeliefs.for_game(game)
+        self.assertEqual(model.cache_hits, hits + 1)
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,157 @@
+import unittest
+import random
+import sys
+import os
+import time
+
+# 添加项目根目录到 Python 路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tests.helpers import quiet  # 在导入 app 之前把数据目录指向临时目录
+
+from bots import BotDriver, decide, next_move, play_out
+from game import Game, GameAction, GamePhase, Player, Team
+from app import app, rooms, lobby, socketio, Room, bot_act
+
+
+def wait_until(condition, timeout=3.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.01)
+    return condition()
+
+
+class TestBotDecisions(unittest.TestCase):
+    def setUp(self):
+        self.players = [Player(f"机器人{i}") for i in range(1, 6)]
+        self.game = Game(self.players, 5)
+        self.rng = random.Random(0)
+
+    def test_leader_submits_valid_team(self):
+        """测试机器人队长提交人数正确、包含自己的队伍"""
+        leader = self.game.players[self.game.current_leader_index]
+        action, payload = decide(self.game, leader.name, self.rng)
+        self.assertEqual(action, GameAction.SUBMIT_TEAM)
+        self.assertEqual(len(payload['team']), self.game.current_quest.required_players)
+        self.assertIn(leader.name, payload['team'])
+        self.assertIn(payload['magic_token_target'], payload['team'])
+        self.game.submit_team(payload['team'], payload['magic_token_target'], leader.name)
+
+    def test_only_active_bots_act(self):
+        """测试不需要行动的机器人不做动作"""
+        leader = self.game.players[self.game.current_leader_index]
+        others = [p for p in self.players if p is not leader]
+        self.assertIsNone(decide(self.game, others[0].name, self.rng))
+
+        self.game.submit_team([others[0].name, others[1].name], None, leader.name)
+        self.assertIsNone(decide(self.game, leader.name, self.rng))
+        action, payload = decide(self.game, others[0].name, self.rng)
+        self.assertEqual(action, GameAction.SUBMIT_QUEST_VOTE)
+        if others[0].team == Team.GOOD:
+            self.assertTrue(payload['success'])
+
+
+    def test_play_out(self):
+        """测试 play_out 按步数执行、经过 dispatch 提交，并能打完一局"""
+        moves = []
+
+        def dispatch(player_name, action, payload):
+            moves.append(action)
+            self.game.dispatch(action, player_name, **payload)
+
+        self.assertEqual(play_out(self.game, self.rng, steps=3, dispatch=dispatch), 3)
+        self.assertEqual(moves[0], GameAction.SUBMIT_TEAM)
+        self.assertEqual(len(self.game.action_log), 3)
+        play_out(self.game, self.rng)
+        self.assertEqual(self.game.current_phase, GamePhase.GAME_OVER)
+        self.assertIsNone(next_move(self.game, self.rng))
+        self.assertEqual(play_out(self.game, self.rng), 0)
+
+
+class TestBotDriver(unittest.TestCase):
+    def tearDown(self):
+        rooms.clear()
+        lobby.clear()
+
+    def test_bot_room_plays_to_completion(self):
+        """测试全机器人房间在线程池中自动打完一局"""
+        driver = BotDriver(bot_act, max_workers=2, seed=1)
+        try:
+            room = Room("机器人1", 5)
+            room.bots.append("机器人1")
+            room.players[0].is_bot = True
+            room.fill_with_bots()
+            room.start_game()
+            driver.schedule(room)
+            self.assertTrue(wait_until(lambda: room.game.current_phase == GamePhase.GAME_OVER))
+            self.assertIn(room.game.winner, ('GOOD', 'EVIL'))
+            self.assertGreater(driver.stats()['actions'], 0)
+            self.assertEqual(driver.stats()['errors'], 0)
+        finally:
+            driver.shutdown()
+
+    def test_failed_action_is_retried(self):
+        """测试机器人动作出错后退避重试，房间不会停住"""
+        failures = []
+
+        def flaky_act(room, bot_name, action, payload):
+            if len(failures) < 2:
+                failures.append(action)
+                raise RuntimeError("临时故障")
+            bot_act(room, bot_name, action, payload)
+
+        driver = BotDriver(flaky_act, max_workers=2, seed=1, retry_delay=0.01)
+        try:
+            room = Room("机器人1", 5)
+            room.bots.append("机器人1")
+            room.players[0].is_bot = True
+            room.fill_with_bots()
+            room.start_game()
+            with quiet():
+                driver.schedule(room)
+                self.assertTrue(wait_until(lambda: room.game.current_phase == GamePhase.GAME_OVER))
+            stats = driver.stats()
+            self.assertEqual(stats['errors'], 2)
+            self.assertEqual(stats['retries'], 2)
+        finally:
+            driver.shutdown()
+
+    def test_human_room_with_bots(self):
+        """测试房主补满机器人后，机器人队员自动投票"""
+        host = socketio.test_client(app)
+        try:
+            ack = host.emit('create_room', {'player_count': 5}, callback=True)
+            code = ack['room_info']['code']
+            ack = host.emit('add_bots', {'room_code': code, 'player_name': '玩家1'}, callback=True)
+            self.assertEqual(sum(p['is_bot'] for p in ack['room_info']['players']), 4)
+            self.assertNotIn(code, lobby)
+            self.assertTrue(host.emit('start_game', {'room_code': code, 'player_name': '玩家1'},
+                                      callback=True)['success'])
+
+            ack = host.emit('submit_team', {'room_code': code, 'player_name': '玩家1',
+                                            'team': ['机器人2', '机器人3']}, callback=True)
+            self.assertTrue(ack['success'])
+            room = rooms[code]
+            self.assertTrue(wait_until(lambda: room.game.quest_number == 2))
+            socketio.sleep(0.1)
+            events = [m['name'] for m in host.get_received()]
+            self.assertIn('quest_result', events)
+        finally:
+            host.disconnect()
+
+    def test_add_bots_host_only(self):
+        """测试只有房主可以添加机器人"""
+        client = socketio.test_client(app)
+        try:
+            ack = client.emit('create_room', {'player_count': 5}, callback=True)
+            ack = client.emit('add_bots', {'room_code': ack['room_info']['code'],
+                                           'player_name': '玩家2'}, callback=True)
+            self.assertIn('error', ack)
+        finally:
+            client.disconnect()
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,75 @@
+import unittest
+import sys
+import os
+
+# 添加项目根目录到 Python 路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from broadcast import BroadcastCoalescer
+
+
+class TestBroadcastCoalescer(unittest.TestCase):
+    def setUp(self):
+        self.sent = []
+        self.scheduled = []
+        self.state = {'version': 0}
+        self.coalescer = BroadcastCoalescer(
+            lambda event, payload, room: self.sent.append((room, event, payload)),
+            window_ms=20,
+            spawn=lambda target, room: self.scheduled.append(room))
+
+    def publish(self, event, room='1234', extra=None):
+        self.state['version'] += 1
+        self.coalescer.publish(room, event, lambda: {'game_state': dict(self.state)}, extra)
+
+    def test_updates_merged_within_window(self):
+        """测试窗口内的多次 game_update 只发送一次最新状态"""
+        for _ in range(4):
+            self.publish('game_update')
+        self.assertEqual(self.sent, [])
+        self.assertEqual(self.scheduled, ['1234'])
+
+        self.coalescer.flush('1234')
+        self.assertEqual(len(self.sent), 1)
+        self.assertEqual(self.sent[0][2]['game_state']['version'], 4)
+        stats = self.coalescer.stats()
+        self.assertEqual((stats['requested'], stats['sent'], stats['saved']), (4, 1, 3))
+
+    def test_only_latest_extras_kept(self):
+        """测试合并时只保留最近一次更新的附加字段"""
+        self.publish('game_update', extra={'next_leader': '玩家2'})
+        self.publish('game_update', extra={'next_leader': '玩家3'})
+        self.coalescer.flush()
+        self.assertEqual(self.sent[0][2]['next_leader'], '玩家3')
+
+        self.publish('game_update', extra={'next_leader': '玩家4'})
+        self.publish('game_update')
+        self.coalescer.flush()
+        self.assertNotIn('next_leader', self.sent[1][2])
+
+    def test_discrete_event_supersedes_pending_update(self):
+        """测试离散事件立即发送并取代等待中的 game_update"""
+        self.publish('game_update')
+        self.publish('quest_result', extra={'success': True})
+        self.assertEqual([event for _, event, _ in self.sent], ['quest_result'])
+        self.coalescer.flush('1234')
+        self.assertEqual(len(self.sent), 1)
+        self.assertEqual(self.coalescer.stats()['saved'], 1)
+
+    def test_rooms_independent(self):
+        """测试不同房间分别合并"""
+        self.publish('game_update', room='A')
+        self.publish('game_update', room='B')
+        self.coalescer.flush()
+        self.assertEqual(sorted(room for room, _, _ in self.sent), ['A', 'B'])
+
+    def test_zero_window_disables_coalescing(self):
+        """测试窗口为 0 时直接发送"""
+        self.coalescer.window = 0
+        self.publish('game_update')
+        self.publish('game_update')
+        self.assertEqual(len(self.sent), 2)
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
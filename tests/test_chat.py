@@ -0,0 +1,134 @@
+import unittest
+import json
+import sys
+import os
+
+# 添加项目根目录到 Python 路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tests.helpers import quiet  # 在导入 app 之前把数据目录指向临时目录
+
+from chat import ChatHistory
+from ratelimit import RateLimiter
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestChatHistory(unittest.TestCase):
+    def test_ring_buffer_keeps_latest(self):
+        """测试只保留最近的消息，id 连续递增"""
+        chat = ChatHistory(capacity=3)
+        for number in range(5):
+            chat.append('玩家1', f"消息{number}")
+        self.assertEqual(len(chat), 3)
+        self.assertEqual([m['text'] for m in chat.tail()], ['消息2', '消息3', '消息4'])
+        self.assertEqual([m['id'] for m in chat.tail(since=4)], [5])
+
+    def test_validation(self):
+        """测试空消息和超长消息被拒绝，首尾空白被去掉"""
+        chat = ChatHistory(max_length=5)
+        for text in ('', '   ', None, '太长了太长了'):
+            with self.assertRaises(ValueError):
+                chat.append('玩家1', text)
+        self.assertEqual(chat.append('玩家1', ' 你好 ')['text'], '你好')
+        self.assertEqual(len(chat), 1)
+
+    def test_load_continues_ids(self):
+        """测试恢复交接前的消息后 id 接着递增"""
+        original = ChatHistory()
+        original.append('玩家1', '第一条')
+        original.append('玩家2', '第二条')
+        restored = ChatHistory()
+        restored.load(json.loads(json.dumps(original.tail())))
+        self.assertEqual(restored.tail(), original.tail())
+        self.assertEqual(restored.append('玩家1', '第三条')['id'], 3)
+
+
+class TestRateLimiter(unittest.TestCase):
+    def test_burst_then_refill(self):
+        """测试突发用完后被限流，按速率补充令牌"""
+        clock = FakeClock()
+        limiter = RateLimiter(rate=2, burst=3, clock=clock)
+        self.assertEqual([limiter.allow('a') for _ in range(4)], [True, True, True, False])
+        self.assertAlmostEqual(limiter.retry_after('a'), 0.5)
+        self.assertTrue(limiter.allow('b'))
+        clock.now += 0.5
+        self.assertTrue(limiter.allow('a'))
+        self.assertFalse(limiter.allow('a'))
+        clock.now += 60
+        self.assertEqual(sum(limiter.allow('a') for _ in range(5)), 3)
+        self.assertEqual(limiter.stats()['throttled'], 4)
+
+    def test_idle_buckets_are_pruned(self):
+        """测试键的数量达到阈值时清理已经补满的桶"""
+        clock = FakeClock()
+        limiter = RateLimiter(rate=1, burst=2, clock=clock, prune_threshold=10)
+        for number in range(10):
+            limiter.allow(number)
+        clock.now += 5
+        limiter.allow('active')
+        limiter.allow('new')
+        self.assertEqual(len(limiter), 2)
+
+    def test_disabled(self):
+        """测试速率为 0 时不限流"""
+        limiter = RateLimiter(rate=0, burst=1)
+        self.assertTrue(all(limiter.allow('a') for _ in range(10)))
+        self.assertEqual(len(limiter), 0)
+
+
+class TestRoomChat(unittest.TestCase):
+    def setUp(self):
+        import app
+        self.app = app
+        self.original = app.chat_limiter
+        app.chat_limiter = RateLimiter(rate=1, burst=3)
+        self.clients = [app.socketio.test_client(app.app) for _ in range(3)]
+        self.code = None
+
+    def tearDown(self):
+        for client in self.clients:
+            client.disconnect()
+        self.app.chat_limiter = self.original
+        if self.code:
+            self.app.rooms.pop(self.code, None)
+            self.app.lobby.remove(self.code)
+
+    def test_chat_broadcast_history_and_limit(self):
+        """测试聊天广播给房间、后加入的玩家收到历史、发送过快被限流"""
+        host, guest, late = self.clients
+        with quiet():
+            self.code = host.emit('create_room', {'player_count': 5}, callback=True)['room_info']['code']
+            guest.emit('join_room', {'room_code': self.code}, callback=True)
+            host.get_received()
+            replies = [host.emit('chat_message', {'room_code': self.code, 'player_name': '玩家1',
+                                                  'text': f"第{number}条"}, callback=True)
+                       for number in range(4)]
+            empty = guest.emit('chat_message', {'room_code': self.code, 'player_name': '玩家2', 'text': ' '},
+                               callback=True)
+            stranger = guest.emit('chat_message', {'room_code': self.code, 'player_name': '路人', 'text': '嗨'},
+                                  callback=True)
+            received = [m['args'][0] for m in guest.get_received() if m['name'] == 'chat_message']
+            joined = late.emit('join_room', {'room_code': self.code}, callback=True)
+        self.assertTrue(all(reply['success'] for reply in replies[:3]))
+        self.assertIn('error', replies[3])
+        self.assertGreater(replies[3]['retry_after'], 0)
+        self.assertIn('error', empty)
+        self.assertIn('error', stranger)
+        self.assertEqual([m['text'] for m in received], ['第0条', '第1条', '第2条'])
+        self.assertEqual(joined['chat'], received)
+
+        room = self.app.rooms[self.code]
+        with quiet():
+            restored = self.app.Room.restore(json.loads(json.dumps(room.snapshot(), ensure_ascii=False)))
+        self.assertEqual(restored.chat.tail(), received)
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,139 @@
+import unittest
+import json
+import random
+import shutil
+import sys
+import os
+import tempfile
+import threading
+
+# 添加项目根目录到 Python 路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tests.helpers import quiet  # 在导入 app 之前把数据目录指向临时目录
+
+from bots import decide
+from events import EventExporter
+from stats import profile_id_for
+
+
+def read_events(path):
+    with open(path, encoding='utf-8') as f:
+        return [json.loads(line) for line in f]
+
+
+class TestEventExporter(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'events', 'events.ndjson')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_ring_buffer_drops_oldest(self):
+        """测试缓冲区满时丢弃最旧的事件并计数，seq 留下缺口"""
+        exporter = EventExporter(self.path, capacity=3)
+        for number in range(5):
+            exporter.emit('vote_cast', number=number)
+        self.assertEqual(exporter.stats()['dropped'], 2)
+        exporter.close()
+        written = read_events(self.path)
+        self.assertEqual([e['seq'] for e in written], [3, 4, 5])
+        self.assertEqual(written[0]['type'], 'vote_cast')
+        self.assertEqual(exporter.stats()['written'], 3)
+
+    def test_emit_does_not_wait_for_writer(self):
+        """测试写入进行中（持有文件锁）时记录事件不会被阻塞"""
+        exporter = EventExporter(self.path)
+        done = threading.Event()
+        with exporter._file_lock:
+            worker = threading.Thread(target=lambda: (exporter.emit('room_created', room='1234'), done.set()))
+            worker.start()
+            self.assertTrue(done.wait(1))
+        worker.join()
+        self.assertEqual(exporter.stats()['buffered'], 1)
+
+    def test_background_batches_and_rotation(self):
+        """测试后台按批写入，缓冲区清空后线程退出，文件超过大小后轮转"""
+        spawned = []
+        exporter = EventExporter(self.path, max_bytes=200, backups=2,
+                                 spawn=spawned.append, sleep=lambda seconds: None)
+        for batch in range(4):
+            for number in range(3):
+                exporter.emit('player_joined', room='1234', player=f"玩家{number}")
+            # 一批事件只启动一次写入线程，线程写完后退出
+            self.assertEqual(len(spawned), 1)
+            spawned.pop()()
+            self.assertEqual(exporter.stats()['buffered'], 0)
+        self.assertEqual(exporter.stats()['batches'], 4)
+        self.assertTrue(os.path.exists(self.path + '.1'))
+        self.assertFalse(os.path.exists(self.path + '.3'))
+
+    def test_disabled(self):
+        """测试路径为空时不记录"""
+        exporter = EventExporter('')
+        exporter.emit('room_created')
+        self.assertEqual(exporter.stats()['emitted'], 0)
+
+
+class TestGameEvents(unittest.TestCase):
+    def setUp(self):
+        import app
+        self.app = app
+        self.directory = tempfile.mkdtemp()
+        self.original = app.events
+        app.events = EventExporter(os.path.join(self.directory, 'events.ndjson'))
+
+    def tearDown(self):
+        self.app.events = self.original
+        shutil.rmtree(self.directory)
+
+    def test_game_lifecycle_events(self):
+        """测试一局游戏依次导出房间、加入、开局、组队、投票、任务结果和结束事件"""
+        app = self.app
+        random.seed(8)
+        with quiet():
+            room = app.Room('玩家1', 5)
+            app.register_room(room)
+            try:
+                for number in range(2, 6):
+                    room.add_player(f"玩家{number}")
+                tokens = []
+                for player in room.players:
+                    tokens.append(f"token-of-{player.name}-0123456789")
+                    player.profile_id = profile_id_for(tokens[-1])
+                room.start_game()
+                app.announce_game_start(room)
+                client = app.app.test_client()
+                rng = random.Random(2)
+                while not room.game.is_game_over():
+                    decisions = [(p.name, decide(room.game, p.name, rng)) for p in room.game.players]
+                    actions = [{'action': d[0].value, 'player_name': name, **d[1]}
+                               for name, d in decisions if d is not None]
+                    self.assertEqual(client.post(f'/rooms/{room.code}/actions', json={'actions': actions},
+                                                 headers={'X-Player-Token': ','.join(tokens)}).status_code, 200)
+            finally:
+                app.rooms.pop(room.code, None)
+        app.events.close()
+        exported = read_events(os.path.join(self.directory, 'events.ndjson'))
+        types = [e['type'] for e in exported]
+        self.assertEqual(types[:7], ['room_created'] + ['player_joined'] * 4 + ['game_started', 'team_submitted'])
+        self.assertEqual(types[-1], 'game_over')
+        self.assertEqual([e['seq'] for e in exported], list(range(1, len(exported) + 1)))
+
+        game = room.game
+        quests = [e for e in exported if e['type'] == 'quest_result']
+        self.assertEqual([q['success'] for q in quests], game.quest_results)
+        self.assertEqual([q['quest'] for q in quests], list(range(1, len(quests) + 1)))
+        votes = [e for e in exported if e['type'] == 'vote_cast']
+        self.assertEqual(len(votes), sum(len(q['team']) for q in quests))
+        over = exported[-1]
+        self.assertEqual(over['winner'], game.winner)
+        self.assertEqual(over['actions'], len(game.action_log))
+        started = next(e for e in exported if e['type'] == 'game_started')
+        self.assertEqual(sorted(p['role'] for p in started['players']),
+                         sorted(p.role.name for p in game.players))
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,95 @@
+import unittest
+import json
+import sys
+import os
+
+# 添加项目根目录到 Python 路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from game import Game, GamePhase, Player, Team
+from app import Player as RoomPlayer
+
+
+def snapshot(game):
+    """对局状态与玩家可变字段的快照"""
+    return json.dumps({
+        'status': game.get_game_status(),
+        'players': [p.to_dict() for p in game.players],
+        'history': game.quest_history,
+        'leaders': sorted(p.name for p in game.previous_leaders),
+    }, sort_keys=True, ensure_ascii=False)
+
+
+class TestGameFork(unittest.TestCase):
+    def setUp(self):
+        self.players = [Player(f"分支玩家{i}") for i in range(1, 8)]
+        self.game = Game(self.players, 7)
+
+    def play_quest(self, game, magic_target=None):
+        leader = game.get_current_leader()
+        team = [p.name for p in game.players[:game.current_quest.required_players]]
+        game.submit_team(team, magic_target or team[0], leader.name)
+        for name in team:
+            player = game.get_player(name)
+            game.submit_quest_result(player, player.team == Team.GOOD)
+
+    def test_fork_mutations_do_not_leak(self):
+        """测试分支上的动作不影响原对局"""
+        self.play_quest(self.game)
+        before = snapshot(self.game)
+
+        branch = self.game.fork()
+        candidates = [p for p in branch.players if p not in branch.previous_leaders]
+        branch.select_next_leader(branch.get_current_leader().name, candidates[0].name)
+        self.play_quest(branch)
+        self.assertEqual(snapshot(self.game), before)
+        self.assertEqual(len(branch.quest_history), 2)
+        self.assertEqual(len(self.game.quest_history), 1)
+
+    def test_live_mutations_do_not_leak(self):
+        """测试原对局继续进行时分支保持不变"""
+        branch = self.game.fork()
+        before = snapshot(branch)
+        self.play_quest(self.game)
+        self.assertEqual(snapshot(branch), before)
+        self.assertEqual(branch.current_phase, GamePhase.LEADER_TURN)
+
+    def test_mid_vote_fork(self):
+        """测试投票进行到一半时分叉，两边各自结算"""
+        leader = self.game.get_current_leader()
+        team = [p.name for p in self.players[:2]]
+        self.game.submit_team(team, team[0], leader.name)
+        self.game.submit_quest_result(self.players[0], True)
+
+        branch = self.game.fork()
+        branch.submit_quest_result(branch.get_player(team[1]), False)
+        self.assertEqual(branch.current_phase, GamePhase.SELECT_NEXT_LEADER)
+        self.assertEqual(self.game.current_phase, GamePhase.QUEST_VOTE)
+        self.assertEqual(len(self.game.current_quest.votes), 1)
+        self.assertEqual(self.players[0].magic_tokens, 0)
+        self.assertIsNot(branch.get_player(team[0]), self.players[0])
+
+    def test_history_shared_until_written(self):
+        """测试历史列表在写入前共享"""
+        self.play_quest(self.game)
+        branch = self.game.fork()
+        self.assertIs(branch.quest_history, self.game.quest_history)
+        branch.select_next_leader(branch.get_current_leader().name,
+                                  next(p.name for p in branch.players if p not in branch.previous_leaders))
+        self.play_quest(branch)
+        self.assertIsNot(branch.quest_history, self.game.quest_history)
+        self.assertIs(branch.quest_history[0], self.game.quest_history[0])
+
+    def test_room_player_fields_preserved(self):
+        """测试分支保留房间玩家的子类字段"""
+        players = [RoomPlayer(f"房间玩家{i}") for i in range(1, 6)]
+        players[0].is_host = True
+        game = Game(players, 5)
+        branch = game.fork()
+        self.assertIsInstance(branch.players[0], RoomPlayer)
+        self.assertTrue(branch.players[0].is_host)
+        self.assertEqual(branch.players[0], players[0])
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
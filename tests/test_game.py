@@ -7,6 +7,8 @@ from datetime import datetime
 # 添加项目根目录到 Python 路径
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
+import tests.helpers  # 在导入 app 之前把数据目录指向临时目录
+
 from app import app, rooms, Room, socketio
 from game import Game, Role, Team, Player, GamePhase
 
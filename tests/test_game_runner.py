@@ -0,0 +1,106 @@
+import unittest
+import contextlib
+import io
+import json
+import random
+import shutil
+import sys
+import os
+import tempfile
+
+# 添加项目根目录到 Python 路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tests.helpers import quiet
+
+import game_runner
+from bots import play_out
+from game_runner import generated_script, load_script, main, run_batch, run_script
+from replay import ReplayStore
+
+
+class TestBatchMode(unittest.TestCase):
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def write_script(self, lines):
+        path = os.path.join(self.path, 'script.ndjson')
+        with open(path, 'w', encoding='utf-8') as f:
+            for line in lines:
+                f.write(json.dumps(line, ensure_ascii=False) + '\n')
+        return path
+
+    def test_generated_games_are_deterministic(self):
+        """测试相同种子生成的对局结果相同"""
+        with quiet():
+            first = run_script(generated_script(7, 42))
+            second = run_script(generated_script(7, 42))
+        self.assertIsNone(first['error'])
+        self.assertIn(first['winner'], ('GOOD', 'EVIL'))
+        first.pop('seconds'), second.pop('seconds')
+        self.assertEqual(first, second)
+
+    def test_replay_file_as_script(self):
+        """测试回放文件可以直接作为脚本重新执行"""
+        with quiet():
+            game = game_runner._script_game({'player_count': 5, 'seed': 3})
+            play_out(game, random.Random(3))
+        replay_id = ReplayStore(self.path).save(game)
+
+        with quiet():
+            outcome = run_script(load_script(os.path.join(self.path, f"{replay_id}.ndjson")))
+        self.assertIsNone(outcome['error'])
+        self.assertEqual(outcome['winner'], game.winner)
+        self.assertEqual(outcome['quests'], game.quest_results)
+        self.assertEqual(outcome['actions'], len(game.action_log))
+
+    def test_invalid_move_reported(self):
+        """测试非法动作记录为错误而不是中断批量运行"""
+        path = self.write_script([
+            {'type': 'header', 'players': ['甲', '乙', '丙', '丁', '戊']},
+            {'player': '乙', 'action': 'submit_team', 'data': {'team': ['甲', '乙']}},
+        ])
+        with quiet():
+            outcome = run_script(load_script(path))
+        self.assertEqual(outcome['actions'], 0)
+        self.assertEqual(outcome['error'], '只有领袖可以选择队员')
+
+    def test_unexpected_error_reported(self):
+        """测试其他类型的异常也只记到该脚本的结果里，并且不重置全局随机数"""
+        path = self.write_script([
+            {'type': 'header', 'player_count': 5, 'seed': 1},
+            {'player': '玩家1', 'action': 'submit_team', 'data': {'team': 5}},
+        ])
+        random.seed(99)
+        expected = random.Random(99).random()
+        with quiet():
+            outcomes = [run_script(load_script(path)), run_script(generated_script(5, 1))]
+        self.assertTrue(outcomes[0]['error'].startswith('TypeError'))
+        self.assertIsNone(outcomes[1]['error'])
+        self.assertEqual(random.random(), expected)
+
+    def test_concurrent_batch_keeps_order(self):
+        """测试多进程执行时结果按输入顺序返回"""
+        scripts = [generated_script(count, seed) for seed, count in enumerate([5, 6, 7, 8, 9, 10])]
+        outcomes = run_batch(scripts, jobs=3)
+        self.assertEqual([o['script'] for o in outcomes], [s['name'] for s in scripts])
+        self.assertEqual([o['player_count'] for o in outcomes], [5, 6, 7, 8, 9, 10])
+
+    def test_main_with_profile(self):
+        """测试命令行批量模式输出结果和性能报告"""
+        output = os.path.join(self.path, 'out.ndjson')
+        stderr = io.StringIO()
+        with contextlib.redirect_stderr(stderr):
+            code = main(['--generate', '4', '--players', '6', '--jobs', '1', '--profile',
+                         '--output', output])
+        self.assertEqual(code, 0)
+        with open(output, encoding='utf-8') as f:
+            self.assertEqual(len([json.loads(line) for line in f]), 4)
+        self.assertIn('dispatch', stderr.getvalue())
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
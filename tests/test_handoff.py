@@ -0,0 +1,192 @@
+import unittest
+import json
+import random
+import shutil
+import socket
+import sys
+import os
+import tempfile
+import threading
+import types
+
+# 添加项目根目录到 Python 路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tests.helpers import quiet  # 在导入 app 之前把数据目录指向临时目录
+
+import handoff
+from bots import play_out
+from game import Game, GameAction, GamePhase, Player
+from handoff import HandoffServer
+
+
+def public_state(game):
+    return {
+        'status': game.get_game_status(),
+        'roles': [p.role for p in game.players],
+        'tokens': [(p.magic_tokens, p.amulets) for p in game.players],
+        'previous_leaders': sorted(p.name for p in game.previous_leaders),
+        'fail_votes': game.fail_votes_cast,
+        'quest_history': game.quest_history,
+        'amulets': [(u.user.name, u.target.name) for u in game.amulet_history],
+    }
+
+
+class TestGameSnapshot(unittest.TestCase):
+    def test_restore_reproduces_state(self):
+        """测试快照经 JSON 编码后重放出相同的状态，之后的动作结果也相同"""
+        random.seed(21)
+        with quiet():
+            game = Game([Player(f"玩家{i}") for i in range(1, 8)], 7)
+            game.dispatch(GameAction.USE_AMULET, '玩家3', target='玩家1')
+            play_out(game, random.Random(5), steps=9)
+            snapshot = json.loads(json.dumps(game.snapshot(), ensure_ascii=False))
+            restored = Game.restore(snapshot, [Player(name) for name in snapshot['players']])
+        self.assertEqual(restored.version, game.version)
+        self.assertEqual(restored.action_log, game.action_log)
+        self.assertEqual(public_state(restored), public_state(game))
+
+        with quiet():
+            play_out(game, random.Random(9))
+            play_out(restored, random.Random(9))
+        self.assertEqual(restored.current_phase, GamePhase.GAME_OVER)
+        self.assertEqual(restored.winner, game.winner)
+        self.assertEqual(public_state(restored), public_state(game))
+
+
+class TestHandoffProtocol(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'handoff.sock')
+        self.listener = socket.create_server(('127.0.0.1', 0))
+        self.completed = threading.Event()
+        self.aborted = threading.Event()
+        self.server = HandoffServer(
+            self.path, lambda: ({'rooms': ['房间']}, [self.listener.fileno()]),
+            self.completed.set, self.aborted.set, timeout=5)
+        self.server.start()
+
+    def tearDown(self):
+        self.server.close()
+        self.listener.close()
+        shutil.rmtree(self.directory)
+
+    def test_restore_legacy_team_without_player(self):
+        """测试旧版本记录的不带玩家名的组队仍能在交接时重放"""
+        random.seed(22)
+        with quiet():
+            game = Game([Player(f"玩家{i}") for i in range(1, 6)], 5)
+            play_out(game, random.Random(6), steps=4)
+            snapshot = json.loads(json.dumps(game.snapshot(), ensure_ascii=False))
+            for entry in snapshot['action_log']:
+                if entry['action'] == GameAction.SUBMIT_TEAM.value:
+                    entry['player'] = None
+            restored = Game.restore(snapshot, [Player(name) for name in snapshot['players']])
+        self.assertEqual(public_state(restored), public_state(game))
+
+    def test_state_and_listener_are_handed_over(self):
+        """测试新进程收到状态和同一个监听 socket，确认后旧进程完成交接"""
+        conn, state, fds = handoff.receive_state(self.path)
+        inherited = socket.socket(fileno=fds[0])
+        try:
+            self.assertEqual(state, {'rooms': ['房间']})
+            self.assertEqual(inherited.getsockname(), self.listener.getsockname())
+            handoff.acknowledge(conn, rooms=1, restore_ms=0.5)
+            self.assertTrue(self.completed.wait(5))
+        finally:
+            inherited.close()
+        stats = self.server.stats()
+        self.assertTrue(stats['handed_off'])
+        self.assertEqual(stats['rooms'], 1)
+        self.assertGreater(stats['bytes'], 0)
+        self.assertFalse(self.aborted.is_set())
+
+    def test_abort_without_ack(self):
+        """测试新进程没有确认就断开时旧进程恢复服务"""
+        conn, _, fds = handoff.receive_state(self.path)
+        os.close(fds[0])
+        conn.close()
+        self.assertTrue(self.aborted.wait(5))
+        self.assertFalse(self.server.handed_off.is_set())
+
+    def test_no_predecessor(self):
+        """测试没有旧进程时直接启动"""
+        self.assertIsNone(handoff.receive_state(os.path.join(self.directory, 'missing.sock')))
+
+
+class TestRoomHandoff(unittest.TestCase):
+    def setUp(self):
+        import app
+        self.app = app
+        random.seed(6)
+        with quiet():
+            self.room = app.Room('玩家1', 5)
+            for number in range(2, 6):
+                self.room.add_player(f"玩家{number}")
+            app.register_room(self.room)
+            self.room.start_game()
+            self.room.game.dispatch(GameAction.USE_AMULET, '玩家2', target='玩家4')
+            play_out(self.room.game, random.Random(1), steps=4)
+
+    def tearDown(self):
+        self.app.draining.clear()
+        self.app.bot_driver.resume()
+        self.app.rooms.pop(self.room.code, None)
+
+    def test_room_round_trip(self):
+        """测试房间快照恢复后房间号、座位、比分和对局状态不变"""
+        room = self.room
+        room.series['games'] = 2
+        data = json.loads(json.dumps(room.snapshot(), ensure_ascii=False))
+        with quiet():
+            restored = self.app.Room.restore(data)
+        self.assertEqual(restored.to_dict(), room.to_dict())
+        self.assertEqual(restored.series['games'], 2)
+        self.assertIsNot(restored.game, room.game)
+        self.assertEqual(public_state(restored.game), public_state(room.game))
+        self.assertTrue(all(a is b for a, b in zip(restored.game.players, restored.players)))
+
+    def test_draining_refuses_changes(self):
+        """测试交接开始后不再创建房间、加入玩家或执行动作"""
+        app = self.app
+        with socket.socket() as listener:
+            state, fds = app.export_rooms(types.SimpleNamespace(socket=listener))
+            self.assertEqual(fds, [listener.fileno()])
+        codes = [data['code'] for data in state['rooms']]
+        self.assertIn(self.room.code, codes)
+        self.assertEqual(state['format'], handoff.STATE_FORMAT)
+        version = self.room.game.version
+        with quiet():
+            reply = app.dispatch_action(GameAction.USE_AMULET, {'room_code': self.room.code}, '玩家4',
+                                        target='玩家5')
+            with self.assertRaises(ValueError):
+                app.Room('玩家1', 5)
+        self.assertEqual(reply, {'error': app.DRAINING_ERROR})
+        self.assertEqual(self.room.game.version, version)
+
+    def test_resume_event(self):
+        """测试重连后通过 resume 恢复身份：重新加入房间并收到当前状态和私人信息"""
+        client = self.app.socketio.test_client(self.app.app)
+        try:
+            with quiet():
+                missing = client.emit('resume', {'room_code': self.room.code, 'player_name': '路人'},
+                                      callback=True)
+                reply = client.emit('resume', {'room_code': self.room.code, 'player_name': '玩家3'},
+                                    callback=True)
+                client.get_received()
+                used = self.app.dispatch_action(GameAction.USE_AMULET, {'room_code': self.room.code}, '玩家4',
+                                                target='玩家5')
+                self.app.broadcaster.flush()
+                received = [e['name'] for e in client.get_received()]
+        finally:
+            client.disconnect()
+        self.assertIn('error', missing)
+        self.assertTrue(reply['success'])
+        self.assertEqual(reply['game_state']['quest_number'], self.room.game.quest_number)
+        self.assertTrue(any(info['is_self'] and info['name'] == '玩家3' for info in reply['player_info']))
+        self.assertTrue(used['success'])
+        self.assertIn('amulet_used', received)
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,138 @@
+import unittest
+import sys
+import os
+
+# 添加项目根目录到 Python 路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tests.helpers import quiet  # 在导入 app 之前把数据目录指向临时目录
+
+from game import AbilityUse, Game, GameAction, GamePhase, Player, SpecialAbility, Team
+from journal import ActionJournal
+
+
+def new_game(player_count=5):
+    with quiet():
+        return Game([Player(f"玩家{i}") for i in range(1, player_count + 1)], player_count)
+
+
+class TestActionJournal(unittest.TestCase):
+    def setUp(self):
+        self.a, self.b, self.c = Player('甲'), Player('乙'), Player('丙')
+        self.journal = ActionJournal()
+        self.uses = [AbilityUse(self.a, SpecialAbility.NONE, self.b),
+                     AbilityUse(self.b, SpecialAbility.NONE, self.a),
+                     AbilityUse(self.c, SpecialAbility.NONE, None),
+                     AbilityUse(self.a, SpecialAbility.NONE, self.a)]
+        for quest, use in zip((1, 1, 2, 3), self.uses):
+            self.journal.append(use, quest)
+
+    def test_indexes(self):
+        """测试按使用者、目标和任务轮次查询"""
+        self.assertEqual(self.journal.by_user('甲'), [self.uses[0], self.uses[3]])
+        self.assertEqual(self.journal.by_target('甲'), [self.uses[1], self.uses[3]])
+        self.assertEqual(self.journal.in_quest(1), self.uses[:2])
+        self.assertEqual(self.journal.by_user('丁'), [])
+        self.assertEqual(len(self.journal), 4)
+
+    def test_involving_keeps_order_without_duplicates(self):
+        """测试合并使用和被使用的记录，对自己使用只出现一次"""
+        self.assertEqual(self.journal.involving('甲'), [self.uses[0], self.uses[1], self.uses[3]])
+        self.assertEqual(self.journal.involving('丙'), [self.uses[2]])
+
+    def test_copy_is_independent(self):
+        """测试复制后的日志追加不影响原日志"""
+        clone = self.journal.copy()
+        clone.append(AbilityUse(self.c, SpecialAbility.NONE, self.a), 3)
+        self.assertEqual(len(self.journal.by_target('甲')), 2)
+        self.assertEqual(len(clone.by_target('甲')), 3)
+        self.assertEqual(len(self.journal.in_quest(3)), 1)
+
+
+class TestAmulet(unittest.TestCase):
+    def setUp(self):
+        self.game = new_game()
+        self.user, self.target = self.game.players[0], self.game.players[1]
+
+    def test_use_amulet_action(self):
+        """测试护身符动作：回复查验结果、广播使用者和目标、不改变阶段"""
+        result = self.game.dispatch(GameAction.USE_AMULET, self.user.name, target=self.target.name)
+        self.assertEqual(result.event, 'amulet_used')
+        self.assertEqual(result.extra, {'user': self.user.name, 'target': self.target.name})
+        self.assertIn(result.reply['revealed_team'], (Team.GOOD.value, Team.EVIL.value))
+        self.assertEqual(self.game.current_phase, GamePhase.LEADER_TURN)
+        self.assertEqual(self.user.amulets, 0)
+        self.assertTrue(self.target.was_revealed_by(self.user))
+        self.assertEqual(self.game.action_log[-1]['action'], 'use_amulet')
+        with self.assertRaises(ValueError):
+            self.game.dispatch(GameAction.USE_AMULET, self.user.name, target=self.target.name)
+
+    def test_invalid_targets(self):
+        """测试查验自己、不存在的玩家和游戏结束后使用都被拒绝"""
+        with self.assertRaises(ValueError):
+            self.game.dispatch(GameAction.USE_AMULET, self.user.name, target=self.user.name)
+        with self.assertRaises(ValueError):
+            self.game.dispatch(GameAction.USE_AMULET, self.user.name, target='不存在')
+        self.game.current_phase = GamePhase.GAME_OVER
+        with self.assertRaises(ValueError):
+            self.game.dispatch(GameAction.USE_AMULET, self.user.name, target=self.target.name)
+        self.assertEqual(self.user.amulets, 1)
+
+    def test_views(self):
+        """测试使用者看到查验结果，被查验者只看到使用者"""
+        self.game.dispatch(GameAction.USE_AMULET, self.user.name, target=self.target.name)
+        self.game.dispatch(GameAction.USE_AMULET, self.target.name, target=self.user.name)
+        view = self.game.get_amulet_view(self.user)
+        self.assertEqual(len(view), 2)
+        self.assertIn('revealed_team', view[0])
+        self.assertEqual(view[1], {'quest': 1, 'user': self.target.name, 'target': self.user.name})
+        self.assertEqual(len(self.game.amulet_history.in_quest(1)), 2)
+        self.assertIn('被', self.game.get_amulet_status(self.user))
+
+    def test_fork_copies_on_write(self):
+        """测试分支上使用护身符不影响原对局"""
+        branch = self.game.fork()
+        branch.dispatch(GameAction.USE_AMULET, self.user.name, target=self.target.name)
+        self.assertEqual(len(branch.amulet_history), 1)
+        self.assertEqual(len(self.game.amulet_history), 0)
+        self.assertEqual(self.game.get_amulet_history(self.user), [])
+        self.assertEqual(self.user.amulets, 1)
+
+
+class TestAmuletSocket(unittest.TestCase):
+    def test_use_amulet_event(self):
+        """测试通过 Socket 使用护身符：结果只在回复中，房间收到 amulet_used"""
+        import app
+        clients = [app.socketio.test_client(app.app) for _ in range(4)]
+        try:
+            with quiet():
+                code = clients[0].emit('create_room', {'player_count': 4}, callback=True)['room_info']['code']
+                for client in clients[1:]:
+                    client.emit('join_room', {'room_code': code}, callback=True)
+                clients[0].emit('start_game', {'room_code': code, 'player_name': '玩家1'}, callback=True)
+                for client in clients:
+                    client.get_received()
+                reply = clients[0].emit('use_amulet', {'room_code': code, 'player_name': '玩家1',
+                                                       'target': '玩家2'}, callback=True)
+                history = clients[0].emit('get_amulet_history', {'room_code': code, 'player_name': '玩家1'},
+                                          callback=True)
+                target_history = clients[1].emit('get_amulet_history', {'room_code': code,
+                                                                        'player_name': '玩家2'}, callback=True)
+                received = clients[2].get_received()
+        finally:
+            for client in clients:
+                client.disconnect()
+        self.assertTrue(reply['success'])
+        self.assertIn('revealed_team', reply)
+        event = next(e for e in received if e['name'] == 'amulet_used')
+        payload = event['args'][0]
+        self.assertEqual((payload['user'], payload['target']), ('玩家1', '玩家2'))
+        self.assertNotIn('revealed_team', payload)
+        self.assertEqual(payload['game_state']['players'][0]['amulets'], 0)
+        self.assertEqual(history['amulets'], 0)
+        self.assertEqual(history['history'][0]['revealed_team'], reply['revealed_team'])
+        self.assertNotIn('revealed_team', target_history['history'][0])
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,151 @@
+import unittest
+import sys
+import os
+
+# 添加项目根目录到 Python 路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import tests.helpers  # 在导入 app 之前把数据目录指向临时目录
+
+from lobby import LobbyIndex
+from app import app, rooms, lobby, socketio, Room, broadcaster
+
+
+class FakeRoom:
+    def __init__(self, code, player_count, filled):
+        self.code = code
+        self.host_name = f"房主{code}"
+        self.player_count = player_count
+        self.players = [object()] * filled
+        self.game = None
+
+
+class TestLobbyIndex(unittest.TestCase):
+    def setUp(self):
+        self.index = LobbyIndex(feed_size=8)
+
+    def test_only_open_rooms(self):
+        """测试只索引未开始且未满的房间"""
+        full = FakeRoom('0001', 5, 5)
+        started = FakeRoom('0002', 5, 3)
+        started.game = object()
+        open_room = FakeRoom('0003', 5, 3)
+        for room in (full, started, open_room):
+            self.index.update(room)
+        self.assertEqual([r['code'] for r in self.index.list_rooms()['rooms']], ['0003'])
+
+        open_room.players = [object()] * 5
+        self.index.update(open_room)
+        self.assertEqual(len(self.index), 0)
+
+    def test_pagination(self):
+        """测试按游标翻页不重复不遗漏，接近开局的房间优先"""
+        for i in range(25):
+            self.index.update(FakeRoom(f"{i:04d}", 4 + i % 3, 1 + i % 3))
+        seen = []
+        cursor = None
+        while True:
+            page = self.index.list_rooms(cursor=cursor, limit=7)
+            seen.extend(page['rooms'])
+            cursor = page['next_cursor']
+            if cursor is None:
+                break
+        self.assertEqual(len(seen), 25)
+        self.assertEqual(len({room['code'] for room in seen}), 25)
+        keys = [(room['player_count'], -room['current_players']) for room in seen]
+        self.assertEqual(keys, sorted(keys))
+
+    def test_filters(self):
+        """测试按人数配置和空位数筛选"""
+        self.index.update(FakeRoom('0001', 5, 4))
+        self.index.update(FakeRoom('0002', 5, 2))
+        self.index.update(FakeRoom('0003', 7, 2))
+        page = self.index.list_rooms(player_count=5, min_free=2)
+        self.assertEqual([r['code'] for r in page['rooms']], ['0002'])
+
+    def test_invalid_cursor(self):
+        """测试无效游标"""
+        with self.assertRaises(ValueError):
+            self.index.list_rooms(cursor='abc')
+
+    def test_changes_since(self):
+        """测试增量变更只保留每个房间的最后状态"""
+        room = FakeRoom('0001', 5, 1)
+        self.index.update(room)
+        version = self.index.version
+        room.players = [object()] * 2
+        self.index.update(room)
+        self.index.update(FakeRoom('0002', 6, 1))
+        self.index.remove('0002')
+
+        changes = self.index.changes_since(version)
+        self.assertEqual([(c['code'], c['op']) for c in changes['changes']],
+                         [('0001', 'upsert'), ('0002', 'remove')])
+        self.assertEqual(changes['changes'][0]['room']['current_players'], 2)
+        self.assertEqual(self.index.changes_since(self.index.version)['changes'], [])
+
+    def test_stale_version(self):
+        """测试版本过旧时要求重新拉取"""
+        for i in range(20):
+            self.index.update(FakeRoom(f"{i:04d}", 5, 1))
+        self.assertIsNone(self.index.changes_since(1))
+        self.assertTrue(self.index.publish_changes()['reset'])
+        self.assertEqual(self.index.publish_changes()['changes'], [])
+
+
+class TestLobbyIntegration(unittest.TestCase):
+    def setUp(self):
+        # 之前的测试可能还有合并窗口内未发送的大厅广播，先发出去
+        broadcaster.flush()
+        rooms.clear()
+        lobby.clear()
+
+    def tearDown(self):
+        rooms.clear()
+        lobby.clear()
+
+    def test_room_lifecycle(self):
+        """测试房间加入、开始游戏时大厅索引同步更新"""
+        room = Room('房主', 4)
+        rooms[room.code] = room
+        self.assertIn(room.code, lobby)
+        for name in ('玩家2', '玩家3', '玩家4'):
+            room.add_player(name)
+        self.assertNotIn(room.code, lobby)
+
+    def test_http_listing(self):
+        """测试大厅列表接口"""
+        for i in range(3):
+            room = Room(f"房主{i}", 5)
+            rooms[room.code] = room
+        client = app.test_client()
+        data = client.get('/lobby/rooms?limit=2').get_json()
+        self.assertTrue(data['success'])
+        self.assertEqual(len(data['rooms']), 2)
+        data = client.get(f"/lobby/rooms?limit=2&cursor={data['next_cursor']}").get_json()
+        self.assertEqual(len(data['rooms']), 1)
+        self.assertIsNone(data['next_cursor'])
+        self.assertEqual(client.get('/lobby/rooms?cursor=x').status_code, 400)
+
+        data = client.get(f"/lobby/changes?since={lobby.version - 1}").get_json()
+        self.assertEqual(len(data['changes']), 1)
+
+    def test_subscribe(self):
+        """测试订阅者收到合并后的大厅变更"""
+        watcher = socketio.test_client(app)
+        host = socketio.test_client(app)
+        try:
+            page = watcher.emit('subscribe_lobby', {}, callback=True)
+            self.assertEqual(page['rooms'], [])
+            host.emit('create_room', {'player_count': 5}, callback=True)
+            socketio.sleep(0.1)
+            updates = [m['args'][0] for m in watcher.get_received() if m['name'] == 'lobby_update']
+            self.assertEqual(len(updates), 1)
+            self.assertEqual(updates[0]['changes'][0]['op'], 'upsert')
+        finally:
+            watcher.disconnect()
+            host.disconnect()
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
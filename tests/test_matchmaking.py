@@ -0,0 +1,236 @@
+import unittest
+import sys
+import types
+import os
+
+# 添加项目根目录到 Python 路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tests.helpers import quiet  # 在导入 app 之前把数据目录指向临时目录
+
+from matchmaking import MatchQueue
+from app import app, rooms, lobby, socketio
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestMatchQueue(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.matches = []
+        self.queue = MatchQueue(lambda size, tickets: self.matches.append((size, [t.sid for t in tickets])),
+                                clock=self.clock)
+
+    def test_batch_forms_full_tables(self):
+        """测试每种人数配置凑满多少桌就组多少桌，先到先匹配"""
+        for i in range(11):
+            self.queue.enqueue(f"a{i}", 5)
+        for i in range(3):
+            self.queue.enqueue(f"b{i}", 4)
+        self.assertEqual(self.queue.match_once(), 2)
+        self.assertEqual(self.matches, [(5, [f"a{i}" for i in range(5)]),
+                                        (5, [f"a{i}" for i in range(5, 10)])])
+        self.assertEqual(self.queue.stats()['waiting'], {4: 3, 5: 1})
+
+    def test_cancel_and_requeue(self):
+        """测试取消排队以及重复入队替换旧票据"""
+        for i in range(4):
+            self.queue.enqueue(f"p{i}", 4)
+        self.assertTrue(self.queue.cancel('p1'))
+        self.assertFalse(self.queue.cancel('p1'))
+        self.queue.enqueue('p2', 6)
+        self.assertEqual(self.queue.match_once(), 0)
+        self.queue.enqueue('p1', 4)
+        self.queue.enqueue('p4', 4)
+        self.queue.match_once()
+        self.assertEqual(self.matches, [(4, ['p0', 'p3', 'p1', 'p4'])])
+        self.assertEqual(len(self.queue), 1)
+
+    def test_invalid_size(self):
+        """测试无效的人数配置"""
+        with self.assertRaises(ValueError):
+            self.queue.enqueue('p0', 11)
+
+    def test_failed_match_keeps_priority(self):
+        """测试组桌出错时票据按原入队时间放回队列，暂停结束后再组桌"""
+        def fail(size, tickets):
+            raise RuntimeError("房间创建失败")
+        self.queue.on_match = fail
+        for i in range(4):
+            self.queue.enqueue(f"p{i}", 4)
+            self.clock.now += 1
+        with quiet():
+            self.queue.match_once()
+        self.queue.enqueue('late', 4)
+
+        self.queue.on_match = lambda size, tickets: self.matches.append([t.sid for t in tickets])
+        self.queue.match_once()
+        self.assertEqual(self.matches, [])
+        self.clock.now += self.queue.retry_delay
+        self.queue.match_once()
+        self.assertEqual(self.matches, [['p0', 'p1', 'p2', 'p3']])
+        self.assertEqual(self.queue.stats()['failed'], 1)
+
+    def test_repeated_failures_back_off(self):
+        """测试连续出错时暂停时间翻倍，不影响其他人数配置"""
+        attempts = []
+
+        def fail(size, tickets):
+            attempts.append(self.clock.now)
+            raise RuntimeError("房间创建失败")
+        self.queue.on_match = fail
+        for i in range(4):
+            self.queue.enqueue(f"p{i}", 4)
+        with quiet():
+            for _ in range(24):
+                self.queue.match_once()
+                self.clock.now += 0.25
+        self.assertEqual(len(attempts), 3)
+        self.assertAlmostEqual(attempts[1] - attempts[0], 1.0)
+        self.assertAlmostEqual(attempts[2] - attempts[1], 2.0)
+        self.assertEqual(len(self.queue), 4)
+
+        self.queue.on_match = lambda size, tickets: self.matches.append([t.sid for t in tickets])
+        for i in range(5):
+            self.queue.enqueue(f"q{i}", 5)
+        self.queue.match_once()
+        self.assertEqual(self.matches, [['q0', 'q1', 'q2', 'q3', 'q4']])
+
+    def test_rejected_match_fails_tickets(self):
+        """测试组桌被拒绝（ValueError）时票据作废并通知，不放回队列"""
+        failed = []
+
+        def reject(size, tickets):
+            raise ValueError("服务器房间已满")
+        self.queue.on_match = reject
+        self.queue.on_fail = lambda tickets, error: failed.append(([t.sid for t in tickets], error))
+        for i in range(4):
+            self.queue.enqueue(f"p{i}", 4)
+        with quiet():
+            self.queue.match_once()
+        self.assertEqual(failed, [(['p0', 'p1', 'p2', 'p3'], "服务器房间已满")])
+        self.assertEqual(len(self.queue), 0)
+        self.assertEqual(self.queue.stats()['rejected'], 1)
+
+    def test_wait_metrics(self):
+        """测试等待时间指标"""
+        for i in range(4):
+            self.queue.enqueue(f"p{i}", 4)
+            self.clock.now += 0.5
+        self.queue.match_once()
+        stats = self.queue.stats()
+        self.assertEqual(stats['wait_max_ms'], 2000.0)
+        self.assertEqual(stats['rooms_formed'], 1)
+        self.assertEqual(stats['matched'], 4)
+
+
+class TestQuickMatchIntegration(unittest.TestCase):
+    def tearDown(self):
+        rooms.clear()
+        lobby.clear()
+
+    def test_quick_match_starts_game(self):
+        """测试凑满人数后自动创建房间并开始游戏"""
+        clients = [socketio.test_client(app) for _ in range(4)]
+        try:
+            for client in clients:
+                ack = client.emit('quick_match', {'player_count': 4}, callback=True)
+                self.assertTrue(ack['success'])
+            socketio.sleep(0.3)
+
+            names = set()
+            for client in clients:
+                received = client.get_received()
+                events = [m['name'] for m in received]
+                self.assertIn('game_started', events)
+                self.assertIn('player_info', events)
+                match = next(m['args'][0] for m in received if m['name'] == 'match_found')
+                names.add(match['player_name'])
+            self.assertEqual(len(names), 4)
+            room = rooms[match['room_info']['code']]
+            self.assertIsNotNone(room.game)
+        finally:
+            for client in clients:
+                client.disconnect()
+
+    def test_failed_start_leaves_no_room(self):
+        """测试开始游戏失败时不登记房间、不通知玩家"""
+        import app as app_module
+        client = socketio.test_client(app)
+        original = app_module.Room.start_game
+
+        def fail(room):
+            raise ValueError("服务器正在更新")
+
+        app_module.Room.start_game = fail
+        try:
+            tickets = [types.SimpleNamespace(sid=client.eio_sid) for _ in range(4)]
+            with self.assertRaises(ValueError):
+                app_module.start_matched_room(4, tickets)
+            self.assertEqual(len(rooms), 0)
+            self.assertEqual(len(lobby), 0)
+            self.assertNotIn('match_found', [m['name'] for m in client.get_received()])
+        finally:
+            app_module.Room.start_game = original
+            client.disconnect()
+
+    def test_failed_setup_discards_room(self):
+        """测试加入玩家出错时也放弃房间：移出大厅、释放名额"""
+        import app as app_module
+        original = app_module.Room.add_player
+        reserved = set(app_module.reserved_codes)
+
+        def fail(room, player_name):
+            raise RuntimeError("加入失败")
+
+        app_module.Room.add_player = fail
+        try:
+            tickets = [types.SimpleNamespace(sid=f"sid{i}") for i in range(4)]
+            with self.assertRaises(RuntimeError):
+                app_module.start_matched_room(4, tickets)
+        finally:
+            app_module.Room.add_player = original
+        self.assertEqual(len(rooms), 0)
+        self.assertEqual(len(lobby), 0)
+        self.assertEqual(app_module.reserved_codes, reserved)
+
+    def test_rooms_full_notifies_players(self):
+        """测试房间已满时匹配到的玩家收到 match_failed 并退出队列"""
+        import app as app_module
+        clients = [socketio.test_client(app) for _ in range(4)]
+        queue = MatchQueue(app_module.start_matched_room, on_fail=app_module.fail_matched_tickets)
+        original = app.config['MAX_ROOMS']
+        try:
+            for client in clients:
+                queue.enqueue(socketio.server.manager.sid_from_eio_sid(client.eio_sid, '/'), 4)
+            app.config['MAX_ROOMS'] = len(rooms) + len(app_module.reserved_codes)
+            with quiet():
+                self.assertEqual(queue.match_once(), 0)
+            socketio.sleep(0.1)
+            self.assertEqual(len(queue), 0)
+            for client in clients:
+                failed = [m['args'][0] for m in client.get_received() if m['name'] == 'match_failed']
+                self.assertEqual(failed, [{'error': app_module.ROOMS_FULL_ERROR}])
+        finally:
+            app.config['MAX_ROOMS'] = original
+            for client in clients:
+                client.disconnect()
+
+    def test_cancel_quick_match(self):
+        """测试取消不在队列中的匹配"""
+        client = socketio.test_client(app)
+        try:
+            self.assertIn('error', client.emit('cancel_quick_match', {}, callback=True))
+            self.assertIn('error', client.emit('quick_match', {'player_count': 3}, callback=True))
+        finally:
+            client.disconnect()
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
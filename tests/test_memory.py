@@ -0,0 +1,194 @@
+import unittest
+import random
+import sys
+import os
+import threading
+import tracemalloc
+
+# 添加项目根目录到 Python 路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tests.helpers import quiet  # 在导入 app 之前把数据目录指向临时目录
+
+from bots import play_out
+from game import Game, Player
+from memory import MemoryProfiler, MemorySampler, footprint, room_footprint, rooms_report
+
+
+class FakeRoom:
+    """只有 code / game / lock 的房间，便于独立测试"""
+
+    def __init__(self, code, game=None):
+        self.code = code
+        self.game = game
+        self.lock = threading.RLock()
+
+
+def new_game(player_count=5):
+    return Game([Player(f"内存玩家{i}") for i in range(1, player_count + 1)], player_count)
+
+
+def finished_game(rng):
+    """由机器人决策打完一局"""
+    game = new_game()
+    play_out(game, rng)
+    return game
+
+
+class TestFootprint(unittest.TestCase):
+    def test_room_footprint(self):
+        """测试房间占用随历史增长，并按字段统计历史列表"""
+        with quiet():
+            fresh = FakeRoom('1000', new_game())
+            played = FakeRoom('1001', finished_game(random.Random(3)))
+        small, large = room_footprint(fresh), room_footprint(played)
+        self.assertGreater(large['bytes'], small['bytes'])
+        self.assertEqual(large['phase'], played.game.current_phase.value)
+        self.assertEqual(large['history_lengths']['action_log'], len(played.game.action_log))
+        self.assertIn('action_log', large['game_attributes'])
+        # 字段之间不重复计算，合计不超过整局游戏
+        self.assertLessEqual(sum(large['game_attributes'].values()), footprint(played.game)[0])
+
+    def test_shared_objects_skipped(self):
+        """测试枚举等共享对象不计入房间"""
+        with quiet():
+            room = FakeRoom('1002', new_game())
+        _, by_type = footprint(room)
+        self.assertNotIn('Role', by_type)
+        self.assertNotIn('GamePhase', by_type)
+        self.assertIn('Player', by_type)
+
+    def test_rooms_report(self):
+        """测试按阶段汇总和最大房间排序"""
+        with quiet():
+            rooms = {str(code): FakeRoom(str(code), new_game()) for code in range(2000, 2004)}
+        rooms['2004'] = FakeRoom('2004')
+        report = rooms_report(rooms, limit=2)
+        self.assertEqual(report['rooms'], 5)
+        self.assertEqual(set(report['by_phase']), {'LEADER_TURN', 'WAITING'})
+        self.assertEqual(len(report['largest']), 2)
+        self.assertGreaterEqual(report['largest'][0]['bytes'], report['largest'][1]['bytes'])
+
+
+class TestMemoryProfiler(unittest.TestCase):
+    def setUp(self):
+        self.profiler = MemoryProfiler()
+
+    def tearDown(self):
+        if tracemalloc.is_tracing():
+            self.profiler.stop()
+
+    def test_snapshot_diff_by_class(self):
+        """测试快照差异可以归到 game.py 中的类"""
+        with self.assertRaises(ValueError):
+            self.profiler.snapshot()
+        self.profiler.start()
+        self.assertIsNone(self.profiler.snapshot('class')['diff'])
+        with quiet():
+            games = [new_game(10) for _ in range(200)]
+        report = self.profiler.snapshot('class')
+        grown = {c['where'] for c in report['diff'] if c['size_diff'] > 0}
+        self.assertTrue(any(where.startswith('game.py:') for where in grown), grown)
+        self.assertEqual(len(games), 200)
+        with self.assertRaises(ValueError):
+            self.profiler.snapshot('room')
+
+
+class TestMemorySampler(unittest.TestCase):
+    def test_sample_extrapolates_by_phase(self):
+        """测试只遍历抽中的房间并按阶段外推"""
+        with quiet():
+            rooms = {str(code): FakeRoom(str(code), new_game()) for code in range(3000, 3010)}
+        sampler = MemorySampler(rooms, interval=0, sample_size=3, rng=random.Random(1))
+        sample = sampler.sample()
+        self.assertEqual(sample['rooms'], 10)
+        self.assertEqual(sample['sampled'], 3)
+        actual = sum(footprint(room)[0] for room in rooms.values())
+        self.assertAlmostEqual(sample['estimated_room_bytes'], actual, delta=actual * 0.2)
+        self.assertEqual(sampler.stats()['samples'], 1)
+
+    def test_failed_sample_keeps_running(self):
+        """测试采样出错时记录日志并继续，房间清空后退出，之后可以重新启动"""
+        rooms = {'3100': FakeRoom('3100', new_game())}
+        spawned = []
+        sleeps = []
+
+        def sleep(seconds):
+            sleeps.append(seconds)
+            if len(sleeps) == 3:
+                rooms.clear()
+
+        sampler = MemorySampler(rooms, interval=1, spawn=spawned.append, sleep=sleep)
+        sampler.sample = lambda: 1 / 0
+        sampler.wake()
+        with quiet():
+            spawned[0]()
+        self.assertEqual(len(sleeps), 3)
+        sampler.wake()
+        self.assertEqual(len(spawned), 2)
+
+        def interrupted(seconds):
+            raise KeyboardInterrupt
+        sampler._sleep = interrupted
+        with self.assertRaises(KeyboardInterrupt):
+            spawned[1]()
+        sampler.wake()
+        self.assertEqual(len(spawned), 3)
+
+    def test_sample_waits_for_room_lock(self):
+        """测试采样持有房间锁，不和游戏动作同时遍历"""
+        room = FakeRoom('3200', new_game())
+        sampler = MemorySampler({'3200': room}, interval=0, sample_size=1)
+        results = []
+        with room.lock:
+            worker = threading.Thread(target=lambda: results.append(sampler.sample()))
+            worker.start()
+            worker.join(0.1)
+            self.assertEqual(results, [])
+        worker.join()
+        self.assertEqual(results[0]['sampled'], 1)
+
+    def test_disabled_sampler_does_not_spawn(self):
+        """测试 interval 为 0 时不启动后台任务"""
+        spawned = []
+        sampler = MemorySampler({}, interval=0, spawn=spawned.append)
+        sampler.wake()
+        self.assertEqual(spawned, [])
+
+
+class TestAdminRoutes(unittest.TestCase):
+    def setUp(self):
+        import app
+        self.app = app
+        self.client = app.app.test_client()
+        self.original = app.app.config['ADMIN_TOKEN']
+
+    def tearDown(self):
+        self.app.app.config['ADMIN_TOKEN'] = self.original
+        if tracemalloc.is_tracing():
+            self.app.memory_profiler.stop()
+
+    def test_requires_token(self):
+        """测试未配置或令牌不符时拒绝访问"""
+        self.app.app.config['ADMIN_TOKEN'] = None
+        self.assertEqual(self.client.get('/admin/memory').status_code, 403)
+        self.app.app.config['ADMIN_TOKEN'] = 'secret'
+        self.assertEqual(self.client.get('/admin/memory', headers={'X-Admin-Token': 'wrong'}).status_code, 403)
+
+    def test_tracing_and_rooms(self):
+        """测试开启 tracemalloc、拍摄快照和房间统计"""
+        self.app.app.config['ADMIN_TOKEN'] = 'secret'
+        headers = {'X-Admin-Token': 'secret'}
+        self.assertEqual(self.client.get('/admin/memory/snapshot', headers=headers).status_code, 400)
+        reply = self.client.post('/admin/memory/tracing', json={'enabled': True}, headers=headers)
+        self.assertTrue(reply.get_json()['tracing'])
+        reply = self.client.get('/admin/memory/snapshot?group_by=filename&limit=5', headers=headers)
+        self.assertLessEqual(len(reply.get_json()['top']), 5)
+        reply = self.client.post('/admin/memory/tracing', json={'enabled': False}, headers=headers)
+        self.assertFalse(reply.get_json()['tracing'])
+        reply = self.client.get('/admin/memory/rooms', headers=headers)
+        self.assertTrue(reply.get_json()['success'])
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,87 @@
+import unittest
+import sys
+import os
+
+# 添加项目根目录到 Python 路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from outbound import ClientOutbox, OutboundQueue
+
+
+class TestOutboundQueue(unittest.TestCase):
+    def test_snapshot_superseded(self):
+        """测试新的快照取代未发送的旧快照，离散事件保留"""
+        queue = OutboundQueue(maxlen=8)
+        queue.push('game_update', 1)
+        queue.push('quest_result', 2)
+        queue.push('game_update', 3)
+        queue.push('game_over', 4)
+        self.assertEqual([queue.pop(), queue.pop(), queue.pop()],
+                         [('quest_result', 2), ('game_update', 3), ('game_over', 4)])
+        self.assertIsNone(queue.pop())
+        self.assertEqual(queue.superseded, 1)
+
+    def test_bounded(self):
+        """测试队列容量有界，优先丢弃快照"""
+        queue = OutboundQueue(maxlen=3)
+        queue.push('room_update', 0)
+        for i in range(5):
+            queue.push('quest_result', i)
+        self.assertEqual(len(queue), 3)
+        self.assertEqual(queue.superseded, 1)
+        self.assertEqual(queue.overflow, 2)
+        self.assertEqual(queue.pop(), ('quest_result', 2))
+
+
+class TestClientOutbox(unittest.TestCase):
+    def setUp(self):
+        self.sent = []
+        self.room_emits = []
+        self.backlog = {}
+        self.drains = []
+        self.outbox = ClientOutbox(
+            lambda event, payload, sid: self.sent.append((sid, event, payload)),
+            lambda sid: self.backlog.get(sid, 0),
+            maxlen=4,
+            spawn=lambda target, sid: self.drains.append((target, sid)),
+            sleep=lambda seconds: self.backlog.update(slow=0))
+
+    def broadcast(self, event, payload):
+        self.outbox.broadcast('1234', event, payload, ['fast', 'slow'],
+                              lambda *args: self.room_emits.append(args))
+
+    def test_slow_client_skipped(self):
+        """测试拥塞的连接被跳过并进入自己的队列"""
+        self.backlog['slow'] = 10
+        for version in range(5):
+            self.broadcast('game_update', version)
+        self.broadcast('quest_result', 'result')
+
+        self.assertEqual(len(self.room_emits), 6)
+        self.assertTrue(all(skip == ['slow'] for _, _, _, skip in self.room_emits))
+        self.assertEqual(len(self.drains), 1)
+
+        # 慢客户端的缓冲清空后只收到最新快照和离散事件
+        target, sid = self.drains[0]
+        target(sid)
+        self.assertEqual(self.sent, [('slow', 'game_update', 4), ('slow', 'quest_result', 'result')])
+        stats = self.outbox.stats()
+        self.assertEqual(stats['superseded'], 4)
+        self.assertEqual(stats['congested_clients'], 0)
+
+    def test_all_fast_single_emit(self):
+        """测试没有拥塞时只做一次房间广播"""
+        self.broadcast('game_update', 1)
+        self.assertEqual(self.room_emits, [('game_update', 1, '1234', None)])
+        self.assertEqual(self.drains, [])
+
+    def test_discard_on_disconnect(self):
+        """测试断开连接时丢弃队列"""
+        self.backlog['slow'] = 10
+        self.broadcast('game_update', 1)
+        self.outbox.discard('slow')
+        self.assertEqual(self.outbox.stats()['pending_messages'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
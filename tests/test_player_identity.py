@@ -0,0 +1,120 @@
+import unittest
+import sys
+import os
+
+# 添加项目根目录到 Python 路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from game import Game, GamePhase, Player, Quest, Team, FinalQuestStatus
+
+
+class TestPlayerIdentity(unittest.TestCase):
+    def test_same_name_shares_identity(self):
+        """测试同名玩家共享驻留身份"""
+        a = Player("亚瑟")
+        b = Player(" 亚瑟 ")
+        self.assertEqual(a.id, b.id)
+        self.assertEqual(a, b)
+        self.assertEqual(hash(a), hash(b))
+        self.assertNotEqual(a.id, Player("莫德雷德").id)
+
+    def test_identity_is_interned_name(self):
+        """测试身份是驻留后的名称，不再依赖全局编号表"""
+        a = Player("贝狄威尔")
+        b = Player("贝狄威" + "尔")
+        self.assertIs(a.id, b.id)
+        self.assertIs(a.id, a.name)
+        self.assertEqual(hash(a), hash(a.id))
+        self.assertFalse(hasattr(Player, '_identities'))
+
+    def test_hash_consistent_with_name(self):
+        """测试玩家与名称字符串在集合/字典中可互相查找"""
+        player = Player("兰斯洛特")
+        players = {player}
+        self.assertIn("兰斯洛特", players)
+        self.assertIn(Player("兰斯洛特"), players)
+        votes = {player: True}
+        self.assertTrue(votes["兰斯洛特"])
+
+    def test_name_is_read_only(self):
+        """测试玩家名称不可修改"""
+        player = Player("高文")
+        with self.assertRaises(AttributeError):
+            player.name = "其他"
+
+    def test_quest_team_membership(self):
+        """测试任务队伍的集合成员检查"""
+        players = [Player(f"队员{i}") for i in range(3)]
+        quest = Quest(1, 2)
+        quest.add_team_member(players[0])
+        quest.add_team_member(players[1])
+        self.assertTrue(quest.has_member(players[0]))
+        self.assertTrue(quest.has_member("队员1"))
+        self.assertFalse(quest.has_member(players[2]))
+        with self.assertRaises(ValueError):
+            quest.add_team_member(players[2])
+
+        quest.team = [players[2]]
+        self.assertTrue(quest.has_member(players[2]))
+        self.assertFalse(quest.has_member(players[0]))
+
+    def test_revealed_by_amulet(self):
+        """测试护身符查验记录去重"""
+        target, revealer = Player("目标"), Player("查验者")
+        target.add_revealer(revealer)
+        target.add_revealer(Player("查验者"))
+        self.assertEqual(len(target.revealed_by_amulet), 1)
+        self.assertTrue(target.was_revealed_by(revealer))
+
+
+class TestFinalQuestVoting(unittest.TestCase):
+    def setUp(self):
+        self.players = [Player(f"终局玩家{i}") for i in range(1, 6)]
+        self.game = Game(self.players, 5)
+
+    def test_final_quest_flow(self):
+        """测试最终任务的提名、投票、组队与执行"""
+        self.game.start_final_quest()
+
+        nominator = next(p for p in self.players if p.team == Team.GOOD)
+        leader = self.players[0]
+        self.game.nominate_final_leader(nominator, leader)
+
+        for player in self.players:
+            self.game.vote_for_final_leader(player, True)
+        with self.assertRaises(ValueError):
+            self.game.vote_for_final_leader(self.players[0], True)
+        self.assertEqual(self.game.final_quest.status, FinalQuestStatus.SELECTING_TEAM)
+
+        team = self.players[:self.game.final_quest.required_players]
+        for member in team:
+            self.game.assign_final_quest_member(leader, member)
+        self.assertEqual(self.game.final_quest.status, FinalQuestStatus.EXECUTING)
+
+        for member in team:
+            self.game.submit_final_quest_result(member, True)
+        self.assertEqual(self.game.current_phase, GamePhase.GAME_OVER)
+        self.assertEqual(self.game.game_result['winning_team'], Team.GOOD)
+        self.assertEqual(self.game.get_game_status()['winner'], 'GOOD')
+        with self.assertRaises(ValueError):
+            self.game.start_final_quest()
+
+    def test_start_final_quest_once(self):
+        """测试最终任务只能开始一次"""
+        self.game.start_final_quest()
+        with self.assertRaises(ValueError):
+            self.game.start_final_quest()
+
+    def test_final_leader_vote_rejected(self):
+        """测试最终任务领袖投票未过半时重置提名"""
+        self.game.start_final_quest()
+        nominator = next(p for p in self.players if p.team == Team.GOOD)
+        self.game.nominate_final_leader(nominator, self.players[1])
+        for player in self.players:
+            self.game.vote_for_final_leader(player, False)
+        self.assertIsNone(self.game.final_quest.nominated_leader)
+        self.assertEqual(self.game.final_quest.votes, {})
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
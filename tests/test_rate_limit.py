@@ -0,0 +1,120 @@
+import unittest
+import sys
+import os
+
+# 添加项目根目录到 Python 路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tests.helpers import quiet  # 在导入 app 之前把数据目录指向临时目录
+
+from ratelimit import RateLimiter
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestSocketRateLimit(unittest.TestCase):
+    def setUp(self):
+        import app
+        self.app = app
+        self.clock = FakeClock()
+        self.original = (app.sid_limiter, app.ip_limiter, app.app.config['MAX_ROOMS'])
+        app.sid_limiter = RateLimiter(rate=1, burst=2, clock=self.clock)
+        app.ip_limiter = RateLimiter(rate=0, burst=0)
+        self.created = []
+
+    def tearDown(self):
+        app = self.app
+        app.sid_limiter, app.ip_limiter, app.app.config['MAX_ROOMS'] = self.original
+        for code in self.created:
+            app.rooms.pop(code, None)
+            app.lobby.remove(code)
+
+    def test_connection_bucket(self):
+        """测试单个连接发送过快时被限流并计数，令牌补充后恢复，断开后删除令牌桶"""
+        app = self.app
+        before = app.throttled_events.get('subscribe_lobby', 0)
+        client = app.socketio.test_client(app.app)
+        other = app.socketio.test_client(app.app)
+        try:
+            with quiet():
+                replies = [client.emit('subscribe_lobby', {}, callback=True) for _ in range(3)]
+                other_reply = other.emit('subscribe_lobby', {}, callback=True)
+                self.clock.now += 1
+                recovered = client.emit('subscribe_lobby', {}, callback=True)
+        finally:
+            with quiet():
+                client.disconnect()
+        self.assertNotIn('error', replies[1])
+        self.assertEqual(replies[2], {'error': app.THROTTLED_ERROR})
+        self.assertNotIn('error', other_reply)
+        self.assertNotIn('error', recovered)
+        self.assertEqual(app.throttled_events['subscribe_lobby'], before + 1)
+        self.assertEqual(len(app.sid_limiter), 1)
+        with quiet():
+            other.disconnect()
+
+    def test_ip_bucket_refuses_connections(self):
+        """测试同一 IP 的新连接超过限额时被拒绝"""
+        app = self.app
+        app.ip_limiter = RateLimiter(rate=1, burst=1, clock=self.clock)
+        before = app.admission_rejected['connections']
+        with quiet():
+            first = app.socketio.test_client(app.app)
+            second = app.socketio.test_client(app.app)
+        try:
+            self.assertTrue(first.is_connected())
+            self.assertFalse(second.is_connected())
+            self.assertEqual(app.admission_rejected['connections'], before + 1)
+        finally:
+            with quiet():
+                first.disconnect()
+
+    def test_room_cap(self):
+        """测试房间数达到上限后创建房间和快速匹配都被拒绝"""
+        app = self.app
+        app.sid_limiter = RateLimiter(rate=0, burst=0)
+        app.app.config['MAX_ROOMS'] = len(app.rooms) + len(app.reserved_codes) + 1
+        before = app.admission_rejected['rooms']
+        client = app.socketio.test_client(app.app)
+        try:
+            with quiet():
+                created = client.emit('create_room', {'player_count': 5}, callback=True)
+                self.created.append(created['room_info']['code'])
+                full = client.emit('create_room', {'player_count': 5}, callback=True)
+                matched = client.emit('quick_match', {'player_count': 5}, callback=True)
+        finally:
+            with quiet():
+                client.disconnect()
+        self.assertEqual(full, {'error': app.ROOMS_FULL_ERROR})
+        self.assertEqual(matched, {'error': app.ROOMS_FULL_ERROR})
+        self.assertEqual(app.admission_rejected['rooms'], before + 2)
+        metrics = app.app.test_client().get('/metrics').get_json()['rate_limit']
+        self.assertEqual(metrics['max_rooms'], app.app.config['MAX_ROOMS'])
+        self.assertEqual(metrics['rejected']['rooms'], before + 2)
+
+    def test_room_cap_counts_reserved_rooms(self):
+        """测试已预留、还没登记的房间也占用名额，放弃后名额释放"""
+        app = self.app
+        app.app.config['MAX_ROOMS'] = len(app.rooms) + len(app.reserved_codes) + 1
+        with quiet():
+            pending = app.Room('玩家1', 5)
+            with self.assertRaises(ValueError):
+                app.Room('玩家1', 5)
+            app.discard_room(pending)
+            room = app.Room('玩家1', 5)
+            app.register_room(room)
+        self.created.append(room.code)
+        self.assertNotIn(pending.code, app.reserved_codes)
+        self.assertIs(app.rooms[room.code], room)
+        with self.assertRaises(ValueError):
+            app.reserve_room_code()
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
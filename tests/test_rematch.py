@@ -0,0 +1,116 @@
+import unittest
+import random
+import sys
+import os
+
+# 添加项目根目录到 Python 路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tests.helpers import quiet  # 在导入 app 之前把数据目录指向临时目录
+
+from bots import play_out
+from game import Game, GameAction, GamePhase, Player
+
+
+class TestGameRematch(unittest.TestCase):
+    def setUp(self):
+        random.seed(5)
+        with quiet():
+            self.game = Game([Player(f"玩家{i}") for i in range(1, 8)], 7)
+
+    def test_rematch_resets_in_place(self):
+        """测试再来一局清空任务、历史和指示物并重新分配角色"""
+        game = self.game
+        with quiet():
+            game.dispatch(GameAction.USE_AMULET, '玩家1', target='玩家2')
+            play_out(game, random.Random(1))
+        players = list(game.players)
+        roles_before = sorted(p.role.name for p in players)
+        with quiet():
+            game.rematch()
+        self.assertEqual(game.match_number, 2)
+        self.assertEqual(game.current_phase, GamePhase.LEADER_TURN)
+        self.assertEqual(game.players, players)
+        self.assertIsNone(game.winner)
+        self.assertEqual(game.quest_number, 1)
+        for name in ('quest_results', 'quest_history', 'action_log', 'amulet_history'):
+            self.assertEqual(len(getattr(game, name)), 0, name)
+        self.assertEqual(game.previous_leaders, set())
+        self.assertEqual(game.fail_votes_cast, {})
+        self.assertTrue(all(p.amulets == 1 and p.magic_tokens == 0 and not p.revealed_by_amulet
+                            for p in players))
+        self.assertEqual(sorted(p.role.name for p in players), roles_before)
+        with quiet():
+            play_out(game, random.Random(2))
+        self.assertEqual(game.current_phase, GamePhase.GAME_OVER)
+
+    def test_rematch_requires_game_over(self):
+        """测试对局进行中不能再来一局"""
+        with self.assertRaises(ValueError):
+            self.game.rematch()
+
+    def test_fork_keeps_previous_match(self):
+        """测试再来一局不影响之前创建的分支"""
+        with quiet():
+            play_out(self.game, random.Random(3))
+            branch = self.game.fork()
+            self.game.rematch()
+        self.assertEqual(branch.current_phase, GamePhase.GAME_OVER)
+        self.assertGreater(len(branch.action_log), 0)
+
+
+class TestRoomRematch(unittest.TestCase):
+    def test_rematch_event(self):
+        """测试房主发起再来一局：房间号和 Game 对象不变，比分累计，所有连接收到 game_started"""
+        import app
+        clients = [app.socketio.test_client(app.app) for _ in range(4)]
+        try:
+            with quiet():
+                code = clients[0].emit('create_room', {'player_count': 4}, callback=True)['room_info']['code']
+                for client in clients[1:]:
+                    client.emit('join_room', {'room_code': code}, callback=True)
+                clients[0].emit('start_game', {'room_code': code, 'player_name': '玩家1'}, callback=True)
+                room = app.rooms[code]
+                game = room.game
+                self.assertIn('error', clients[0].emit('rematch', {'room_code': code, 'player_name': '玩家1'},
+                                                       callback=True))
+                sockets = {p.name: clients[i] for i, p in enumerate(room.players)}
+                rng = random.Random(0)
+
+                def emit(name, action, payload):
+                    sockets[name].emit(action.value, {'room_code': code, 'player_name': name, **payload},
+                                       callback=True)
+
+                for match in (1, 2):
+                    play_out(room.game, rng, dispatch=emit)
+                    if match == 1:
+                        denied = clients[1].emit('rematch', {'room_code': code, 'player_name': '玩家2'},
+                                                 callback=True)
+                        for client in clients:
+                            client.get_received()
+                        reply = clients[0].emit('rematch', {'room_code': code, 'player_name': '玩家1'},
+                                                callback=True)
+                        received = clients[3].get_received()
+                        started = [e for e in received if e['name'] == 'game_started']
+                        private = [e for e in received if e['name'] == 'player_info']
+                over = [e for e in clients[2].get_received() if e['name'] == 'game_over']
+        finally:
+            for client in clients:
+                client.disconnect()
+        self.assertIn('error', denied)
+        self.assertTrue(reply['success'])
+        self.assertEqual(reply['match_number'], 2)
+        self.assertEqual(reply['series']['games'], 1)
+        self.assertIs(room.game, game)
+        self.assertEqual(len(started), 1)
+        self.assertEqual(len(private), 1)
+        self.assertEqual(started[0]['args'][0]['series']['games'], 1)
+        series = over[-1]['args'][0]['series']
+        self.assertEqual(series['games'], 2)
+        self.assertEqual(series['GOOD'] + series['EVIL'], 2)
+        # 4 人局每局有 2 名获胜者
+        self.assertEqual(sum(series['wins'].values()), 4)
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,165 @@
+import unittest
+import json
+import random
+import shutil
+import sys
+import os
+import tempfile
+
+# 添加项目根目录到 Python 路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tests.helpers import quiet  # 在导入 app 之前把数据目录指向临时目录
+
+from bots import play_out
+from game import Game, Player
+from replay import MAX_GAP, ReplayStore
+
+
+def play_game(player_count, rng):
+    """由机器人决策打完一局"""
+    players = [Player(f"回放玩家{i}") for i in range(1, player_count + 1)]
+    game = Game(players, player_count)
+    play_out(game, rng)
+    return game if game.is_game_over() else None
+
+
+def setUpModule():
+    global GAME
+    with quiet():
+        rng = random.Random(5)
+        GAME = next(g for g in (play_game(7, rng) for _ in range(20))
+                    if g and len(g.quest_history) >= 3)
+
+
+class TestReplayStore(unittest.TestCase):
+    def setUp(self):
+        self.game = GAME
+        self.path = tempfile.mkdtemp()
+        self.store = ReplayStore(self.path)
+        self.replay_id = self.store.save(self.game)
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def records(self, **kwargs):
+        return [json.loads(line) for line in self.store.stream(self.replay_id, **kwargs)]
+
+    def test_full_stream(self):
+        """测试完整回放：header、全部动作和 end"""
+        records = self.records()
+        header, actions, end = records[0], records[1:-1], records[-1]
+        self.assertEqual(header['type'], 'header')
+        self.assertEqual(header['winner'], self.game.winner)
+        self.assertEqual({p['name'] for p in header['players']}, {p.name for p in self.game.players})
+        self.assertEqual(len(actions), len(self.game.action_log))
+        self.assertEqual([a['seq'] for a in actions], list(range(len(actions))))
+        self.assertEqual(end, {'type': 'end', 'winner': self.game.winner})
+        self.assertEqual(self.store.header(self.replay_id), header)
+        self.assertEqual(self.store.stats()['streams'], 0)
+
+    def test_seek_to_quest(self):
+        """测试跳转到指定任务轮次"""
+        records = self.records(from_quest=3)
+        actions = records[1:-1]
+        self.assertTrue(actions)
+        self.assertEqual(actions[0]['quest'], 3)
+        self.assertEqual(len(actions), sum(1 for a in self.game.action_log if a['quest'] >= 3))
+        self.assertEqual(self.records(from_quest=99)[1:], [{'type': 'end', 'winner': self.game.winner}])
+
+    def test_playback_speed(self):
+        """测试按倍速等待，且单次等待有上限"""
+        waits = []
+        list(self.store.stream(self.replay_id, speed=4, sleep=waits.append))
+        self.assertTrue(all(0 < w <= MAX_GAP / 4 for w in waits))
+        times = [a['t'] for a in self.game.action_log]
+        expected = sum(min(b - a, MAX_GAP) / 4 for a, b in zip(times, times[1:]) if b > a)
+        self.assertAlmostEqual(sum(waits), expected, places=6)
+
+        none = []
+        list(self.store.stream(self.replay_id, sleep=none.append))
+        self.assertEqual(none, [])
+
+    def test_invalid_requests(self):
+        """测试不存在的回放ID和非法速度"""
+        with self.assertRaises(ValueError):
+            self.store.stream('../../etc/passwd')
+        with self.assertRaises(ValueError):
+            self.store.stream('0' * 32)
+        with self.assertRaises(ValueError):
+            self.store.stream(self.replay_id, speed=-1)
+        self.assertIsNone(self.store.header('0' * 32))
+        self.assertEqual(self.store.recent(), [self.replay_id])
+
+    def test_buffered_save(self):
+        """测试后台写入：save 立即返回，写入前也能列出和读取，写完后从磁盘读取"""
+        spawned = []
+        store = ReplayStore(self.path, spawn=spawned.append, sleep=lambda s: None)
+        replay_id = store.save(self.game)
+        second = store.save(self.game)
+        self.assertEqual(len(spawned), 1)
+        self.assertFalse(os.path.exists(os.path.join(self.path, f"{second}.ndjson")))
+        self.assertEqual(store.stats()['pending'], 2)
+        self.assertEqual(store.recent(2), [second, replay_id])
+        self.assertTrue(store.exists(second))
+
+        self.assertEqual(store.header(replay_id)['id'], replay_id)
+        self.assertEqual(store.stats()['pending'], 0)
+        spawned[0]()
+        self.assertFalse(store._running)
+        self.assertEqual(self.records(), [json.loads(line) for line in store.stream(self.replay_id)])
+
+    def test_recent_index(self):
+        """测试最近回放来自内存索引，重新打开时从目录加载"""
+        later = self.store.save(self.game)
+        self.assertEqual(self.store.recent(), [later, self.replay_id])
+        self.assertEqual(self.store.recent(1), [later])
+        self.assertEqual(self.store.recent(-1), [])
+        self.assertEqual(set(ReplayStore(self.path).recent()), {later, self.replay_id})
+
+    def test_unfinished_game(self):
+        """测试未结束的对局不保存"""
+        game = Game([Player(f"回放玩家{i}") for i in range(1, 6)], 5)
+        self.assertIsNone(self.store.save(game))
+
+
+class TestReplayRoutes(unittest.TestCase):
+    def setUp(self):
+        import app
+        self.app = app
+        self.path = tempfile.mkdtemp()
+        self.original = app.replays
+        app.replays = ReplayStore(self.path)
+        self.replay_id = app.replays.save(GAME)
+        self.client = app.app.test_client()
+
+    def tearDown(self):
+        self.app.replays = self.original
+        shutil.rmtree(self.path)
+
+    def test_ndjson_and_sse(self):
+        """测试 NDJSON 和 SSE 两种流式格式"""
+        response = self.client.get(f'/replays/{self.replay_id}/stream?from_quest=2')
+        self.assertEqual(response.mimetype, 'application/x-ndjson')
+        lines = response.get_data().splitlines()
+        self.assertEqual(json.loads(lines[0])['id'], self.replay_id)
+
+        response = self.client.get(f'/replays/{self.replay_id}/stream?format=sse')
+        self.assertEqual(response.mimetype, 'text/event-stream')
+        events = response.get_data().split(b'\n\n')
+        self.assertTrue(events[0].startswith(b'data: {'))
+
+        self.assertEqual(self.client.get('/replays/' + '0' * 32).status_code, 404)
+        self.assertEqual(self.client.get(f'/replays/{self.replay_id}/stream?speed=1000').status_code, 400)
+        self.assertEqual(self.client.get('/replays').get_json()['replays'], [self.replay_id])
+
+    def test_limit_validation(self):
+        """测试非法的 limit 返回 400，过大的 limit 被截断"""
+        self.assertEqual(self.client.get('/replays?limit=abc').status_code, 400)
+        self.assertEqual(self.client.get('/stats/leaderboard?limit=abc').status_code, 400)
+        self.assertEqual(self.client.get('/replays?limit=1000000').get_json()['replays'], [self.replay_id])
+        self.assertEqual(self.client.get('/replays?limit=0').get_json()['replays'], [])
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,115 @@
+import unittest
+import json
+import random
+import sys
+import os
+import tempfile
+
+# 添加项目根目录到 Python 路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tests.helpers import quiet
+
+from game import Game, GamePhase, Player
+from rules import RULE_SETS, STANDARD_RULES, Role, RuleSet, Team, get_rules, load_rules
+
+VARIANT = {
+    'name': '六人快速局',
+    'quest_sizes': {'6': [2, 2, 3, 3, 3]},
+    'final_quest_sizes': {'6': 3},
+    'roles': {'6': ['LOYAL_SERVANT', 'LOYAL_SERVANT', 'LOYAL_SERVANT', 'DUKE', 'MORGAN', 'MORDRED_MINION']},
+    'visibility': {'MORDRED_MINION': ['MORGAN', 'PRINCE']},
+}
+
+
+def new_game(player_count, rules=STANDARD_RULES):
+    with quiet():
+        return Game([Player(f"玩家{i}") for i in range(1, player_count + 1)], player_count, rules)
+
+
+class TestRuleTables(unittest.TestCase):
+    def test_tables_are_shared_and_read_only(self):
+        """测试对局引用共享的只读规则表"""
+        first, second = new_game(7), new_game(7)
+        self.assertIs(first.rules, second.rules)
+        self.assertIs(first.quest_requirements, STANDARD_RULES.for_players(7).quest_sizes)
+        self.assertEqual(first.quest_requirements, (2, 3, 3, 4, 4))
+        with self.assertRaises(AttributeError):
+            first.rules.final_quest_size = 1
+        with self.assertRaises(TypeError):
+            first.rules.visibility[Role.PRINCE] = frozenset()
+
+    def test_standard_tables(self):
+        """测试标准规则覆盖 4-10 人，角色数与人数一致"""
+        self.assertEqual(STANDARD_RULES.player_counts, tuple(range(4, 11)))
+        for count in STANDARD_RULES.player_counts:
+            table = STANDARD_RULES.for_players(count)
+            self.assertEqual(len(table.roles), count)
+            self.assertEqual(len(table.quest_sizes), 5)
+        self.assertEqual(STANDARD_RULES.for_players(4).final_quest_size, 3)
+        with self.assertRaises(ValueError):
+            new_game(11)
+
+    def test_visibility_only_lists_present_roles(self):
+        """测试可见性表只包含本局存在的角色"""
+        self.assertEqual(STANDARD_RULES.for_players(5).visibility,
+                         {Role.MORGAN: {Role.MORGAN, Role.PRINCE}})
+        ten = STANDARD_RULES.for_players(10).visibility
+        self.assertNotIn(Role.SHAPESHIFTER, ten[Role.MORGAN])
+        self.assertEqual(ten[Role.MORDRED_MINION], {Role.MORGAN})
+
+    def test_player_info_visibility(self):
+        """测试摩根勒菲看到邪恶方（幻形妖除外），忠臣看不到任何人"""
+        random.seed(3)
+        game = new_game(8)
+        morgan = next(p for p in game.players if p.role == Role.MORGAN)
+        with quiet():
+            seen = {info['name']: info.get('role') for info in game.get_player_info(morgan.name)
+                    if not info['is_self']}
+            servant = next(p for p in game.players if p.role == Role.LOYAL_SERVANT)
+            hidden = [info for info in game.get_player_info(servant.name) if not info['is_self']]
+        for player in game.players:
+            if player == morgan:
+                continue
+            expected = player.role.display_name if player.role == Role.MORDRED_MINION else None
+            self.assertEqual(seen[player.name], expected)
+        self.assertTrue(all('team' not in info for info in hidden))
+
+
+class TestRuleVariants(unittest.TestCase):
+    def tearDown(self):
+        RULE_SETS.pop(VARIANT['name'], None)
+
+    def test_variant_side_by_side(self):
+        """测试加载规则变体后与标准规则并存"""
+        with tempfile.NamedTemporaryFile('w', suffix='.json', delete=False, encoding='utf-8') as f:
+            json.dump(VARIANT, f, ensure_ascii=False)
+        try:
+            variant = load_rules(f.name)
+        finally:
+            os.remove(f.name)
+        self.assertIs(get_rules(VARIANT['name']), variant)
+        fast, standard = new_game(6, variant), new_game(6)
+        self.assertEqual(fast.quest_requirements, (2, 2, 3, 3, 3))
+        self.assertEqual(standard.quest_requirements, (2, 3, 4, 3, 4))
+        self.assertNotIn(Role.SHAPESHIFTER, [p.role for p in fast.players])
+        self.assertEqual(sum(p.team == Team.EVIL for p in fast.players), 2)
+        self.assertEqual(fast.current_phase, GamePhase.LEADER_TURN)
+        with self.assertRaises(ValueError):
+            new_game(5, variant)
+
+    def test_invalid_variants(self):
+        """测试人数、任务人数或角色无效的规则被拒绝"""
+        broken = dict(VARIANT, roles={'6': ['MORGAN']})
+        with self.assertRaises(ValueError):
+            RuleSet.from_dict(broken)
+        with self.assertRaises(ValueError):
+            RuleSet.from_dict(dict(VARIANT, quest_sizes={'6': [2, 2, 3, 3, 7]}))
+        with self.assertRaises(ValueError):
+            RuleSet.from_dict(dict(VARIANT, roles={'6': ['KING'] * 6}))
+        with self.assertRaises(ValueError):
+            get_rules('不存在')
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,148 @@
+import unittest
+import sys
+import os
+
+# 添加项目根目录到 Python 路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import tests.helpers  # 在导入 app 之前把数据目录指向临时目录
+
+from app import app, rooms, socketio
+from game import Game, GameAction, GamePhase, Player, Role
+
+
+def make_game(player_count=5):
+    players = [Player(f"状态机玩家{i}") for i in range(1, player_count + 1)]
+    return Game(players, player_count)
+
+
+class TestTransitionTable(unittest.TestCase):
+    def test_every_action_has_a_transition(self):
+        """测试每个动作都在转移表中"""
+        actions = {action for _, action in Game.TRANSITIONS}
+        self.assertEqual(actions, set(GameAction))
+
+    def test_wrong_phase_rejected(self):
+        """测试不在对应阶段的动作被拒绝且不改变状态"""
+        game = make_game()
+        with self.assertRaisesRegex(ValueError, '现在不是执行任务的阶段'):
+            game.dispatch(GameAction.SUBMIT_QUEST_VOTE, game.players[0].name, success=True)
+        self.assertEqual(game.current_phase, GamePhase.LEADER_TURN)
+
+    def test_team_validation(self):
+        """测试队伍校验"""
+        game = make_game()
+        leader = game.get_current_leader()
+        with self.assertRaisesRegex(ValueError, '队伍人数不正确'):
+            game.submit_team([leader.name], player_name=leader.name)
+        names = [p.name for p in game.players[:2]]
+        with self.assertRaisesRegex(ValueError, '只有领袖'):
+            game.submit_team(names, player_name=game.players[1].name)
+        with self.assertRaisesRegex(ValueError, '只有领袖'):
+            game.submit_team(names)
+        with self.assertRaisesRegex(ValueError, '队员不能重复'):
+            game.submit_team([names[0], names[0]], player_name=leader.name)
+
+    def test_quest_cycle(self):
+        """测试一轮完整任务：组队 -> 投票 -> 选择下一任队长"""
+        game = make_game()
+        leader = game.get_current_leader()
+        team = game.players[:2]
+        result = game.submit_team([p.name for p in team], team[1].name, leader.name)
+        self.assertEqual(result.event, 'game_update')
+        self.assertEqual(game.current_phase, GamePhase.QUEST_VOTE)
+        self.assertEqual(team[1].magic_tokens, 1)
+
+        result = game.submit_quest_result(team[0], True)
+        self.assertEqual(result.event, 'game_update')
+        with self.assertRaisesRegex(ValueError, '你已经投过票了'):
+            game.submit_quest_result(team[0], True)
+
+        result = game.submit_quest_result(team[1], False)
+        self.assertEqual(team[1].magic_tokens, 0)
+        # 持有魔法指示物的非摩根勒菲玩家只能出成功
+        self.assertEqual(result.event, 'quest_result')
+        self.assertEqual(result.reply['vote'], team[1].role != Role.MORGAN)
+        self.assertEqual(result.extra['success'], team[1].role != Role.MORGAN)
+        self.assertEqual(game.current_phase, GamePhase.SELECT_NEXT_LEADER)
+        self.assertEqual(game.quest_number, 2)
+
+        with self.assertRaisesRegex(ValueError, '新队长必须是没当过队长的玩家'):
+            game.select_next_leader(leader.name, leader.name)
+        result = game.select_next_leader(leader.name, game.players[2].name)
+        self.assertEqual(result.extra['next_leader'], game.players[2].name)
+        self.assertEqual(game.current_phase, GamePhase.LEADER_TURN)
+        self.assertIs(game.get_current_leader(), game.players[2])
+
+    def test_game_over(self):
+        """测试三次任务失败后游戏结束"""
+        game = make_game()
+        for _ in range(3):
+            leader = game.get_current_leader()
+            team = game.players[:game.current_quest.required_players]
+            game.submit_team([p.name for p in team], player_name=leader.name)
+            for player in team:
+                result = game.submit_quest_result(player, False)
+            if result.event == 'quest_result':
+                candidate = next(p for p in game.players if p not in game.previous_leaders)
+                game.select_next_leader(leader.name, candidate.name)
+        self.assertEqual(result.event, 'game_over')
+        self.assertEqual(result.extra['winner'], 'EVIL')
+        self.assertTrue(game.is_game_over())
+        self.assertEqual(game.get_game_status()['winner'], 'EVIL')
+
+
+class TestSocketHandlers(unittest.TestCase):
+    def setUp(self):
+        app.config['TESTING'] = True
+        rooms.clear()
+        self.clients = []
+
+    def tearDown(self):
+        for client in self.clients:
+            client.disconnect()
+        rooms.clear()
+
+    def connect(self):
+        client = socketio.test_client(app)
+        self.clients.append(client)
+        return client
+
+    def test_quest_round_through_sockets(self):
+        """测试通过 Socket.IO 处理器完成一轮任务"""
+        host = self.connect()
+        ack = host.emit('create_room', {'player_count': 5}, callback=True)
+        code = ack['room_info']['code']
+        names = [ack['player_name']]
+        clients = {names[0]: host}
+        for _ in range(4):
+            client = self.connect()
+            ack = client.emit('join_room', {'room_code': code}, callback=True)
+            names.append(ack['player_name'])
+            clients[ack['player_name']] = client
+        self.assertEqual(host.emit('start_game', {'room_code': code, 'player_name': names[0]},
+                                   callback=True), {'success': True})
+
+        game = rooms[code].game
+        wrong = host.emit('submit_quest_vote', {'room_code': code, 'player_name': names[0],
+                                                'success': True}, callback=True)
+        self.assertIn('error', wrong)
+
+        team = names[:2]
+        leader = game.get_current_leader().name
+        self.assertIn('error', host.emit('submit_team', {'room_code': code, 'team': team}, callback=True))
+        self.assertEqual(clients[leader].emit('submit_team', {'room_code': code, 'player_name': leader,
+                                                              'team': team}, callback=True), {'success': True})
+        self.assertEqual(game.current_phase, GamePhase.QUEST_VOTE)
+
+        for name in team:
+            ack = clients[name].emit('submit_quest_vote', {'room_code': code, 'player_name': name,
+                                                           'success': True}, callback=True)
+            self.assertTrue(ack['success'])
+        self.assertEqual(game.current_phase, GamePhase.SELECT_NEXT_LEADER)
+        events = [message['name'] for message in clients[names[4]].get_received()]
+        self.assertIn('quest_result', events)
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
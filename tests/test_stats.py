@@ -0,0 +1,207 @@
+import unittest
+import random
+import shutil
+import sys
+import os
+import tempfile
+
+# 添加项目根目录到 Python 路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tests.helpers import quiet  # 在导入 app 之前把数据目录指向临时目录
+
+from bots import play_out
+from game import Game, Player, Team
+import stats
+from stats import LEADERBOARDS, MIN_GAMES_FOR_RATE, PlayerStatsStore, game_deltas, profile_id_for
+
+
+def profile_of(name):
+    """测试玩家的档案 id"""
+    return profile_id_for(f"token-of-{name}-0123456789")
+
+
+def play_game(names, rng, bots=()):
+    """由机器人决策打完一局"""
+    players = [Player(name) for name in names]
+    for player in players:
+        player.is_bot = player.name in bots
+        player.profile_id = profile_of(player.name)
+    game = Game(players, len(players))
+    play_out(game, rng)
+    return game if game.is_game_over() else None
+
+
+class TestPlayerStats(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        with quiet():
+            rng = random.Random(11)
+            names = [f"统计玩家{i}" for i in range(1, 8)]
+            cls.games = [g for g in (play_game(rng.sample(names, 5), rng) for _ in range(30)) if g]
+            cls.bot_game = play_game(names[:5], rng, bots={names[0], names[1]})
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.store = PlayerStatsStore(os.path.join(self.path, 'stats.sqlite3'))
+
+    def tearDown(self):
+        self.store.close()
+        shutil.rmtree(self.path)
+
+    def expected(self):
+        """逐局累计的期望统计"""
+        totals = {}
+        for game in self.games:
+            for player in game.players:
+                entry = totals.setdefault(player.profile_id, {'games': 0, 'wins': 0, 'quests_led': 0})
+                entry['games'] += 1
+                entry['wins'] += player.role.team.value == game.winner
+            for record in game.quest_history:
+                totals[profile_of(record['leader'])]['quests_led'] += 1
+        return totals
+
+    def test_game_deltas(self):
+        """测试单局增量：阵营计数、担任队长次数和失败票"""
+        game = self.games[0]
+        deltas = {d['player_id']: d for d in game_deltas(game)}
+        self.assertEqual(len(deltas), len(game.players))
+        for player in game.players:
+            delta = deltas[player.profile_id]
+            good = player.role.team == Team.GOOD
+            self.assertEqual(delta['good_games'], int(good))
+            self.assertEqual(delta['evil_games'], int(not good))
+            self.assertEqual(delta['wins'], int(player.role.team.value == game.winner))
+            if good:
+                self.assertEqual(delta['fail_votes'], 0)
+        self.assertEqual(sum(d['quests_led'] for d in deltas.values()), len(game.quest_history))
+        self.assertEqual(sum(d['fail_votes'] for d in deltas.values()),
+                         sum(r['fail_count'] for r in game.quest_history))
+
+    def test_batched_flush(self):
+        """测试多局记录合并为一次批量写入，档案与逐局累计一致"""
+        for game in self.games:
+            self.store.record(game)
+        self.assertEqual(self.store.stats()['pending'], sum(len(g.players) for g in self.games))
+        self.store.flush()
+        self.assertEqual(self.store.batches, 1)
+        for player_id, entry in self.expected().items():
+            profile = self.store.profile(player_id)
+            for key, value in entry.items():
+                self.assertEqual(profile[key], value)
+            self.assertEqual(sum(r['games'] for r in profile['roles'].values()), entry['games'])
+            self.assertEqual(profile['good_games'] + profile['evil_games'], entry['games'])
+
+    def test_reload_from_disk(self):
+        """测试重新打开数据库后档案和排行榜保持一致"""
+        half = len(self.games) // 2
+        for game in self.games[:half]:
+            self.store.record(game)
+        self.store.flush()
+        for game in self.games[half:]:
+            self.store.record(game)
+        self.store.close()
+
+        reopened = PlayerStatsStore(self.store.path)
+        try:
+            for player_id, entry in self.expected().items():
+                self.assertEqual(reopened.profile(player_id)['wins'], entry['wins'])
+            top = reopened.leaderboard('games', 1)[0]
+            self.assertEqual(top['games'], max(e['games'] for e in self.expected().values()))
+        finally:
+            reopened.close()
+
+    def test_leaderboard_order(self):
+        """测试排行榜排序和胜率榜的最少对局数"""
+        for game in self.games:
+            self.store.record(game)
+        self.store.flush()
+        wins = self.store.leaderboard('wins', 100)
+        self.assertEqual([p['wins'] for p in wins], sorted((p['wins'] for p in wins), reverse=True))
+        self.assertEqual(len(self.store.leaderboard('wins', 3)), 3)
+        rates = self.store.leaderboard('win_rate', 100)
+        self.assertTrue(all(p['games'] >= MIN_GAMES_FOR_RATE for p in rates))
+        self.assertEqual([p['win_rate'] for p in rates],
+                         sorted((p['win_rate'] for p in rates), reverse=True))
+        with self.assertRaises(ValueError):
+            self.store.leaderboard('luck')
+
+    def test_incremental_leaderboards(self):
+        """测试逐批增量更新的排行榜与全量排序一致（含胜率下降时榜外档案补进来）"""
+        def keys(boards):
+            return {by: [(p[by], p['games']) for p in board] for by, board in boards.items()}
+
+        original = stats.LEADERBOARD_SIZE
+        stats.LEADERBOARD_SIZE = 3
+        try:
+            for game in self.games:
+                self.store.record(game)
+                self.store.flush()
+                incremental = keys(self.store._leaderboards)
+                self.store._leaderboards = {by: [] for by in LEADERBOARDS}
+                self.store._rank()
+                self.assertEqual(incremental, keys(self.store._leaderboards))
+        finally:
+            stats.LEADERBOARD_SIZE = original
+        self.assertEqual(len(self.store.leaderboard('win_rate', 10)), 3)
+
+    def test_bots_excluded(self):
+        """测试机器人不计入统计"""
+        self.store.record(self.bot_game)
+        self.store.flush()
+        self.assertIsNone(self.store.profile(profile_of("统计玩家1")))
+        self.assertIsNone(self.store.profile(profile_of("统计玩家2")))
+        self.assertEqual(self.store.profile(profile_of("统计玩家3"))['games'], 1)
+        self.assertIsNone(self.store.profile(profile_of("不存在的玩家")))
+
+    def test_keyed_by_profile_not_seat(self):
+        """测试统计按档案累计：同一座位名的不同玩家分开，同一玩家换座位后合并，没有档案的不计入"""
+        with quiet():
+            first = play_game([f"玩家{i}" for i in range(1, 6)], random.Random(3))
+            second = play_game([f"玩家{i}" for i in range(1, 6)], random.Random(4))
+        for index, player in enumerate(first.players):
+            player.profile_id = profile_of(f"甲{index}")
+        for index, player in enumerate(second.players):
+            # 第二局的 2 号座位是第一局 1 号座位的同一个人，1 号座位没有档案
+            player.profile_id = profile_of(f"乙{index}")
+        second.players[1].profile_id = profile_of("甲0")
+        second.players[0].profile_id = None
+        self.store.record(first)
+        self.store.record(second)
+        self.store.flush()
+        self.assertEqual(self.store.profile(profile_of("甲0"))['games'], 2)
+        self.assertEqual(self.store.profile(profile_of("甲1"))['games'], 1)
+        self.assertIsNone(self.store.profile(profile_of("乙0")))
+        self.assertEqual(self.store.stats()['players'], 5 + 3)
+        self.assertIsNone(profile_id_for('短'))
+        self.assertIsNone(profile_id_for(None))
+        self.assertEqual(len(profile_id_for('x' * 32)), 16)
+
+
+class TestProfileIdentity(unittest.TestCase):
+    def test_token_sets_seat_profile(self):
+        """测试连接时带的令牌派生档案 id，创建和加入房间时记到座位上"""
+        import app
+        token = 'abcdef0123456789abcdef'
+        host = app.socketio.test_client(app.app, auth={'player_token': token})
+        guest = app.socketio.test_client(app.app)
+        try:
+            with quiet():
+                protocol = [m['args'][0] for m in host.get_received() if m['name'] == 'protocol'][0]
+                code = host.emit('create_room', {'player_count': 5}, callback=True)['room_info']['code']
+                guest.emit('join_room', {'room_code': code}, callback=True)
+            room = app.rooms[code]
+            self.assertEqual(protocol['profile_id'], profile_id_for(token))
+            self.assertEqual(room.players[0].profile_id, profile_id_for(token))
+            self.assertIsNone(room.players[1].profile_id)
+            self.assertEqual(room.snapshot()['players'][0]['profile_id'], profile_id_for(token))
+        finally:
+            with quiet():
+                host.disconnect()
+                guest.disconnect()
+            app.rooms.pop(code, None)
+            app.lobby.remove(code)
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
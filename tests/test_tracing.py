@@ -0,0 +1,132 @@
+import unittest
+import json
+import random
+import shutil
+import sys
+import os
+import tempfile
+import threading
+
+# 添加项目根目录到 Python 路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tests.helpers import quiet  # 在导入 app 之前把数据目录指向临时目录
+
+from bots import decide
+from broadcast import BroadcastCoalescer
+from tracing import NULL_SPAN, Tracer, TracedJSON, activate, current_trace, span
+
+
+def read_events(path):
+    """读取 Chrome Trace 文件（结尾可以没有 "]"）"""
+    with open(path, encoding='utf-8') as f:
+        text = f.read().rstrip().rstrip(',')
+    return json.loads(text + ']')
+
+
+class TestTracer(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp, 'traces', 'actions.json')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+    def test_sampling(self):
+        """测试未采样时返回空上下文且不写文件"""
+        tracer = Tracer(self.path, sample_rate=0.5, random_fn=lambda: 0.9)
+        self.assertIs(tracer.trace('select_team'), NULL_SPAN)
+        self.assertIs(Tracer(self.path, sample_rate=0).trace('select_team'), NULL_SPAN)
+        self.assertIs(span('validate'), NULL_SPAN)
+        self.assertFalse(os.path.exists(self.path))
+
+    def test_nested_spans(self):
+        """测试 span 嵌套在根 span 内并带有房间和玩家标签"""
+        tracer = Tracer(self.path, sample_rate=1)
+        with tracer.trace('select_team', room='1234', player='玩家1'):
+            with span('validate'):
+                pass
+            self.assertEqual(TracedJSON.dumps({'a': 1}), '{"a": 1}')
+        self.assertIsNone(current_trace())
+        events = read_events(self.path)
+        self.assertEqual([e['name'] for e in events], ['validate', 'json_encode', 'select_team'])
+        root = events[-1]
+        for event in events:
+            self.assertEqual(event['ph'], 'X')
+            self.assertEqual(event['args']['trace'], root['args']['trace'])
+            self.assertEqual(event['args']['room'], '1234')
+            self.assertGreaterEqual(event['ts'], root['ts'])
+            self.assertLessEqual(event['ts'] + event['dur'], root['ts'] + root['dur'] + 1)
+        self.assertIn('time', root['args'])
+        self.assertEqual(tracer.stats()['spans'], 3)
+
+    def test_coalesced_broadcast_continues_trace(self):
+        """测试合并广播在其他线程发送时仍记入触发它的 trace"""
+        tracer = Tracer(self.path, sample_rate=1)
+        sent = threading.Event()
+        coalescer = BroadcastCoalescer(lambda event, payload, room: sent.set(), window_ms=1)
+        with tracer.trace('vote', room='5678'):
+            coalescer.publish('5678', 'game_update', lambda: {'game_state': {}})
+        self.assertTrue(sent.wait(2))
+        tracer.flush()
+        names = [e['name'] for e in read_events(self.path)]
+        self.assertIn('build_payload', names)
+        self.assertIn('coalesced_send', names)
+        with activate(None):
+            self.assertIsNone(current_trace())
+
+    def test_rotation(self):
+        """测试超过大小后轮转并保留指定数量的旧文件"""
+        tracer = Tracer(self.path, sample_rate=1, max_bytes=400, backups=2)
+        for _ in range(20):
+            with tracer.trace('vote', room='1'):
+                pass
+        tracer.close()
+        self.assertTrue(os.path.exists(self.path + '.1'))
+        self.assertTrue(os.path.exists(self.path + '.2'))
+        self.assertFalse(os.path.exists(self.path + '.3'))
+        self.assertEqual(read_events(self.path + '.1')[0]['name'], 'vote')
+
+
+class TestActionTracing(unittest.TestCase):
+    def test_socket_action_trace(self):
+        """测试通过 Socket 提交的动作记录校验、变更、构建状态、编码和发送"""
+        import app
+        tmp = tempfile.mkdtemp()
+        original = app.tracer
+        app.tracer = Tracer(os.path.join(tmp, 'actions.json'), sample_rate=1)
+        clients = [app.socketio.test_client(app.app) for _ in range(4)]
+        try:
+            with quiet():
+                reply = clients[0].emit('create_room', {'player_count': 4}, callback=True)
+                code = reply['room_info']['code']
+                for client in clients[1:]:
+                    client.emit('join_room', {'room_code': code}, callback=True)
+                clients[0].emit('start_game', {'room_code': code, 'player_name': '玩家1'}, callback=True)
+                room = app.rooms[code]
+                leader = room.game.players[room.game.current_leader_index].name
+                action, payload = decide(room.game, leader, random.Random(0))
+                sender = clients[[p.name for p in room.players].index(leader)]
+                reply = sender.emit(action.value, {'room_code': code, 'player_name': leader, **payload},
+                                    callback=True)
+                app.broadcaster.flush()
+            self.assertNotIn('error', reply)
+            app.tracer.flush()
+            events = read_events(app.tracer.path)
+            names = {e['name'] for e in events}
+            for name in (action.value, 'lock_wait', 'validate', 'mutate', 'build_payload', 'emit', 'json_encode'):
+                self.assertIn(name, names)
+            emit = next(e for e in events if e['name'] == 'emit')
+            self.assertEqual(emit['args']['recipients'], 4)
+            self.assertEqual(emit['args']['room'], code)
+            self.assertEqual(emit['args']['player'], leader)
+        finally:
+            for client in clients:
+                client.disconnect()
+            app.tracer.close()
+            app.tracer = original
+            shutil.rmtree(tmp, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,87 @@
+import unittest
+import json
+import sys
+import os
+
+# 添加项目根目录到 Python 路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import tests.helpers  # 在导入 app 之前把数据目录指向临时目录
+
+import wire
+from app import app, rooms, socketio
+from game import Game, Player
+
+
+@unittest.skipUnless(wire.AVAILABLE, "未安装 msgpack")
+class TestWireProtocol(unittest.TestCase):
+    def setUp(self):
+        players = [Player(f"协议玩家{i}") for i in range(1, 8)]
+        self.game = Game(players, 7)
+        leader = self.game.get_current_leader()
+        team = [p.name for p in players[:self.game.current_quest.required_players]]
+        self.game.submit_team(team, team[0], leader.name)
+        self.game.submit_quest_result(players[1], False)
+
+    def test_game_state_round_trip(self):
+        """测试 game_state 编码后可以还原"""
+        payload = {'game_state': self.game.get_game_status(), 'next_leader': '协议玩家3'}
+        self.assertEqual(wire.decode(wire.encode(payload)), payload)
+
+    def test_game_over_round_trip(self):
+        """测试包含获胜方的状态可以还原"""
+        self.game._end_game(self.game.players[0].team)
+        payload = {'winner': 'GOOD', 'game_state': self.game.get_game_status()}
+        self.assertEqual(wire.decode(wire.encode(payload)), payload)
+
+    def test_player_info_round_trip(self):
+        """测试每个玩家的私有信息可以还原"""
+        for player in self.game.players:
+            payload = {'player_info': self.game.get_player_info(player.name)}
+            self.assertEqual(wire.decode(wire.encode(payload)), payload)
+
+    def test_other_payloads_unchanged(self):
+        """测试不含游戏状态的负载原样传输"""
+        payload = {'code': '1234', 'players': [{'name': '玩家1', 'is_host': True}]}
+        self.assertEqual(wire.decode(wire.encode(payload)), payload)
+
+    def test_smaller_than_json(self):
+        """测试二进制负载小于 JSON"""
+        payload = {'game_state': self.game.get_game_status()}
+        self.assertLess(len(wire.encode(payload)), len(json.dumps(payload)) / 3)
+
+    def test_negotiate(self):
+        """测试协议协商"""
+        self.assertEqual(wire.negotiate('msgpack'), wire.PROTOCOL_MSGPACK)
+        self.assertEqual(wire.negotiate(None), wire.PROTOCOL_JSON)
+        self.assertEqual(wire.negotiate('cbor'), wire.PROTOCOL_JSON)
+
+
+@unittest.skipUnless(wire.AVAILABLE, "未安装 msgpack")
+class TestWireNegotiation(unittest.TestCase):
+    def tearDown(self):
+        rooms.clear()
+
+    def test_mixed_room(self):
+        """测试同一房间内 JSON 与二进制客户端各自收到对应格式"""
+        binary = socketio.test_client(app, auth={'protocol': 'msgpack'})
+        text = socketio.test_client(app)
+        try:
+            ack = binary.emit('create_room', {'player_count': 5}, callback=True)
+            text.emit('join_room', {'room_code': ack['room_info']['code']}, callback=True)
+
+            received = binary.get_received()
+            self.assertEqual(received[0]['args'][0]['protocol'], wire.PROTOCOL_MSGPACK)
+            updates = [m['args'][0] for m in received if m['name'] == 'room_update']
+            self.assertTrue(all(isinstance(update, bytes) for update in updates))
+            self.assertEqual(len(wire.decode(updates[-1])['players']), 2)
+
+            updates = [m['args'][0] for m in text.get_received() if m['name'] == 'room_update']
+            self.assertEqual(len(updates[-1]['players']), 2)
+        finally:
+            binary.disconnect()
+            text.disconnect()
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,204 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""按动作采样的延迟追踪
+
+每个被采样的玩家动作是一条 trace：根 span 覆盖 Socket 处理函数从收到到返回，
+其中嵌套校验、变更、构建 game_state、JSON/MessagePack 编码和房间 emit 等 span。
+合并广播在另一个线程中发送时，通过 activate() 把 span 继续记到同一条 trace 上。
+
+输出为 Chrome Trace Event 格式（JSON 数组，每行一个 "ph": "X" 事件），可以直接
+在 chrome://tracing 或 Perfetto 中打开；文件超过 max_bytes 后轮转。未被采样的
+动作只有一次随机数判断，span() 在没有活动 trace 时返回共享的空上下文。
+"""
+
+import itertools
+import json
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Optional
+
+_local = threading.local()
+
+
+class _NullSpan:
+    """未采样时使用的空上下文"""
+    __slots__ = ()
+
+    def __enter__(self):
+        return None
+
+    def __exit__(self, *exc):
+        return False
+
+
+NULL_SPAN = _NullSpan()
+
+
+class Trace:
+    """一条 trace：编号和附加在每个 span 上的标签（房间、玩家等）"""
+    __slots__ = ('tracer', 'id', 'tags')
+
+    def __init__(self, tracer, trace_id: int, tags: Dict):
+        self.tracer = tracer
+        self.id = trace_id
+        self.tags = tags
+
+
+class _Span:
+    __slots__ = ('trace', 'name', 'args', 'start')
+
+    def __init__(self, trace: Trace, name: str, args: Dict):
+        self.trace = trace
+        self.name = name
+        self.args = args
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self.trace
+
+    def __exit__(self, *exc):
+        self.trace.tracer.record(self.trace, self.name, self.start, time.perf_counter_ns(), self.args)
+        return False
+
+
+class _RootSpan(_Span):
+    """根 span：进入时把 trace 设为当前线程的活动 trace，退出时恢复并写出"""
+    __slots__ = ('previous',)
+
+    def __enter__(self):
+        self.previous = getattr(_local, 'trace', None)
+        _local.trace = self.trace
+        return super().__enter__()
+
+    def __exit__(self, *exc):
+        super().__exit__(*exc)
+        _local.trace = self.previous
+        self.trace.tracer.flush()
+        return False
+
+
+def current_trace() -> Optional[Trace]:
+    """当前线程的活动 trace"""
+    return getattr(_local, 'trace', None)
+
+
+def span(name: str, **args):
+    """在当前 trace 中记录一个 span，没有活动 trace 时不做任何事"""
+    trace = getattr(_local, 'trace', None)
+    if trace is None:
+        return NULL_SPAN
+    return _Span(trace, name, args)
+
+
+@contextmanager
+def activate(trace: Optional[Trace]):
+    """在其他线程中继续记录同一条 trace（例如合并广播延迟发送时）"""
+    previous = getattr(_local, 'trace', None)
+    _local.trace = trace
+    try:
+        yield trace
+    finally:
+        _local.trace = previous
+
+
+class TracedJSON:
+    """供 Socket.IO 编码数据包使用的 json 模块，在 trace 中记录编码耗时"""
+
+    @staticmethod
+    def dumps(*args, **kwargs):
+        with span('json_encode'):
+            return json.dumps(*args, **kwargs)
+
+    @staticmethod
+    def loads(*args, **kwargs):
+        return json.loads(*args, **kwargs)
+
+
+class Tracer:
+    """按 sample_rate 采样动作，把 span 写入轮转的 Chrome Trace 文件"""
+
+    def __init__(self, path: str, sample_rate: float = 0.01, max_bytes: int = 16 * 1024 * 1024,
+                 backups: int = 3, random_fn: Callable[[], float] = random.random):
+        self.path = path
+        self.sample_rate = sample_rate
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self._random = random_fn
+        self._ids = itertools.count(1)
+        self._file = None
+        self._size = 0
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+        self.sampled = 0
+        self.spans = 0
+
+    def trace(self, name: str, **tags):
+        """开始一条 trace（用作 with 语句），未被采样时返回空上下文"""
+        if self.sample_rate <= 0 or (self.sample_rate < 1 and self._random() >= self.sample_rate):
+            return NULL_SPAN
+        self.sampled += 1
+        trace = Trace(self, next(self._ids), tags)
+        return _RootSpan(trace, name, {'time': round(time.time(), 6)})
+
+    def record(self, trace: Trace, name: str, start_ns: int, end_ns: int, args: Dict):
+        """写入一个已结束的 span"""
+        event = {
+            'name': name,
+            'cat': 'action',
+            'ph': 'X',
+            'ts': start_ns / 1000,
+            'dur': (end_ns - start_ns) / 1000,
+            'pid': self._pid,
+            'tid': threading.get_native_id(),
+            'args': {'trace': trace.id, **trace.tags, **args},
+        }
+        line = json.dumps(event, ensure_ascii=False) + ',\n'
+        with self._lock:
+            if self._file is None:
+                self._open()
+            self._file.write(line)
+            self._size += len(line.encode())
+            self.spans += 1
+            if self._size >= self.max_bytes:
+                self._rotate()
+
+    def _open(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._file = open(self.path, 'a', encoding='utf-8')
+        self._size = self._file.tell()
+        if self._size == 0:
+            # Chrome Trace 的 JSON 数组格式允许省略结尾的 "]"
+            self._file.write('[\n')
+            self._size = 2
+
+    def _rotate(self):
+        self._file.close()
+        self._file = None
+        for index in range(self.backups - 1, 0, -1):
+            source = f"{self.path}.{index}"
+            if os.path.exists(source):
+                os.replace(source, f"{self.path}.{index + 1}")
+        if self.backups > 0:
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+
+    def flush(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.flush()
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def stats(self) -> Dict:
+        """追踪统计"""
+        return {'sample_rate': self.sample_rate, 'sampled': self.sampled, 'spans': self.spans}
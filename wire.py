@@ -0,0 +1,198 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""二进制线协议：MessagePack + 紧凑的游戏状态结构
+
+客户端连接时通过 auth={'protocol': 'msgpack'} 选择二进制协议。game_state 和
+player_info 会被压缩为定长数组，阵营/角色/阶段使用小整数编码，展示文字由客户端
+根据 client_tables() 下发的表还原。其他字段原样保留。
+"""
+
+from typing import Dict, List, Optional
+
+from game import GamePhase, Role, Team
+
+try:
+    import msgpack
+except ImportError:  # 未安装 msgpack 时只提供 JSON 协议
+    msgpack = None
+
+PROTOCOL_JSON = 'json'
+PROTOCOL_MSGPACK = 'msgpack'
+WIRE_VERSION = 2
+
+AVAILABLE = msgpack is not None
+
+TEAMS = list(Team)
+ROLES = list(Role)
+PHASES = list(GamePhase)
+
+TEAM_CODES = {team.value: code for code, team in enumerate(TEAMS)}
+ROLE_CODES = {role.display_name: code for code, role in enumerate(ROLES)}
+PHASE_CODES = {phase.value: code for code, phase in enumerate(PHASES)}
+
+# 玩家标志位
+FLAG_LEADER = 1
+FLAG_HAS_BEEN_LEADER = 2
+FLAG_SELF = 4
+
+
+def negotiate(requested: Optional[str]) -> str:
+    """根据客户端请求确定使用的协议"""
+    if requested == PROTOCOL_MSGPACK and AVAILABLE:
+        return PROTOCOL_MSGPACK
+    return PROTOCOL_JSON
+
+
+def client_tables() -> Dict:
+    """客户端还原展示文字所需的编码表"""
+    return {
+        'version': WIRE_VERSION,
+        'teams': [[team.value, team.display_name] for team in TEAMS],
+        'roles': [[role.display_name, role.description, TEAM_CODES[role.team.value]] for role in ROLES],
+        'phases': [phase.value for phase in PHASES],
+    }
+
+
+def compact_game_state(state: Dict) -> List:
+    """将 get_game_status() 的结果压缩为数组"""
+    seats = {}
+    players = []
+    leader_seat = None
+    for player in state['players']:
+        seat = player['player_number']
+        seats[player['name']] = seat
+        flags = (FLAG_LEADER if player['is_leader'] else 0) | \
+                (FLAG_HAS_BEEN_LEADER if player['has_been_leader'] else 0)
+        if player['is_leader']:
+            leader_seat = seat
+        players.append([
+            player['name'],
+            seat,
+            flags,
+            ROLE_CODES.get(player['role']),
+            TEAM_CODES.get(player['team']),
+            player['magic_tokens'],
+            player['amulets'],
+        ])
+
+    quest = state['current_quest']
+    winner = state.get('winner')
+    return [
+        state['quest_number'],
+        PHASE_CODES[state['current_phase']],
+        leader_seat,
+        players,
+        state['quest_results'],
+        state['successful_quests'],
+        state['failed_quests'],
+        [quest['required_players'],
+         [member['player_number'] for member in quest['team']],
+         [seats.get(name) for name in quest['votes']]],
+        TEAM_CODES[winner] if winner else None,
+    ]
+
+
+def expand_game_state(compact: List) -> Dict:
+    """还原 compact_game_state() 的结果（与客户端 expandGameState 一致）"""
+    (quest_number, phase, leader_seat, players, quest_results,
+     successful, failed, quest, winner) = compact
+    names = {}
+    expanded_players = []
+    for name, seat, flags, role, team, magic_tokens, amulets in players:
+        names[seat] = name
+        expanded_players.append({
+            'name': name,
+            'is_leader': bool(flags & FLAG_LEADER),
+            'has_been_leader': bool(flags & FLAG_HAS_BEEN_LEADER),
+            'role': ROLES[role].display_name if role is not None else None,
+            'team': TEAMS[team].value if team is not None else None,
+            'team_display': TEAMS[team].display_name if team is not None else None,
+            'player_number': seat,
+            'magic_tokens': magic_tokens,
+            'amulets': amulets,
+        })
+
+    required_players, team_seats, voter_seats = quest
+    state = {
+        'quest_number': quest_number,
+        'current_phase': PHASES[phase].value,
+        'current_leader': names.get(leader_seat),
+        'players': expanded_players,
+        'quest_results': quest_results,
+        'successful_quests': successful,
+        'failed_quests': failed,
+        'current_quest': {
+            'required_players': required_players,
+            'team': [{'name': names[seat], 'player_number': seat} for seat in team_seats],
+            'votes': [names[seat] for seat in voter_seats],
+        },
+    }
+    if winner is not None:
+        state['winner'] = TEAMS[winner].value
+    return state
+
+
+def compact_player_info(info: List[Dict]) -> List:
+    """将 get_player_info() 的结果压缩为数组"""
+    compact = []
+    for entry in info:
+        flags = (FLAG_LEADER if entry['is_leader'] else 0) | (FLAG_SELF if entry['is_self'] else 0)
+        compact.append([
+            entry['name'],
+            entry['number'],
+            flags,
+            ROLE_CODES.get(entry.get('role')),
+            TEAM_CODES.get(entry.get('team')),
+        ])
+    return compact
+
+
+def expand_player_info(compact: List) -> List[Dict]:
+    """还原 compact_player_info() 的结果（与客户端 expandPlayerInfo 一致）"""
+    info = []
+    for name, number, flags, role, team in compact:
+        entry = {
+            'name': name,
+            'number': number,
+            'is_leader': bool(flags & FLAG_LEADER),
+            'is_self': bool(flags & FLAG_SELF),
+        }
+        if role is not None:
+            entry['role'] = ROLES[role].display_name
+            if entry['is_self']:
+                entry['role_description'] = ROLES[role].description
+        if team is not None:
+            entry['team'] = TEAMS[team].value
+            entry['team_display'] = TEAMS[team].display_name
+        info.append(entry)
+    return info
+
+
+def compact_payload(payload):
+    """压缩事件负载中的 game_state / player_info，其余字段不变"""
+    if not isinstance(payload, dict):
+        return payload
+    compact = dict(payload)
+    if 'game_state' in compact:
+        compact['game_state'] = compact_game_state(compact['game_state'])
+    if 'player_info' in compact:
+        compact['player_info'] = compact_player_info(compact['player_info'])
+    return compact
+
+
+def encode(payload) -> bytes:
+    """编码为二进制事件负载"""
+    return msgpack.packb([WIRE_VERSION, compact_payload(payload)], use_bin_type=True)
+
+
+def decode(data: bytes):
+    """解码二进制事件负载"""
+    version, payload = msgpack.unpackb(data, raw=False)
+    if version != WIRE_VERSION:
+        raise ValueError(f"不支持的协议版本: {version}")
+    if isinstance(payload, dict):
+        if 'game_state' in payload:
+            payload['game_state'] = expand_game_state(payload['game_state'])
+        if 'player_info' in payload:
+            payload['player_info'] = expand_player_info(payload['player_info'])
+    return payload